@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Rate-Limiter gibt es nur einmal (Paket livekit_auth im Repo-Root, im Image neben app/)
+from livekit_auth.tokens import IdentityRateLimiter, RateLimited
+
+__all__ = ["IdentityRateLimiter", "LivekitTokenCache", "RateLimited", "TTLMemo"]
+
+
+class TTLMemo:
+    """Kleiner thread-sicherer TTL/LRU-Cache (z.B. Avatar-Metadaten aus Firestore)."""
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 5000, clock: Callable[[], float] = time.monotonic) -> None:
+        self.ttl = float(ttl_seconds)
+        self.max_entries = max_entries
+        self._clock = clock
+        self._data: "OrderedDict[Any, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        now = self._clock()
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is None:
+                return default
+            if hit[0] <= now:
+                self._data.pop(key, None)
+                return default
+            self._data.move_to_end(key)
+            return hit[1]
+
+    def set(self, key: Any, value: Any, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._data[key] = (self._clock() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class LivekitTokenCache:
+    """Signierte Tokens pro (room, identity, name, grants) bis kurz vor Ablauf wiederverwenden.
+
+    `mint(room, identity, name, ttl_seconds)` liefert das signierte JWT; der Cache
+    kennt die Signatur-Details nicht (LiveKit SDK oder PyJWT).
+    """
+
+    def __init__(
+        self,
+        mint: Callable[[str, str, str, int], str],
+        ttl_seconds: int = 3600,
+        refresh_margin_seconds: int = 300,
+        max_entries: int = 5000,
+        rate_limiter: Optional[IdentityRateLimiter] = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self._mint = mint
+        self.ttl = int(ttl_seconds)
+        self.refresh_margin = int(refresh_margin_seconds)
+        self.rate_limiter = rate_limiter
+        self._tokens = TTLMemo(max(1, self.ttl - self.refresh_margin), max_entries=max_entries, clock=clock)
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "rate_limited": 0}
+
+    def get_token(self, room: str, identity: str, name: str, grants_key: str = "room_join") -> str:
+        if self.rate_limiter is not None:
+            try:
+                self.rate_limiter.check(identity)
+            except RateLimited:
+                self.stats["rate_limited"] += 1
+                raise
+        key = (room, identity, name, grants_key)
+        token = self._tokens.get(key)
+        if token:
+            self.stats["hits"] += 1
+            return token
+        token = self._mint(room, identity, name, self.ttl)
+        self.stats["misses"] += 1
+        self._tokens.set(key, token)
+        return token
+
+    def metrics(self) -> Dict[str, int]:
+        return {**self.stats, "cached": len(self._tokens)}
@@ -59,6 +59,7 @@ except Exception as e:
     FIREBASE_AVAILABLE = False
 
 from .chunking import chunk_text
+from .livekit_tokens import IdentityRateLimiter, LivekitTokenCache, RateLimited, TTLMemo
 from .pinecone_client import (
     get_pinecone,
     ensure_index_exists,
@@ -372,6 +373,45 @@ class LivekitTokenResponse(BaseModel):
     room: str
     identity: str
 
+def _mint_livekit_jwt(room: str, identity: str, name: str, ttl_seconds: int) -> str:
+    at = lk_api.AccessToken(LIVEKIT_API_KEY, LIVEKIT_API_SECRET)
+    grants = lk_api.VideoGrants(room=room, room_join=True)
+    return (
+        at.with_identity(identity)
+        .with_name(name)
+        .with_grants(grants)
+        .with_ttl(timedelta(seconds=ttl_seconds))
+        .to_jwt()
+    )
+
+
+# Reconnect-Schleifen: signierte Tokens wiederverwenden + pro Identity drosseln
+_LK_TOKENS = LivekitTokenCache(
+    _mint_livekit_jwt,
+    ttl_seconds=3600,
+    refresh_margin_seconds=int(os.getenv("LIVEKIT_TOKEN_REFRESH_MARGIN", "300")),
+    rate_limiter=IdentityRateLimiter(
+        rate_per_sec=float(os.getenv("LIVEKIT_TOKEN_RATE_PER_SEC", "2")),
+        burst=int(os.getenv("LIVEKIT_TOKEN_BURST", "10")),
+    ),
+)
+# Zuletzt persistierte/gelesene avatarImageUrl pro (user_id, avatar_id)
+_AVATAR_IMAGE_MEMO = TTLMemo(ttl_seconds=float(os.getenv("AVATAR_INFO_TTL_SEC", "300")))
+
+
+def _sync_avatar_image_url(user_id: str, avatar_id: str, url: str) -> None:
+    """avatarImageUrl nur schreiben, wenn sie sich seit dem letzten Aufruf geändert hat."""
+    key = (user_id, avatar_id)
+    if _AVATAR_IMAGE_MEMO.get(key) == url:
+        return
+    doc_ref = db.collection("users").document(user_id).collection("avatars").document(avatar_id)
+    doc_ref.set({
+        "avatarImageUrl": url,
+        "updatedAt": firestore.SERVER_TIMESTAMP if FIREBASE_AVAILABLE else int(time.time()*1000),
+    }, merge=True)
+    _AVATAR_IMAGE_MEMO.set(key, url)
+
+
 @app.post("/livekit/token", response_model=LivekitTokenResponse)
 def create_livekit_token(payload: LivekitTokenRequest) -> LivekitTokenResponse:
     if not (LIVEKIT_URL and LIVEKIT_API_KEY and LIVEKIT_API_SECRET):
@@ -382,20 +422,20 @@ def create_livekit_token(payload: LivekitTokenRequest) -> LivekitTokenResponse:
         identity = payload.user_id.strip()
         room = (payload.room or f"user_{payload.user_id.strip()}_avatar_{payload.avatar_id.strip()}")[:128]
         name = (payload.name or identity)[:64]
-        at = lk_api.AccessToken(LIVEKIT_API_KEY, LIVEKIT_API_SECRET)
-        grants = lk_api.VideoGrants(room=room, room_join=True)
-        token = at.with_identity(identity).with_name(name).with_grants(grants).to_jwt()
+        token = _LK_TOKENS.get_token(room, identity, name)
         # Optional: Avatar-Bild in Firestore synchronisieren
         try:
             if FIREBASE_AVAILABLE and db and payload.avatar_image_url:
-                doc_ref = db.collection("users").document(payload.user_id).collection("avatars").document(payload.avatar_id)
-                doc_ref.set({
-                    "avatarImageUrl": payload.avatar_image_url.strip(),
-                    "updatedAt": firestore.SERVER_TIMESTAMP if FIREBASE_AVAILABLE else int(time.time()*1000),
-                }, merge=True)
+                _sync_avatar_image_url(payload.user_id, payload.avatar_id, payload.avatar_image_url.strip())
         except Exception as _e:
             logger.warning(f"AvatarImageUrl Persist Fehler: {_e}")
         return LivekitTokenResponse(url=LIVEKIT_URL, token=token, room=room, identity=identity)
+    except RateLimited as e:
+        raise HTTPException(
+            status_code=429,
+            detail="Zu viele Token-Anfragen",
+            headers={"Retry-After": str(max(1, int(e.retry_after + 0.999)))},
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Token Fehler: {e}")
 
@@ -2752,6 +2792,10 @@ def get_avatar_info(payload: AvatarInfoRequest) -> AvatarInfoResponse:
     try:
         if not FIREBASE_AVAILABLE or not db:
             return AvatarInfoResponse(avatar_image_url=None)
+        key = (payload.user_id, payload.avatar_id)
+        cached = _AVATAR_IMAGE_MEMO.get(key, default=False)
+        if cached is not False:
+            return AvatarInfoResponse(avatar_image_url=cached)
         doc = db.collection("users").document(payload.user_id).collection("avatars").document(payload.avatar_id).get()
         data = doc.to_dict() or {}
         url = None
@@ -2763,6 +2807,7 @@ def get_avatar_info(payload: AvatarInfoRequest) -> AvatarInfoResponse:
                 url = None
         except Exception:
             url = None
+        _AVATAR_IMAGE_MEMO.set(key, url)
         return AvatarInfoResponse(avatar_image_url=url)
     except Exception as e:
         logger.warning(f"Avatar Info Fehler: {e}")
@@ -1,8 +1,8 @@
 import os
+import sys
 import asyncio
 import json
 import requests
-import tempfile
 from pathlib import Path
 from typing import Optional
 from datetime import datetime
@@ -13,6 +13,10 @@ from pydantic import BaseModel
 import bithuman
 from bithuman import AsyncBithuman
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from bithuman_pipeline.runtime_pool import RuntimePool
+from dynamics_pipeline.workspace import Workspace, WorkspaceQuotaExceeded, default_manager
+
 # FastAPI App
 app = FastAPI(title="Avatar Backend", version="1.0.0")
 
@@ -26,7 +30,8 @@ app.add_middleware(
 )
 
 # Globale Variablen
-runtime = None
+runtime_pool: Optional[RuntimePool] = None  # Runtimes nach Modellpfad, LRU nach Speicher
+current_model: Optional[str] = None  # aktives Avatar-Modell (switch_avatar)
 UPLOAD_FOLDER = "avatars"
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
@@ -35,10 +40,22 @@ class SpeakRequest(BaseModel):
     text: str
     imx: str
 
+def _runtime_pool(api_secret: str) -> RuntimePool:
+    global runtime_pool
+    if runtime_pool is None:
+        runtime_pool = RuntimePool(
+            AsyncBithuman.create,
+            base_kwargs={"api_secret": api_secret},
+            max_bytes=int(float(os.getenv("BITHUMAN_POOL_MAX_GB", "8")) * 1024 ** 3),
+            max_runtimes=int(os.getenv("BITHUMAN_POOL_MAX_RUNTIMES", "4")),
+            stats_path=os.getenv("BITHUMAN_POOL_STATS", os.path.join("models", ".runtime_stats.json")),
+        )
+    return runtime_pool
+
 # BitHuman SDK Initialisierung - dynamisch je nach Avatar
 async def initialize_bithuman():
     """Initialisiert BitHuman SDK nur wenn Avatar-Modell vorhanden"""
-    global runtime
+    global current_model
     
     try:
         # Prüfe ob irgendein Avatar-Modell vorhanden ist
@@ -51,7 +68,6 @@ async def initialize_bithuman():
         
         if not imx_files:
             print("⚠️ BitHuman: Kein Avatar-Modell gefunden - wird beim Upload initialisiert")
-            runtime = None
             return True
         
         # Verwende das erste gefundene Modell
@@ -63,23 +79,22 @@ async def initialize_bithuman():
         if not api_secret:
             raise ValueError('BITHUMAN_API_KEY fehlt in Umgebungsvariablen')
         
-        # Offizielle SDK-Initialisierung
-        runtime = await AsyncBithuman.create(
-            model_path=model_path,
-            api_secret=api_secret,
-        )
+        # Offizielle SDK-Initialisierung über den Pool (+ beliebte Modelle der letzten Läufe)
+        pool = _runtime_pool(api_secret)
+        if await pool.preload([(model_path, {"model_path": model_path})]):
+            current_model = model_path
+        await pool.preload_popular(int(os.getenv("BITHUMAN_POOL_PRELOAD", "2")))
         print("✅ BitHuman SDK initialisiert")
         return True
         
     except Exception as e:
         print(f"⚠️ BitHuman: Wird beim Avatar-Upload initialisiert - {e}")
-        runtime = None
         return True
 
 # BitHuman Avatar wechseln
 async def switch_avatar(imx_filename: str):
-    """Wechselt zu einem anderen Avatar-Modell"""
-    global runtime
+    """Wechselt zu einem anderen Avatar-Modell (bereits geladene bleiben im Pool)"""
+    global current_model
     
     try:
         model_path = os.path.join("models", imx_filename)
@@ -87,20 +102,15 @@ async def switch_avatar(imx_filename: str):
             print(f"❌ Avatar-Modell nicht gefunden: {imx_filename}")
             return False
         
-        # Stoppe aktuellen Runtime
-        if runtime:
-            await runtime.stop()
-        
         # API Secret aus Umgebungsvariable
         api_secret = os.getenv('BITHUMAN_API_KEY')
         if not api_secret:
             raise ValueError('BITHUMAN_API_KEY fehlt in Umgebungsvariablen')
         
-        # Neuen Runtime starten
-        runtime = await AsyncBithuman.create(
-            model_path=model_path,
-            api_secret=api_secret,
-        )
+        # Laden, falls nicht schon im Pool – laufende Requests auf dem alten Modell laufen weiter
+        if not await _runtime_pool(api_secret).preload([(model_path, {"model_path": model_path})]):
+            return False
+        current_model = model_path
         print(f"✅ Avatar gewechselt zu: {imx_filename}")
         return True
         
@@ -109,8 +119,8 @@ async def switch_avatar(imx_filename: str):
         return False
 
 # ElevenLabs TTS
-async def generate_tts(text: str) -> Optional[str]:
-    """Generiert TTS Audio mit ElevenLabs"""
+async def generate_tts(text: str, ws: Workspace) -> Optional[str]:
+    """Generiert TTS Audio mit ElevenLabs (Datei landet im Request-Workspace)"""
     try:
         api_key = os.getenv('ELEVENLABS_API_KEY')
         voice_id = os.getenv('ELEVENLABS_VOICE_ID', 'pNInz6obpgDQGcFmaJgB')
@@ -137,12 +147,8 @@ async def generate_tts(text: str) -> Optional[str]:
         response = requests.post(url, headers=headers, json=data)
         
         if response.status_code == 200:
-            # Audio in temporärem Verzeichnis speichern
-            temp_dir = tempfile.gettempdir()
-            audio_path = os.path.join(temp_dir, f"tts_{os.urandom(4).hex()}.wav")
-            
-            with open(audio_path, "wb") as f:
-                f.write(response.content)
+            # Audio im Workspace des Requests speichern (mit Quota)
+            audio_path = str(ws.write_bytes(f"tts_{os.urandom(4).hex()}.wav", response.content))
                 
             print(f"✅ TTS Audio erstellt: {audio_path}")
             return audio_path
@@ -150,6 +156,8 @@ async def generate_tts(text: str) -> Optional[str]:
             print(f"❌ ElevenLabs Fehler: {response.status_code}")
             return None
             
+    except WorkspaceQuotaExceeded:
+        raise
     except Exception as e:
         print(f"❌ TTS Fehler: {e}")
         return None
@@ -158,16 +166,18 @@ async def generate_tts(text: str) -> Optional[str]:
 async def create_avatar_video(image_path: str, audio_path: str, output_path: str) -> bool:
     """Erstellt Avatar-Video mit BitHuman SDK"""
     try:
-        if not runtime:
+        if runtime_pool is None or not current_model:
             print("❌ BitHuman Runtime nicht initialisiert")
             return False
             
-        # Avatar-Video erstellen
-        success = await runtime.create_avatar_video(
-            image_path=image_path,
-            audio_path=audio_path,
-            output_path=output_path
-        )
+        # Avatar-Video erstellen (Runtime exklusiv ausleihen)
+        model_path = current_model
+        async with runtime_pool.checkout(model_path, model_path=model_path) as runtime:
+            success = await runtime.create_avatar_video(
+                image_path=image_path,
+                audio_path=audio_path,
+                output_path=output_path
+            )
         
         if success:
             print(f"✅ Avatar-Video erstellt: {output_path}")
@@ -181,9 +191,14 @@ async def create_avatar_video(image_path: str, audio_path: str, output_path: str
         return False
 
 # API Endpoints
+def _workspaces():
+    """Workspaces für /speak-Ergebnisse (bis zum Download behalten, Janitor räumt ab)"""
+    return default_manager("avatar-backend")
+
 @app.on_event("startup")
 async def startup_event():
     """Startup Event - Initialisiert BitHuman SDK"""
+    _workspaces()
     await initialize_bithuman()
 
 @app.get("/")
@@ -196,10 +211,13 @@ async def health():
     """Health Check"""
     key_present = bool(os.getenv('BITHUMAN_API_KEY'))
     # Als "ready" werten, sobald der API-Key vorhanden ist (Modell kann später kommen)
-    ready = key_present or (runtime is not None)
+    ready = key_present or (current_model is not None)
     return {
         "status": "healthy",
         "bithuman_ready": ready,
+        "current_model": current_model,
+        "runtime_pool": runtime_pool.metrics() if runtime_pool else None,
+        "workspaces": _workspaces().metrics(),
         "service": "avatar-backend"
     }
 
@@ -249,11 +267,13 @@ async def upload_imx_file(file: UploadFile = File(...)):
 @app.post("/speak")
 async def speak(req: SpeakRequest):
     """Startet Avatar-Sprechen mit Text"""
+    # Ergebnisse bleiben für /download liegen (keep), bei Fehlern wird sofort gelöscht
+    ws = _workspaces().create("speak")
     try:
         print(f"🗣️ Avatar-Sprechen: {req.text}")
         
         # 1. TTS Audio generieren
-        audio_path = await generate_tts(req.text)
+        audio_path = await generate_tts(req.text, ws)
         if not audio_path:
             raise HTTPException(status_code=500, detail="TTS-Generierung fehlgeschlagen")
             
@@ -263,11 +283,13 @@ async def speak(req: SpeakRequest):
             raise HTTPException(status_code=404, detail="Avatar-Modell nicht gefunden")
             
         # 3. Avatar-Video erstellen (falls BitHuman verfügbar)
-        if runtime:
-            output_path = os.path.join(tempfile.gettempdir(), f"avatar_{os.urandom(4).hex()}.mp4")
+        if runtime_pool is not None and current_model:
+            output_path = str(ws.file(f"avatar_{os.urandom(4).hex()}.mp4"))
             success = await create_avatar_video(imx_path, audio_path, output_path)
             
             if success:
+                ws.check_quota()
+                ws.keep()
                 return {
                     "status": "spoken",
                     "audio_path": audio_path,
@@ -276,23 +298,28 @@ async def speak(req: SpeakRequest):
                 }
         
         # Fallback: Nur Audio
+        ws.keep()
         return {
             "status": "audio_only",
             "audio_path": audio_path,
             "message": "Audio generiert (Avatar-Video nicht verfügbar)"
         }
         
+    except WorkspaceQuotaExceeded as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         print(f"❌ Speak Fehler: {e}")
         raise HTTPException(status_code=500, detail=f"Speak fehlgeschlagen: {str(e)}")
+    finally:
+        ws.close()
 
 @app.get("/download/{filename}")
 async def download_file(filename: str):
-    """Download für generierte Dateien"""
-    file_path = os.path.join(tempfile.gettempdir(), filename)
+    """Download für generierte Dateien (aus den behaltenen /speak-Workspaces)"""
+    file_path = _workspaces().find(filename)
     
-    if os.path.exists(file_path):
-        return FileResponse(file_path, filename=filename)
+    if file_path is not None:
+        return FileResponse(str(file_path), filename=file_path.name)
     else:
         raise HTTPException(status_code=404, detail="Datei nicht gefunden")
 
@@ -9,12 +9,12 @@ BitHuman LiveKit Agent - COMPLETE PRODUCTION VERSION
 - Firebase für Config/Voice IDs
 """
 
+import importlib.util
 import logging
 import os
 import sys
 from pathlib import Path
-from typing import Optional, List, Dict, Any
-import asyncio
+from typing import Optional
 
 from dotenv import load_dotenv
 from livekit.agents import (
@@ -26,7 +26,12 @@ from livekit.agents import (
     WorkerType,
     cli,
 )
-from livekit.plugins import bithuman, openai, silero
+from livekit.plugins import bithuman, openai
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from bithuman_pipeline.agent_bootstrap import ParticipantTimeout, PhaseTimer, get_model, prewarm, wait_for_participant
+from bithuman_pipeline.agent_config import config_service
+from bithuman_pipeline.knowledge import KnowledgeBase
 
 # ElevenLabs Plugin (falls vorhanden)
 try:
@@ -36,29 +41,13 @@ except ImportError:
     ELEVENLABS_AVAILABLE = False
     print("⚠️ livekit-plugins-elevenlabs nicht installiert")
 
-# Firebase Admin
-try:
-    import firebase_admin
-    from firebase_admin import credentials, firestore
-    FIREBASE_AVAILABLE = True
-except ImportError:
-    FIREBASE_AVAILABLE = False
-    print("⚠️ firebase-admin nicht installiert")
-
-# Pinecone
-try:
-    from pinecone import Pinecone, ServerlessSpec
-    PINECONE_AVAILABLE = True
-except ImportError:
-    PINECONE_AVAILABLE = False
+# Pinecone / OpenAI (Embeddings) – genutzt über bithuman_pipeline.knowledge, hier nur Verfügbarkeit
+PINECONE_AVAILABLE = importlib.util.find_spec("pinecone") is not None
+if not PINECONE_AVAILABLE:
     print("⚠️ pinecone-client nicht installiert")
 
-# OpenAI für Embeddings
-try:
-    from openai import OpenAI
-    OPENAI_CLIENT_AVAILABLE = True
-except ImportError:
-    OPENAI_CLIENT_AVAILABLE = False
+OPENAI_CLIENT_AVAILABLE = importlib.util.find_spec("openai") is not None
+if not OPENAI_CLIENT_AVAILABLE:
     print("⚠️ openai client nicht installiert")
 
 # Logging
@@ -72,168 +61,23 @@ if env_path.exists():
     logger.info(f"✅ .env geladen: {env_path}")
 
 
-class KnowledgeBase:
-    """Pinecone Knowledge Base mit OpenAI Fallback"""
-    
-    def __init__(
-        self,
-        pinecone_api_key: str,
-        pinecone_index_name: str,
-        openai_api_key: str,
-        namespace: str = None,
-    ):
-        self.namespace = namespace
-        self.openai_client = OpenAI(api_key=openai_api_key) if OPENAI_CLIENT_AVAILABLE else None
-        
-        # Pinecone initialisieren
-        if PINECONE_AVAILABLE and pinecone_api_key:
-            try:
-                self.pc = Pinecone(api_key=pinecone_api_key)
-                self.index = self.pc.Index(pinecone_index_name)
-                logger.info(f"✅ Pinecone verbunden: {pinecone_index_name}")
-            except Exception as e:
-                logger.error(f"❌ Pinecone Fehler: {e}")
-                self.pc = None
-                self.index = None
-        else:
-            self.pc = None
-            self.index = None
-    
-    async def query(self, question: str, top_k: int = 5) -> Optional[str]:
-        """
-        Fragt Pinecone Knowledge Base.
-        Returns: Context String oder None
-        """
-        if not self.index or not self.openai_client:
-            logger.warning("⚠️ Pinecone oder OpenAI Client nicht verfügbar")
-            return None
-        
-        try:
-            # 1. Embedding für Frage erstellen
-            response = await asyncio.to_thread(
-                self.openai_client.embeddings.create,
-                model="text-embedding-ada-002",
-                input=question,
-            )
-            query_embedding = response.data[0].embedding
-            
-            # 2. Pinecone Query
-            query_params = {
-                "vector": query_embedding,
-                "top_k": top_k,
-                "include_metadata": True,
-            }
-            if self.namespace:
-                query_params["namespace"] = self.namespace
-            
-            results = await asyncio.to_thread(
-                self.index.query,
-                **query_params
-            )
-            
-            if not results.matches:
-                logger.info("ℹ️ Pinecone: Keine Matches gefunden")
-                return None
-            
-            # 3. Relevante Matches filtern (Score > 0.7)
-            relevant_matches = [m for m in results.matches if m.score > 0.7]
-            
-            if not relevant_matches:
-                logger.info("ℹ️ Pinecone: Keine relevanten Matches (Score < 0.7)")
-                return None
-            
-            # 4. Context zusammenbauen
-            context_parts = []
-            for match in relevant_matches[:3]:  # Top 3
-                text = match.metadata.get('text', '')
-                source = match.metadata.get('source', 'Unknown')
-                context_parts.append(f"[{source}]: {text}")
-            
-            context = "\n\n".join(context_parts)
-            logger.info(f"✅ Pinecone Context: {len(context)} chars, {len(relevant_matches)} matches")
-            return context
-            
-        except Exception as e:
-            logger.error(f"❌ Pinecone Query Fehler: {e}")
-            return None
-
-
-def get_firebase_config(agent_id: str) -> Dict[str, Any]:
-    """
-    Holt Config aus Firebase für Agent ID.
-    
-    Returns:
-        {
-            'voice_id': str,
-            'namespace': str,
-            'instructions': str,
-        }
-    """
-    if not FIREBASE_AVAILABLE:
-        logger.warning("⚠️ Firebase nicht verfügbar")
-        return {}
-    
-    try:
-        if not firebase_admin._apps:
-            # Initialize Firebase
-            cred_path = os.getenv("FIREBASE_CREDENTIALS_PATH")
-            if cred_path and Path(cred_path).exists():
-                cred = credentials.Certificate(cred_path)
-                firebase_admin.initialize_app(cred)
-            else:
-                firebase_admin.initialize_app()
-        
-        db = firestore.client()
-        
-        # Suche Avatar mit agent_id
-        avatars_ref = db.collection('avatars')
-        query = avatars_ref.where('liveAvatar.agentId', '==', agent_id).limit(1)
-        docs = query.stream()
-        
-        for doc in docs:
-            data = doc.to_dict()
-            
-            # Voice ID
-            voice_data = data.get('training', {}).get('voice', {})
-            voice_id = voice_data.get('cloneVoiceId') or voice_data.get('elevenVoiceId')
-            if voice_id == '__CLONE__':
-                voice_id = None
-            
-            # Namespace für Pinecone
-            user_id = data.get('userId', '')
-            avatar_id = doc.id
-            namespace = f"{user_id}_{avatar_id}" if user_id else avatar_id
-            
-            # Instructions/Personality
-            instructions = data.get('personality') or data.get('description') or None
-            
-            config = {
-                'voice_id': voice_id.strip() if voice_id else None,
-                'namespace': namespace,
-                'instructions': instructions,
-                'avatar_name': data.get('name', 'Avatar'),
-            }
-            
-            logger.info(f"✅ Firebase Config: {config}")
-            return config
-        
-        logger.warning(f"⚠️ Kein Avatar mit agent_id={agent_id} gefunden")
-        return {}
-        
-    except Exception as e:
-        logger.error(f"❌ Firebase Config Fehler: {e}")
-        return {}
-
-
 async def entrypoint(ctx: JobContext):
     """
     LiveKit Agent Entrypoint - PRODUCTION VERSION
     """
+    timer = PhaseTimer()
     await ctx.connect()
+    timer.mark("connect")
     logger.info(f"🚀 Agent connected to room: {ctx.room.name}")
     
-    # Warte auf Participant
-    await ctx.wait_for_participant()
+    # Warte auf Participant (Room-Events mit Timeout statt Polling)
+    try:
+        await wait_for_participant(ctx.room)
+    except ParticipantTimeout as e:
+        logger.warning(f"⏱️ {e} → Job beendet")
+        ctx.shutdown(reason="no participant")
+        return
+    timer.mark("participant")
     logger.info(f"✅ Participant joined")
     
     # === ENVIRONMENT VARIABLES ===
@@ -259,12 +103,13 @@ async def entrypoint(ctx: JobContext):
     
     logger.info(f"🤖 Agent ID: {agent_id}")
     
-    # === FIREBASE CONFIG LADEN ===
-    firebase_config = get_firebase_config(agent_id)
+    # === FIREBASE CONFIG (Index des Workers, kein Query pro Join) ===
+    firebase_config = await config_service().aget(agent_id)
+    timer.mark("config")
     voice_id = firebase_config.get('voice_id')
     namespace = firebase_config.get('namespace')
-    custom_instructions = firebase_config.get('instructions')
-    avatar_name = firebase_config.get('avatar_name', 'Avatar')
+    custom_instructions = firebase_config.get('instructions') or firebase_config.get('description')
+    avatar_name = firebase_config.get('name', 'Avatar')
     
     # Fallback Voice ID
     if not voice_id:
@@ -277,14 +122,14 @@ async def entrypoint(ctx: JobContext):
     
     # === KNOWLEDGE BASE ===
     kb = None
-    if pinecone_api_key and PINECONE_AVAILABLE:
-        kb = KnowledgeBase(
-            pinecone_api_key=pinecone_api_key,
-            pinecone_index_name=pinecone_index,
-            openai_api_key=openai_api_key,
-            namespace=namespace,
-        )
-        logger.info("✅ Knowledge Base initialisiert")
+    if pinecone_api_key and PINECONE_AVAILABLE and OPENAI_CLIENT_AVAILABLE:
+        try:
+            kb = KnowledgeBase.from_env(namespace, index_name=pinecone_index)
+            kb.start_prefetch()  # häufige Chunks/Fragen des Avatars im Hintergrund vorladen
+            logger.info(f"✅ Knowledge Base initialisiert: {pinecone_index}")
+        except Exception as e:
+            logger.error(f"❌ Pinecone Fehler: {e}")
+            kb = None
     else:
         logger.warning("⚠️ Pinecone nicht verfügbar - Nur OpenAI Fallback")
     
@@ -357,14 +202,16 @@ Antworte basierend auf dem Kontext. Falls der Kontext nicht ausreicht, sage das
     # Agent Session
     session = AgentSession(
         llm=llm,
-        vad=silero.VAD.load(),
+        vad=get_model("vad", ctx.proc.userdata),  # aus prewarm, geteilt statt pro Session geladen
         tts=tts_engine,
     )
+    timer.mark("session")
     
     # === BITHUMAN AVATAR STARTEN ===
     try:
         logger.info("🎬 Starting BitHuman Avatar...")
         await bithuman_avatar.start(session, room=ctx.room)
+        timer.mark("avatar")
         logger.info("✅ BitHuman Avatar gestartet")
     except Exception as e:
         logger.error(f"❌ BitHuman Start Fehler: {e}")
@@ -388,17 +235,23 @@ Wichtig:
         room=ctx.room,
         room_output_options=RoomOutputOptions(audio_enabled=False),
     )
+    timer.mark("agent")
+    timer.report(ctx.room.name)
     
     logger.info("✅ Agent läuft - bereit für Conversation!")
 
 
 if __name__ == "__main__":
+    # Agent-Configs einmal laden + Listener; Job-Prozesse lesen den Snapshot
+    config_service().start()
     cli.run_app(
         WorkerOptions(
             entrypoint_fnc=entrypoint,
+            prewarm_fnc=prewarm,  # VAD einmal pro Job-Prozess
             worker_type=WorkerType.ROOM,
             job_memory_warn_mb=2000,
-            num_idle_processes=0,  # Scale-to-zero! Nur aktiv wenn Chat läuft
+            # Scale-to-zero! Nur aktiv wenn Chat läuft (>0: vorgewärmte Prozesse)
+            num_idle_processes=int(os.getenv("AGENT_IDLE_PROCESSES", "0")),
             initialize_process_timeout=300,
         )
     )
@@ -4,6 +4,7 @@ Basierend auf der offiziellen Dokumentation: https://docs.bithuman.ai
 """
 
 import os
+import sys
 from pathlib import Path
 import io
 from dotenv import load_dotenv, find_dotenv
@@ -14,7 +15,6 @@ import bithuman
 from bithuman import AsyncBithuman
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
 from fastapi.responses import FileResponse
-import tempfile
 import shutil
 import requests
 import time
@@ -24,10 +24,21 @@ import subprocess
 import traceback
 from typing import Tuple
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from bithuman_pipeline.http_range import ranged_file_response
+from bithuman_pipeline.job_store import (
+    CANCELLED, EXPIRED, FAILED, QUEUED, RUNNING, SUCCEEDED, AvatarJobStore, InvalidTransition,
+)
+from bithuman_pipeline.runtime_pool import RuntimePool
+from bithuman_pipeline.stream_encoder import encode_still, encode_stream
+from dynamics_pipeline.workspace import WorkspaceQuotaExceeded, default_manager
+
 # BitHuman SDK initialisieren
 runtime = None
 API_SECRET_CACHE = None
-JOBS: dict[str, dict] = {}
+_JOB_STORE: Optional[AvatarJobStore] = None
+_JOB_TASKS: dict[str, asyncio.Task] = {}  # nur laufende/wartende Jobs dieses Prozesses
+_JOB_SLOTS: Optional[asyncio.Semaphore] = None
 
 async def initialize_bithuman():
     """Initialisiert BitHuman SDK mit offiziellem API Secret"""
@@ -105,49 +116,108 @@ try:
 except Exception:
     OPENAI_CLIENT = None
 
-async def _try_load_imx_into_global_runtime() -> bool:
-    """Versucht beim Start ein lokales .imx in die globale Runtime zu laden."""
-    try:
-        global runtime, API_SECRET_CACHE
-        if not API_SECRET_CACHE:
-            return False
-        # Pfad aus ENV oder aus ./avatars größtes .imx wählen
-        imx_env = os.getenv("BITHUMAN_IMX_PATH", "").strip()
-        imx_path: Optional[Path] = None
-        if imx_env:
-            p = Path(imx_env)
-            if p.exists() and p.is_file() and p.suffix.lower() == ".imx":
-                imx_path = p
-        if imx_path is None:
-            avatars_dir = Path(__file__).resolve().parents[1] / "avatars"
-            if avatars_dir.exists() and avatars_dir.is_dir():
-                imx_files = [f for f in avatars_dir.iterdir() if f.is_file() and f.suffix.lower() == ".imx"]
-                if imx_files:
-                    imx_files.sort(key=lambda f: f.stat().st_size, reverse=True)
-                    imx_path = imx_files[0]
-        if imx_path is None:
-            print("ℹ️ Startup: kein lokales .imx gefunden")
-            return False
-        # Runtime erstellen und Modell setzen
-        print(f"🧠 Startup: lade .imx in globale Runtime: {imx_path}")
-        rt = await AsyncBithuman.create(
-            api_secret=API_SECRET_CACHE,
-            model_path=str(imx_path),
+def _local_imx_path() -> Optional[Path]:
+    """.imx aus BITHUMAN_IMX_PATH oder das größte in ./avatars (None, wenn keins da ist)."""
+    imx_env = os.getenv("BITHUMAN_IMX_PATH", "").strip()
+    if imx_env:
+        p = Path(imx_env)
+        if p.exists() and p.is_file() and p.suffix.lower() == ".imx":
+            return p
+    avatars_dir = Path(__file__).resolve().parents[1] / "avatars"
+    if avatars_dir.exists() and avatars_dir.is_dir():
+        imx_files = [f for f in avatars_dir.iterdir() if f.is_file() and f.suffix.lower() == ".imx"]
+        if imx_files:
+            imx_files.sort(key=lambda f: f.stat().st_size, reverse=True)
+            return imx_files[0]
+    return None
+
+
+def _runtime_target(figure_id: Optional[str] = None, runtime_model_hash: Optional[str] = None):
+    """Pool-Schlüssel + Erzeugungs-Parameter: Request-Figur > lokales .imx > .env-Defaults."""
+    if figure_id or runtime_model_hash:
+        kw = {k: v for k, v in (("figure_id", figure_id), ("runtime_model_hash", runtime_model_hash)) if v}
+        return f"figure:{figure_id or ''}:{runtime_model_hash or ''}", kw
+    imx_path = _local_imx_path()
+    if imx_path is not None:
+        return str(imx_path), {"model_path": str(imx_path)}
+    env_figure = os.getenv("BITHUMAN_DEFAULT_FIGURE_ID", "").strip() or None
+    env_model = os.getenv("BITHUMAN_DEFAULT_MODEL_HASH", "").strip() or None
+    kw = {k: v for k, v in (("figure_id", env_figure), ("runtime_model_hash", env_model)) if v}
+    return f"figure:{env_figure or ''}:{env_model or ''}", kw
+
+
+_RUNTIME_POOL: Optional[RuntimePool] = None
+
+
+def _runtime_pool() -> RuntimePool:
+    """Runtime-Pool (lazy, braucht API_SECRET_CACHE aus initialize_bithuman)."""
+    global _RUNTIME_POOL
+    if _RUNTIME_POOL is None:
+        _RUNTIME_POOL = RuntimePool(
+            AsyncBithuman.create,
+            base_kwargs={"api_secret": API_SECRET_CACHE},
+            max_bytes=int(float(os.getenv("BITHUMAN_POOL_MAX_GB", "8")) * 1024 ** 3),
+            max_runtimes=int(os.getenv("BITHUMAN_POOL_MAX_RUNTIMES", "4")),
+            stats_path=os.getenv("BITHUMAN_POOL_STATS", "/tmp/bithuman_runtime_stats.json"),
         )
-        runtime = rt
-        print("✅ Startup: .imx Modell global gesetzt")
-        return True
-    except Exception as e:
-        print(f"⚠️ Startup .imx Laden fehlgeschlagen: {e}")
-        return False
+    return _RUNTIME_POOL
+
+
+async def _preload_runtimes():
+    """Beim Start: lokales .imx + die meistgenutzten Modelle der letzten Läufe vorladen."""
+    if not API_SECRET_CACHE:
+        return
+    pool = _runtime_pool()
+    imx_path = _local_imx_path()
+    if imx_path is not None:
+        print(f"🧠 Startup: lade .imx in den Runtime-Pool: {imx_path}")
+        await pool.preload([(str(imx_path), {"model_path": str(imx_path)})])
+    loaded = await pool.preload_popular(int(os.getenv("BITHUMAN_POOL_PRELOAD", "2")))
+    if loaded:
+        print(f"✅ Startup: vorgeladen {loaded}")
+
+
+def _workspaces():
+    """Request-Workspaces (eigenes Verzeichnis pro Request, Janitor räumt Verwaistes auf)"""
+    return default_manager("bithuman")
+
+
+def _job_store() -> AvatarJobStore:
+    """Avatar-Jobs in SQLite: überstehen Neustarts, TTL für Records und Videos"""
+    global _JOB_STORE
+    if _JOB_STORE is None:
+        data_dir = os.getenv("BITHUMAN_JOBS_DIR", "/tmp/bithuman_jobs")
+        ttl_h = float(os.getenv("BITHUMAN_JOB_TTL_H", "24"))
+        _JOB_STORE = AvatarJobStore(
+            os.path.join(data_dir, "jobs.sqlite3"),
+            os.path.join(data_dir, "results"),
+            ttl_s=ttl_h * 3600,
+            max_records=int(os.getenv("BITHUMAN_JOB_MAX_RECORDS", "10000")),
+            max_result_bytes=int(float(os.getenv("BITHUMAN_JOB_RESULTS_MAX_GB", "20")) * 1024 ** 3),
+        )
+    return _JOB_STORE
+
+
+async def _purge_jobs_loop():
+    interval = float(os.getenv("BITHUMAN_JOB_PURGE_INTERVAL_S", "300"))
+    while True:
+        try:
+            await asyncio.to_thread(_job_store().purge)
+        except Exception as e:
+            print(f"⚠️ Job-Purge fehlgeschlagen: {e}")
+        await asyncio.sleep(interval)
 
 
 @app.on_event("startup")
 async def startup_event():
     """Initialisiert BitHuman beim Start"""
+    _workspaces()
     await initialize_bithuman()
-    # Optional: globales .imx laden
-    await _try_load_imx_into_global_runtime()
+    # Jobs eines vorherigen Prozesses, die mitten im Lauf waren, können nicht weiterlaufen
+    _job_store().recover()
+    asyncio.get_running_loop().create_task(_purge_jobs_loop())
+    # Optional: lokales .imx und beliebte Modelle vorladen
+    await _preload_runtimes()
 
 
 @app.post("/stt/whisper")
@@ -158,10 +228,8 @@ async def stt_whisper(audio: UploadFile = File(...), language: str | None = Form
     try:
         if OPENAI_CLIENT is None:
             raise HTTPException(status_code=500, detail="OPENAI_API_KEY fehlt oder Client nicht initialisiert")
-        with tempfile.TemporaryDirectory() as td:
-            tmp = Path(td) / (audio.filename or "audio.m4a")
-            with open(tmp, "wb") as buf:
-                shutil.copyfileobj(audio.file, buf)
+        async with _workspaces().aworkspace("stt") as ws:
+            tmp = await ws.save_upload(audio, audio.filename or "audio.m4a")
             # Whisper Transkription
             with open(tmp, "rb") as f:
                 resp = OPENAI_CLIENT.audio.transcriptions.create(
@@ -186,6 +254,8 @@ async def stt_whisper(audio: UploadFile = File(...), language: str | None = Form
             return {"text": text}
     except HTTPException:
         raise
+    except WorkspaceQuotaExceeded as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         print(f"[stt/whisper] Exception: {e}\n{traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=f"STT Fehler: {e}")
@@ -259,14 +329,12 @@ async def test_simple_avatar():
 async def test_video_creation():
     """Test Video-Erstellung ohne BitHuman"""
     try:
-        import tempfile
         import cv2
         import numpy as np
-        from pathlib import Path
 
-        with tempfile.TemporaryDirectory() as temp_dir:
-            temp_path = Path(temp_dir)
-            video_path = temp_path / "test_video.mp4"
+        # TemporaryDirectory war schon gelöscht, bevor FileResponse die Datei las
+        async with _workspaces().aworkspace("test-video") as ws:
+            video_path = ws.file("test_video.mp4")
 
             # Erstelle Test-Video
             fourcc = cv2.VideoWriter_fourcc(*'mp4v')
@@ -283,7 +351,8 @@ async def test_video_creation():
                 return FileResponse(
                     path=str(video_path),
                     media_type="video/mp4",
-                    filename="test_video.mp4"
+                    filename="test_video.mp4",
+                    background=ws.handoff(),
                 )
             else:
                 return {"error": "Video nicht erstellt"}
@@ -291,6 +360,68 @@ async def test_video_creation():
     except Exception as e:
         return {"error": f"Video-Test fehlgeschlagen: {e}"}
 
+async def _render_avatar(image_path: Path, audio_path: Path, output_path: Path,
+                         figure_id: Optional[str] = None, runtime_model_hash: Optional[str] = None) -> bool:
+    """Bild + Audio → MP4 (output_path) über den Runtime-Pool; Standbild-Fallback ohne Frames.
+
+    Gemeinsam für /generate-avatar (synchron) und die Avatar-Jobs. Wirft bei SDK-Fehlern.
+    """
+    # Runtime aus dem Pool: nach Modell geschlüsselt, pro Request exklusiv ausgeliehen
+    # (kein Neuladen pro Request, keine fremde Figur aus einer globalen Runtime)
+    pool_key, create_kwargs = _runtime_target(figure_id, runtime_model_hash)
+    print(f"🧠 Runtime-Pool Schlüssel: {pool_key}")
+
+    print("🚀 ECHTE BitHuman Avatar-Generierung startet...")
+
+    # 1. Audio KORREKT konvertieren: 16kHz, Mono, int16
+    import numpy as np
+    import librosa
+
+    # Audio laden und zu 16kHz konvertieren (nicht 44.1kHz!)
+    audio_data, _ = librosa.load(str(audio_path), sr=16000, mono=True)
+    audio_pcm = (audio_data * 32767).astype(np.int16)
+    print(f"✅ Audio KORREKT konvertiert: {len(audio_pcm)} samples, 16000 Hz, int16")
+
+    fps = 30
+    try:
+        audio_duration_s = float(len(audio_pcm)) / 16000.0
+    except Exception:
+        audio_duration_s = 5.0
+    max_frames = max(1, int((audio_duration_s + 0.2) * fps))
+
+    # 2. Runtime ausleihen (lädt + startet sie beim ersten Mal)
+    async with _runtime_pool().checkout(pool_key, **create_kwargs) as local_runtime:
+        # 3. Audio zur Verarbeitung senden (16kHz!) – Bytes verwenden
+        await local_runtime.push_audio(audio_pcm.tobytes(), 16000)
+        print("✅ Audio-Daten gesendet (16kHz)")
+
+        # 4. Frames direkt in EINEN ffmpeg-Lauf streamen (H.264 + AAC, kein Frame-Puffer im RAM)
+        encoded = await encode_stream(
+            local_runtime.run(),
+            str(output_path),
+            audio_path=str(audio_path),
+            fps=fps,
+            max_frames=max_frames,
+        )
+    if encoded["source_error"]:
+        print(f"⚠️ Frame-Iteration fehlgeschlagen: {encoded['source_error']}")
+    print(f"🎬 Video gestreamt: {encoded['frames']} frames @ {fps} fps in {encoded['elapsed_s']:.1f}s")
+    result = encoded["ok"]
+    if encoded["frames"] and not result:
+        print(f"⚠️ ffmpeg Streaming-Encode fehlgeschlagen: {encoded['stderr'][-500:]}")
+
+    if not encoded["frames"]:
+        print("❌ Keine Frames generiert - Fallback statisches Video + Audio")
+        still = await asyncio.to_thread(
+            encode_still, str(image_path), str(output_path),
+            audio_path=str(audio_path), fps=fps, duration_s=audio_duration_s + 0.2,
+        )
+        result = still["ok"]
+        if not result:
+            print(f"⚠️ ffmpeg Standbild-Encode fehlgeschlagen: {still['stderr'][-500:]}")
+    return result
+
+
 @app.post("/generate-avatar")
 async def generate_avatar(
     image: UploadFile = File(...),
@@ -308,21 +439,14 @@ async def generate_avatar(
     Returns:
         Video-Datei oder Fehler
     """
+    # Eigener Workspace pro Request: wird nach dem Senden der Antwort, bei Fehlern
+    # und bei Abbruch gelöscht (vorher: mkdtemp ohne Aufräumen)
+    ws = _workspaces().create("generate-avatar")
     try:
-        # Temporäre Dateien erstellen - PERSISTENT!
-        temp_dir = tempfile.mkdtemp()  # Nicht auto-delete!
-        temp_path = Path(temp_dir)
-
-        # Dateien speichern
-        image_path = temp_path / f"avatar_{image.filename}"
-        audio_path = temp_path / f"audio_{audio.filename}"
-        output_path = temp_path / "avatar_video.mp4"
-
-        # Upload-Dateien speichern
-        with open(image_path, "wb") as buffer:
-            shutil.copyfileobj(image.file, buffer)
-        with open(audio_path, "wb") as buffer:
-            shutil.copyfileobj(audio.file, buffer)
+        # Upload-Dateien speichern (mit Quota)
+        image_path = await ws.save_upload(image, f"avatar_{image.filename}")
+        audio_path = await ws.save_upload(audio, f"audio_{audio.filename}")
+        output_path = ws.file("avatar_video.mp4")
 
         print(f"📁 Dateien gespeichert:")
         print(f"   🖼️ Bild: {image_path}")
@@ -333,265 +457,14 @@ async def generate_avatar(
         except Exception:
             pass
 
-        # FIGURE AUS BILD ERSTELLEN (für .imx Model)
-        global runtime, API_SECRET_CACHE
-        local_runtime = None
-
         if not API_SECRET_CACHE:
             raise HTTPException(status_code=500, detail="BitHuman API-Key nicht verfügbar")
 
-        # 1. Figure aus Bild erstellen - VEREINFACHT
-        if not figure_id:
-            print("🎭 Verwende Standard-Runtime ohne spezifische Figure...")
-            # Für jetzt: Ohne Figure-Erstellung, direkt mit API-Key
-
-        # 2. Runtime mit Figure erstellen (globale Runtime bevorzugen, wenn vorhanden)
         try:
-            # Wenn globale Runtime vorhanden, wiederverwenden (nicht stoppen)
-            if runtime is not None:
-                local_runtime = runtime
-                print("♻️ Verwende globale Runtime")
-            # Andernfalls per-request erstellen
-            kw = {"api_secret": API_SECRET_CACHE}
-            # Optional: Defaults aus .env verwenden, falls nichts aus der App kommt
-            env_figure = os.getenv("BITHUMAN_DEFAULT_FIGURE_ID", "").strip() or None
-            env_model = os.getenv("BITHUMAN_DEFAULT_MODEL_HASH", "").strip() or None
-            eff_figure = figure_id or env_figure
-            eff_model = runtime_model_hash or env_model
-            if eff_figure:
-                kw["figure_id"] = eff_figure
-            if eff_model:
-                kw["runtime_model_hash"] = eff_model
-
-            if local_runtime is None:
-                local_runtime = await AsyncBithuman.create(**kw)
-                print(f"✅ Per-request Runtime erstellt: figure_id={eff_figure}, hash={eff_model}")
-
-            # Versuche ein lokales .imx Modell zu nutzen
-            try:
-                imx_env = os.getenv("BITHUMAN_IMX_PATH", "").strip()
-                imx_path: Optional[Path] = None
-                if imx_env:
-                    p = Path(imx_env)
-                    if p.exists() and p.is_file() and p.suffix.lower() == ".imx":
-                        imx_path = p
-                if imx_path is None:
-                    avatars_dir = Path(__file__).resolve().parents[1] / "avatars"
-                    if avatars_dir.exists() and avatars_dir.is_dir():
-                        imx_files = [f for f in avatars_dir.iterdir() if f.is_file() and f.suffix.lower() == ".imx"]
-                        if imx_files:
-                            imx_files.sort(key=lambda f: f.stat().st_size, reverse=True)
-                            imx_path = imx_files[0]
-
-                if imx_path is not None and local_runtime is None:
-                    # Direkt mit model_path initialisieren statt set_model()
-                    kw_with_model = dict(kw)
-                    kw_with_model["model_path"] = str(imx_path)
-                    local_runtime = await AsyncBithuman.create(**kw_with_model)
-                    print(f"✅ Runtime mit .imx initialisiert: {imx_path}")
-                elif imx_path is None:
-                    print("ℹ️ Kein lokales .imx gefunden – verwende ggf. figure_id/runtime_model_hash")
-            except Exception as e_imx:
-                print(f"⚠️ .imx Handling Fehler: {e_imx}")
-        except Exception as e:
-            print(f"❌ Per-request Runtime Fehler: {e}")
-            raise HTTPException(status_code=500, detail=f"BitHuman Runtime-Erstellung fehlgeschlagen: {e}")
-
-        # Avatar-Video mit BitHuman erstellen
-        if not local_runtime:
-            raise HTTPException(status_code=500, detail="BitHuman Runtime nicht bereit")
-
-        # BitHuman Figure/Runtime-API verwenden (streaming-basiert)
-        print(f"🔍 Verwende BitHuman streaming API...")
-
-        try:
-            # ECHTE BITHUMAN INTEGRATION - JETZT RICHTIG!
-            print("🚀 ECHTE BitHuman Avatar-Generierung startet...")
-
-            # 1. Audio KORREKT konvertieren: 16kHz, Mono, int16
-            import numpy as np
-            import librosa
-
-            # Audio laden und zu 16kHz konvertieren (nicht 44.1kHz!)
-            audio_data, _ = librosa.load(str(audio_path), sr=16000, mono=True)
-            audio_pcm = (audio_data * 32767).astype(np.int16)
-            print(f"✅ Audio KORREKT konvertiert: {len(audio_pcm)} samples, 16000 Hz, int16")
-
-            # 2. Runtime starten
-            await local_runtime.start()
-            print("✅ BitHuman Runtime gestartet")
-
-            # 3. Audio zur Verarbeitung senden (16kHz!) – Bytes verwenden
-            audio_bytes = audio_pcm.tobytes()
-            await local_runtime.push_audio(audio_bytes, 16000)
-            print("✅ Audio-Daten gesendet (16kHz)")
-
-            # 4. Verarbeitung starten und Frames sammeln (bis zur Audiolänge)
-            frames = []
-            fps = 30
-            try:
-                audio_duration_s = float(len(audio_pcm)) / 16000.0
-            except Exception:
-                audio_duration_s = 5.0
-            max_frames = max(1, int((audio_duration_s + 0.2) * fps))
-            try:
-                run_gen = local_runtime.run()
-                # Async-Generator
-                if hasattr(run_gen, "__aiter__"):
-                    print("✅ Runtime läuft (async generator)")
-                    async for frame in run_gen:
-                        frames.append(frame)
-                        if len(frames) >= max_frames:
-                            break
-                else:
-                    # Sync-Iterator fallback
-                    print("✅ Runtime läuft (sync iterator)")
-                    for frame in run_gen:
-                        frames.append(frame)
-                        if len(frames) >= max_frames:
-                            break
-            except Exception as e_run:
-                print(f"⚠️ Frame-Iteration fehlgeschlagen: {e_run}")
-
-            print(f"📹 Frames gesammelt: {len(frames)}")
-
-            if frames and len(frames) > 0:
-                # ECHTES MP4-VIDEO ERSTELLEN und AUDIO MUXEN
-                import cv2
-
-                # Video ohne Audio zuerst schreiben
-                fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-                height, width = frames[0].shape[:2]
-                temp_video = output_path.with_name("avatar_video_no_audio.mp4")
-                video_writer = cv2.VideoWriter(str(temp_video), fourcc, fps, (width, height))
-
-                for frame in frames:
-                    video_writer.write(frame)
-
-                video_writer.release()
-                print(f"🎬 Video ohne Audio erstellt: {len(frames)} frames @ {fps} fps")
-
-                # Audio in das Video muxen (ffmpeg bevorzugt)
-                ffmpeg = shutil.which("ffmpeg")
-                if ffmpeg:
-                    try:
-                        cmd = [
-                            ffmpeg, "-y",
-                            "-i", str(temp_video),
-                            "-i", str(audio_path),
-                            "-c:v", "copy",
-                            "-c:a", "aac",
-                            "-shortest",
-                            str(output_path),
-                        ]
-                        print("🔊 ffmpeg mux:", " ".join(cmd))
-                        subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                        result = True
-                    except subprocess.CalledProcessError as e:
-                        print(f"⚠️ ffmpeg mux fehlgeschlagen: {e}")
-                        result = False
-                else:
-                    # Fallback: MoviePy
-                    try:
-                        from moviepy.editor import VideoFileClip, AudioFileClip
-                        v = VideoFileClip(str(temp_video))
-                        a = AudioFileClip(str(audio_path))
-                        v = v.set_audio(a)
-                        v.write_videofile(
-                            str(output_path),
-                            codec="libx264",
-                            audio_codec="aac",
-                            fps=fps,
-                            verbose=False,
-                            logger=None,
-                        )
-                        result = True
-                    except Exception as e:
-                        print(f"⚠️ MoviePy mux fehlgeschlagen: {e}")
-                        result = False
-
-                # Temp-Datei aufräumen
-                try:
-                    if temp_video.exists():
-                        temp_video.unlink()
-                except Exception:
-                    pass
-
-            else:
-                print("❌ Keine Frames generiert - Fallback statisches Video + Audio")
-                import cv2
-
-                img = cv2.imread(str(image_path))
-                if img is None:
-                    raise Exception("Konnte Input-Bild nicht laden")
-
-                height, width = img.shape[:2]
-                temp_video = output_path.with_name("fallback_no_audio.mp4")
-                fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-                video_writer = cv2.VideoWriter(str(temp_video), fourcc, fps, (width, height))
-
-                # Frames entsprechend Audiolänge schreiben
-                total_frames = max(1, int((audio_duration_s + 0.2) * fps))
-                for _ in range(total_frames):
-                    video_writer.write(img)
-
-                video_writer.release()
-
-                # Audio muxen
-                ffmpeg = shutil.which("ffmpeg")
-                if ffmpeg:
-                    try:
-                        cmd = [
-                            ffmpeg, "-y",
-                            "-i", str(temp_video),
-                            "-i", str(audio_path),
-                            "-c:v", "copy",
-                            "-c:a", "aac",
-                            "-shortest",
-                            str(output_path),
-                        ]
-                        print("🔊 ffmpeg mux (fallback):", " ".join(cmd))
-                        subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                        result = True
-                    except subprocess.CalledProcessError as e:
-                        print(f"⚠️ ffmpeg mux (fallback) fehlgeschlagen: {e}")
-                        result = False
-                else:
-                    try:
-                        from moviepy.editor import VideoFileClip, AudioFileClip
-                        v = VideoFileClip(str(temp_video))
-                        a = AudioFileClip(str(audio_path))
-                        v = v.set_audio(a)
-                        v.write_videofile(
-                            str(output_path),
-                            codec="libx264",
-                            audio_codec="aac",
-                            fps=fps,
-                            verbose=False,
-                            logger=None,
-                        )
-                        result = True
-                    except Exception as e:
-                        print(f"⚠️ MoviePy mux (fallback) fehlgeschlagen: {e}")
-                        result = False
-
-                try:
-                    if temp_video.exists():
-                        temp_video.unlink()
-                except Exception:
-                    pass
-
+            result = await _render_avatar(image_path, audio_path, output_path, figure_id, runtime_model_hash)
         except Exception as e:
             print(f"❌ BitHuman streaming API Fehler: {e}")
             raise HTTPException(status_code=500, detail=f"BitHuman Verarbeitung fehlgeschlagen: {e}")
-        finally:
-            # Globale Runtime nicht stoppen, per-request Runtimes schon
-            try:
-                if local_runtime is not None and local_runtime is not runtime:
-                    await local_runtime.stop()
-                    print("✅ BitHuman Runtime gestoppt")
-            except:
-                pass
 
         # SICHERER FILE-RESPONSE
         if result and output_path.exists() and output_path.stat().st_size > 0:
@@ -599,7 +472,8 @@ async def generate_avatar(
             return FileResponse(
                 path=str(output_path),
                 media_type="video/mp4",
-                filename="avatar_video.mp4"
+                filename="avatar_video.mp4",
+                background=ws.handoff(),
             )
         else:
             error_msg = f"Video-Datei nicht gefunden oder leer: exists={output_path.exists()}"
@@ -610,12 +484,145 @@ async def generate_avatar(
             # Wichtig: mit Fehlerstatus antworten, damit der Client kein JSON als MP4 behandelt
             raise HTTPException(status_code=502, detail=error_msg)
 
+    except WorkspaceQuotaExceeded as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         print(f"💥 Avatar-Generierung Fehler: {e}")
         raise HTTPException(
         status_code=500,
         detail=f"Avatar-Generierung Fehler: {str(e)}"
         )
+    finally:
+        ws.close()
+
+
+async def _run_avatar_job(job_id: str, ws, image_path: Path, audio_path: Path,
+                          figure_id: Optional[str], runtime_model_hash: Optional[str]):
+    store = _job_store()
+    try:
+        async with _JOB_SLOTS:
+            store.transition(job_id, RUNNING)
+            output_path = ws.file("avatar_video.mp4")
+            ok = await _render_avatar(image_path, audio_path, output_path, figure_id, runtime_model_hash)
+            if not (ok and output_path.exists() and output_path.stat().st_size > 0):
+                raise RuntimeError("Video-Datei nicht erstellt oder leer")
+            await asyncio.to_thread(store.attach_result, job_id, str(output_path))
+            store.transition(job_id, SUCCEEDED)
+            print(f"✅ Avatar-Job {job_id} fertig")
+    except asyncio.CancelledError:
+        _finish_job(job_id, CANCELLED)
+        raise
+    except Exception as e:
+        print(f"❌ Avatar-Job {job_id} fehlgeschlagen: {e}")
+        _finish_job(job_id, FAILED, error=str(e)[:500])
+    finally:
+        _JOB_TASKS.pop(job_id, None)
+        # Video liegt nach attach_result im results_dir – hier bleiben nur Eingaben/Reste
+        ws.cleanup()
+
+
+def _finish_job(job_id: str, status: str, **fields):
+    try:
+        _job_store().transition(job_id, status, **fields)
+    except (KeyError, InvalidTransition):
+        pass
+
+
+@app.post("/generate-avatar/jobs", status_code=202)
+async def submit_avatar_job(
+    image: UploadFile = File(...),
+    audio: UploadFile = File(...),
+    figure_id: str | None = Form(None),
+    runtime_model_hash: str | None = Form(None),
+    user_id: str | None = Form(None),
+):
+    """Wie /generate-avatar, aber asynchron: Job anlegen, Video später per /generate-avatar/jobs/{id}/video"""
+    global _JOB_SLOTS
+    if not API_SECRET_CACHE:
+        raise HTTPException(status_code=500, detail="BitHuman API-Key nicht verfügbar")
+    store = _job_store()
+    # Begrenzte Warteschlange: unter Dauerlast lieber 429 als unbegrenzt Uploads/Tasks im Speicher
+    max_pending = int(os.getenv("BITHUMAN_JOB_MAX_PENDING", "50"))
+    if len(_JOB_TASKS) >= max_pending:
+        raise HTTPException(status_code=429, detail=f"Zu viele offene Avatar-Jobs ({len(_JOB_TASKS)})")
+    if _JOB_SLOTS is None:
+        _JOB_SLOTS = asyncio.Semaphore(int(os.getenv("BITHUMAN_JOB_CONCURRENCY", "2")))
+
+    ws = _workspaces().create("avatar-job")
+    try:
+        image_path = await ws.save_upload(image, f"avatar_{image.filename}")
+        audio_path = await ws.save_upload(audio, f"audio_{audio.filename}")
+    except WorkspaceQuotaExceeded as e:
+        ws.close()
+        raise HTTPException(status_code=413, detail=str(e))
+    except BaseException:
+        ws.close()
+        raise
+    job = store.create(
+        "generate-avatar",
+        params={"figure_id": figure_id, "runtime_model_hash": runtime_model_hash,
+                "image": image.filename, "audio": audio.filename},
+        user_id=user_id,
+    )
+    # Workspace gehört ab hier dem Job-Task (bleibt aktiv → Janitor lässt ihn in Ruhe)
+    _JOB_TASKS[job["id"]] = asyncio.get_running_loop().create_task(
+        _run_avatar_job(job["id"], ws, image_path, audio_path, figure_id, runtime_model_hash))
+    return {**job, "status_url": f"/generate-avatar/jobs/{job['id']}",
+            "video_url": f"/generate-avatar/jobs/{job['id']}/video"}
+
+
+@app.get("/generate-avatar/jobs")
+async def list_avatar_jobs(status: str | None = None, user_id: str | None = None,
+                           limit: int = 50, cursor: str | None = None):
+    """Jobs, neueste zuerst; Pagination über next_cursor"""
+    try:
+        jobs, next_cursor = _job_store().list(status=status, user_id=user_id, limit=limit, cursor=cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Ungültiger cursor")
+    return {"jobs": jobs, "next_cursor": next_cursor}
+
+
+@app.get("/generate-avatar/jobs/{job_id}")
+async def get_avatar_job(job_id: str):
+    job = _job_store().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job nicht gefunden")
+    return job
+
+
+@app.get("/generate-avatar/jobs/{job_id}/video")
+async def download_avatar_job_video(job_id: str, request: Request):
+    """Fertiges Video mit Range-Support (206) – Player können spulen, Downloads fortsetzen"""
+    store = _job_store()
+    job = store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job nicht gefunden")
+    if job["status"] != SUCCEEDED:
+        code = 410 if job["status"] == EXPIRED else 409
+        raise HTTPException(status_code=code, detail=f"Job-Status: {job['status']}")
+    path = store.result_path(job_id)
+    if path is None:
+        raise HTTPException(status_code=410, detail="Ergebnis abgelaufen")
+    return ranged_file_response(path, request.headers.get("range"), media_type="video/mp4",
+                                filename="avatar_video.mp4")
+
+
+@app.delete("/generate-avatar/jobs/{job_id}")
+async def cancel_or_delete_avatar_job(job_id: str):
+    """Wartend/laufend: abbrechen. Abgeschlossen: Record + Video löschen."""
+    store = _job_store()
+    job = store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job nicht gefunden")
+    task = _JOB_TASKS.get(job_id)
+    if job["status"] in (QUEUED, RUNNING):
+        if task is not None:
+            task.cancel()
+        else:
+            _finish_job(job_id, CANCELLED)
+        return {"id": job_id, "status": CANCELLED}
+    store.delete(job_id)
+    return {"id": job_id, "deleted": True}
 
 
 @app.post("/figure/create")
@@ -633,11 +640,9 @@ async def create_figure(image: UploadFile = File(...)):
             raise HTTPException(status_code=400, detail="BitHuman API Token/Key fehlt")
 
         # Bild lokal persistieren
-        with tempfile.TemporaryDirectory() as temp_dir:
-            safe_name = Path(image.filename).name or "upload.png"
-            img_path = Path(temp_dir) / safe_name
-            with open(img_path, "wb") as buf:
-                shutil.copyfileobj(image.file, buf)
+        async with _workspaces().aworkspace("figure-create") as ws:
+            img_path = await ws.save_upload(image, Path(image.filename or "").name or "upload.png")
+            safe_name = img_path.name
 
             try:
                 size = img_path.stat().st_size
@@ -708,13 +713,15 @@ async def create_figure(image: UploadFile = File(...)):
                 raise HTTPException(status_code=500, detail=f"Figure-Erstellung fehlgeschlagen: {e}")
     except HTTPException:
         raise
+    except WorkspaceQuotaExceeded as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/figure/job/{job_id}")
 async def figure_job_status(job_id: str):
-    job = JOBS.get(job_id)
+    job = _job_store().get(job_id)
     if not job:
         raise HTTPException(status_code=404, detail="job not found")
     return job
@@ -725,7 +732,10 @@ async def health():
     return {
         "status": "healthy",
         "service": "bithuman-avatar-service",
-        "runtime_ready": runtime is not None,
+        "runtime_ready": bool(_RUNTIME_POOL and _RUNTIME_POOL.metrics()["runtimes"]),
+        "runtime_pool": _RUNTIME_POOL.metrics() if _RUNTIME_POOL else None,
+        "workspaces": _workspaces().metrics(),
+        "avatar_jobs": {**_job_store().metrics(), "in_process": len(_JOB_TASKS)},
         "version": "1.0.0"
     }
 
@@ -5,12 +5,11 @@ Generiert sprechende Avatar-Videos mit BitHuman API
 """
 
 import os
-import tempfile
-import shutil
+import sys
 import asyncio
 from pathlib import Path
 
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, UploadFile, HTTPException, Body
 from fastapi.responses import FileResponse
 import uvicorn
 import hashlib
@@ -18,6 +17,11 @@ import requests
 import json
 import inspect
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from bithuman_pipeline.hedged_probe import HedgedProber, ProbeFailed
+from bithuman_pipeline.model_cache import ModelCache
+from dynamics_pipeline.workspace import WorkspaceQuotaExceeded, default_manager
+
 # BitHuman SDK
 try:
     from bithuman import AsyncBithuman
@@ -32,7 +36,9 @@ app = FastAPI(title="BitHuman Avatar Service", version="1.0")
 runtime = None
 API_SECRET_CACHE = None
 MODELS_CACHE_DIR = Path(__file__).resolve().parents[1] / "models" / "bithuman"
-FIGURES_MAP_PATH = MODELS_CACHE_DIR / "figures.json"
+FIGURES_MAP_PATH = MODELS_CACHE_DIR / "figures.json"  # Altbestand, wird in den Cache-Index übernommen
+MODEL_CACHE: ModelCache | None = None
+FIGURE_PROBER: HedgedProber | None = None
 
 @app.on_event("startup")
 async def startup():
@@ -45,11 +51,15 @@ async def startup():
         or ""
     ).strip()
     
-    # Ensure models cache dir exists
+    # Modell-Cache (LRU, Index in SQLite); alter Bestand + figures.json werden übernommen
     try:
-        MODELS_CACHE_DIR.mkdir(parents=True, exist_ok=True)
-    except Exception:
-        pass
+        cache = _model_cache()
+        await asyncio.to_thread(cache.adopt_existing, FIGURES_MAP_PATH)
+        prefetch = [u.strip() for u in (_env("BITHUMAN_PREFETCH_IMX_URLS", "") or "").split(",") if u.strip()]
+        if prefetch:
+            await asyncio.to_thread(cache.prefetch, prefetch, _requests_headers(), True)
+    except Exception as e:
+        print(f"⚠️ Modell-Cache-Initialisierung fehlgeschlagen: {e}")
 
     if API_SECRET_CACHE:
         print("ℹ️ BitHuman: API-Key geladen, Runtime wird per-request erstellt")
@@ -73,28 +83,16 @@ def _requests_headers() -> dict:
         "api-secret": API_SECRET_CACHE,  # Fallback: direkte api-secret header
     }
 
-def _load_figures_map() -> dict:
-    try:
-        if FIGURES_MAP_PATH.exists():
-            with open(FIGURES_MAP_PATH, "r", encoding="utf-8") as f:
-                return json.load(f)
-    except Exception:
-        pass
-    return {}
-
-def _save_figures_map(data: dict) -> None:
-    try:
-        FIGURES_MAP_PATH.parent.mkdir(parents=True, exist_ok=True)
-        with open(FIGURES_MAP_PATH, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-    except Exception:
-        pass
+def _model_cache() -> ModelCache:
+    global MODEL_CACHE
+    if MODEL_CACHE is None:
+        max_gb = float(_env("BITHUMAN_MODEL_CACHE_GB", "20"))
+        MODEL_CACHE = ModelCache(MODELS_CACHE_DIR, max_bytes=int(max_gb * 1024 ** 3))
+    return MODEL_CACHE
 
-def _figure_create(image_path: Path) -> dict:
-    """Call BitHuman Figure creation API. Endpoint configurable via env.
-    Returns parsed json dict or raises.
-    """
-    urls_to_try = [
+def _figure_candidates() -> list[dict]:
+    """Endpunkt × Feldname-Varianten für die Figure-Erstellung (Reihenfolge = Default-Priorität)."""
+    urls = [
         _env("BITHUMAN_FIGURE_CREATE_URL"),
         _env("BITHUMAN_AGENT_CREATE_URL"),
         # Offizieller Figure-Creation-Endpunkt (Paid, ohne /v1)
@@ -106,110 +104,93 @@ def _figure_create(image_path: Path) -> dict:
         "https://api.bithuman.ai/v1/figures/create",
         "https://api.bithuman.ai/figures",
     ]
-    last_err = None
-    print(f"🎭 Versuche Figure-Erstellung für {image_path.name} mit API-Key: {API_SECRET_CACHE[:10]}...")
-    for url in [u for u in urls_to_try if u]:
-        try:
-            print(f"  📡 Versuche URL: {url}")
-            with open(image_path, "rb") as img:
-                # Variante 1: Feldname 'image'
-                files_image = {"image": (image_path.name, img, "image/jpeg")}
-                data_meta = {"name": image_path.stem}
-                print(f"     🔄 POST mit 'image'-Feld...")
-                r = requests.post(url, headers=_requests_headers(), files=files_image, data=data_meta, timeout=60)
-                print(f"     📋 Response: {r.status_code} - {r.text[:500]}")
-            if r.status_code // 100 == 2:
-                print(f"  ✅ Erfolg mit 'image'-Feld!")
-                return r.json() if r.content else {}
-            # Variante 2: Feldname 'file'
-            with open(image_path, "rb") as img2:
-                files_file = {"file": (image_path.name, img2, "image/jpeg")}
-                data_meta = {"name": image_path.stem}
-                print(f"     🔄 POST mit 'file'-Feld...")
-                r = requests.post(url, headers=_requests_headers(), files=files_file, data=data_meta, timeout=60)
-                print(f"     📋 Response: {r.status_code} - {r.text[:500]}")
-            if r.status_code // 100 == 2:
-                print(f"  ✅ Erfolg mit 'file'-Feld!")
-                return r.json() if r.content else {}
-            print(f"  ❌ URL {url} fehlgeschlagen: {r.status_code}")
-            last_err = RuntimeError(f"Figure create failed: {r.status_code} {r.text[:200]}")
-        except Exception as e:
-            print(f"  💥 Exception bei {url}: {e}")
-            last_err = e
-    print(f"🚫 Alle Figure-URLs fehlgeschlagen. Letzter Fehler: {last_err}")
-    if last_err:
-        raise last_err
-    return {}
-
-def _download_imx(url: str, target_path: Path) -> Path:
-    r = requests.get(url, headers=_requests_headers(), timeout=120, stream=True)
+    return [{"url": u, "field": field} for u in dict.fromkeys(u for u in urls if u) for field in ("image", "file")]
+
+def _figure_prober() -> HedgedProber:
+    global FIGURE_PROBER
+    if FIGURE_PROBER is None:
+        FIGURE_PROBER = HedgedProber(
+            hedge_delay_s=float(_env("BITHUMAN_FIGURE_HEDGE_S", "2.0")),
+            max_in_flight=int(_env("BITHUMAN_FIGURE_MAX_IN_FLIGHT", "3")),
+            state_path=str(MODELS_CACHE_DIR / "figure_endpoints.json"),
+        )
+    return FIGURE_PROBER
+
+def _figure_post(candidate: dict, image_path: Path) -> dict:
+    """Ein Versuch: POST multipart mit Feldname candidate['field']; Nicht-2xx → Exception."""
+    timeout = float(_env("BITHUMAN_FIGURE_TIMEOUT_S", "60"))
+    with open(image_path, "rb") as img:
+        files = {candidate["field"]: (image_path.name, img, "image/jpeg")}
+        r = requests.post(candidate["url"], headers=_requests_headers(), files=files,
+                          data={"name": image_path.stem}, timeout=timeout)
+    print(f"     📋 {candidate['field']}@{candidate['url']}: {r.status_code} - {r.text[:300]}")
     if r.status_code // 100 != 2:
-        raise RuntimeError(f"IMX download failed: {r.status_code}")
-    target_path.parent.mkdir(parents=True, exist_ok=True)
-    with open(target_path, "wb") as out:
-        for chunk in r.iter_content(chunk_size=65536):
-            if chunk:
-                out.write(chunk)
-    return target_path
+        raise RuntimeError(f"Figure create failed: {r.status_code} {r.text[:200]}")
+    return r.json() if r.content else {}
+
+def _figure_create(image_path: Path, candidates: list[dict] | None = None) -> dict:
+    """Call BitHuman Figure creation API. Endpoint configurable via env.
+    Varianten laufen gestaffelt parallel (hedged), die erste gültige Antwort gewinnt;
+    die erfolgreiche Variante wird gemerkt und beim nächsten Mal zuerst probiert.
+    Returns parsed json dict or raises.
+    """
+    print(f"🎭 Versuche Figure-Erstellung für {image_path.name} mit API-Key: {API_SECRET_CACHE[:10]}...")
+    try:
+        return _figure_prober().probe(candidates or _figure_candidates(), lambda c: _figure_post(c, image_path))
+    except ProbeFailed as e:
+        print(f"🚫 Alle Figure-URLs fehlgeschlagen: {e}")
+        raise
+
+def _download_imx(url: str, cache_key: str) -> Path:
+    """IMX über den Modell-Cache laden (atomar, Größe/Checksumme geprüft, einmal pro Schlüssel)."""
+    return _model_cache().fetch(url, key=cache_key, headers=_requests_headers(), timeout=120)
+
+async def _load_into_runtime(local_runtime, path: Path) -> None:
+    # Prefer documented async loader if available
+    if hasattr(local_runtime, "load_data_async"):
+        await local_runtime.load_data_async(str(path))
+    elif hasattr(local_runtime, "load_data"):
+        local_runtime.load_data(str(path))
+    else:
+        # Fallback to set_model if it's the expected API
+        await local_runtime.set_model(str(path))
 
 async def _ensure_model_from_image(local_runtime, image_path: Path, figure_id_in: str | None, model_hash_in: str | None) -> tuple[Path | None, str | None, str | None]:
     """Ensure we have a local .imx for this image and load it into runtime.
     Returns (imx_path, figure_id, runtime_model_hash).
     """
+    cache = _model_cache()
     # Cache key by content hash
     try:
         cache_key = _hash_file(image_path)
     except Exception:
         cache_key = image_path.stem
-    imx_path = MODELS_CACHE_DIR / f"{cache_key}.imx"
 
     figure_id = figure_id_in
     runtime_model_hash = model_hash_in
 
-    # If IMX cached, use it
-    if imx_path.exists():
+    # Bild → Modell-Zuordnung aus dem Index (ersetzt figures.json)
+    alias = cache.get_alias(cache_key) or {}
+    if alias and not figure_id_in:
+        figure_id = alias.get("figure_id") or figure_id
+        runtime_model_hash = alias.get("runtime_model_hash") or runtime_model_hash
+
+    # If IMX cached, use it (get() prüft Größe/Checksumme)
+    for key in dict.fromkeys(k for k in (cache_key, alias.get("key")) if k):
+        imx_path = await asyncio.to_thread(cache.get, key)
+        if imx_path is None:
+            continue
         try:
-            # Prefer documented async loader if available
-            if hasattr(local_runtime, "load_data_async"):
-                await local_runtime.load_data_async(str(imx_path))
-            elif hasattr(local_runtime, "load_data"):
-                local_runtime.load_data(str(imx_path))
-            else:
-                # Fallback to set_model if it's the expected API
-                await local_runtime.set_model(str(imx_path))
+            await _load_into_runtime(local_runtime, imx_path)
             return imx_path, figure_id, runtime_model_hash
         except Exception as e:
             # If loading cached model fails, remove and re-create
-            try:
-                imx_path.unlink(missing_ok=True)  # type: ignore[arg-type]
-            except Exception:
-                pass
+            cache.evict(key)
             print(f"⚠️ Cached IMX load failed, will re-create: {e}")
 
-    # Create figure via API and get model (or reuse from map)
-    figures_map = _load_figures_map()
-    cached = figures_map.get(cache_key)
-    if cached and not figure_id_in:
-        figure_id = cached.get("figure_id") or figure_id
-        runtime_model_hash = cached.get("runtime_model_hash") or runtime_model_hash
-        cached_imx = cached.get("imx_path")
-        if cached_imx:
-            p = Path(cached_imx)
-            if p.exists():
-                try:
-                    if hasattr(local_runtime, "load_data_async"):
-                        await local_runtime.load_data_async(str(p))
-                    elif hasattr(local_runtime, "load_data"):
-                        local_runtime.load_data(str(p))
-                    else:
-                        await local_runtime.set_model(str(p))
-                    return p, figure_id, runtime_model_hash
-                except Exception:
-                    pass
-
     # Create figure via API and get model
     try:
-        resp = _figure_create(image_path)
+        resp = await asyncio.to_thread(_figure_create, image_path)
         # Try to read common fields
         figure_id = figure_id or resp.get("figure_id") or resp.get("id")
         runtime_model_hash = runtime_model_hash or resp.get("runtime_model_hash") or resp.get("model_hash") or resp.get("hash")
@@ -222,23 +203,12 @@ async def _ensure_model_from_image(local_runtime, image_path: Path, figure_id_in
             or (resp.get("data") or {}).get("imx_url")
         )
         if imx_url:
-            _download_imx(imx_url, imx_path)
-            # Load into runtime
-            if hasattr(local_runtime, "load_data_async"):
-                await local_runtime.load_data_async(str(imx_path))
-            elif hasattr(local_runtime, "load_data"):
-                local_runtime.load_data(str(imx_path))
-            else:
-                await local_runtime.set_model(str(imx_path))
-            # Persist
-            figures_map[cache_key] = {
-                "figure_id": figure_id,
-                "runtime_model_hash": runtime_model_hash,
-                "imx_path": str(imx_path),
-            }
-            _save_figures_map(figures_map)
+            imx_path = await asyncio.to_thread(_download_imx, imx_url, cache_key)
+            await _load_into_runtime(local_runtime, imx_path)
+            cache.set_alias(cache_key, cache_key, figure_id, runtime_model_hash)
             return imx_path, figure_id, runtime_model_hash
         # If only hash is available, we rely on runtime created with hash
+        cache.set_alias(cache_key, None, figure_id, runtime_model_hash)
         return None, figure_id, runtime_model_hash
     except Exception as e:
         print(f"⚠️ Figure/Model provisioning failed: {e}")
@@ -249,9 +219,35 @@ def health_check():
     """Health Check"""
     return {
         "message": "BitHuman Avatar Service läuft",
-        "runtime_initialized": runtime is not None
+        "runtime_initialized": runtime is not None,
+        "model_cache": {k: v for k, v in _model_cache().metrics().items() if k != "entries"},
+        "workspaces": default_manager("bithuman").metrics(),
+        "figure_probe": _figure_prober().metrics(),
     }
 
+@app.get("/models")
+def list_models():
+    """Modell-Cache: Einträge (LRU-Reihenfolge), Pins, Hit-Rate, Belegung"""
+    return _model_cache().metrics()
+
+@app.post("/models/prefetch")
+async def prefetch_models(urls: list[str] = Body(..., embed=True), pin: bool = Body(False, embed=True)):
+    """IMX-Modelle vorab in den Cache laden (optional gepinnt = nie per LRU entfernt)"""
+    result = await asyncio.to_thread(_model_cache().prefetch, urls, _requests_headers(), pin)
+    return {"models": result, "failed": [k for k, v in result.items() if v is None]}
+
+@app.post("/models/{key}/pin")
+def pin_model(key: str):
+    if not _model_cache().pin(key):
+        raise HTTPException(status_code=404, detail=f"Modell {key} nicht im Cache")
+    return {"key": key, "pinned": True}
+
+@app.delete("/models/{key}/pin")
+def unpin_model(key: str):
+    if not _model_cache().unpin(key):
+        raise HTTPException(status_code=404, detail=f"Modell {key} nicht im Cache")
+    return {"key": key, "pinned": False}
+
 @app.post("/test/simple")
 async def test_simple():
     """Einfacher Test"""
@@ -284,21 +280,15 @@ async def generate_avatar(
     
     print(f"📋 Parameter: figure_id={figure_id}, runtime_model_hash={runtime_model_hash}, imx_url={imx_url}, imx_file={imx_file is not None}")
     
-    # Temporäre Dateien erstellen (persistent!)
-    temp_dir = tempfile.mkdtemp()
-    temp_path = Path(temp_dir)
+    # Workspace pro Request: nach dem Senden, bei Fehlern und bei Abbruch gelöscht
+    ws = default_manager("bithuman").create("generate-avatar")
+    leased_keys: list[str] = []  # Cache-Einträge, die während des Requests nicht entfernt werden dürfen
     
     try:
-        # Dateien speichern
-        image_path = temp_path / f"avatar_{image.filename}"
-        audio_path = temp_path / f"audio_{audio.filename}"
-        output_path = temp_path / "avatar_video.mp4"
-        
-        # Upload-Dateien speichern
-        with open(image_path, "wb") as buffer:
-            shutil.copyfileobj(image.file, buffer)
-        with open(audio_path, "wb") as buffer:
-            shutil.copyfileobj(audio.file, buffer)
+        # Upload-Dateien speichern (mit Quota)
+        image_path = await ws.save_upload(image, f"avatar_{image.filename}")
+        audio_path = await ws.save_upload(audio, f"audio_{audio.filename}")
+        output_path = ws.file("avatar_video.mp4")
         
         print(f"📁 Dateien gespeichert: {image_path}, {audio_path}")
         
@@ -309,21 +299,20 @@ async def generate_avatar(
                 try:
                     imx_bytes = imx_file.file.read()
                     content_hash = hashlib.md5(imx_bytes).hexdigest()
-                    direct_imx_path = MODELS_CACHE_DIR / f"{content_hash}.imx"
-                    direct_imx_path.parent.mkdir(parents=True, exist_ok=True)
-                    with open(direct_imx_path, "wb") as f:
-                        f.write(imx_bytes)
-                    selected_imx_path = direct_imx_path
+                    cache = _model_cache()
+                    selected_imx_path = cache.get(content_hash) or await asyncio.to_thread(
+                        cache.put_bytes, content_hash, imx_bytes, "upload")
+                    cache.acquire(content_hash)
+                    leased_keys.append(content_hash)
                     print(f"✅ IMX aus Upload übernommen: {selected_imx_path}")
                 except Exception as e:
                     print(f"⚠️ Upload-IMX konnte nicht übernommen werden: {e}")
             if selected_imx_path is None and imx_url and imx_url.strip() != "":
                 try:
                     url_hash = hashlib.md5(imx_url.strip().encode("utf-8")).hexdigest()
-                    direct_imx_path = MODELS_CACHE_DIR / f"{url_hash}.imx"
-                    if not direct_imx_path.exists():
-                        _download_imx(imx_url.strip(), direct_imx_path)
-                    selected_imx_path = direct_imx_path
+                    selected_imx_path = await asyncio.to_thread(_download_imx, imx_url.strip(), url_hash)
+                    _model_cache().acquire(url_hash)
+                    leased_keys.append(url_hash)
                     print(f"✅ IMX aus URL übernommen: {selected_imx_path}")
                 except Exception as e:
                     print(f"⚠️ IMX-URL Download fehlgeschlagen: {e}")
@@ -499,14 +488,21 @@ async def generate_avatar(
             return FileResponse(
                 path=str(output_path),
                 media_type="video/mp4",
-                filename="avatar_video.mp4"
+                filename="avatar_video.mp4",
+                background=ws.handoff(),
             )
         else:
             return {"error": "Video konnte nicht erstellt werden"}
             
+    except WorkspaceQuotaExceeded as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         print(f"💥 Generierung fehlgeschlagen: {e}")
         raise HTTPException(status_code=500, detail=f"Avatar-Generierung fehlgeschlagen: {e}")
+    finally:
+        for key in leased_keys:
+            _model_cache().release(key)
+        ws.close()
 
 async def create_fallback_video(image_path: Path, audio_path: Path, output_path: Path):
     """Erstellt Fallback-Video aus statischem Bild"""
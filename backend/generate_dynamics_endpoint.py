@@ -6,6 +6,7 @@ Wird vom Backend (FastAPI) aufgerufen
 
 import sys
 import os
+import signal
 import subprocess
 import json
 from pathlib import Path
@@ -13,6 +14,17 @@ from datetime import datetime
 import firebase_admin
 from firebase_admin import credentials, storage, firestore
 
+# Gemeinsame Pipeline-Bausteine liegen im Projektroot (dynamics_pipeline/)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from dynamics_pipeline.estimator import features_for
+from dynamics_pipeline.jobs import report_features, report_result, report_stage
+from dynamics_pipeline.media_fetch import default_cache, fetch_media
+from dynamics_pipeline.result_cache import DynamicsResultCache, cache_key
+from dynamics_pipeline.workspace import default_manager
+
+# Ergebnis-Cache (content-addressed) – lokal auf Platte
+DYNAMICS_CACHE_DIR = os.getenv('DYNAMICS_CACHE_DIR', '/tmp/dynamics_result_cache')
+
 # Service Account Key (lokal: service-account-key.json, Cloud: /secrets/)
 SERVICE_ACCOUNT_KEY_PATHS = [
     Path(__file__).parent / "service-account-key.json",  # Lokal
@@ -40,7 +52,21 @@ def init_firebase():
             })
     return storage.bucket(), firestore.client()
 
-def generate_dynamics(avatar_id: str, dynamics_id: str, parameters: dict):
+def _update_firestore(avatar_ref, dynamics_id: str, parameters: dict, idle_url: str):
+    print(f"💾 Updating Firestore...")
+    
+    dynamics_data = {
+        'idleVideoUrl': idle_url,
+        'parameters': parameters,
+        'generatedAt': datetime.utcnow(),
+        'status': 'ready'
+    }
+    
+    avatar_ref.update({
+        f'dynamics.{dynamics_id}': dynamics_data
+    })
+
+def generate_dynamics(avatar_id: str, dynamics_id: str, parameters: dict, force: bool = False):
     """
     Generiere Dynamics für einen Avatar
     
@@ -48,7 +74,16 @@ def generate_dynamics(avatar_id: str, dynamics_id: str, parameters: dict):
         avatar_id: Firestore avatar document ID
         dynamics_id: Name der Dynamics (z.B. 'basic', 'lachen')
         parameters: Dict mit driving_multiplier, scale, source_max_dim
+        force: Ergebnis-Cache ignorieren und neu generieren
     """
+    # Eigener Workspace pro Job (statt fester /tmp/{avatar_id}_*-Pfade): gelöscht bei
+    # Erfolg, Fehler und Abbruch; Reste abgestürzter Worker räumt der Janitor in main.py ab
+    workspaces = default_manager('dynamics', start_janitor=False)
+    quota = int(float(os.getenv('DYNAMICS_WORKSPACE_QUOTA_MB', '8192')) * 1024 * 1024)
+    with workspaces.workspace(f'{avatar_id}-{dynamics_id}', quota_bytes=quota) as ws:
+        return _generate_dynamics(ws, avatar_id, dynamics_id, parameters, force)
+
+def _generate_dynamics(ws, avatar_id: str, dynamics_id: str, parameters: dict, force: bool):
     bucket, db = init_firebase()
     
     print(f"🎭 Generiere Dynamics '{dynamics_id}' für Avatar {avatar_id}")
@@ -70,117 +105,165 @@ def generate_dynamics(avatar_id: str, dynamics_id: str, parameters: dict):
         raise Exception("Hero-Image oder Hero-Video fehlt")
     
     # 3. Assets herunterladen
-    import requests
+    report_stage('download')
     
-    hero_image_path = f'/tmp/{avatar_id}_hero.jpg'
-    hero_video_path = f'/tmp/{avatar_id}_hero_video.mp4'
+    hero_image_path = str(ws.file('hero.jpg'))
+    hero_video_path = str(ws.file('hero_video.mp4'))
     
+    # Streamend mit Größen-/Typ-/Dauer-Check; gemeinsamer Download-Cache für alle Jobs
+    media_cache = default_cache()
     print(f"📥 Lade Hero-Image...")
-    resp = requests.get(hero_image_url, stream=True, timeout=60)
-    resp.raise_for_status()
-    with open(hero_image_path, 'wb') as f:
-        for chunk in resp.iter_content(chunk_size=8192):
-            f.write(chunk)
+    fetch_media(hero_image_url, kind='image', cache=media_cache, dest=hero_image_path)
     
     print(f"📥 Lade Hero-Video...")
-    resp = requests.get(hero_video_url, stream=True, timeout=60)
-    resp.raise_for_status()
-    with open(hero_video_path, 'wb') as f:
-        for chunk in resp.iter_content(chunk_size=8192):
-            f.write(chunk)
-    
-    # 4. Video trimmen (10 Sekunden)
-    trimmed_video_path = f'/tmp/{avatar_id}_trimmed.mp4'
-    print(f"✂️ Trimme Video auf 10 Sekunden...")
-    
-    subprocess.run([
-        'ffmpeg', '-i', hero_video_path,
-        '-ss', '0', '-t', '10',
-        '-c:v', 'copy', '-y', trimmed_video_path
-    ], check=True, capture_output=True)
-    
-    # 5. LivePortrait starten
-    print(f"🎬 Starte LivePortrait...")
-    
-    lp_output_dir = f'/tmp/{avatar_id}_lp_output'
-    os.makedirs(lp_output_dir, exist_ok=True)
-    
-    # Python-Interpreter: Verwende das aktuelle Python (aus venv oder System)
-    python_executable = sys.executable
-    
-    # LivePortrait-Pfad: aus Umgebungsvariable oder Default (lokal)
-    liveportrait_path = os.getenv(
-        'LIVEPORTRAIT_PATH',
-        '/Users/hhsw/Desktop/sunriza/LivePortrait/inference.py'
+    fetched = fetch_media(
+        hero_video_url,
+        kind='video',
+        max_duration_s=float(os.getenv('MEDIA_MAX_DURATION_S', '900')),
+        cache=media_cache,
+        dest=hero_video_path,
     )
+    print(f"📥 Hero-Video: {'Cache' if fetched['cached'] else 'Download'} in {fetched['elapsed_s']:.1f}s")
     
-    lp_cmd = [
-        python_executable,
-        liveportrait_path,
-        '-s', hero_image_path,
-        '-d', trimmed_video_path,
-        '-o', lp_output_dir,
-        '--driving_multiplier', str(parameters.get('driving_multiplier', 0.41)),
-        '--source-max-dim', str(parameters.get('source_max_dim', 1600)),
-        '--scale', str(parameters.get('scale', 1.7)),
-        '--animation-region', parameters.get('animation_region', 'all'),
-    ]
-    
-    # Optional flags
-    if parameters.get('flag_normalize_lip', True):
-        lp_cmd.append('--flag-normalize-lip')
-    
-    if parameters.get('flag_pasteback', True):
-        lp_cmd.append('--flag-pasteback')
-    
-    env = os.environ.copy()
-    env['PYTORCH_ENABLE_MPS_FALLBACK'] = '1'
-    
-    subprocess.run(lp_cmd, env=env, check=True, capture_output=False)
-    
-    # 6. Output-Video finden
-    output_files = list(Path(lp_output_dir).glob('*.mp4'))
-    if not output_files:
-        raise Exception("LivePortrait Output nicht gefunden")
-    
-    lp_output = str(output_files[0])
-    
-    # 7. H.264 Konvertierung + Crossfade (ohne Audio!)
-    print(f"🔄 Konvertiere zu H.264 + Crossfade...")
-    
-    temp_output = f'/tmp/{avatar_id}_temp.mp4'
-    final_output = f'/tmp/{avatar_id}_{dynamics_id}_idle.mp4'
-    
-    # Schritt 1: H.264 ohne Audio
-    subprocess.run([
-        'ffmpeg', '-i', lp_output,
-        '-an',  # Kein Audio!
-        '-c:v', 'libx264',
-        '-preset', 'slow',
-        '-crf', '18',
-        '-pix_fmt', 'yuv420p',
-        '-y', temp_output
-    ], check=True, capture_output=True)
-    
-    # Schritt 2: Crossfade
-    duration_result = subprocess.run([
-        'ffprobe', '-v', 'error', '-show_entries', 'format=duration',
-        '-of', 'default=noprint_wrappers=1:nokey=1', temp_output
-    ], capture_output=True, text=True, check=True)
-    
-    duration = float(duration_result.stdout.strip())
-    offset = duration - 1.0
-    
-    subprocess.run([
-        'ffmpeg', '-i', temp_output,
-        '-filter_complex',
-        f'[0:v]split[main][dup];[dup]trim=start=0:duration=1.0,setpts=PTS-STARTPTS[start];[main][start]xfade=transition=fade:duration=1.0:offset={offset}',
-        '-y', final_output
-    ], check=True, capture_output=True)
-    
-    print(f"✅ Video generiert: {final_output}")
+    # 3b. Ergebnis-Cache: gleiche Input-Bytes + Parameter → LivePortrait überspringen
+    result_cache = DynamicsResultCache(
+        DYNAMICS_CACHE_DIR,
+        max_bytes=int(float(os.getenv('DYNAMICS_CACHE_MAX_GB', '5')) * 1024 ** 3),
+        max_age_s=float(os.getenv('DYNAMICS_CACHE_MAX_AGE_DAYS', '30')) * 86400,
+    )
+    content_key = cache_key([hero_image_path, hero_video_path], parameters, version='dynamics-local-xfade-v1')
+    result_key = f"{avatar_id}/{dynamics_id}"
+    cached = None if force else result_cache.get(content_key)
+    if cached:
+        print(f"♻️ Ergebnis-Cache Treffer: {content_key[:12]}…")
+        report_stage('upload')
+        idle_url = cached.get('results', {}).get(result_key)
+        if idle_url:
+            _update_firestore(avatar_ref, dynamics_id, parameters, idle_url)
+            print(f"🎉 Dynamics '{dynamics_id}' aus Cache bereitgestellt!")
+            return {
+                'avatar_id': avatar_id,
+                'dynamics_id': dynamics_id,
+                'idle_url': idle_url,
+                'status': 'ready',
+                'cached': True,
+            }
+        final_output = cached['files']['idle']
+    else:
+        # 4. Video trimmen (10 Sekunden)
+        report_stage('trim')
+        trimmed_video_path = str(ws.file('trimmed.mp4'))
+        print(f"✂️ Trimme Video auf 10 Sekunden...")
+    
+        subprocess.run([
+            'ffmpeg', '-i', hero_video_path,
+            '-ss', '0', '-t', '10',
+            '-c:v', 'copy', '-y', trimmed_video_path
+        ], check=True, capture_output=True)
+    
+        # Eingabe-Features für den Zeit-Schätzer (Videolänge treibt Inference/Encode)
+        try:
+            probe = subprocess.run([
+                'ffprobe', '-v', 'error', '-show_entries', 'format=duration',
+                '-of', 'default=noprint_wrappers=1:nokey=1', trimmed_video_path
+            ], capture_output=True, text=True, check=True)
+            trimmed_seconds = float(probe.stdout.strip())
+        except (subprocess.CalledProcessError, ValueError, OSError):
+            trimmed_seconds = None
+        report_features(**features_for(
+            video_seconds=trimmed_seconds,
+            input_bytes=os.path.getsize(hero_video_path),
+        ))
+    
+        # 5. LivePortrait starten
+        report_stage('inference')
+        print(f"🎬 Starte LivePortrait...")
+    
+        lp_output_dir = str(ws.file('lp_output'))
+        os.makedirs(lp_output_dir, exist_ok=True)
+    
+        # Python-Interpreter: Verwende das aktuelle Python (aus venv oder System)
+        python_executable = sys.executable
+    
+        # LivePortrait-Pfad: aus Umgebungsvariable oder Default (lokal)
+        liveportrait_path = os.getenv(
+            'LIVEPORTRAIT_PATH',
+            '/Users/hhsw/Desktop/sunriza/LivePortrait/inference.py'
+        )
+    
+        lp_cmd = [
+            python_executable,
+            liveportrait_path,
+            '-s', hero_image_path,
+            '-d', trimmed_video_path,
+            '-o', lp_output_dir,
+            '--driving_multiplier', str(parameters.get('driving_multiplier', 0.41)),
+            '--source-max-dim', str(parameters.get('source_max_dim', 1600)),
+            '--scale', str(parameters.get('scale', 1.7)),
+            '--animation-region', parameters.get('animation_region', 'all'),
+        ]
+    
+        # Optional flags
+        if parameters.get('flag_normalize_lip', True):
+            lp_cmd.append('--flag-normalize-lip')
+    
+        if parameters.get('flag_pasteback', True):
+            lp_cmd.append('--flag-pasteback')
+    
+        env = os.environ.copy()
+        env['PYTORCH_ENABLE_MPS_FALLBACK'] = '1'
+    
+        subprocess.run(lp_cmd, env=env, check=True, capture_output=False)
+    
+        # 6. Output-Video finden
+        output_files = list(Path(lp_output_dir).glob('*.mp4'))
+        if not output_files:
+            raise Exception("LivePortrait Output nicht gefunden")
+    
+        lp_output = str(output_files[0])
+        ws.check_quota()
+    
+        # 7. H.264 Konvertierung + Crossfade (ohne Audio!)
+        report_stage('encode')
+        print(f"🔄 Konvertiere zu H.264 + Crossfade...")
+    
+        temp_output = str(ws.file('temp.mp4'))
+        final_output = str(ws.file(f'{dynamics_id}_idle.mp4'))
+    
+        # Schritt 1: H.264 ohne Audio
+        subprocess.run([
+            'ffmpeg', '-i', lp_output,
+            '-an',  # Kein Audio!
+            '-c:v', 'libx264',
+            '-preset', 'slow',
+            '-crf', '18',
+            '-pix_fmt', 'yuv420p',
+            '-y', temp_output
+        ], check=True, capture_output=True)
+    
+        # Schritt 2: Crossfade
+        duration_result = subprocess.run([
+            'ffprobe', '-v', 'error', '-show_entries', 'format=duration',
+            '-of', 'default=noprint_wrappers=1:nokey=1', temp_output
+        ], capture_output=True, text=True, check=True)
+    
+        duration = float(duration_result.stdout.strip())
+        offset = duration - 1.0
+    
+        subprocess.run([
+            'ffmpeg', '-i', temp_output,
+            '-filter_complex',
+            f'[0:v]split[main][dup];[dup]trim=start=0:duration=1.0,setpts=PTS-STARTPTS[start];[main][start]xfade=transition=fade:duration=1.0:offset={offset}',
+            '-y', final_output
+        ], check=True, capture_output=True)
+    
+        print(f"✅ Video generiert: {final_output}")
+        ws.check_quota()
+    
+        result_cache.put(content_key, {'idle': final_output})
     
     # 8. Assets zu Firebase Storage hochladen
+    report_stage('upload')
     print(f"📤 Uploading zu Firebase Storage...")
     
     storage_path = f"avatars/{avatar_id}/dynamics/{dynamics_id}/idle.mp4"
@@ -192,19 +275,10 @@ def generate_dynamics(avatar_id: str, dynamics_id: str, parameters: dict):
     
     print(f"✅ Uploaded: {idle_url}")
     
-    # 9. Firestore aktualisieren
-    print(f"💾 Updating Firestore...")
-    
-    dynamics_data = {
-        'idleVideoUrl': idle_url,
-        'parameters': parameters,
-        'generatedAt': datetime.utcnow(),
-        'status': 'ready'
-    }
+    result_cache.record_result(content_key, result_key, idle_url)
     
-    avatar_ref.update({
-        f'dynamics.{dynamics_id}': dynamics_data
-    })
+    # 9. Firestore aktualisieren
+    _update_firestore(avatar_ref, dynamics_id, parameters, idle_url)
     
     print(f"🎉 Dynamics '{dynamics_id}' erfolgreich generiert!")
     
@@ -217,9 +291,16 @@ def generate_dynamics(avatar_id: str, dynamics_id: str, parameters: dict):
 
 if __name__ == '__main__':
     if len(sys.argv) < 3:
-        print("Usage: python generate_dynamics_endpoint.py <avatar_id> <dynamics_id> [driving_multiplier] [scale] [source_max_dim]")
+        print("Usage: python generate_dynamics_endpoint.py <avatar_id> <dynamics_id> [driving_multiplier] [scale] [source_max_dim] [--force]")
         sys.exit(1)
     
+    # Abbruch durch den Scheduler (SIGTERM) → SystemExit, damit der Workspace aufgeräumt wird
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+    
+    force = '--force' in sys.argv
+    if force:
+        sys.argv.remove('--force')
+    
     avatar_id = sys.argv[1]
     dynamics_id = sys.argv[2]
     
@@ -229,6 +310,7 @@ if __name__ == '__main__':
         'source_max_dim': int(sys.argv[5]) if len(sys.argv) > 5 else 1600,
     }
     
-    result = generate_dynamics(avatar_id, dynamics_id, parameters)
+    result = generate_dynamics(avatar_id, dynamics_id, parameters, force=force)
+    report_result(result)
     print(json.dumps(result, indent=2))
 
@@ -1,14 +1,24 @@
-from fastapi import FastAPI, BackgroundTasks, HTTPException
+from fastapi import FastAPI, HTTPException
 from fastapi.responses import JSONResponse, FileResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import uvicorn
-import subprocess
+import asyncio
 import sys
 import os
-import tempfile
 import requests
 import shutil
+import threading
+from pathlib import Path
+from typing import Optional
+
+# Gemeinsame Pipeline-Bausteine liegen im Projektroot (dynamics_pipeline/)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from dynamics_pipeline.estimator import GenerationTimeEstimator, TimingStore, features_for
+from dynamics_pipeline.jobs import JobScheduler, SqliteJobStore, SubprocessBackend
+from dynamics_pipeline.media_fetch import MediaFetchError, default_cache, fetch_media
+from dynamics_pipeline.trimming import MODES, trim_video as trim_media
+from dynamics_pipeline.workspace import WorkspaceQuotaExceeded, default_manager
 
 app = FastAPI()
 
@@ -25,21 +35,38 @@ class DynamicsRequest(BaseModel):
     avatar_id: str
     dynamics_id: str
     parameters: dict
+    force: bool = False  # Ergebnis-Cache ignorieren
+    user_id: Optional[str] = None
+    priority: str = "standard"  # paid | standard | free
 
 class TrimVideoRequest(BaseModel):
     video_url: str
     start_time: float
     end_time: float
+    mode: str = "accurate"  # accurate (Smart Cut) | keyframe (nur Stream-Copy) | reencode
 
 @app.get("/")
 async def root():
     """Backend ist jetzt nur noch für andere Services da - BitHuman übernimmt Avatar-Generierung"""
     return {"message": "Backend läuft - Avatar-Generierung erfolgt über BitHuman SDK"}
 
+@app.on_event("startup")
+async def startup():
+    """Janitor für Request-Workspaces und verwaiste Worker-Verzeichnisse starten"""
+    _workspaces()
+    default_manager("dynamics")
+
+def _workspaces():
+    return default_manager("backend")
+
 @app.get("/health")
 async def health():
     """Health Check für das Backend"""
-    return {"status": "healthy", "service": "sunriza26-backend"}
+    return {
+        "status": "healthy",
+        "service": "sunriza26-backend",
+        "workspaces": {name: default_manager(name).metrics() for name in ("backend", "dynamics")},
+    }
 
 @app.get("/api/elevenlabs/voices")
 async def get_elevenlabs_voices():
@@ -60,72 +87,120 @@ async def get_elevenlabs_voices():
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/generate-dynamics")
-async def generate_dynamics(request: DynamicsRequest, background_tasks: BackgroundTasks):
-    """Generiere Dynamics für einen Avatar (Live Avatar Animation)"""
+async def generate_dynamics(request: DynamicsRequest):
+    """Generiere Dynamics für einen Avatar (Live Avatar Animation) – als Job in der Queue"""
     
-    # Schätze Generierungszeit basierend auf source_max_dim
-    source_max_dim = request.parameters.get('source_max_dim', 1600)
-    estimated_seconds = _estimate_generation_time(source_max_dim)
+    # Schätzung aus historischen Stage-Zeiten (Fallback: statische Stage-Werte)
+    estimate = _estimate_generation_time(request.parameters)
+    estimated_seconds = estimate['seconds']
     
-    # Starte Dynamics-Generierung im Hintergrund
-    background_tasks.add_task(
-        _run_dynamics_generation,
+    parameters = dict(request.parameters)
+    if request.force:
+        parameters['force'] = True
+    job = _dynamics_scheduler().submit(
         request.avatar_id,
         request.dynamics_id,
-        request.parameters
+        parameters,
+        user_id=request.user_id,
+        priority=request.priority,
     )
+    queued = _dynamics_scheduler().get(job['id']) or job
     
     return {
         "status": "generating",
+        "job_id": job['id'],
+        "queue_position": queued.get('queue_position', 0),
         "avatar_id": request.avatar_id,
         "dynamics_id": request.dynamics_id,
         "estimated_seconds": estimated_seconds,
+        "estimated_range": [estimate['low'], estimate['high']],
         "message": f"Dynamics-Generierung gestartet (geschätzt: {estimated_seconds // 60} Min {estimated_seconds % 60} Sek)"
     }
 
-def _estimate_generation_time(source_max_dim: int) -> int:
+@app.get("/dynamics-jobs")
+async def list_dynamics_jobs(user_id: Optional[str] = None, status: Optional[str] = None, limit: int = 50):
+    """Jobs (optional pro User/Status), Priorität und Alter aufsteigend"""
+    return {"jobs": _dynamics_scheduler().store.list(status=status, user_id=user_id, limit=limit)}
+
+@app.get("/dynamics-jobs/{job_id}")
+async def get_dynamics_job(job_id: str):
+    """Status, aktuelle Stage, Fortschritt (0..1) und ETA eines Jobs"""
+    job = _dynamics_scheduler().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job nicht gefunden")
+    return job
+
+@app.post("/dynamics-jobs/{job_id}/cancel")
+async def cancel_dynamics_job(job_id: str):
+    """Job abbrechen – wartend: sofort, laufend: Worker-Prozess wird beendet"""
+    job = _dynamics_scheduler().cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job nicht gefunden")
+    return job
+
+_timings: Optional[TimingStore] = None
+_estimator: Optional[GenerationTimeEstimator] = None
+_estimator_lock = threading.Lock()
+
+def _timing_store() -> TimingStore:
+    global _timings
+    if _timings is None:
+        _timings = TimingStore(os.getenv("DYNAMICS_TIMINGS_DB", "/tmp/dynamics_timings.sqlite3"))
+    return _timings
+
+def _generation_estimator(refit: bool = False) -> GenerationTimeEstimator:
+    """Regression pro Stage über die aufgezeichneten Jobs – nach jedem fertigen Job neu gefittet"""
+    global _estimator
+    with _estimator_lock:
+        if _estimator is None or refit:
+            _estimator = GenerationTimeEstimator(_timing_store().records())
+        return _estimator
+
+def _estimate_generation_time(parameters: dict) -> dict:
     """
-    Schätzt die Generierungszeit basierend auf Bildgröße
+    Schätzt die Generierungszeit aus den Parametern (source_max_dim, scale)
     
-    Returns: Geschätzte Zeit in Sekunden
+    Returns: {"seconds", "low", "high" (90%-Intervall), "stages": {...}}
     """
-    # Empirische Werte (müssen angepasst werden basierend auf deinem System)
-    # GPU: ~180s für 1600px, CPU: ~600s für 1600px
-    
-    base_time = 180  # Sekunden für 1600px (mit GPU)
-    
-    # Skaliere basierend auf source_max_dim
-    # Größere Bilder = länger
-    if source_max_dim <= 512:
-        return int(base_time * 0.5)  # ~90s
-    elif source_max_dim <= 1024:
-        return int(base_time * 0.7)  # ~126s
-    elif source_max_dim <= 1600:
-        return int(base_time * 1.0)  # ~180s
-    else:  # 2048+
-        return int(base_time * 1.5)  # ~270s
-    
-    # TODO: CPU-Erkennung und längere Zeit für CPU
-    # if not has_gpu():
-    #     base_time *= 3  # 3x länger ohne GPU
+    return _generation_estimator().estimate(features_for(parameters))
 
-def _run_dynamics_generation(avatar_id: str, dynamics_id: str, parameters: dict):
-    """Hintergrund-Task für Dynamics-Generierung"""
-    try:
-        cmd = [
-            sys.executable,
-            'generate_dynamics_endpoint.py',
-            avatar_id,
-            dynamics_id,
-            str(parameters.get('driving_multiplier', 0.41)),
-            str(parameters.get('scale', 1.7)),
-            str(parameters.get('source_max_dim', 1600)),
-        ]
-        
-        subprocess.run(cmd, check=True, cwd='/app')
-        print(f"✅ Dynamics '{dynamics_id}' für Avatar {avatar_id} erfolgreich generiert")
-    except Exception as e:
-        print(f"❌ Fehler bei Dynamics-Generierung: {e}")
+def _record_job_timings(job: dict):
+    """on_finished-Hook: Stage-Dauern erfolgreicher Jobs speichern, Modell neu fitten"""
+    _timing_store().record_job(job)
+    _generation_estimator(refit=True)
+
+_scheduler: Optional[JobScheduler] = None
+
+def _dynamics_worker_cmd(job: dict):
+    """Worker-Aufruf für einen Job (meldet Stages über @@dynamics-Zeilen)"""
+    parameters = job.get('parameters') or {}
+    cmd = [
+        sys.executable,
+        'generate_dynamics_endpoint.py',
+        job['avatar_id'],
+        job['dynamics_id'],
+        str(parameters.get('driving_multiplier', 0.41)),
+        str(parameters.get('scale', 1.7)),
+        str(parameters.get('source_max_dim', 1600)),
+    ]
+    if parameters.get('force'):
+        cmd.append('--force')
+    return cmd, '/app'
+
+def _dynamics_scheduler() -> JobScheduler:
+    """Job-Scheduler (SQLite-Store, ein Worker-Subprozess pro Job) – lazy gestartet"""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = JobScheduler(
+            SqliteJobStore(os.getenv("DYNAMICS_JOBS_DB", "/tmp/dynamics_jobs.sqlite3")),
+            SubprocessBackend(_dynamics_worker_cmd),
+            max_concurrent=int(os.getenv("DYNAMICS_MAX_CONCURRENT", "1")),
+            per_user_limit=int(os.getenv("DYNAMICS_PER_USER_LIMIT", "1")),
+            stage_seconds=lambda job: _generation_estimator().stage_seconds(features_for(job.get('parameters'))),
+            on_finished=_record_job_timings,
+        )
+        _scheduler.start()
+    return _scheduler
 
 
 @app.post("/trim-video")
@@ -135,44 +210,45 @@ async def trim_video(request: TrimVideoRequest):
     # 1. Prüfe ob ffmpeg verfügbar ist
     if shutil.which('ffmpeg') is None:
         raise HTTPException(status_code=500, detail="ffmpeg nicht installiert")
+    if request.mode not in MODES:
+        raise HTTPException(status_code=400, detail=f"mode muss einer von {', '.join(MODES)} sein")
+    if request.end_time <= request.start_time:
+        raise HTTPException(status_code=400, detail="end_time muss größer als start_time sein")
     
-    # 2. Video von URL herunterladen
-    temp_dir = tempfile.gettempdir()
-    input_filename = f"input_{os.urandom(8).hex()}.mp4"
+    # 2. Video streamend laden (Cache, Größen-/Typ-/Dauer-Check)
+    # Ergebnis im Request-Workspace: gelöscht nach dem Senden bzw. bei Fehler/Abbruch
+    ws = _workspaces().create("trim")
     output_filename = f"trimmed_{os.urandom(8).hex()}.mp4"
-    input_path = os.path.join(temp_dir, input_filename)
-    output_path = os.path.join(temp_dir, output_filename)
+    output_path = str(ws.file(output_filename))
     
     try:
         print(f"📥 Lade Video herunter: {request.video_url}")
-        response = requests.get(request.video_url, timeout=120)
-        response.raise_for_status()
-        
-        with open(input_path, 'wb') as f:
-            f.write(response.content)
+        fetched = await asyncio.to_thread(
+            fetch_media,
+            request.video_url,
+            kind="video",
+            max_duration_s=float(os.getenv("MEDIA_MAX_DURATION_S", "900")),
+            cache=default_cache(),
+            timeout=120,
+        )
+        print(f"📦 Quelle: {fetched['bytes'] / 1e6:.1f} MB, "
+              f"{'Cache' if fetched['cached'] else 'Download'} ({fetched['elapsed_s']:.1f}s)")
         
-        # 3. Video mit ffmpeg trimmen
+        # 3. Trimmen: ganze GOPs per Stream-Copy, nur angeschnittene GOPs neu encodieren
         duration = request.end_time - request.start_time
-        print(f"✂️ Trimme Video: {request.start_time}s bis {request.end_time}s (Dauer: {duration}s)")
-        
-        cmd = [
-            'ffmpeg',
-            '-i', input_path,
-            '-ss', str(request.start_time),
-            '-t', str(duration),
-            '-c:v', 'libx264',
-            '-c:a', 'aac',
-            '-y',
-            output_path
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        
-        if result.returncode != 0:
-            print(f"❌ ffmpeg Fehler: {result.stderr}")
-            raise HTTPException(status_code=500, detail=f"ffmpeg Fehler: {result.stderr}")
+        print(f"✂️ Trimme Video: {request.start_time}s bis {request.end_time}s (Dauer: {duration}s, {request.mode})")
+        result = await asyncio.to_thread(
+            trim_media,
+            fetched['path'],
+            output_path,
+            request.start_time,
+            request.end_time,
+            mode=request.mode,
+            ffprobe_bin=shutil.which('ffprobe') or 'ffprobe',
+        )
         
-        print(f"✅ Video getrimmt: {output_filename}")
+        print(f"✅ Video getrimmt: {output_filename} ({result['strategy']}, {result['elapsed_s']:.2f}s)")
+        ws.check_quota()
         
         # 4. Datei zum Download bereitstellen
         return FileResponse(
@@ -180,19 +256,25 @@ async def trim_video(request: TrimVideoRequest):
             media_type='video/mp4',
             filename=output_filename,
             headers={
-                "Content-Disposition": f"attachment; filename={output_filename}"
-            }
+                "Content-Disposition": f"attachment; filename={output_filename}",
+                "X-Trim-Strategy": result['strategy'],
+                "X-Trim-Start": f"{result['start']:.3f}",
+            },
+            background=ws.handoff(),
         )
         
-    except requests.RequestException as e:
+    except WorkspaceQuotaExceeded as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except (MediaFetchError, requests.RequestException) as e:
         raise HTTPException(status_code=400, detail=f"Video konnte nicht heruntergeladen werden: {str(e)}")
+    except RuntimeError as e:
+        print(f"❌ ffmpeg Fehler: {e}")
+        raise HTTPException(status_code=500, detail=f"ffmpeg Fehler: {e}")
     except Exception as e:
         print(f"❌ Fehler beim Video-Trimming: {e}")
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        # Cleanup Input-Datei
-        if os.path.exists(input_path):
-            os.remove(input_path)
+        ws.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1 @@
+"""Bausteine der BitHuman-Services (backend/bithuman_service*.py, avatar_backend.py) und -Agents."""
@@ -0,0 +1,220 @@
+"""Gemeinsamer Session-Bootstrap der BitHuman-Agents.
+
+Bisher: Teilnehmer per `asyncio.sleep(0.5)`-Schleife abwarten (bis zu 0.5 s
+zusätzlich pro Join) und `silero.VAD.load()` in jedem Entrypoint.
+
+    # Worker (livekit-agents): VAD einmal pro Job-Prozess, vor dem Job
+    WorkerOptions(entrypoint_fnc=entrypoint, prewarm_fnc=prewarm)
+    vad = get_model("vad", ctx.proc.userdata)
+
+    # Teilnehmer über Room-Events, mit Timeout (andere Agents zählen nicht)
+    participant = await wait_for_participant(ctx.room, timeout_s=60)
+
+    # Startup-Timings je Phase
+    timer = PhaseTimer(); ...; timer.mark("connect"); ...; timer.report("room-abc")
+
+- Modelle: Registry (register_model), Modul-Cache pro Prozess, proc.userdata im Worker;
+  preload_background() lädt parallel zu Token/Connect (Modal-Funktion ohne Worker)
+- startup_stats(): p50/p95 je Phase über alle Sessions des Prozesses
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional, Union
+
+logger = logging.getLogger("agent")
+
+PARTICIPANT_TIMEOUT_S = float(os.getenv("AGENT_PARTICIPANT_TIMEOUT_S", "120"))
+
+# rtc.ParticipantKind (ohne livekit-Import); Default wie JobContext.wait_for_participant:
+# nur Menschen/Telefon – keine anderen Agents (z. B. den BitHuman-Avatar), Ingress, Egress
+KIND_STANDARD, KIND_INGRESS, KIND_EGRESS, KIND_SIP, KIND_AGENT = 0, 1, 2, 3, 4
+DEFAULT_PARTICIPANT_KINDS = (KIND_STANDARD, KIND_SIP)
+
+
+class ParticipantTimeout(Exception):
+    pass
+
+
+async def wait_for_participant(room, timeout_s: Optional[float] = PARTICIPANT_TIMEOUT_S,
+                               identity: Optional[str] = None,
+                               kind: Union[int, Iterable[int]] = DEFAULT_PARTICIPANT_KINDS):
+    """Erster (passender) Remote-Teilnehmer; wartet auf "participant_connected" statt zu pollen.
+
+    kind: erlaubte ParticipantKind-Werte (einzeln oder mehrere), Default ohne Agents.
+    """
+    kinds = {int(kind)} if isinstance(kind, int) else {int(k) for k in kind}
+
+    def matches(p) -> bool:
+        if int(getattr(p, "kind", KIND_STANDARD)) not in kinds:
+            return False
+        return identity is None or getattr(p, "identity", None) == identity
+
+    loop = asyncio.get_running_loop()
+    fut = loop.create_future()
+
+    def on_connected(participant, *args):
+        if matches(participant) and not fut.done():
+            fut.set_result(participant)
+
+    room.on("participant_connected", on_connected)
+    try:
+        # erst nach dem Registrieren prüfen → kein Join geht zwischen Check und Listener verloren
+        for participant in list(room.remote_participants.values()):
+            if matches(participant):
+                return participant
+        try:
+            return await asyncio.wait_for(fut, timeout_s)
+        except asyncio.TimeoutError:
+            raise ParticipantTimeout(f"kein Teilnehmer nach {timeout_s:g}s") from None
+    finally:
+        off = getattr(room, "off", None)
+        if off:
+            off("participant_connected", on_connected)
+
+
+# ---------------------------------------------------------------------------
+# Modelle: einmal pro Prozess laden, von allen Sessions geteilt
+# ---------------------------------------------------------------------------
+
+def _load_vad():
+    from livekit.plugins import silero
+    return silero.VAD.load()
+
+
+_LOADERS: Dict[str, Callable[[], Any]] = {"vad": _load_vad}
+_MODELS: Dict[str, Any] = {}
+_LOCKS: Dict[str, threading.Lock] = {}
+_LOCKS_GUARD = threading.Lock()
+_LOAD_TIMES: Dict[str, float] = {}
+
+
+def register_model(name: str, loader: Callable[[], Any]):
+    """Weiteres Modell für preload()/prewarm() (z. B. Turn-Detector)."""
+    _LOADERS[name] = loader
+
+
+def get_model(name: str, userdata: Optional[dict] = None):
+    """Modell aus proc.userdata bzw. dem Prozess-Cache; lädt beim ersten Zugriff (einmal, auch parallel)."""
+    if userdata is not None and name in userdata:
+        return userdata[name]
+    model = _MODELS.get(name)
+    if model is None:
+        with _LOCKS_GUARD:
+            lock = _LOCKS.setdefault(name, threading.Lock())
+        with lock:
+            model = _MODELS.get(name)
+            if model is None:
+                t = time.perf_counter()
+                model = _LOADERS[name]()
+                _MODELS[name] = model
+                _LOAD_TIMES[name] = round(time.perf_counter() - t, 4)
+                logger.info(f"🧠 Modell {name} geladen in {_LOAD_TIMES[name]:.2f}s")
+    if userdata is not None:
+        userdata[name] = model
+    return model
+
+
+async def aget_model(name: str, userdata: Optional[dict] = None):
+    """get_model ohne den Event-Loop zu blockieren, falls noch geladen wird."""
+    if (userdata is not None and name in userdata) or name in _MODELS:
+        return get_model(name, userdata)
+    return await asyncio.to_thread(get_model, name, userdata)
+
+
+def preload(names: Optional[Iterable[str]] = None, userdata: Optional[dict] = None) -> Dict[str, float]:
+    """Alle (oder die genannten) Modelle laden; Ladezeiten in Sekunden (0 = war schon geladen)."""
+    times = {}
+    for name in list(names or _LOADERS):
+        cached = name in _MODELS
+        get_model(name, userdata)
+        times[name] = 0.0 if cached else _LOAD_TIMES.get(name, 0.0)
+    return times
+
+
+def preload_background(names: Optional[Iterable[str]] = None) -> threading.Thread:
+    """preload() im Thread, z. B. parallel zu Token/Connect; Fehler nur loggen (Session lädt dann selbst)."""
+    def _run():
+        try:
+            preload(names)
+        except Exception as e:
+            logger.warning(f"⚠️ Modell-Preload fehlgeschlagen: {e}")
+    thread = threading.Thread(target=_run, name="agent-preload", daemon=True)
+    thread.start()
+    return thread
+
+
+def prewarm(proc):
+    """prewarm_fnc für WorkerOptions: Modelle in den Job-Prozess laden, bevor ein Job kommt."""
+    proc.userdata["prewarm_timings"] = preload(userdata=proc.userdata)
+    logger.info(f"🔥 Prewarm: {proc.userdata['prewarm_timings']}")
+
+
+# ---------------------------------------------------------------------------
+# Startup-Timings
+# ---------------------------------------------------------------------------
+
+class StartupStats:
+    """Startup-Timings aller Sessions des Prozesses (p50/p95 je Phase)."""
+
+    def __init__(self, max_samples: int = 500):
+        self.max_samples = max_samples
+        self._samples: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def record(self, timings: dict):
+        with self._lock:
+            for phase, seconds in timings.items():
+                samples = self._samples.setdefault(phase, [])
+                samples.append(seconds)
+                del samples[:-self.max_samples]
+
+    def metrics(self) -> dict:
+        with self._lock:
+            out = {}
+            for phase, samples in self._samples.items():
+                s = sorted(samples)
+                out[phase] = {"n": len(s), "p50": s[len(s) // 2],
+                              "p95": s[min(len(s) - 1, int(len(s) * 0.95))]}
+            return out
+
+
+_STATS: Optional[StartupStats] = None
+
+
+def startup_stats() -> StartupStats:
+    global _STATS
+    if _STATS is None:
+        _STATS = StartupStats()
+    return _STATS
+
+
+class PhaseTimer:
+    """Sekunden je Startphase (token, connect, participant, config, models, session, avatar, agent)."""
+
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self._last = self.t0
+        self.phases = {}
+
+    def mark(self, phase: str) -> float:
+        now = time.perf_counter()
+        self.phases[phase] = round(now - self._last, 4)
+        self._last = now
+        return self.phases[phase]
+
+    def total(self) -> float:
+        return round(self._last - self.t0, 4)
+
+    def as_dict(self) -> dict:
+        return {**self.phases, "total": self.total()}
+
+    def report(self, label: str = "") -> dict:
+        """Timings samt langsamster Phase loggen und in startup_stats() aufnehmen."""
+        timings = self.as_dict()
+        slowest = max(self.phases, key=self.phases.get) if self.phases else "-"
+        logger.info(f"⏱️ Startup {label}: {timings['total']:.2f}s (langsamste Phase: {slowest}) {timings}")
+        startup_stats().record(timings)
+        return timings
@@ -0,0 +1,338 @@
+"""Agent-Konfiguration (agentId → Voice, Namespace, Prompt, Modell) aus Firestore, gecacht.
+
+Bisher lief bei jedem Sessionstart eine Firestore-Query
+`avatars where liveAvatar.agentId == ...` – bei Reconnect-Stürmen eine Query pro Join.
+
+    service = config_service()
+    service.start()                       # Worker-Start: alle Avatare laden + Snapshot-Listener
+    config = await service.aget(agent_id) # Session: aus dem Speicher
+
+- warm(): eine Query über alle Avatare mit agentId → Index im Speicher
+- Frische: Firestore-Snapshot-Listener (Änderungen sofort); ohne/nach Ausfall des
+  Listeners TTL (ttl_s) mit Einzel-Query beim nächsten Zugriff
+- Job-Prozesse (LiveKit startet Sessions in eigenen Prozessen) lesen den Index aus
+  einer JSON-Datei (snapshot_path), die der Worker-Prozess schreibt
+- Ausfall von Firestore: letzter bekannter Stand (auch abgelaufen) statt leerer Config;
+  unbekannte agentIds werden kurz negativ gecacht
+- metrics(): Treffer, Fehlzugriffe, Firestore-Queries, veraltete Antworten, Listener-Events
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+COLLECTION = "avatars"
+AGENT_FIELD = "liveAvatar.agentId"
+
+
+def parse_avatar(doc_id: str, data: dict) -> dict:
+    """Firestore-Avatar → Agent-Config (Felder wie bisher in get_config)."""
+    voice = (data.get("training") or {}).get("voice") or {}
+    vid = voice.get("cloneVoiceId") or voice.get("elevenVoiceId")
+    if vid == "__CLONE__":
+        vid = None
+    live_avatar = data.get("liveAvatar") or {}
+    return {
+        "agent_id": live_avatar.get("agentId"),
+        "avatar_id": doc_id,
+        "voice_id": vid.strip() if vid else None,
+        "namespace": f"{data.get('userId', '')}_{doc_id}",
+        "instructions": data.get("personality"),
+        "description": data.get("description"),
+        "name": data.get("name", "Avatar"),
+        "bithuman_model": live_avatar.get("model"),
+    }
+
+
+def firestore_client():
+    """Firestore über firebase_admin (FIREBASE_CREDENTIALS als JSON, FIREBASE_CREDENTIALS_PATH oder ADC)."""
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    if not firebase_admin._apps:
+        creds = os.getenv("FIREBASE_CREDENTIALS")
+        cred_path = os.getenv("FIREBASE_CREDENTIALS_PATH")
+        if creds:
+            firebase_admin.initialize_app(credentials.Certificate(json.loads(creds)))
+        elif cred_path and os.path.exists(cred_path):
+            firebase_admin.initialize_app(credentials.Certificate(cred_path))
+        else:
+            firebase_admin.initialize_app()
+    return firestore.client()
+
+
+class AgentConfigService:
+    def __init__(
+        self,
+        client_factory: Callable[[], object] = firestore_client,
+        ttl_s: float = 300.0,
+        negative_ttl_s: float = 30.0,
+        snapshot_path: Optional[str] = None,
+        collection: str = COLLECTION,
+    ):
+        self.client_factory = client_factory
+        self.ttl_s = ttl_s
+        self.negative_ttl_s = negative_ttl_s
+        self.snapshot_path = snapshot_path
+        self.collection = collection
+        self._db = None
+        self._lock = threading.Lock()
+        self._agent_locks: Dict[str, threading.Lock] = {}
+        self._configs: Dict[str, dict] = {}   # agentId → config
+        self._loaded: Dict[str, float] = {}   # agentId → Zeitpunkt (monotonic) der letzten Bestätigung
+        self._missing: Dict[str, float] = {}  # agentId → Zeitpunkt des letzten "nicht gefunden"
+        self._watch = None
+        self._listening = False
+        self._started = False
+        self._snapshot_mtime = 0.0
+        self._counters = {"hits": 0, "misses": 0, "queries": 0, "errors": 0, "stale_served": 0,
+                          "negative_hits": 0, "snapshot_loads": 0, "listener_events": 0, "listener_lost": 0,
+                          "warmed": 0}
+
+    # --- Firestore ---
+    def _client(self):
+        if self._db is None:
+            self._db = self.client_factory()
+        return self._db
+
+    def _query(self):
+        return self._client().collection(self.collection)
+
+    # --- Start / Listener ---
+    def start(self, listen: bool = True) -> int:
+        """Worker-Start: alles laden, Snapshot schreiben, optional Listener. Fehler → Snapshot/TTL."""
+        if self._started:
+            return len(self._configs)
+        self._started = True
+        try:
+            n = self.warm()
+        except Exception as e:
+            self._counters["errors"] += 1
+            print(f"⚠️ Agent-Configs nicht vorgeladen ({e}) → Snapshot/Einzelabfragen")
+            self._load_snapshot(force=True)
+            n = 0
+        if listen:  # der erste Snapshot des Listeners lädt alles nach, sobald Firestore wieder da ist
+            self.listen()
+        return n
+
+    def start_background(self, listen: bool = True):
+        """start() in einem Daemon-Thread – der aktuelle Join wartet nicht auf das Vorladen."""
+        if not self._started:
+            threading.Thread(target=self.start, args=(listen,), name="agent-config-start", daemon=True).start()
+
+    def warm(self) -> int:
+        t0 = time.perf_counter()
+        self._counters["queries"] += 1
+        docs = list(self._query().where(AGENT_FIELD, ">", "").stream())
+        now = time.monotonic()
+        with self._lock:
+            for doc in docs:
+                cfg = parse_avatar(doc.id, doc.to_dict() or {})
+                if cfg["agent_id"]:
+                    self._configs[cfg["agent_id"]] = cfg
+                    self._loaded[cfg["agent_id"]] = now
+            self._counters["warmed"] = len(self._configs)
+        self._save_snapshot()
+        print(f"🗂️ Agent-Configs vorgeladen: {len(docs)} in {time.perf_counter() - t0:.2f}s")
+        return len(docs)
+
+    def listen(self):
+        """Firestore on_snapshot: Änderungen an Avataren landen sofort im Index."""
+        if self._watch is not None:
+            return
+        try:
+            self._watch = self._query().where(AGENT_FIELD, ">", "").on_snapshot(self._on_snapshot)
+            self._listening = True
+        except Exception as e:
+            self._counters["errors"] += 1
+            print(f"⚠️ Agent-Config-Listener nicht gestartet ({e}) → TTL {self.ttl_s:.0f}s")
+            return
+        if self.snapshot_path:
+            threading.Thread(target=self._heartbeat, name="agent-config-heartbeat", daemon=True).start()
+
+    def _heartbeat(self):
+        """Snapshot regelmäßig neu schreiben, solange der Listener lebt – Job-Prozesse sehen ihn als frisch."""
+        while self._watch is not None:
+            time.sleep(max(1.0, self.ttl_s / 2))
+            if self._listener_alive():
+                self._save_snapshot()
+
+    def _listener_alive(self) -> bool:
+        if not self._listening or self._watch is None:
+            return False
+        active = getattr(self._watch, "is_active", True)
+        if callable(active):
+            active = active()
+        if not active:
+            self._listening = False
+            self._counters["listener_lost"] += 1
+            print(f"⚠️ Agent-Config-Listener beendet → TTL {self.ttl_s:.0f}s")
+        return bool(active)
+
+    def _on_snapshot(self, docs, changes, read_time=None):
+        now = time.monotonic()
+        with self._lock:
+            for change in changes or []:
+                doc = change.document
+                kind = getattr(change.type, "name", str(change.type))
+                old = next((a for a, c in self._configs.items() if c.get("avatar_id") == doc.id), None)
+                if old:
+                    self._configs.pop(old, None)
+                    self._loaded.pop(old, None)
+                if kind != "REMOVED":
+                    cfg = parse_avatar(doc.id, doc.to_dict() or {})
+                    if cfg["agent_id"]:
+                        self._configs[cfg["agent_id"]] = cfg
+                        self._loaded[cfg["agent_id"]] = now
+                        self._missing.pop(cfg["agent_id"], None)
+                self._counters["listener_events"] += 1
+            # Listener lebt → alle bekannten Einträge gelten als bestätigt
+            for agent_id in self._configs:
+                self._loaded[agent_id] = now
+        self._save_snapshot()
+
+    def stop(self):
+        if self._watch is not None:
+            try:
+                self._watch.unsubscribe()
+            except Exception:
+                pass
+        self._watch = None
+        self._listening = False
+
+    # --- Lesen ---
+    def get(self, agent_id: str) -> dict:
+        """Config oder {} (wie das bisherige get_config). Blockiert nur bei Cache-Miss/abgelaufen."""
+        if not agent_id:
+            return {}
+        cfg = self._fresh(agent_id)
+        if cfg is not None:
+            return dict(cfg)
+        with self._lock:
+            lock = self._agent_locks.setdefault(agent_id, threading.Lock())
+        with lock:  # gleichzeitige Joins derselben agentId → eine Query
+            cfg = self._fresh(agent_id, count=False)
+            if cfg is not None:
+                return dict(cfg)
+            return dict(self._fetch(agent_id))
+
+    async def aget(self, agent_id: str) -> dict:
+        cfg = self._fresh(agent_id) if agent_id else None
+        if cfg is not None:
+            return dict(cfg)
+        return await asyncio.to_thread(self.get, agent_id)
+
+    def _fresh(self, agent_id: str, count: bool = True) -> Optional[dict]:
+        self._load_snapshot()
+        now = time.monotonic()
+        listening = self._listener_alive()
+        with self._lock:
+            cfg = self._configs.get(agent_id)
+            if cfg is not None and (listening or now - self._loaded.get(agent_id, 0) < self.ttl_s):
+                if count:
+                    self._counters["hits"] += 1
+                return cfg
+            missing = self._missing.get(agent_id)
+            if cfg is None and missing is not None and now - missing < self.negative_ttl_s:
+                if count:
+                    self._counters["negative_hits"] += 1
+                return {}
+        return None
+
+    def _fetch(self, agent_id: str) -> dict:
+        self._counters["misses"] += 1
+        try:
+            self._counters["queries"] += 1
+            docs = list(self._query().where(AGENT_FIELD, "==", agent_id).limit(1).stream())
+        except Exception as e:
+            self._counters["errors"] += 1
+            with self._lock:
+                stale = self._configs.get(agent_id)
+            if stale is not None:
+                self._counters["stale_served"] += 1
+                print(f"⚠️ Firestore nicht erreichbar ({e}) → letzter bekannter Stand für {agent_id}")
+                return stale
+            print(f"❌ Firestore nicht erreichbar, keine Config für {agent_id}: {e}")
+            return {}
+        now = time.monotonic()
+        with self._lock:
+            if not docs:
+                self._configs.pop(agent_id, None)
+                self._missing[agent_id] = now
+                print(f"⚠️ Kein Avatar mit agentId={agent_id}")
+                return {}
+            cfg = parse_avatar(docs[0].id, docs[0].to_dict() or {})
+            self._configs[agent_id] = cfg
+            self._loaded[agent_id] = now
+            self._missing.pop(agent_id, None)
+        return cfg
+
+    def invalidate(self, agent_id: Optional[str] = None):
+        with self._lock:
+            if agent_id is None:
+                self._loaded.clear()
+                self._missing.clear()
+            else:
+                self._loaded.pop(agent_id, None)
+                self._missing.pop(agent_id, None)
+
+    # --- Snapshot-Datei (Worker-Prozess → Job-Prozesse) ---
+    def _save_snapshot(self):
+        if not self.snapshot_path:
+            return
+        with self._lock:
+            data = {"written": time.time(), "configs": dict(self._configs)}
+        tmp = f"{self.snapshot_path}.{os.getpid()}.tmp"
+        try:
+            if os.path.dirname(self.snapshot_path):
+                os.makedirs(os.path.dirname(self.snapshot_path), exist_ok=True)
+            with open(tmp, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.snapshot_path)
+        except OSError as e:
+            print(f"⚠️ Agent-Config-Snapshot nicht geschrieben: {e}")
+
+    def _load_snapshot(self, force: bool = False):
+        """Neuere Snapshot-Datei übernehmen; Einträge gelten ab Schreibzeitpunkt ttl_s lang."""
+        if not self.snapshot_path or self._listening:
+            return
+        try:
+            mtime = os.path.getmtime(self.snapshot_path)
+        except OSError:
+            return
+        if not force and mtime <= self._snapshot_mtime:
+            return
+        try:
+            with open(self.snapshot_path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Agent-Config-Snapshot nicht lesbar: {e}")
+            return
+        confirmed = time.monotonic() - max(0.0, time.time() - float(data.get("written", 0)))
+        with self._lock:
+            for agent_id, cfg in (data.get("configs") or {}).items():
+                if confirmed >= self._loaded.get(agent_id, float("-inf")):
+                    self._configs[agent_id] = cfg
+                    self._loaded[agent_id] = confirmed
+            self._snapshot_mtime = mtime
+        self._counters["snapshot_loads"] += 1
+
+    def metrics(self) -> dict:
+        return {**self._counters, "agents": len(self._configs), "listening": self._listening,
+                "ttl_s": self.ttl_s, "snapshot_path": self.snapshot_path}
+
+
+_SERVICE: Optional[AgentConfigService] = None
+
+
+def config_service() -> AgentConfigService:
+    """Prozessweiter Service; AGENT_CONFIG_TTL_S, AGENT_CONFIG_SNAPSHOT (Default /tmp/agent_configs.json)."""
+    global _SERVICE
+    if _SERVICE is None:
+        _SERVICE = AgentConfigService(
+            ttl_s=float(os.getenv("AGENT_CONFIG_TTL_S", "300")),
+            snapshot_path=os.getenv("AGENT_CONFIG_SNAPSHOT", "/tmp/agent_configs.json") or None,
+        )
+    return _SERVICE
@@ -0,0 +1,325 @@
+"""Kontextgestütztes, gestreamtes LLM für die BitHuman-Agents.
+
+Bisher hat PineconeMistralLLM bei einem Pinecone-Treffer den rohen Chunk-Text
+zurückgegeben (Avatar liest Dokumente vor) und nur ohne Treffer Mistral
+gefragt – blockierend, ohne Streaming.
+
+    responder = GroundedResponder.from_env(kb)      # Mistral, Fallback OpenAI
+    async for token in responder.respond(history):  # history: [{"role", "content"}]
+        ...                                          # Token für Token an die TTS
+
+    llm = PineconeMistralLLM(responder)              # livekit.agents LLM für AgentSession
+
+- immer generiert: Kontext der KnowledgeBase in der System-Nachricht (nach den
+  Instructions), ohne Treffer der Hinweis, nichts zu erfinden
+- Streaming über die OpenAI-kompatible Chat-API (SSE; Mistral, OpenAI, lokal)
+- First-Token-Budget: kommt innerhalb von first_token_s nichts, wird ein
+  Füllsatz gesprochen und parallel das Fallback-Modell gefragt – das erste
+  Token gewinnt, der andere Stream wird abgebrochen
+- metrics(): First-Token-Latenz p50/p95, Fallbacks, Füllsätze, Timeouts
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+
+logger = logging.getLogger("agent")
+
+MISTRAL_BASE_URL = "https://api.mistral.ai/v1"
+OPENAI_BASE_URL = "https://api.openai.com/v1"
+
+CONTEXT_PROMPT = """Wissen aus deiner Wissensbasis:
+{context}
+
+Beantworte die nächste Frage auf Basis dieses Wissens, in deinen eigenen Worten.
+Lies keine Quellenangaben oder Dokumenttexte vor. Wenn das Wissen nicht reicht, sag das ehrlich.
+Antworte kurz und gesprochen – der Text wird vorgelesen."""
+
+NO_CONTEXT_PROMPT = """Zu dieser Frage gibt es nichts in deiner Wissensbasis.
+Erfinde keine Fakten über dich oder dein Angebot. Antworte kurz und gesprochen."""
+
+
+class ChatStreamClient:
+    """Streamt Antworten einer OpenAI-kompatiblen /chat/completions-API (SSE)."""
+
+    def __init__(self, base_url: str, api_key: Optional[str], model: str,
+                 timeout_s: float = 30.0, max_tokens: int = 300, temperature: float = 0.4):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.model = model
+        self.timeout_s = timeout_s
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _http(self) -> httpx.AsyncClient:
+        # Keep-Alive über alle Turns der Session (TLS-Handshake nur einmal)
+        if self._client is None or self._client.is_closed:
+            headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+            self._client = httpx.AsyncClient(headers=headers, timeout=httpx.Timeout(self.timeout_s, connect=5.0))
+        return self._client
+
+    async def stream(self, messages: List[dict]) -> AsyncIterator[str]:
+        payload = {"model": self.model, "messages": messages, "stream": True,
+                   "max_tokens": self.max_tokens, "temperature": self.temperature}
+        async with self._http().stream("POST", f"{self.base_url}/chat/completions", json=payload) as resp:
+            if resp.status_code != 200:
+                body = (await resp.aread())[:200]
+                raise RuntimeError(f"LLM HTTP {resp.status_code}: {body!r}")
+            async for line in resp.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    return
+                try:
+                    choices = json.loads(data).get("choices") or [{}]
+                except ValueError:
+                    continue
+                token = (choices[0].get("delta") or {}).get("content")
+                if token:
+                    yield token
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+def build_messages(history: List[dict], context: Optional[str]) -> List[dict]:
+    """Verlauf mit Kontext in der führenden System-Nachricht.
+
+    Mistral lehnt "system" nach "assistant" ab (HTTP 400) – deshalb alle System-Teile
+    (Instructions + Kontext) vorne zusammengefasst, der Rest des Verlaufs unverändert.
+    """
+    prompt = CONTEXT_PROMPT.format(context=context) if context else NO_CONTEXT_PROMPT
+    messages = [m for m in history if m.get("content")]
+    system = [m["content"] for m in messages if m["role"] == "system"]
+    rest = [m for m in messages if m["role"] != "system"]
+    return [{"role": "system", "content": "\n\n".join(system + [prompt])}] + rest
+
+
+def history_from_chat_ctx(chat_ctx) -> List[dict]:
+    """livekit ChatContext (1.x: items/text_content, 0.x: messages/content) → [{"role", "content"}]."""
+    items = getattr(chat_ctx, "items", None)
+    if items is None:
+        items = getattr(chat_ctx, "messages", None) or []
+    history = []
+    for item in items:
+        role = getattr(item, "role", None)
+        if role is None:  # Function-Calls etc.
+            continue
+        content = getattr(item, "text_content", None)
+        if content is None:
+            content = getattr(item, "content", "")
+            if isinstance(content, list):
+                content = "\n".join(c for c in content if isinstance(c, str))
+        history.append({"role": "system" if role == "developer" else role, "content": content or ""})
+    return history
+
+
+async def _close_stream(agen, first: Optional[asyncio.Future]):
+    if first is not None and not first.done():
+        first.cancel()
+        try:
+            await first
+        except (asyncio.CancelledError, Exception):
+            pass
+    try:
+        await agen.aclose()
+    except Exception:
+        pass
+
+
+class GroundedResponder:
+    """Kontext holen → Prompt → Token streamen, mit First-Token-Budget und Fallback-Modell."""
+
+    def __init__(
+        self,
+        client: ChatStreamClient,
+        kb=None,
+        fallback: Optional[ChatStreamClient] = None,
+        first_token_s: float = 1.5,
+        timeout_s: float = 8.0,
+        filler: str = "Einen Moment, ich schaue kurz nach.",
+        apology: str = "Entschuldigung, ich kann gerade nicht antworten. Versuch es bitte gleich noch einmal.",
+    ):
+        self.client = client
+        self.kb = kb
+        self.fallback = fallback
+        self.first_token_s = first_token_s
+        self.timeout_s = timeout_s
+        self.filler = filler
+        self.apology = apology
+        self._lock = threading.Lock()
+        self._first_token: List[float] = []
+        self._counters = {"turns": 0, "with_context": 0, "slow_first_token": 0, "fillers": 0,
+                          "fallback_used": 0, "primary_errors": 0, "timeouts": 0, "stream_errors": 0}
+
+    @classmethod
+    def from_env(cls, kb=None, **overrides) -> Optional["GroundedResponder"]:
+        """Mistral (MISTRAL_API_KEY) primär, OpenAI (OPENAI_API_KEY) als Fallback; AGENT_LLM_* übersteuern.
+
+        None, wenn kein Schlüssel gesetzt ist.
+        """
+        clients = []
+        if os.getenv("MISTRAL_API_KEY"):
+            clients.append(ChatStreamClient(os.getenv("AGENT_LLM_BASE_URL", MISTRAL_BASE_URL),
+                                            os.getenv("MISTRAL_API_KEY"),
+                                            os.getenv("AGENT_LLM_MODEL", "mistral-small-latest")))
+        if os.getenv("OPENAI_API_KEY"):
+            clients.append(ChatStreamClient(os.getenv("AGENT_LLM_FALLBACK_BASE_URL", OPENAI_BASE_URL),
+                                            os.getenv("OPENAI_API_KEY"),
+                                            os.getenv("AGENT_LLM_FALLBACK_MODEL", "gpt-4o-mini")))
+        if not clients:
+            return None
+        kwargs = dict(
+            first_token_s=float(os.getenv("AGENT_LLM_FIRST_TOKEN_S", "1.5")),
+            timeout_s=float(os.getenv("AGENT_LLM_TIMEOUT_S", "8")),
+        )
+        if os.getenv("AGENT_LLM_FILLER") is not None:
+            kwargs["filler"] = os.getenv("AGENT_LLM_FILLER")
+        kwargs.update(overrides)
+        return cls(clients[0], kb=kb, fallback=clients[1] if len(clients) > 1 else None, **kwargs)
+
+    async def respond(self, history: List[dict]) -> AsyncIterator[str]:
+        t0 = time.perf_counter()
+        self._counters["turns"] += 1
+        question = next((m["content"] for m in reversed(history) if m["role"] == "user"), "")
+        context = await self.kb.query(question) if (self.kb and question.strip()) else None
+        if context:
+            self._counters["with_context"] += 1
+        messages = build_messages(history, context)
+
+        async for token in self._race(messages, t0):
+            yield token
+
+    async def _race(self, messages: List[dict], t0: float) -> AsyncIterator[str]:
+        """Primär-Stream; nach first_token_s Füllsatz + Fallback, erstes Token gewinnt."""
+        streams = [("primary", self.client.stream(messages))]
+        pending: Dict[asyncio.Future, tuple] = {}
+        for name, agen in streams:
+            pending[asyncio.ensure_future(agen.__anext__())] = (name, agen)
+        deadline = t0 + self.timeout_s
+        budget_at = t0 + self.first_token_s
+        slow = False
+        winner = None
+        try:
+            while pending and winner is None:
+                wait_until = deadline if slow else min(budget_at, deadline)
+                done, _ = await asyncio.wait(pending, timeout=max(0.0, wait_until - time.perf_counter()),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                for fut in done:
+                    name, agen = pending.pop(fut)
+                    try:
+                        token = fut.result()
+                    except (StopAsyncIteration, Exception) as e:
+                        self._counters["primary_errors" if name == "primary" else "stream_errors"] += 1
+                        logger.warning(f"⚠️ LLM {name} ohne Antwort: {e!r}")
+                        await _close_stream(agen, None)
+                        if name == "primary" and not slow:
+                            slow = True  # Fehler = sofort auf Fallback
+                            await self._start_fallback(messages, pending)
+                        continue
+                    if winner is None:
+                        winner = (name, agen, token)
+                    else:
+                        await _close_stream(agen, None)
+                if winner is not None:
+                    break
+                if not slow and time.perf_counter() >= budget_at:
+                    slow = True
+                    self._counters["slow_first_token"] += 1
+                    logger.info(f"🐢 Kein erstes Token nach {self.first_token_s:.1f}s")
+                    await self._start_fallback(messages, pending)
+                    if self.filler:
+                        self._counters["fillers"] += 1
+                        yield self.filler + " "
+                elif time.perf_counter() >= deadline:
+                    break
+        finally:
+            for fut, (name, agen) in list(pending.items()):
+                await _close_stream(agen, fut)
+
+        if winner is None:
+            self._counters["timeouts"] += 1
+            logger.warning(f"❌ LLM: keine Antwort nach {self.timeout_s:.1f}s")
+            yield self.apology
+            return
+
+        name, agen, token = winner
+        if name == "fallback":
+            self._counters["fallback_used"] += 1
+        with self._lock:
+            self._first_token.append(time.perf_counter() - t0)
+            del self._first_token[:-500]
+        logger.info(f"⚡ Erstes Token ({name}) nach {(time.perf_counter() - t0) * 1000:.0f} ms")
+        yield token
+        try:
+            async for token in agen:
+                yield token
+        except Exception as e:
+            self._counters["stream_errors"] += 1
+            logger.warning(f"⚠️ LLM-Stream abgebrochen: {e!r}")
+        finally:
+            await _close_stream(agen, None)
+
+    async def _start_fallback(self, messages: List[dict], pending: Dict[asyncio.Future, tuple]):
+        if self.fallback is None:
+            return
+        logger.info(f"↪️ Fallback-Modell {self.fallback.model} parallel gestartet")
+        agen = self.fallback.stream(messages)
+        pending[asyncio.ensure_future(agen.__anext__())] = ("fallback", agen)
+
+    async def complete(self, history: List[dict]) -> str:
+        """Ganze Antwort als String (ohne TTS-Pipeline)."""
+        return "".join([token async for token in self.respond(history)])
+
+    def metrics(self) -> dict:
+        with self._lock:
+            s = sorted(self._first_token)
+        latency = {"n": len(s), "p50": round(s[len(s) // 2], 4) if s else None,
+                   "p95": round(s[min(len(s) - 1, int(len(s) * 0.95))], 4) if s else None}
+        return {**self._counters, "first_token_s": latency}
+
+
+# ---------------------------------------------------------------------------
+# livekit.agents-Adapter (nur wenn livekit installiert ist)
+# ---------------------------------------------------------------------------
+
+try:
+    from livekit.agents import llm as lk_llm
+    from livekit.agents.types import DEFAULT_API_CONNECT_OPTIONS
+    LIVEKIT_AVAILABLE = True
+except ImportError:
+    LIVEKIT_AVAILABLE = False
+
+if LIVEKIT_AVAILABLE:
+
+    class PineconeMistralLLM(lk_llm.LLM):
+        """AgentSession-LLM: Knowledge Base + Mistral, Token gehen direkt in die TTS-Pipeline."""
+
+        def __init__(self, responder: GroundedResponder):
+            super().__init__()
+            self.responder = responder
+
+        @property
+        def model(self) -> str:
+            return self.responder.client.model
+
+        def chat(self, *, chat_ctx, tools=None, conn_options=DEFAULT_API_CONNECT_OPTIONS, **kwargs):
+            return _GroundedStream(self, chat_ctx=chat_ctx, tools=tools or [], conn_options=conn_options)
+
+    class _GroundedStream(lk_llm.LLMStream):
+        async def _run(self) -> None:
+            request_id = f"grounded-{uuid.uuid4().hex[:12]}"
+            async for token in self._llm.responder.respond(history_from_chat_ctx(self._chat_ctx)):
+                self._event_ch.send_nowait(
+                    lk_llm.ChatChunk(id=request_id, delta=lk_llm.ChoiceDelta(role="assistant", content=token))
+                )
@@ -0,0 +1,188 @@
+"""Gestaffelte (hedged) Parallel-Probes über Endpunkt-Varianten, erste gültige Antwort gewinnt.
+
+_figure_create() probierte bisher 9 URLs × 2 Feldnamen nacheinander, jeweils
+mit 60s Timeout – im schlechtesten Fall über 15 Minuten.
+
+    prober = HedgedProber(state_path=".../figure_endpoints.json")
+    result = prober.probe(candidates, send)   # send(candidate) → Ergebnis oder Exception
+
+- Start mit der zuletzt erfolgreichen Variante (persistiert als JSON), dann nach
+  bisheriger Erfolgsquote
+- schlägt ein Versuch fehl (404/405/Verbindungsfehler), startet sofort der nächste;
+  antwortet er nur nicht, startet nach hedge_delay_s ein weiterer parallel
+  (höchstens max_in_flight gleichzeitig)
+- die bekannte Variante bekommt einen Vorsprung (≥ 1.5 × ihre letzte Latenz),
+  damit bei einem nur langsamen Server keine doppelten Figuren entstehen
+- laufende Verlierer werden nicht abgebrochen (HTTP-POST ist schon unterwegs);
+  kommen sie später noch erfolgreich zurück, zählt metrics()["late_successes"]
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional
+
+
+def candidate_key(candidate: dict) -> str:
+    return f"{candidate.get('field', '')}@{candidate['url']}"
+
+
+class ProbeFailed(RuntimeError):
+    """Keine Variante lieferte eine gültige Antwort."""
+
+    def __init__(self, message: str, errors: Dict[str, str]):
+        super().__init__(message)
+        self.errors = errors
+
+
+class HedgedProber:
+    def __init__(self, hedge_delay_s: float = 2.0, max_in_flight: int = 3,
+                 state_path: Optional[str] = None, head_start_factor: float = 1.5,
+                 max_head_start_s: float = 30.0):
+        self.hedge_delay_s = hedge_delay_s
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.state_path = state_path
+        self.head_start_factor = head_start_factor
+        self.max_head_start_s = max_head_start_s
+        self._lock = threading.Lock()
+        self._state = self._read_state()
+        self._counters = {"probes": 0, "wins": 0, "failures": 0, "attempts": 0,
+                          "hedges": 0, "late_successes": 0, "preferred_hits": 0}
+
+    # --- Reihenfolge ---
+    def order(self, candidates: List[dict]) -> List[dict]:
+        """Bevorzugte Variante zuerst, dann nach Erfolgsquote; sonst Listenreihenfolge."""
+        stats = self._state.get("stats", {})
+        preferred = self._state.get("preferred")
+
+        def rank(item):
+            idx, c = item
+            key = candidate_key(c)
+            s = stats.get(key, {})
+            ok, fail = s.get("ok", 0), s.get("fail", 0)
+            return (key != preferred, -(ok + 1) / (ok + fail + 2), idx)
+        return [c for _, c in sorted(enumerate(candidates), key=rank)]
+
+    def _head_start(self, key: str) -> float:
+        if key != self._state.get("preferred"):
+            return self.hedge_delay_s
+        latency = self._state.get("stats", {}).get(key, {}).get("latency_s") or 0.0
+        return min(self.max_head_start_s, max(self.hedge_delay_s, latency * self.head_start_factor))
+
+    # --- Probe ---
+    def probe(self, candidates: List[dict], send: Callable[[dict], object]):
+        """send(candidate) wird in Threads aufgerufen; Rückgabe = Erfolg, Exception = Fehlschlag."""
+        queue = self.order([c for c in candidates if c.get("url")])
+        if not queue:
+            raise ProbeFailed("keine Kandidaten", {})
+        self._counters["probes"] += 1
+        t0 = time.perf_counter()
+        errors: Dict[str, str] = {}
+        pool = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="hedged-probe")
+        running = {}
+        winner = {}
+
+        def _launch():
+            c = queue.pop(0)
+            key = candidate_key(c)
+            started = time.perf_counter()
+            fut = pool.submit(send, c)
+            fut.add_done_callback(lambda f, k=key, s=started: self._on_done(f, k, s, winner))
+            running[fut] = (c, key, started)
+            self._counters["attempts"] += 1
+            print(f"  📡 Probe: {key}")
+            return key
+
+        try:
+            next_delay = self._head_start(_launch())
+            while running:
+                done, _ = wait(list(running), timeout=next_delay if queue else None,
+                               return_when=FIRST_COMPLETED)
+                for fut in done:
+                    c, key, started = running.pop(fut)
+                    err = fut.exception()
+                    if err is None:
+                        result = fut.result()
+                        winner["key"] = key
+                        self._counters["wins"] += 1
+                        if key == self._state.get("preferred"):
+                            self._counters["preferred_hits"] += 1
+                        self._remember(key, ok=True, latency_s=time.perf_counter() - started, prefer=True)
+                        print(f"  ✅ Probe-Gewinner: {key} nach {time.perf_counter() - t0:.2f}s"
+                              f" ({len(running)} Versuche laufen noch)")
+                        return result
+                    errors[key] = str(err)[:300]
+                    self._remember(key, ok=False)
+                    print(f"  ❌ {key}: {str(err)[:200]}")
+                if not done:
+                    # Keine Antwort in der Wartezeit → zusätzlich die nächste Variante (Hedge)
+                    if queue and len(running) < self.max_in_flight:
+                        self._counters["hedges"] += 1
+                        _launch()
+                else:
+                    # Fehlschläge sofort ersetzen, ohne die Hedge-Wartezeit abzusitzen
+                    for _ in done:
+                        if queue and len(running) < self.max_in_flight:
+                            _launch()
+                next_delay = self.hedge_delay_s
+            self._counters["failures"] += 1
+            raise ProbeFailed(f"alle {len(errors)} Varianten fehlgeschlagen", errors)
+        finally:
+            pool.shutdown(wait=False)
+
+    def _on_done(self, fut, key: str, started: float, winner: dict):
+        """Verlierer, die nach dem Gewinner noch erfolgreich antworten, zählen (Duplikat-Risiko)."""
+        if winner.get("key") and winner["key"] != key and not fut.cancelled() and fut.exception() is None:
+            self._counters["late_successes"] += 1
+            self._remember(key, ok=True, latency_s=time.perf_counter() - started)
+            print(f"  ⚠️ Später Erfolg nach Gewinner: {key}")
+
+    # --- Gedächtnis ---
+    def _remember(self, key: str, ok: bool, latency_s: Optional[float] = None, prefer: bool = False):
+        with self._lock:
+            stats = self._state.setdefault("stats", {}).setdefault(key, {"ok": 0, "fail": 0})
+            stats["ok" if ok else "fail"] += 1
+            if ok:
+                stats["latency_s"] = round(latency_s or 0.0, 3)
+                stats["last_ok"] = time.time()
+            if prefer:
+                self._state["preferred"] = key
+            elif not ok and key == self._state.get("preferred"):
+                # bekannte Variante kaputt → nächstes Mal nach Erfolgsquote sortieren
+                self._state.pop("preferred", None)
+            self._write_state()
+
+    def forget(self):
+        with self._lock:
+            self._state = {}
+            self._write_state()
+
+    @property
+    def preferred(self) -> Optional[str]:
+        return self._state.get("preferred")
+
+    def _read_state(self) -> dict:
+        if not self.state_path or not os.path.exists(self.state_path):
+            return {}
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Probe-Status nicht lesbar: {e}")
+            return {}
+
+    def _write_state(self):
+        if not self.state_path:
+            return
+        tmp = f"{self.state_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(self._state, f)
+            os.replace(tmp, self.state_path)
+        except OSError as e:
+            print(f"⚠️ Probe-Status nicht geschrieben: {e}")
+
+    def metrics(self) -> dict:
+        return {**self._counters, "preferred": self.preferred,
+                "hedge_delay_s": self.hedge_delay_s, "max_in_flight": self.max_in_flight}
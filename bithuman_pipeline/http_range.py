@@ -0,0 +1,74 @@
+"""HTTP-Range-Auslieferung fertiger Videos (Seek im Player, fortgesetzte Downloads).
+
+    return ranged_file_response(path, request.headers.get("range"), media_type="video/mp4")
+
+- `bytes=a-b`, `bytes=a-`, `bytes=-n` (ein Bereich; Mehrfach-Ranges → ganze Datei)
+- 206 mit Content-Range, 416 bei unerfüllbarem Bereich, sonst 200
+- Datei wird in Chunks gelesen, nie komplett in den Speicher
+"""
+import os
+from typing import Optional, Tuple
+
+CHUNK_SIZE = 256 * 1024
+
+
+class RangeNotSatisfiable(ValueError):
+    pass
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Range-Header → (start, end) inklusiv, None = ganze Datei."""
+    if not header or not header.strip().lower().startswith("bytes="):
+        return None
+    spec = header.strip()[6:]
+    if "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first == "":
+            n = int(last)
+            if n <= 0:
+                raise RangeNotSatisfiable(header)
+            return max(0, size - n), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        raise RangeNotSatisfiable(header)
+    return start, min(end, size - 1)
+
+
+def iter_file(path: str, start: int, length: int, chunk_size: int = CHUNK_SIZE):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def ranged_file_response(path: str, range_header: Optional[str], media_type: str = "application/octet-stream",
+                         filename: Optional[str] = None, headers: Optional[dict] = None):
+    from starlette.responses import Response, StreamingResponse
+
+    size = os.path.getsize(path)
+    base = {"Accept-Ranges": "bytes", **(headers or {})}
+    if filename:
+        base["Content-Disposition"] = f'attachment; filename="{filename}"'
+    try:
+        rng = parse_range(range_header, size)
+    except RangeNotSatisfiable:
+        return Response(status_code=416, headers={**base, "Content-Range": f"bytes */{size}"})
+    if rng is None:
+        return StreamingResponse(iter_file(path, 0, size), media_type=media_type,
+                                 headers={**base, "Content-Length": str(size)})
+    start, end = rng
+    length = end - start + 1
+    return StreamingResponse(
+        iter_file(path, start, length), status_code=206, media_type=media_type,
+        headers={**base, "Content-Length": str(length), "Content-Range": f"bytes {start}-{end}/{size}"},
+    )
@@ -0,0 +1,312 @@
+"""Persistente Job-Records für /generate-avatar (SQLite) mit TTL für Records und Ergebnisdateien.
+
+Bisher lag der Job-Zustand im prozesslokalen JOBS-Dict: unbegrenzt, nach einem
+Neustart weg. AvatarJobStore hält nichts im Speicher außer der DB-Verbindung.
+
+    store = AvatarJobStore("/data/avatar_jobs.sqlite3", "/data/avatar_results", ttl_s=86400)
+    job = store.create("generate-avatar", params={...})
+    store.transition(job["id"], RUNNING)
+    store.attach_result(job["id"], "/tmp/ws/avatar_video.mp4")   # verschiebt in results_dir
+    store.transition(job["id"], SUCCEEDED)
+
+- Statusübergänge werden geprüft (queued → running → succeeded/failed/cancelled,
+  abgeschlossen → expired); jeder Übergang landet mit Zeitstempel in `history`
+  und als `<status>_at`
+- TTL: abgeschlossene Jobs laufen nach ttl_s ab, purge() löscht Ergebnisdatei
+  und (nach record_ttl_s) den Record; verwaiste Dateien im results_dir ebenfalls
+- Grenzen: max_records (älteste abgeschlossene zuerst) und max_result_bytes
+- recover(): nach einem Neustart hängen gebliebene queued/running-Jobs → failed
+- list(): Keyset-Pagination (created_at, id) → stabile Seiten auch bei neuen Jobs
+"""
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from typing import List, Optional, Tuple
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED, EXPIRED = (
+    "queued", "running", "succeeded", "failed", "cancelled", "expired")
+FINAL_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+TRANSITIONS = {
+    QUEUED: (RUNNING, FAILED, CANCELLED),
+    RUNNING: (SUCCEEDED, FAILED, CANCELLED),
+    SUCCEEDED: (EXPIRED,),
+    FAILED: (EXPIRED,),
+    CANCELLED: (EXPIRED,),
+    EXPIRED: (),
+}
+
+
+class InvalidTransition(ValueError):
+    """Statuswechsel nicht erlaubt (z.B. succeeded → running)."""
+
+
+def encode_cursor(job: dict) -> str:
+    return f"{job['created_at']!r}:{job['id']}"
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    created, _, job_id = cursor.partition(":")
+    return float(created), job_id
+
+
+class AvatarJobStore:
+    def __init__(self, path: str, results_dir: str, ttl_s: float = 24 * 3600,
+                 record_ttl_s: Optional[float] = None, max_records: int = 10000,
+                 max_result_bytes: int = 20 * 1024 ** 3):
+        self.path = path
+        self.results_dir = results_dir
+        self.ttl_s = ttl_s
+        self.record_ttl_s = record_ttl_s if record_ttl_s is not None else 6 * ttl_s
+        self.max_records = max_records
+        self.max_result_bytes = max_result_bytes
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.makedirs(results_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS avatar_jobs ("
+            " id TEXT PRIMARY KEY, kind TEXT, status TEXT, user_id TEXT,"
+            " created_at REAL, updated_at REAL, expires_at REAL,"
+            " result_path TEXT, result_bytes INTEGER DEFAULT 0, data TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS avatar_jobs_created ON avatar_jobs(created_at, id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS avatar_jobs_status ON avatar_jobs(status, created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS avatar_jobs_expires ON avatar_jobs(expires_at)")
+
+    # --- Schreiben ---
+    def create(self, kind: str, params: Optional[dict] = None, user_id: Optional[str] = None,
+               job_id: Optional[str] = None) -> dict:
+        now = time.time()
+        job = {
+            "id": job_id or uuid.uuid4().hex,
+            "kind": kind,
+            "status": QUEUED,
+            "user_id": user_id,
+            "params": params or {},
+            "created_at": now,
+            "updated_at": now,
+            "queued_at": now,
+            "history": [{"status": QUEUED, "at": now}],
+            "expires_at": None,
+            "error": None,
+            "result": None,
+        }
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO avatar_jobs (id, kind, status, user_id, created_at, updated_at, expires_at, data)"
+                " VALUES (?,?,?,?,?,?,?,?)",
+                (job["id"], kind, QUEUED, user_id, now, now, None, json.dumps(job, default=str)),
+            )
+        return job
+
+    def transition(self, job_id: str, status: str, **fields) -> dict:
+        """Status wechseln (geprüft), Zeitstempel + History setzen, weitere Felder übernehmen."""
+        with self._lock:
+            job = self._get_locked(job_id)
+            if job is None:
+                raise KeyError(job_id)
+            if status not in TRANSITIONS.get(job["status"], ()):
+                raise InvalidTransition(f"{job['status']} → {status} nicht erlaubt ({job_id})")
+            now = time.time()
+            job.update(fields)
+            job["status"] = status
+            job["updated_at"] = now
+            job[f"{status}_at"] = now
+            job["history"].append({"status": status, "at": now})
+            if status in FINAL_STATES:
+                job["expires_at"] = now + self.ttl_s
+                started = job.get("running_at")
+                job["duration_s"] = round(now - started, 3) if started else None
+            self._save_locked(job)
+            return job
+
+    def update(self, job_id: str, **fields) -> Optional[dict]:
+        """Felder ohne Statuswechsel setzen (Fortschritt, Zwischenstände)."""
+        fields.pop("status", None)
+        with self._lock:
+            job = self._get_locked(job_id)
+            if job is None:
+                return None
+            job.update(fields)
+            job["updated_at"] = time.time()
+            self._save_locked(job)
+            return job
+
+    def attach_result(self, job_id: str, src_path: str, suffix: str = ".mp4") -> str:
+        """Ergebnisdatei in results_dir verschieben (gleiches FS → rename) und am Job vermerken."""
+        dest = os.path.join(self.results_dir, f"{job_id}{suffix}")
+        tmp = f"{dest}.part"
+        shutil.move(src_path, tmp)
+        os.replace(tmp, dest)
+        size = os.path.getsize(dest)
+        with self._lock:
+            job = self._get_locked(job_id)
+            if job is None:
+                os.remove(dest)
+                raise KeyError(job_id)
+            job["result"] = {"bytes": size, "suffix": suffix}
+            job["updated_at"] = time.time()
+            self._save_locked(job, result_path=dest, result_bytes=size)
+        return dest
+
+    def delete(self, job_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT result_path FROM avatar_jobs WHERE id=?", (job_id,)).fetchone()
+            if row is None:
+                return False
+            self._conn.execute("DELETE FROM avatar_jobs WHERE id=?", (job_id,))
+        _remove(row[0])
+        return True
+
+    def _save_locked(self, job: dict, result_path: Optional[str] = None, result_bytes: Optional[int] = None):
+        sets = "status=?, updated_at=?, expires_at=?, data=?"
+        args = [job["status"], job["updated_at"], job.get("expires_at"), json.dumps(job, default=str)]
+        if result_path is not None:
+            sets += ", result_path=?, result_bytes=?"
+            args += [result_path, int(result_bytes or 0)]
+        self._conn.execute(f"UPDATE avatar_jobs SET {sets} WHERE id=?", (*args, job["id"]))
+
+    # --- Lesen ---
+    def _get_locked(self, job_id: str) -> Optional[dict]:
+        row = self._conn.execute("SELECT data FROM avatar_jobs WHERE id=?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            return self._get_locked(job_id)
+
+    def result_path(self, job_id: str) -> Optional[str]:
+        """Pfad der Ergebnisdatei, solange der Job nicht abgelaufen ist."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result_path, status, expires_at FROM avatar_jobs WHERE id=?", (job_id,)).fetchone()
+        if not row or not row[0] or row[1] == EXPIRED or (row[2] and row[2] <= time.time()):
+            return None
+        return row[0] if os.path.exists(row[0]) else None
+
+    def list(self, status: Optional[str] = None, user_id: Optional[str] = None, kind: Optional[str] = None,
+             limit: int = 50, cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+        """Neueste zuerst; → (jobs, next_cursor). Details (history/params) bleiben drin."""
+        limit = max(1, min(int(limit), 500))
+        sql, args = "SELECT data FROM avatar_jobs WHERE 1=1", []
+        for col, val in (("status", status), ("user_id", user_id), ("kind", kind)):
+            if val:
+                sql += f" AND {col}=?"
+                args.append(val)
+        if cursor:
+            created, job_id = decode_cursor(cursor)
+            sql += " AND (created_at < ? OR (created_at = ? AND id < ?))"
+            args += [created, created, job_id]
+        sql += " ORDER BY created_at DESC, id DESC LIMIT ?"
+        args.append(limit + 1)
+        with self._lock:
+            rows = self._conn.execute(sql, args).fetchall()
+        jobs = [json.loads(r[0]) for r in rows[:limit]]
+        next_cursor = encode_cursor(jobs[-1]) if len(rows) > limit and jobs else None
+        return jobs, next_cursor
+
+    def count(self, status: Optional[str] = None) -> int:
+        with self._lock:
+            if status:
+                return self._conn.execute("SELECT COUNT(*) FROM avatar_jobs WHERE status=?", (status,)).fetchone()[0]
+            return self._conn.execute("SELECT COUNT(*) FROM avatar_jobs").fetchone()[0]
+
+    # --- Wartung ---
+    def recover(self, reason: str = "Service neu gestartet") -> int:
+        """queued/running aus einem früheren Prozess können nicht weiterlaufen → failed."""
+        with self._lock:
+            ids = [r[0] for r in self._conn.execute(
+                "SELECT id FROM avatar_jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)).fetchall()]
+        for job_id in ids:
+            try:
+                self.transition(job_id, FAILED, error=reason)
+            except (KeyError, InvalidTransition):
+                pass
+        if ids:
+            print(f"♻️ {len(ids)} unterbrochene Avatar-Jobs als failed markiert")
+        return len(ids)
+
+    def purge(self, now: Optional[float] = None) -> dict:
+        """Abgelaufene Ergebnisse löschen (Record → expired), alte Records entfernen, Grenzen durchsetzen."""
+        now = now or time.time()
+        expired_files = dropped = 0
+        with self._lock:
+            due = self._conn.execute(
+                "SELECT id FROM avatar_jobs WHERE status IN (?,?,?) AND expires_at IS NOT NULL AND expires_at <= ?",
+                (*FINAL_STATES, now)).fetchall()
+        for (job_id,) in due:
+            if self._expire(job_id):
+                expired_files += 1
+        # Größenbudget der Ergebnisse: älteste zuerst abgelaufen setzen
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, result_bytes FROM avatar_jobs WHERE status IN (?,?,?) AND result_bytes > 0"
+                " ORDER BY updated_at ASC", FINAL_STATES).fetchall()
+        total = sum(r[1] for r in rows)
+        for job_id, size in rows:
+            if total <= self.max_result_bytes:
+                break
+            if self._expire(job_id, reason="Speicherbudget"):
+                expired_files += 1
+                total -= size
+        with self._lock:
+            cutoff = now - self.record_ttl_s
+            dropped += self._conn.execute(
+                "DELETE FROM avatar_jobs WHERE status IN (?,?,?,?) AND updated_at < ?",
+                (*FINAL_STATES, EXPIRED, cutoff)).rowcount
+            excess = self._conn.execute("SELECT COUNT(*) FROM avatar_jobs").fetchone()[0] - self.max_records
+            if excess > 0:
+                victims = self._conn.execute(
+                    "SELECT id, result_path FROM avatar_jobs WHERE status IN (?,?,?,?)"
+                    " ORDER BY created_at ASC LIMIT ?", (*FINAL_STATES, EXPIRED, excess)).fetchall()
+                self._conn.executemany("DELETE FROM avatar_jobs WHERE id=?", [(v[0],) for v in victims])
+                dropped += len(victims)
+                for _, path in victims:
+                    _remove(path)
+            known = {r[0] for r in self._conn.execute(
+                "SELECT result_path FROM avatar_jobs WHERE result_path IS NOT NULL AND status != ?", (EXPIRED,))}
+        orphans = 0
+        for name in os.listdir(self.results_dir):
+            path = os.path.join(self.results_dir, name)
+            if path not in known and os.path.isfile(path) and now - os.path.getmtime(path) > 3600:
+                _remove(path)
+                orphans += 1
+        if expired_files or dropped or orphans:
+            print(f"🧹 Avatar-Jobs: {expired_files} Ergebnisse abgelaufen, {dropped} Records, {orphans} verwaiste Dateien")
+        return {"expired": expired_files, "dropped": dropped, "orphans": orphans}
+
+    def _expire(self, job_id: str, reason: str = "TTL") -> bool:
+        try:
+            job = self.transition(job_id, EXPIRED, expired_reason=reason)
+        except (KeyError, InvalidTransition):
+            return False
+        with self._lock:
+            row = self._conn.execute("SELECT result_path FROM avatar_jobs WHERE id=?", (job_id,)).fetchone()
+            self._conn.execute("UPDATE avatar_jobs SET result_bytes=0 WHERE id=?", (job_id,))
+        _remove(row[0] if row else None)
+        return job is not None
+
+    def metrics(self) -> dict:
+        with self._lock:
+            by_status = dict(self._conn.execute("SELECT status, COUNT(*) FROM avatar_jobs GROUP BY status").fetchall())
+            result_bytes = self._conn.execute("SELECT COALESCE(SUM(result_bytes), 0) FROM avatar_jobs").fetchone()[0]
+        return {"jobs": by_status, "result_bytes": result_bytes, "max_result_bytes": self.max_result_bytes,
+                "ttl_s": self.ttl_s, "record_ttl_s": self.record_ttl_s, "max_records": self.max_records}
+
+
+def _remove(path: Optional[str]):
+    if not path:
+        return
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"⚠️ Ergebnisdatei nicht gelöscht ({path}): {e}")
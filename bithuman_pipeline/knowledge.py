@@ -0,0 +1,475 @@
+"""Gemeinsame Wissensabfrage (Embedding + Vektorsuche) für die BitHuman-Agents.
+
+Bisher hatte jede Agent-Variante ihre eigene KnowledgeBase: pro Turn ein
+ada-002-Embedding + Pinecone-Query, harter Cutoff 0.7, Top 3, nichts gecacht.
+
+    kb = KnowledgeBase.from_env(namespace)        # Pinecone + OpenAI
+    kb.start_prefetch()                           # Hintergrund, blockiert den Join nicht
+    context = await kb.query("Was kostet das?")   # String oder None (wie bisher)
+
+- Session-Cache: Ergebnisse und Embeddings pro normalisierter Frage (LRU + TTL),
+  gleichzeitige gleiche Fragen teilen sich einen Lookup (Single-Flight)
+- Prefetch zum Sessionstart: häufigste Chunks des Avatars (fetch per ID) und
+  häufigste Fragen (ein Batch-Embedding) aus UsageStats; antwortet die
+  Vektorsuche nicht rechtzeitig, wird lokal über die Hot-Chunks gesucht
+- Scoring: min_score, top_k, max_chunks und rerank ("score", "keyword", "mmr"
+  oder eine Funktion) – per Konstruktor oder KB_*-Env
+- metrics(): Cache-Treffer, Fallbacks, Latenzen (p50/p95) für Embedding/Suche/gesamt
+- Backends sind austauschbar: embedder.embed(texts) → Vektoren,
+  index.query(vector, top_k, namespace, include_values) / index.fetch(ids, namespace);
+  HashingEmbedder + MemoryIndex laufen lokal ohne Netz (Tests, lokaler Agent)
+"""
+import asyncio
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Union
+
+DEFAULT_EMBED_MODEL = "text-embedding-ada-002"
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def normalize_question(text: str) -> str:
+    return " ".join(_WORD.findall((text or "").lower()))
+
+
+def _terms(text: str) -> set:
+    return {w for w in _WORD.findall((text or "").lower()) if len(w) > 2}
+
+
+def cosine(a: Sequence[float], b: Sequence[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    na = math.sqrt(sum(x * x for x in a))
+    nb = math.sqrt(sum(y * y for y in b))
+    return dot / (na * nb) if na and nb else 0.0
+
+
+# --- Backends -------------------------------------------------------------
+
+class OpenAIEmbedder:
+    def __init__(self, client, model: str = DEFAULT_EMBED_MODEL):
+        self.client = client
+        self.model = model
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        resp = self.client.embeddings.create(model=self.model, input=texts)
+        return [d.embedding for d in sorted(resp.data, key=lambda d: getattr(d, "index", 0))]
+
+
+class PineconeIndex:
+    """Adapter: Pinecone-Antworten (Objekte oder Dicts) → einfache Match-Dicts."""
+
+    def __init__(self, index):
+        self.index = index
+
+    def query(self, vector: List[float], top_k: int, namespace: Optional[str] = None,
+              include_values: bool = False) -> List[dict]:
+        params = {"vector": vector, "top_k": top_k, "include_metadata": True, "include_values": include_values}
+        if namespace:
+            params["namespace"] = namespace
+        res = self.index.query(**params)
+        matches = res.get("matches", []) if isinstance(res, dict) else (res.matches or [])
+        return [_as_match(m) for m in matches]
+
+    def fetch(self, ids: List[str], namespace: Optional[str] = None) -> List[dict]:
+        res = self.index.fetch(ids=list(ids), namespace=namespace) if namespace else self.index.fetch(ids=list(ids))
+        vectors = res.get("vectors", {}) if isinstance(res, dict) else (res.vectors or {})
+        return [_as_match(v, vid) for vid, v in vectors.items()]
+
+
+def _as_match(m, vid: Optional[str] = None) -> dict:
+    get = m.get if isinstance(m, dict) else (lambda k, d=None: getattr(m, k, d))
+    return {"id": get("id") or vid, "score": float(get("score", 0.0) or 0.0),
+            "metadata": dict(get("metadata") or {}), "values": list(get("values") or [])}
+
+
+class HashingEmbedder:
+    """Deterministisches Bag-of-Words-Embedding (Feature Hashing) – ohne Netz, für Tests/lokal."""
+
+    def __init__(self, dim: int = 256, delay_s: float = 0.0):
+        self.dim = dim
+        self.delay_s = delay_s
+        self.calls = 0
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        if self.delay_s:
+            time.sleep(self.delay_s)
+        out = []
+        for text in texts:
+            vec = [0.0] * self.dim
+            for w in _WORD.findall((text or "").lower()):
+                h = int(hashlib.md5(w.encode()).hexdigest(), 16)
+                vec[h % self.dim] += 1.0 if (h >> 8) & 1 else -1.0
+            out.append(vec)
+        return out
+
+
+class MemoryIndex:
+    """Vektorindex im Speicher mit Pinecone-ähnlicher Schnittstelle (Cosine, Namespaces)."""
+
+    def __init__(self, delay_s: float = 0.0):
+        self.delay_s = delay_s
+        self.queries = 0
+        self._ns: Dict[str, Dict[str, dict]] = {}
+
+    def upsert(self, items: Iterable[dict], namespace: Optional[str] = None):
+        ns = self._ns.setdefault(namespace or "", {})
+        for it in items:
+            ns[it["id"]] = {"values": list(it["values"]), "metadata": dict(it.get("metadata") or {})}
+
+    def query(self, vector: List[float], top_k: int, namespace: Optional[str] = None,
+              include_values: bool = False) -> List[dict]:
+        self.queries += 1
+        if self.delay_s:
+            time.sleep(self.delay_s)
+        scored = [{"id": vid, "score": cosine(vector, v["values"]), "metadata": v["metadata"],
+                   "values": v["values"] if include_values else []}
+                  for vid, v in self._ns.get(namespace or "", {}).items()]
+        return sorted(scored, key=lambda m: -m["score"])[:top_k]
+
+    def fetch(self, ids: List[str], namespace: Optional[str] = None) -> List[dict]:
+        ns = self._ns.get(namespace or "", {})
+        return [{"id": i, "score": 0.0, "metadata": ns[i]["metadata"], "values": ns[i]["values"]}
+                for i in ids if i in ns]
+
+
+# --- Nutzungsstatistik (für Prefetch) -------------------------------------
+
+class UsageStats:
+    """Zählt pro Namespace getroffene Chunks und gestellte Fragen; optional als JSON persistiert."""
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = 500, save_every: int = 20):
+        self.path = path
+        self.max_entries = max_entries
+        self.save_every = save_every
+        self._lock = threading.Lock()
+        self._dirty = 0
+        self._data: Dict[str, Dict[str, Counter]] = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    raw = json.load(f)
+                self._data = {ns: {k: Counter(v) for k, v in d.items()} for ns, d in raw.items()}
+            except (OSError, ValueError) as e:
+                print(f"⚠️ KB-Nutzungsstatistik nicht lesbar: {e}")
+
+    def record(self, namespace: Optional[str], question: str, chunk_ids: Iterable[str]):
+        with self._lock:
+            d = self._data.setdefault(namespace or "", {"chunks": Counter(), "questions": Counter()})
+            d["chunks"].update(chunk_ids)
+            if question:
+                d["questions"][question] += 1
+            for key in ("chunks", "questions"):
+                if len(d[key]) > self.max_entries * 2:
+                    d[key] = Counter(dict(d[key].most_common(self.max_entries)))
+            self._dirty += 1
+            due = self._dirty >= self.save_every
+        if due:
+            self.save()
+
+    def top_chunks(self, namespace: Optional[str], n: int) -> List[str]:
+        with self._lock:
+            return [k for k, _ in self._data.get(namespace or "", {}).get("chunks", Counter()).most_common(n)]
+
+    def top_questions(self, namespace: Optional[str], n: int) -> List[str]:
+        with self._lock:
+            return [k for k, _ in self._data.get(namespace or "", {}).get("questions", Counter()).most_common(n)]
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            snapshot = {ns: {k: dict(c) for k, c in d.items()} for ns, d in self._data.items()}
+            self._dirty = 0
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp, "w") as f:
+                json.dump(snapshot, f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"⚠️ KB-Nutzungsstatistik nicht gespeichert: {e}")
+
+
+_USAGE: Optional[UsageStats] = None
+
+
+def usage_stats() -> UsageStats:
+    """Prozessweite Statistik (KB_USAGE_PATH, z.B. auf einem Volume); ohne Pfad nur im Speicher."""
+    global _USAGE
+    if _USAGE is None:
+        _USAGE = UsageStats(os.getenv("KB_USAGE_PATH") or None)
+    return _USAGE
+
+
+# --- Rerank ---------------------------------------------------------------
+
+def rerank_keyword(question: str, matches: List[dict], weight: float = 0.3) -> List[dict]:
+    """Vektorscore mit Wortüberlappung mischen (hilft bei Namen/Zahlen, die Embeddings verwischen)."""
+    q = _terms(question)
+    for m in matches:
+        overlap = len(q & _terms(m["metadata"].get("text", ""))) / len(q) if q else 0.0
+        m["rank_score"] = (1 - weight) * m["score"] + weight * overlap
+    return sorted(matches, key=lambda m: -m["rank_score"])
+
+
+def rerank_mmr(question: str, matches: List[dict], lam: float = 0.5, k: int = 3) -> List[dict]:
+    """Maximal Marginal Relevance: relevante, aber nicht redundante Chunks (braucht values)."""
+    pool, picked = list(matches), []
+    while pool and len(picked) < k:
+        def gain(m):
+            redundancy = max((cosine(m["values"], p["values"]) for p in picked if m["values"] and p["values"]),
+                             default=0.0)
+            return lam * m["score"] - (1 - lam) * redundancy
+        best = max(pool, key=gain)
+        best["rank_score"] = gain(best)
+        picked.append(best)
+        pool.remove(best)
+    return picked + pool
+
+
+RERANKERS = {"score": None, "keyword": rerank_keyword, "mmr": rerank_mmr}
+
+
+# --- KnowledgeBase --------------------------------------------------------
+
+class KnowledgeBase:
+    def __init__(
+        self,
+        embedder,
+        index,
+        namespace: Optional[str] = None,
+        top_k: int = 5,
+        min_score: float = 0.7,
+        max_chunks: int = 3,
+        rerank: Union[str, Callable[[str, List[dict]], List[dict]], None] = "score",
+        cache_size: int = 256,
+        cache_ttl_s: float = 600.0,
+        search_timeout_s: Optional[float] = None,
+        usage: Optional[UsageStats] = None,
+        prefetch_chunks: int = 50,
+        prefetch_questions: int = 10,
+    ):
+        self.embedder = embedder
+        self.index = index
+        self.namespace = namespace
+        self.top_k = top_k
+        self.min_score = min_score
+        self.max_chunks = max_chunks
+        self.rerank = RERANKERS[rerank] if isinstance(rerank, str) else rerank
+        self.rerank_name = rerank if isinstance(rerank, str) else getattr(rerank, "__name__", "custom")
+        self.cache_size = cache_size
+        self.cache_ttl_s = cache_ttl_s
+        self.search_timeout_s = search_timeout_s
+        self.usage = usage if usage is not None else usage_stats()
+        self.prefetch_chunks = prefetch_chunks
+        self.prefetch_questions = prefetch_questions
+        self._results: "OrderedDict[str, tuple]" = OrderedDict()  # frage → (zeit, matches)
+        self._vectors: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._hot: Dict[str, dict] = {}
+        self._prefetch_task: Optional[asyncio.Task] = None
+        self._counters = {"queries": 0, "cache_hits": 0, "embed_cache_hits": 0, "joined": 0,
+                          "empty": 0, "errors": 0, "search_timeouts": 0, "hot_fallbacks": 0,
+                          "prefetched_chunks": 0, "prefetched_questions": 0}
+        self._latency = {"embed": deque(maxlen=200), "search": deque(maxlen=200), "total": deque(maxlen=200)}
+
+    @classmethod
+    def from_env(cls, namespace: Optional[str], index_name: Optional[str] = None, **overrides) -> "KnowledgeBase":
+        """Pinecone + OpenAI aus PINECONE_*/OPENAI_API_KEY, Scoring aus KB_* (Defaults = altes Verhalten)."""
+        from openai import OpenAI
+        from pinecone import Pinecone
+
+        index_name = index_name or os.getenv("PINECONE_INDEX_NAME", "avatars-index")
+        pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+        timeout = os.getenv("KB_SEARCH_TIMEOUT_S")
+        kwargs = dict(
+            top_k=int(os.getenv("KB_TOP_K", "5")),
+            min_score=float(os.getenv("KB_MIN_SCORE", "0.7")),
+            max_chunks=int(os.getenv("KB_MAX_CHUNKS", "3")),
+            rerank=os.getenv("KB_RERANK", "score"),
+            cache_ttl_s=float(os.getenv("KB_CACHE_TTL_S", "600")),
+            search_timeout_s=float(timeout) if timeout else None,
+        )
+        kwargs.update(overrides)
+        return cls(
+            OpenAIEmbedder(OpenAI(api_key=os.getenv("OPENAI_API_KEY")), os.getenv("KB_EMBED_MODEL", DEFAULT_EMBED_MODEL)),
+            PineconeIndex(pc.Index(index_name)),
+            namespace,
+            **kwargs,
+        )
+
+    # --- Abfrage ---
+    async def query(self, question: str, top_k: Optional[int] = None) -> Optional[str]:
+        """Kontext-String ("[source]: text" je Chunk) oder None – Schnittstelle der alten KnowledgeBase."""
+        try:
+            matches = await self.retrieve(question, top_k=top_k)
+        except Exception as e:
+            self._counters["errors"] += 1
+            print(f"❌ Wissensabfrage fehlgeschlagen: {e}")
+            return None
+        return self.format_context(matches)
+
+    @staticmethod
+    def format_context(matches: List[dict]) -> Optional[str]:
+        if not matches:
+            return None
+        return "\n\n".join(f"[{m['metadata'].get('source', 'Unknown')}]: {m['metadata'].get('text', '')}"
+                           for m in matches)
+
+    async def retrieve(self, question: str, top_k: Optional[int] = None) -> List[dict]:
+        """Gefilterte, gererankte Matches (höchstens max_chunks)."""
+        t0 = time.perf_counter()
+        self._counters["queries"] += 1
+        key = normalize_question(question)
+        if not key:
+            return []
+        hit = self._cached(key)
+        if hit is not None:
+            self._counters["cache_hits"] += 1
+            matches = hit
+        elif key in self._inflight:
+            self._counters["joined"] += 1
+            matches = await asyncio.shield(self._inflight[key])
+        else:
+            fut = asyncio.get_running_loop().create_future()
+            self._inflight[key] = fut
+            try:
+                matches = await self._lookup(question, key, top_k or self.top_k)
+                fut.set_result(matches)
+            except BaseException as e:
+                fut.set_exception(e)
+                fut.exception()  # kein "never retrieved", wenn niemand wartet
+                raise
+            finally:
+                self._inflight.pop(key, None)
+        self._latency["total"].append(time.perf_counter() - t0)
+        if not matches:
+            self._counters["empty"] += 1
+        self.usage.record(self.namespace, key, [m["id"] for m in matches if m.get("id")])
+        return [dict(m) for m in matches]
+
+    async def _lookup(self, question: str, key: str, top_k: int) -> List[dict]:
+        vec = self._vectors.get(key)
+        if vec is not None:
+            self._counters["embed_cache_hits"] += 1
+            self._vectors.move_to_end(key)
+        else:
+            t = time.perf_counter()
+            vec = (await asyncio.to_thread(self.embedder.embed, [question]))[0]
+            self._latency["embed"].append(time.perf_counter() - t)
+            self._remember_vector(key, vec)
+        matches = await self._search(vec, top_k)
+        selected = self._select(question, matches)
+        self._store(key, selected)
+        return selected
+
+    async def _search(self, vec: List[float], top_k: int) -> List[dict]:
+        t = time.perf_counter()
+        call = asyncio.to_thread(self.index.query, vec, top_k, self.namespace, self.rerank is rerank_mmr)
+        try:
+            if self.search_timeout_s and self._hot:
+                matches = await asyncio.wait_for(call, self.search_timeout_s)
+            else:
+                matches = await call
+        except asyncio.TimeoutError:
+            self._counters["search_timeouts"] += 1
+            return self._search_hot(vec, top_k)
+        except Exception as e:
+            if not self._hot:
+                raise
+            print(f"⚠️ Vektorsuche fehlgeschlagen ({e}) → Hot-Chunks")
+            return self._search_hot(vec, top_k)
+        self._latency["search"].append(time.perf_counter() - t)
+        return matches
+
+    def _search_hot(self, vec: List[float], top_k: int) -> List[dict]:
+        """Lokale Suche über die vorab geladenen, häufigsten Chunks dieses Avatars."""
+        self._counters["hot_fallbacks"] += 1
+        scored = [{**m, "score": cosine(vec, m["values"])} for m in self._hot.values() if m["values"]]
+        return sorted(scored, key=lambda m: -m["score"])[:top_k]
+
+    def _select(self, question: str, matches: List[dict]) -> List[dict]:
+        relevant = [m for m in matches if m["score"] > self.min_score]
+        if self.rerank and relevant:
+            relevant = self.rerank(question, relevant)
+        return [{k: v for k, v in m.items() if k != "values"} for m in relevant[: self.max_chunks]]
+
+    # --- Cache ---
+    def _cached(self, key: str) -> Optional[List[dict]]:
+        item = self._results.get(key)
+        if item is None:
+            return None
+        if time.monotonic() - item[0] > self.cache_ttl_s:
+            del self._results[key]
+            return None
+        self._results.move_to_end(key)
+        return item[1]
+
+    def _store(self, key: str, matches: List[dict]):
+        self._results[key] = (time.monotonic(), matches)
+        self._results.move_to_end(key)
+        while len(self._results) > self.cache_size:
+            self._results.popitem(last=False)
+
+    def _remember_vector(self, key: str, vec: List[float]):
+        self._vectors[key] = vec
+        while len(self._vectors) > self.cache_size:
+            self._vectors.popitem(last=False)
+
+    # --- Prefetch ---
+    def start_prefetch(self) -> Optional[asyncio.Task]:
+        """prefetch() im Hintergrund; Fehler werden nur geloggt."""
+        if self._prefetch_task is None:
+            self._prefetch_task = asyncio.get_running_loop().create_task(self._prefetch_safe())
+        return self._prefetch_task
+
+    async def _prefetch_safe(self):
+        try:
+            await self.prefetch()
+        except Exception as e:
+            print(f"⚠️ KB-Prefetch fehlgeschlagen: {e}")
+
+    async def prefetch(self) -> dict:
+        """Häufigste Chunks (per ID) und häufigste Fragen (ein Batch-Embedding) vorab laden."""
+        t0 = time.perf_counter()
+        chunk_ids = self.usage.top_chunks(self.namespace, self.prefetch_chunks)
+        if chunk_ids and hasattr(self.index, "fetch"):
+            for m in await asyncio.to_thread(self.index.fetch, chunk_ids, self.namespace):
+                self._hot[m["id"]] = m
+            self._counters["prefetched_chunks"] = len(self._hot)
+        questions = [q for q in self.usage.top_questions(self.namespace, self.prefetch_questions)
+                     if self._cached(q) is None]
+        if questions:
+            vectors = await asyncio.to_thread(self.embedder.embed, questions)
+            for q, vec in zip(questions, vectors):
+                self._remember_vector(q, vec)
+            results = await asyncio.gather(*(self._search(v, self.top_k) for v in vectors), return_exceptions=True)
+            for q, res in zip(questions, results):
+                if not isinstance(res, BaseException):
+                    self._store(q, self._select(q, res))
+                    self._counters["prefetched_questions"] += 1
+        elapsed = time.perf_counter() - t0
+        print(f"📚 KB-Prefetch ({self.namespace}): {len(self._hot)} Chunks, "
+              f"{self._counters['prefetched_questions']} Fragen in {elapsed:.2f}s")
+        return {"chunks": len(self._hot), "questions": self._counters["prefetched_questions"], "elapsed_s": elapsed}
+
+    # --- Metriken ---
+    def metrics(self) -> dict:
+        def pct(samples, p):
+            if not samples:
+                return None
+            s = sorted(samples)
+            return round(s[min(len(s) - 1, int(p * len(s)))] * 1000, 1)
+        latency = {name: {"p50_ms": pct(v, 0.5), "p95_ms": pct(v, 0.95), "n": len(v)}
+                   for name, v in self._latency.items()}
+        return {**self._counters, "namespace": self.namespace, "cached_questions": len(self._results),
+                "hot_chunks": len(self._hot), "rerank": self.rerank_name, "min_score": self.min_score,
+                "latency": latency}
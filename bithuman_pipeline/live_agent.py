@@ -0,0 +1,217 @@
+"""BitHuman Complete Agent als importierbares Modul (vorher Inline-Code + Subprozess).
+
+modal_bithuman_complete_agent.run_agent hat pro Join `pip install pinecone`
+ausgeführt, den Agent-Quelltext in eine Temp-Datei geschrieben, ein Token beim
+Orchestrator geholt und dann einen neuen Python-Prozess gestartet – Join-Latenz
+im Kaltstart zig Sekunden.
+
+    from bithuman_pipeline.live_agent import start
+    result = start(room, agent_id)          # blockiert bis die Session endet
+    result["timings"]                       # Sekunden je Phase bis zum Join
+
+- Abhängigkeiten kommen aus dem Image, nichts wird zur Laufzeit installiert
+- LiveKit-Token lokal signiert (LIVEKIT_URL/API_KEY/API_SECRET, gleiche Identity
+  wie bisher vom Orchestrator: "agent-<agent_id>")
+- Config über bithuman_pipeline.agent_config (Index im Container-Prozess)
+- VAD einmal pro Container-Prozess (agent_bootstrap), Teilnehmer über Room-Events
+- room/build_session injizierbar → Join-Latenz lokal messbar (tools/check_live_agent.py)
+"""
+import asyncio
+import logging
+import os
+from typing import Callable, Optional, Tuple
+
+from bithuman_pipeline.agent_bootstrap import (
+    PARTICIPANT_TIMEOUT_S, ParticipantTimeout, PhaseTimer, aget_model, get_model,
+    preload_background, wait_for_participant,
+)
+from bithuman_pipeline.agent_config import config_service
+from livekit_auth.tokens import LiveKitTokenService
+
+logger = logging.getLogger("agent")
+
+DEFAULT_MODEL = "expression"
+_TOKENS: Optional[LiveKitTokenService] = None
+
+
+def mint_agent_token(room: str, agent_id: str) -> Tuple[str, str]:
+    """(url, token) für den Agent; ersetzt den HTTP-Roundtrip zu /livekit/token."""
+    global _TOKENS
+    url = os.getenv("LIVEKIT_URL", "").strip()
+    key = os.getenv("LIVEKIT_API_KEY", "").strip()
+    secret = os.getenv("LIVEKIT_API_SECRET", "").strip()
+    if not (url and key and secret):
+        raise RuntimeError("LIVEKIT_URL/LIVEKIT_API_KEY/LIVEKIT_API_SECRET fehlen")
+    if _TOKENS is None or _TOKENS.api_key != key:
+        _TOKENS = LiveKitTokenService(key, secret, ttl_seconds=3600)
+    return url, _TOKENS.get_token(room, f"agent-{agent_id}", name=agent_id)
+
+
+async def wait_for_disconnect(room, timeout_s: Optional[float] = None):
+    done = asyncio.Event()
+    room.on("disconnected", lambda *args: done.set())
+    if getattr(room, "connection_state", None) == 0:  # schon getrennt (CONN_DISCONNECTED)
+        return
+    try:
+        await asyncio.wait_for(done.wait(), timeout_s)
+    except asyncio.TimeoutError:
+        logger.info("⏱️ Maximale Session-Dauer erreicht")
+
+
+def build_session(agent_id: str, config: dict):
+    """LiveKit AgentSession + BitHuman AvatarSession + Agent aus der Avatar-Config."""
+    from livekit.agents import Agent, AgentSession, RoomOutputOptions
+    from livekit.plugins import bithuman, openai
+
+    voice_id = config.get("voice_id") or os.getenv("ELEVEN_DEFAULT_VOICE_ID")
+    namespace = config.get("namespace")
+    bh_model = config.get("bithuman_model") or DEFAULT_MODEL
+
+    # Knowledge Base (Avatar-spezifischer Index!)
+    kb = None
+    if os.getenv("PINECONE_API_KEY"):
+        try:
+            from bithuman_pipeline.knowledge import KnowledgeBase
+            kb = KnowledgeBase.from_env(namespace)  # PINECONE_INDEX_NAME: Avatar-Index, nicht global!
+            kb.start_prefetch()
+            logger.info(f"✅ Knowledge Base initialized (namespace={namespace})")
+        except Exception as e:
+            logger.warning(f"⚠️ Knowledge Base init failed (continuing without KB): {e}")
+
+    # LLM: Antwort immer aus dem KB-Kontext generiert und gestreamt (Mistral, Fallback OpenAI)
+    from bithuman_pipeline.grounded_llm import GroundedResponder, PineconeMistralLLM
+    responder = GroundedResponder.from_env(kb)
+    if responder:
+        llm = PineconeMistralLLM(responder)
+        logger.info(f"✅ LLM: Knowledge Base + {responder.client.model} (Streaming)")
+    else:
+        llm = openai.LLM(model="gpt-4o-mini")
+        logger.info("⚠️ Fallback: OpenAI LLM (kein MISTRAL_API_KEY/OPENAI_API_KEY)")
+
+    # TTS: ElevenLabs falls Voice-ID vorhanden, sonst BitHuman intern
+    tts = None
+    if voice_id:
+        try:
+            from livekit.plugins import elevenlabs
+            tts = elevenlabs.TTS(voice_id=voice_id, api_key=os.getenv("ELEVENLABS_API_KEY"))
+            logger.info(f"✅ ElevenLabs TTS aktiviert (Voice: {voice_id})")
+        except ImportError:
+            logger.info("⚠️ Kein ElevenLabs Plugin → BitHuman nutzt interne Voice")
+
+    session = AgentSession(llm=llm, vad=get_model("vad"), tts=tts)
+    # Cloud-Avatar: avatar_id + api_secret (kein lokales Modell)
+    avatar = bithuman.AvatarSession(
+        avatar_id=agent_id,
+        api_secret=os.getenv("BITHUMAN_API_SECRET"),
+        model=bh_model,
+    )
+    instructions = config.get("instructions") or f"Du bist {config.get('name', 'Avatar')}, ein hilfreicher Assistent."
+    return {
+        "session": session,
+        "avatar": avatar,
+        "agent": Agent(instructions=instructions),
+        # Audio geht an den Avatar, nicht direkt in den Room
+        "start_kwargs": {"room_output_options": RoomOutputOptions(audio_enabled=False)},
+    }
+
+
+async def forward_orchestrator_audio(room):
+    """Audio-Tracks des Teilnehmers orchestrator-audio mitlesen (Lipsync läuft im Avatar)."""
+    try:
+        from livekit import rtc
+    except ImportError:
+        return
+
+    for participant in list(room.remote_participants.values()):
+        if participant.identity != "orchestrator-audio":
+            continue
+        logger.info("✅ Found orchestrator-audio participant!")
+        for track_id, track_pub in participant.track_publications.items():
+            if track_pub.kind == rtc.TrackKind.KIND_AUDIO and track_pub.track:
+                logger.info(f"🎵 Subscribing to orchestrator-audio track: {track_id}")
+                async for frame in rtc.AudioStream(track_pub.track):
+                    logger.debug(f"📥 Audio frame from orchestrator: {len(frame.data)} bytes")
+
+
+async def run_session(
+    room_name: str,
+    agent_id: str,
+    room=None,
+    session_builder: Callable = build_session,
+    max_session_s: Optional[float] = None,
+    on_joined: Optional[Callable[[dict], None]] = None,
+    participant_timeout_s: Optional[float] = PARTICIPANT_TIMEOUT_S,
+    models: Tuple[str, ...] = ("vad",),
+) -> dict:
+    """Token → Connect → Teilnehmer → Config → Modelle → Session/Avatar starten → bis Disconnect."""
+    timer = PhaseTimer()
+    if models:
+        preload_background(models)  # lädt parallel zu Connect/Teilnehmer; im warmen Container sofort fertig
+    url, token = mint_agent_token(room_name, agent_id)
+    timer.mark("token")
+
+    if room is None:
+        from livekit import rtc
+        room = rtc.Room()
+    await room.connect(url, token)
+    timer.mark("connect")
+    logger.info(f"✅ Connected to LiveKit room {room_name}")
+
+    # Ab hier gehört der Room uns: bei Ende, max_session_s und Start-Fehlern Session schließen + Room verlassen
+    session = None
+    try:
+        try:
+            await wait_for_participant(room, timeout_s=participant_timeout_s)
+        except ParticipantTimeout as e:
+            logger.warning(f"⏱️ {e} → Room verlassen")
+            return {"status": "no_participant", "room": room_name, "agent_id": agent_id, "timings": timer.as_dict()}
+        timer.mark("participant")
+
+        config = await config_service().aget(agent_id)
+        timer.mark("config")
+        logger.info(f"🤖 Agent: {agent_id}, Voice: {config.get('voice_id')}, NS: {config.get('namespace')}, "
+                    f"Model: {config.get('bithuman_model') or DEFAULT_MODEL}")
+
+        for name in models:
+            await aget_model(name)
+        timer.mark("models")
+
+        parts = session_builder(agent_id, config)
+        session = parts["session"]
+        timer.mark("session")
+        await parts["avatar"].start(session, room=room)
+        timer.mark("avatar")
+        await session.start(agent=parts["agent"], room=room, **parts.get("start_kwargs", {}))
+        timer.mark("agent")
+        timings = timer.report(room_name)
+        logger.info(f"✅ Agent joined in {timings['total']:.2f}s")
+        if on_joined:
+            on_joined(timings)
+
+        audio_task = asyncio.create_task(forward_orchestrator_audio(room))
+        try:
+            await wait_for_disconnect(room, max_session_s)
+        finally:
+            audio_task.cancel()
+        return {"status": "completed", "room": room_name, "agent_id": agent_id, "timings": timings}
+    finally:
+        if session is not None:
+            try:
+                await session.aclose()
+            except Exception as e:
+                logger.warning(f"⚠️ Session schließen fehlgeschlagen: {e}")
+        try:
+            await room.disconnect()
+        except Exception as e:
+            logger.warning(f"⚠️ Room verlassen fehlgeschlagen: {e}")
+        logger.info("👋 Session ended")
+
+
+def start(room_name: str, agent_id: str, max_session_s: Optional[float] = None, **kwargs) -> dict:
+    """Synchroner Einstieg (Modal-Funktion): Session im aktuellen Prozess bis zum Ende."""
+    logging.basicConfig(level=logging.INFO)
+    try:
+        return asyncio.run(run_session(room_name, agent_id, max_session_s=max_session_s, **kwargs))
+    except Exception as e:
+        logger.error(f"❌ Agent Session error: {e}")
+        return {"status": "error", "room": room_name, "agent_id": agent_id, "message": str(e)}
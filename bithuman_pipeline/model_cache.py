@@ -0,0 +1,443 @@
+"""Größenbegrenzter LRU-Cache für .imx-Modelle auf der Platte.
+
+Bisher legte bithuman_service_clean.py Modelle als {md5}.imx in MODELS_CACHE_DIR
+ab und schrieb bei jeder neuen Figur die komplette figures.json neu: nie
+aufgeräumt, parallele Requests konnten sich gegenseitig halbe Dateien
+überschreiben, abgebrochene Downloads blieben als "gültiges" Modell liegen.
+
+    cache = ModelCache(MODELS_CACHE_DIR, max_bytes=20 * 1024 ** 3)
+    path = cache.get(key) or cache.fetch(url, key=key, headers=...)
+    cache.set_alias(image_md5, key, figure_id=..., runtime_model_hash=...)
+
+- Index in SQLite (index.sqlite im Cache-Ordner): Schreibzugriffe laufen in
+  BEGIN IMMEDIATE-Transaktionen → prozessübergreifend gesperrt, keine
+  Voll-Rewrites einer JSON-Map
+- Dateien bleiben {key}.imx (bestehende Caches werden per adopt_existing()
+  übernommen); Schreiben immer als .part im selben Ordner + fsync + os.replace
+- pro Eintrag sha256 + Größe; get() prüft Größe/mtime und hasht nur bei
+  Abweichung komplett nach, verify() erzwingt die volle Prüfung
+- Downloads: Content-Length und optional erwarteter sha256 werden geprüft,
+  paralleles Laden desselben Schlüssels nur einmal (Lock-Datei pro Schlüssel)
+- LRU-Eviction nach Bytes; gepinnte und gerade geleaste Einträge bleiben
+- prefetch()/pin()/unpin() für Modelle, die immer lokal liegen sollen
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: nur prozessinterne Locks
+    fcntl = None
+
+SUFFIX = ".imx"
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key        TEXT PRIMARY KEY,
+    size       INTEGER NOT NULL,
+    sha256     TEXT NOT NULL,
+    mtime_ns   INTEGER NOT NULL,
+    created    REAL NOT NULL,
+    last_used  REAL NOT NULL,
+    uses       INTEGER NOT NULL DEFAULT 0,
+    pinned     INTEGER NOT NULL DEFAULT 0,
+    source     TEXT
+);
+CREATE TABLE IF NOT EXISTS aliases (
+    alias              TEXT PRIMARY KEY,
+    key                TEXT,
+    figure_id          TEXT,
+    runtime_model_hash TEXT,
+    updated            REAL NOT NULL
+);
+"""
+
+
+class CacheIntegrityError(RuntimeError):
+    """Datei passt nicht zu Größe/Checksumme (abgebrochener Download, fremder Schreiber)."""
+
+
+def sha256_file(path, chunk_size: int = 1024 * 1024) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _safe_name(key: str) -> str:
+    """Schlüssel → Dateiname; md5/sha-Schlüssel bleiben unverändert (kompatibel zum alten Layout)."""
+    if re.fullmatch(r"[A-Za-z0-9_.-]{1,128}", key) and not key.startswith("."):
+        return key
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+class ModelCache:
+    def __init__(self, root, max_bytes: int = 20 * 1024 ** 3, suffix: str = SUFFIX):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = int(max_bytes)
+        self.suffix = suffix
+        self.index_path = self.root / "index.sqlite"
+        self._thread_locks: Dict[str, threading.Lock] = {}
+        self._thread_locks_guard = threading.Lock()
+        self._leases: Dict[str, int] = {}
+        self._counters = {"hits": 0, "misses": 0, "writes": 0, "downloads": 0,
+                          "evictions": 0, "integrity_failures": 0, "bytes_written": 0}
+        with self._db() as db:
+            db.executescript(_SCHEMA)
+
+    # --- Index ---
+    @contextmanager
+    def _db(self, write: bool = False):
+        db = sqlite3.connect(str(self.index_path), timeout=60, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            if write:
+                db.execute("BEGIN IMMEDIATE")
+                try:
+                    yield db
+                    db.execute("COMMIT")
+                except BaseException:
+                    db.execute("ROLLBACK")
+                    raise
+            else:
+                yield db
+        finally:
+            db.close()
+
+    def path_for(self, key: str) -> Path:
+        return self.root / f"{_safe_name(key)}{self.suffix}"
+
+    # --- Lesen ---
+    def get(self, key: str) -> Optional[Path]:
+        """Pfad eines gültigen Eintrags (und LRU-Zeitstempel aktualisieren) oder None."""
+        return self._lookup(key, locked=False)
+
+    def _lookup(self, key: str, locked: bool, count: bool = True) -> Optional[Path]:
+        with self._db() as db:
+            row = db.execute("SELECT * FROM entries WHERE key = ?", (key,)).fetchone()
+        path = self.path_for(key)
+        if row is None:
+            self._counters["misses"] += count
+            return None
+        st = path.stat() if path.is_file() else None
+        if st is None or st.st_size != row["size"] or st.st_mtime_ns != row["mtime_ns"]:
+            if not locked:
+                # Evtl. schreibt gerade ein anderer Worker → unter dem Schlüssel-Lock neu prüfen
+                with self._key_lock(key):
+                    return self._lookup(key, locked=True, count=count)
+            if st is None:
+                self._drop(key, reason="Datei fehlt")
+                self._counters["misses"] += count
+                return None
+            # Jemand hat die Datei angefasst → volle Prüfung statt blind vertrauen
+            if st.st_size != row["size"] or sha256_file(path) != row["sha256"]:
+                self._counters["integrity_failures"] += 1
+                self._drop(key, reason="Checksumme/Größe stimmt nicht", unlink=True)
+                self._counters["misses"] += count
+                return None
+            with self._db(write=True) as db:
+                db.execute("UPDATE entries SET mtime_ns = ? WHERE key = ?", (st.st_mtime_ns, key))
+        with self._db(write=True) as db:
+            db.execute("UPDATE entries SET last_used = ?, uses = uses + 1 WHERE key = ?", (time.time(), key))
+        self._counters["hits"] += 1
+        return path
+
+    def verify(self, key: str) -> bool:
+        """Volle sha256-Prüfung; defekte Einträge werden entfernt."""
+        with self._key_lock(key):
+            return self._verify(key)
+
+    def _verify(self, key: str) -> bool:
+        with self._db() as db:
+            row = db.execute("SELECT size, sha256 FROM entries WHERE key = ?", (key,)).fetchone()
+        path = self.path_for(key)
+        if row is None:
+            return False
+        if path.is_file() and path.stat().st_size == row["size"] and sha256_file(path) == row["sha256"]:
+            return True
+        self._counters["integrity_failures"] += 1
+        self._drop(key, reason="verify fehlgeschlagen", unlink=True)
+        return False
+
+    def verify_all(self) -> List[str]:
+        """Alle Einträge voll prüfen → Liste der entfernten Schlüssel."""
+        return [k for k in self.keys() if not self.verify(k)]
+
+    def keys(self) -> List[str]:
+        with self._db() as db:
+            return [r["key"] for r in db.execute("SELECT key FROM entries ORDER BY last_used DESC")]
+
+    # --- Schreiben ---
+    @contextmanager
+    def _key_lock(self, key: str):
+        """Exklusiv pro Schlüssel: Thread-Lock + Lock-Datei (andere Prozesse/Worker)."""
+        with self._thread_locks_guard:
+            tlock = self._thread_locks.setdefault(key, threading.Lock())
+        with tlock:
+            if fcntl is None:
+                yield
+                return
+            lock_path = self.root / f".{_safe_name(key)}.lock"
+            with open(lock_path, "a+") as lf:
+                fcntl.flock(lf, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lf, fcntl.LOCK_UN)
+
+    def put_stream(self, key: str, chunks: Iterable[bytes], source: Optional[str] = None,
+                   expected_size: Optional[int] = None, expected_sha256: Optional[str] = None,
+                   pin: bool = False) -> Path:
+        """Chunks atomar als Eintrag ablegen (.part → fsync → os.replace)."""
+        with self._key_lock(key):
+            return self._write(key, chunks, source, expected_size, expected_sha256, pin)
+
+    def _write(self, key, chunks, source, expected_size, expected_sha256, pin) -> Path:
+        path = self.path_for(key)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.part")
+        h = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp, "wb") as out:
+                for chunk in chunks:
+                    if chunk:
+                        out.write(chunk)
+                        h.update(chunk)
+                        size += len(chunk)
+                out.flush()
+                os.fsync(out.fileno())
+            digest = h.hexdigest()
+            if expected_size is not None and size != expected_size:
+                raise CacheIntegrityError(f"unvollständig: {size} von {expected_size} Bytes")
+            if expected_sha256 and digest != expected_sha256.lower():
+                raise CacheIntegrityError(f"sha256 {digest[:12]}… ≠ erwartet {expected_sha256[:12]}…")
+            if size == 0:
+                raise CacheIntegrityError("leere Modelldatei")
+            self._evict(incoming=size, keep=key)
+            os.replace(tmp, path)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+        now = time.time()
+        with self._db(write=True) as db:
+            db.execute(
+                """INSERT INTO entries (key, size, sha256, mtime_ns, created, last_used, uses, pinned, source)
+                   VALUES (?, ?, ?, ?, ?, ?, 0, ?, ?)
+                   ON CONFLICT(key) DO UPDATE SET size = excluded.size, sha256 = excluded.sha256,
+                       mtime_ns = excluded.mtime_ns, last_used = excluded.last_used,
+                       pinned = MAX(entries.pinned, excluded.pinned),
+                       source = COALESCE(excluded.source, entries.source)""",
+                (key, size, digest, path.stat().st_mtime_ns, now, now, int(pin), source),
+            )
+        self._counters["writes"] += 1
+        self._counters["bytes_written"] += size
+        print(f"💾 Modell im Cache: {key} ({size / 1024 ** 2:.1f} MB, sha256 {digest[:12]}…)")
+        return path
+
+    def put_bytes(self, key: str, data: bytes, source: Optional[str] = None, pin: bool = False) -> Path:
+        return self.put_stream(key, [data], source=source, expected_size=len(data), pin=pin)
+
+    def put_file(self, key: str, src, source: Optional[str] = None, pin: bool = False) -> Path:
+        src = Path(src)
+
+        def _chunks():
+            with open(src, "rb") as f:
+                yield from iter(lambda: f.read(1024 * 1024), b"")
+        return self.put_stream(key, _chunks(), source=source or str(src),
+                               expected_size=src.stat().st_size, pin=pin)
+
+    def fetch(self, url: str, key: Optional[str] = None, headers: Optional[dict] = None,
+              timeout: float = 120, expected_sha256: Optional[str] = None, pin: bool = False,
+              http_get: Optional[Callable] = None) -> Path:
+        """URL in den Cache laden (falls nicht schon gültig vorhanden) → Pfad.
+
+        key: Default md5(url) wie bisher im Service. http_get: injizierbar (Default requests.get).
+        """
+        key = key or hashlib.md5(url.encode("utf-8")).hexdigest()
+        path = self.get(key)
+        if path is not None:
+            if pin:
+                self.pin(key)
+            return path
+        with self._key_lock(key):
+            # Ein paralleler Schreiber war evtl. schneller
+            path = self._lookup(key, locked=True, count=False)
+            if path is not None:
+                if pin:
+                    self.pin(key)
+                return path
+            if http_get is None:
+                import requests
+                http_get = requests.get
+            r = http_get(url, headers=headers or {}, timeout=timeout, stream=True)
+            try:
+                if r.status_code // 100 != 2:
+                    raise RuntimeError(f"IMX download failed: {r.status_code}")
+                length = r.headers.get("Content-Length")
+                # Bei Content-Encoding zählt Content-Length die komprimierten Bytes
+                encoded = r.headers.get("Content-Encoding", "identity") != "identity"
+                expected_size = int(length) if length and length.isdigit() and not encoded else None
+                self._counters["downloads"] += 1
+                return self._write(key, r.iter_content(chunk_size=1024 * 1024), url,
+                                   expected_size, expected_sha256, pin)
+            finally:
+                close = getattr(r, "close", None)
+                if close:
+                    close()
+
+    # --- Prefetch / Pin / Lease ---
+    def prefetch(self, items: Iterable, headers: Optional[dict] = None, pin: bool = False) -> Dict[str, Optional[str]]:
+        """items: URLs oder (url, key). Fehler werden geloggt → {key: pfad | None}."""
+        result = {}
+        for item in items:
+            url, key = item if isinstance(item, tuple) else (item, None)
+            key = key or hashlib.md5(url.encode("utf-8")).hexdigest()
+            try:
+                result[key] = str(self.fetch(url, key=key, headers=headers, pin=pin))
+            except Exception as e:
+                print(f"⚠️ Prefetch fehlgeschlagen ({url}): {e}")
+                result[key] = None
+        return result
+
+    def pin(self, key: str) -> bool:
+        with self._db(write=True) as db:
+            return db.execute("UPDATE entries SET pinned = 1 WHERE key = ?", (key,)).rowcount > 0
+
+    def unpin(self, key: str) -> bool:
+        with self._db(write=True) as db:
+            changed = db.execute("UPDATE entries SET pinned = 0 WHERE key = ?", (key,)).rowcount > 0
+        self._evict()
+        return changed
+
+    def acquire(self, key: str):
+        """Eintrag für die Dauer eines Requests vor Eviction schützen (prozessintern)."""
+        self._leases[key] = self._leases.get(key, 0) + 1
+
+    def release(self, key: str):
+        n = self._leases.get(key, 0) - 1
+        if n > 0:
+            self._leases[key] = n
+        else:
+            self._leases.pop(key, None)
+
+    # --- Aliase (ersetzen figures.json) ---
+    def set_alias(self, alias: str, key: Optional[str], figure_id: Optional[str] = None,
+                  runtime_model_hash: Optional[str] = None):
+        with self._db(write=True) as db:
+            db.execute(
+                """INSERT INTO aliases (alias, key, figure_id, runtime_model_hash, updated) VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT(alias) DO UPDATE SET key = COALESCE(excluded.key, aliases.key),
+                       figure_id = COALESCE(excluded.figure_id, aliases.figure_id),
+                       runtime_model_hash = COALESCE(excluded.runtime_model_hash, aliases.runtime_model_hash),
+                       updated = excluded.updated""",
+                (alias, key, figure_id, runtime_model_hash, time.time()),
+            )
+
+    def get_alias(self, alias: str) -> Optional[dict]:
+        with self._db() as db:
+            row = db.execute("SELECT * FROM aliases WHERE alias = ?", (alias,)).fetchone()
+        return dict(row) if row else None
+
+    # --- Eviction ---
+    def _drop(self, key: str, reason: str = "", unlink: bool = False):
+        with self._db(write=True) as db:
+            db.execute("DELETE FROM entries WHERE key = ?", (key,))
+        if unlink:
+            self.path_for(key).unlink(missing_ok=True)
+        if reason:
+            print(f"⚠️ Cache-Eintrag verworfen: {key} ({reason})")
+
+    def evict(self, key: str) -> bool:
+        """Eintrag explizit entfernen (auch gepinnt)."""
+        with self._db() as db:
+            known = db.execute("SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone() is not None
+        self._drop(key, unlink=True)
+        if known:
+            self._counters["evictions"] += 1
+        return known
+
+    def _evict(self, incoming: int = 0, keep: Optional[str] = None) -> List[str]:
+        """Älteste nicht gepinnte/geleaste Einträge löschen, bis incoming Bytes Platz haben."""
+        victims = []
+        with self._db(write=True) as db:
+            rows = db.execute("SELECT key, size, pinned FROM entries ORDER BY last_used ASC").fetchall()
+            used = sum(r["size"] for r in rows if r["key"] != keep)
+            for r in rows:
+                if used + incoming <= self.max_bytes:
+                    break
+                if r["pinned"] or r["key"] == keep or self._leases.get(r["key"]):
+                    continue
+                db.execute("DELETE FROM entries WHERE key = ?", (r["key"],))
+                used -= r["size"]
+                victims.append(r["key"])
+            if used + incoming > self.max_bytes:
+                print(f"⚠️ Modell-Cache über dem Limit ({(used + incoming) / 1024 ** 3:.1f} GB), Rest gepinnt/in Benutzung")
+        for key in victims:
+            self.path_for(key).unlink(missing_ok=True)
+            self._counters["evictions"] += 1
+            print(f"♻️ Modell aus Cache entfernt (LRU): {key}")
+        return victims
+
+    # --- Migration ---
+    def adopt_existing(self, figures_json=None) -> int:
+        """Vorhandene {key}.imx ohne Index-Eintrag übernehmen, optional figures.json → Aliase."""
+        adopted = 0
+        known = set(self.keys())
+        for path in sorted(self.root.glob(f"*{self.suffix}")):
+            key = path.name[:-len(self.suffix)]
+            if key in known or not path.is_file() or path.stat().st_size == 0:
+                continue
+            st = path.stat()
+            with self._db(write=True) as db:
+                db.execute(
+                    """INSERT OR IGNORE INTO entries (key, size, sha256, mtime_ns, created, last_used, pinned, source)
+                       VALUES (?, ?, ?, ?, ?, ?, 0, 'adopted')""",
+                    (key, st.st_size, sha256_file(path), st.st_mtime_ns, st.st_mtime, st.st_atime),
+                )
+            adopted += 1
+        if figures_json and Path(figures_json).is_file():
+            import json
+            try:
+                with open(figures_json, "r", encoding="utf-8") as f:
+                    legacy = json.load(f)
+                for alias, meta in legacy.items():
+                    imx = meta.get("imx_path")
+                    key = Path(imx).name[:-len(self.suffix)] if imx and imx.endswith(self.suffix) else None
+                    self.set_alias(alias, key, meta.get("figure_id"), meta.get("runtime_model_hash"))
+                Path(figures_json).rename(Path(figures_json).with_suffix(".json.migrated"))
+            except (OSError, ValueError) as e:
+                print(f"⚠️ figures.json nicht übernommen: {e}")
+        for stale in self.root.glob(".*.part"):
+            # Reste abgebrochener Schreibvorgänge (älter als 1h → sicher kein laufender Writer)
+            if time.time() - stale.stat().st_mtime > 3600:
+                stale.unlink(missing_ok=True)
+        if adopted:
+            print(f"📦 Modell-Cache: {adopted} vorhandene .imx übernommen")
+            self._evict()
+        return adopted
+
+    # --- Metriken ---
+    def metrics(self) -> dict:
+        with self._db() as db:
+            rows = [dict(r) for r in db.execute(
+                "SELECT key, size, sha256, last_used, uses, pinned, source FROM entries ORDER BY last_used DESC")]
+            aliases = db.execute("SELECT COUNT(*) FROM aliases").fetchone()[0]
+        lookups = self._counters["hits"] + self._counters["misses"]
+        return {
+            **self._counters,
+            "hit_rate": round(self._counters["hits"] / max(1, lookups), 3),
+            "bytes": sum(r["size"] for r in rows),
+            "max_bytes": self.max_bytes,
+            "pinned_bytes": sum(r["size"] for r in rows if r["pinned"]),
+            "aliases": aliases,
+            "leased": sorted(self._leases),
+            "entries": [{**r, "sha256": r["sha256"][:16], "pinned": bool(r["pinned"])} for r in rows],
+        }
@@ -0,0 +1,301 @@
+"""Pool geladener AsyncBithuman-Runtimes, nach Modell geschlüsselt.
+
+Bisher erzeugte /generate-avatar pro Request eine neue Runtime (Modell-Load
+dominiert kurze Clips), und avatar_backend.py hielt EINE globale Runtime, die
+switch_avatar() stoppte und neu lud – zwei gleichzeitige Requests für
+verschiedene Figuren überschrieben sich gegenseitig.
+
+    async with pool.checkout(key, model_path=...) as rt:   # exklusiv für diesen Request
+        await rt.push_audio(...)
+
+- Schlüssel = Modellpfad (.imx) oder figure/hash; gleiche Schlüssel teilen die Runtime
+- Checkout/Checkin pro Runtime über einen asyncio.Lock (ein Stream gleichzeitig)
+- paralleles Laden desselben Modells nur einmal (Single-Flight)
+- LRU-Eviction nach geschätztem Speicher (max_bytes) und Anzahl; ausgecheckte und
+  reservierte Runtimes (geladen, Checkout steht noch aus) werden nie entfernt
+  (dann kurzzeitig über dem Limit)
+- Nutzungszähler optional als JSON persistiert → preload_popular() beim Start
+- metrics(): Loads, Hits, Misses, Evictions, Load-/Wartezeiten, belegter Speicher
+"""
+import asyncio
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+DEFAULT_RUNTIME_BYTES = int(1.5 * 1024 ** 3)  # ohne Modelldatei (figure_id/hash): grobe Schätzung
+
+
+def estimate_runtime_bytes(model_path: Optional[str], factor: float = 2.0,
+                           default: int = DEFAULT_RUNTIME_BYTES) -> int:
+    """Speicherbedarf einer geladenen Runtime ≈ Größe der .imx-Datei × factor."""
+    if model_path and os.path.isfile(model_path):
+        return int(os.path.getsize(model_path) * factor)
+    return default
+
+
+class _Entry:
+    __slots__ = ("key", "runtime", "lock", "bytes", "last_used", "uses", "loaded_at", "load_s")
+
+    def __init__(self, key: str):
+        self.key = key
+        self.runtime = None
+        self.lock = asyncio.Lock()
+        self.bytes = 0
+        self.last_used = time.time()
+        self.uses = 0
+        self.loaded_at: Optional[float] = None
+        self.load_s = 0.0
+
+
+class RuntimePool:
+    """LRU-Pool von Runtimes; factory(**base_kwargs, **create_kwargs) erzeugt eine Runtime.
+
+    base_kwargs (z.B. api_secret) gelten für alle Schlüssel und werden nicht persistiert.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[..., Awaitable[object]],
+        base_kwargs: Optional[dict] = None,
+        max_bytes: int = 8 * 1024 ** 3,
+        max_runtimes: int = 4,
+        size_of: Callable[[dict], int] = lambda kw: estimate_runtime_bytes(kw.get("model_path")),
+        start_on_load: bool = True,
+        stats_path: Optional[str] = None,
+    ):
+        self.factory = factory
+        self.base_kwargs = dict(base_kwargs or {})
+        self.max_bytes = max_bytes
+        self.max_runtimes = max(1, int(max_runtimes))
+        self.size_of = size_of
+        self.start_on_load = start_on_load
+        self.stats_path = stats_path
+        self._entries: Dict[str, _Entry] = {}
+        self._loading: Dict[str, asyncio.Task] = {}
+        self._reserved: Dict[str, int] = {}  # Checkouts zwischen get_or_load und lock.acquire
+        self._kwargs: Dict[str, dict] = {}
+        self._guard = asyncio.Lock()
+        self._counters = {"hits": 0, "misses": 0, "loads": 0, "load_errors": 0, "evictions": 0}
+        self._load_times: List[float] = []
+        self._wait_times: List[float] = []
+        self._popularity: Dict[str, int] = self._read_stats()
+
+    # --- Checkout ---
+    @asynccontextmanager
+    async def checkout(self, key: str, **create_kwargs):
+        """Runtime für key exklusiv ausleihen (lädt sie bei Bedarf)."""
+        t0 = time.perf_counter()
+        while True:
+            entry = await self._get_or_load(key, create_kwargs, reserve=True)
+            try:
+                await entry.lock.acquire()
+            finally:
+                self._unreserve(key)
+            if self._entries.get(key) is entry:
+                break
+            entry.lock.release()  # zwischen Load und Lock entladen → neu laden
+        self._wait_times.append(time.perf_counter() - t0)
+        del self._wait_times[:-200]
+        entry.uses += 1
+        entry.last_used = time.time()
+        self._bump(key)
+        try:
+            yield entry.runtime
+        finally:
+            entry.last_used = time.time()
+            await self._reset(entry.runtime)
+            entry.lock.release()
+        # Nach dem Checkin: falls zwischenzeitlich über dem Limit, jetzt aufräumen
+        await self._evict()
+
+    async def _get_or_load(self, key: str, create_kwargs: dict, reserve: bool = False) -> _Entry:
+        """reserve=True: Runtime bis zum Checkout vor Eviction schützen (Aufrufer ruft _unreserve)."""
+        async with self._guard:
+            if reserve:
+                self._reserved[key] = self._reserved.get(key, 0) + 1
+            entry = self._entries.get(key)
+            if entry is not None and entry.runtime is not None:
+                self._counters["hits"] += 1
+                return entry
+            self._counters["misses"] += 1
+            if create_kwargs:
+                self._kwargs[key] = dict(create_kwargs)
+            task = self._loading.get(key)
+            if task is None:
+                task = asyncio.ensure_future(self._load(key, self._kwargs.get(key, {})))
+                self._loading[key] = task
+        try:
+            return await asyncio.shield(task)
+        except BaseException:
+            if reserve:
+                self._unreserve(key)
+            raise
+        finally:
+            async with self._guard:
+                if self._loading.get(key) is task and task.done():
+                    self._loading.pop(key, None)
+
+    async def _load(self, key: str, create_kwargs: dict) -> _Entry:
+        t0 = time.perf_counter()
+        try:
+            runtime = await self.factory(**{**self.base_kwargs, **create_kwargs})
+            if self.start_on_load and hasattr(runtime, "start"):
+                await runtime.start()
+        except Exception:
+            self._counters["load_errors"] += 1
+            raise
+        entry = _Entry(key)
+        entry.runtime = runtime
+        entry.bytes = int(self.size_of(create_kwargs))
+        entry.loaded_at = time.time()
+        entry.load_s = time.perf_counter() - t0
+        self._counters["loads"] += 1
+        self._load_times.append(entry.load_s)
+        del self._load_times[:-200]
+        async with self._guard:
+            self._entries[key] = entry
+        print(f"🧠 Runtime geladen: {key} in {entry.load_s:.1f}s (~{entry.bytes / 1024 ** 3:.1f} GB)")
+        await self._evict(keep=key)
+        return entry
+
+    def _unreserve(self, key: str):
+        n = self._reserved.get(key, 0) - 1
+        if n > 0:
+            self._reserved[key] = n
+        else:
+            self._reserved.pop(key, None)
+
+    async def _reset(self, runtime):
+        """Puffer der Runtime nach einem Request leeren (Audio/Frames des Vorgängers verwerfen)."""
+        interrupt = getattr(runtime, "interrupt", None)
+        if interrupt is None:
+            return
+        try:
+            res = interrupt()
+            if asyncio.iscoroutine(res):
+                await res
+        except Exception as e:
+            print(f"⚠️ Runtime-Reset fehlgeschlagen: {e}")
+
+    # --- Eviction ---
+    def _used_bytes(self) -> int:
+        return sum(e.bytes for e in self._entries.values())
+
+    async def _evict(self, keep: Optional[str] = None):
+        victims = []
+        async with self._guard:
+            while len(self._entries) > self.max_runtimes or self._used_bytes() > self.max_bytes:
+                # frisch geladene Runtimes sind bis zum Checkout reserviert – sonst lädt
+                # der wartende Request sie sofort neu (max_runtimes=1: gegenseitiges Verdrängen)
+                idle = [e for e in self._entries.values()
+                        if e.key != keep and not e.lock.locked() and not self._reserved.get(e.key)]
+                if not idle:
+                    print(f"⚠️ Runtime-Pool über dem Limit ({self._used_bytes() / 1024 ** 3:.1f} GB), alle in Benutzung")
+                    break
+                victim = min(idle, key=lambda e: e.last_used)
+                del self._entries[victim.key]
+                self._counters["evictions"] += 1
+                victims.append(victim)
+        for victim in victims:
+            print(f"♻️ Runtime entladen (LRU): {victim.key}")
+            await self._stop(victim.runtime)
+
+    async def _stop(self, runtime):
+        stop = getattr(runtime, "stop", None)
+        if stop is None:
+            return
+        try:
+            res = stop()
+            if asyncio.iscoroutine(res):
+                await res
+        except Exception as e:
+            print(f"⚠️ Runtime-Stop fehlgeschlagen: {e}")
+
+    async def evict(self, key: str) -> bool:
+        """Runtime explizit entladen (wartet, bis sie zurückgegeben wurde)."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False
+        async with entry.lock:
+            async with self._guard:
+                if self._entries.get(key) is not entry:
+                    return False
+                del self._entries[key]
+                self._counters["evictions"] += 1
+        await self._stop(entry.runtime)
+        return True
+
+    async def close(self):
+        for key in list(self._entries):
+            await self.evict(key)
+
+    # --- Preload / Popularität ---
+    async def preload(self, items: Iterable) -> List[str]:
+        """items: keys oder (key, create_kwargs). Fehler werden geloggt, nicht geworfen."""
+        loaded = []
+        for item in items:
+            key, kwargs = item if isinstance(item, tuple) else (item, {})
+            try:
+                await self._get_or_load(key, kwargs)
+                loaded.append(key)
+            except Exception as e:
+                print(f"⚠️ Preload fehlgeschlagen ({key}): {e}")
+        return loaded
+
+    def popular(self, n: int) -> List[str]:
+        """Die n meistgenutzten Schlüssel, für die Erzeugungs-Parameter bekannt sind."""
+        ranked = sorted(self._popularity.items(), key=lambda kv: kv[1], reverse=True)
+        return [k for k, _ in ranked if k in self._kwargs][:n]
+
+    async def preload_popular(self, n: int) -> List[str]:
+        return await self.preload([(k, self._kwargs[k]) for k in self.popular(n)])
+
+    def _bump(self, key: str):
+        self._popularity[key] = self._popularity.get(key, 0) + 1
+        self._write_stats()
+
+    def _read_stats(self) -> Dict[str, int]:
+        if not self.stats_path or not os.path.exists(self.stats_path):
+            return {}
+        try:
+            with open(self.stats_path) as f:
+                data = json.load(f)
+            self._kwargs = {k: v for k, v in data.get("kwargs", {}).items()}
+            return {k: int(v) for k, v in data.get("uses", {}).items()}
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Runtime-Statistik nicht lesbar: {e}")
+            return {}
+
+    def _write_stats(self):
+        if not self.stats_path:
+            return
+        tmp = f"{self.stats_path}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump({"uses": self._popularity, "kwargs": self._kwargs}, f)
+            os.replace(tmp, self.stats_path)
+        except OSError as e:
+            print(f"⚠️ Runtime-Statistik nicht geschrieben: {e}")
+
+    # --- Metriken ---
+    def metrics(self) -> dict:
+        def _stats(values: List[float]) -> dict:
+            if not values:
+                return {"count": 0, "mean_s": None, "max_s": None}
+            return {"count": len(values), "mean_s": round(sum(values) / len(values), 3),
+                    "max_s": round(max(values), 3)}
+        return {
+            **self._counters,
+            "hit_rate": round(self._counters["hits"] / max(1, self._counters["hits"] + self._counters["misses"]), 3),
+            "load": _stats(self._load_times),
+            "wait": _stats(self._wait_times),
+            "bytes": self._used_bytes(),
+            "max_bytes": self.max_bytes,
+            "runtimes": [
+                {"key": e.key, "bytes": e.bytes, "uses": e.uses, "in_use": e.lock.locked(),
+                 "last_used": e.last_used, "load_s": round(e.load_s, 3)}
+                for e in sorted(self._entries.values(), key=lambda e: e.last_used, reverse=True)
+            ],
+        }
@@ -0,0 +1,267 @@
+"""Streaming-Encode für BitHuman-Frames: Frames → ffmpeg-stdin → H.264 + AAC in einem Lauf.
+
+Bisher sammelte /generate-avatar alle Frames in einer Liste (60s @ 30fps ≈ 1800
+volle Frames im RAM), schrieb sie mit cv2.VideoWriter (mp4v) und muxte danach
+das Audio in einem zweiten ffmpeg-Lauf. Hier bekommt EIN ffmpeg jeden Frame,
+sobald die Runtime ihn liefert:
+
+    runtime.run() ─ Frame ─▶ stdin (rawvideo bgr24) ┐
+                                  Audio-Datei ─────┴▶ libx264 + aac (faststart) → mp4
+
+Der Pipe-Write blockiert, solange ffmpeg nicht nachkommt (Backpressure) – es
+liegt nie mehr als ein Frame plus Pipe-Puffer im Speicher.
+
+Preset: der Encoder läuft im Takt der Frames, ein langsames Preset bremst also
+die ganze Anfrage. Gemessen (tools/bench_avatar_stream_encode.py, 60s-Clip):
+libx264 `veryfast` 47.4s gegenüber 24.5s für den alten Pfad (mp4v + Mux).
+Default ist deshalb `ultrafast` (größere Datei bei gleicher CRF);
+BITHUMAN_ENCODE_PRESET stellt es um, z. B. `veryfast`, wenn die Dateigröße
+wichtiger ist als die Latenz.
+"""
+import asyncio
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from typing import Optional
+
+import numpy as np
+
+DEFAULT_PRESET = os.getenv("BITHUMAN_ENCODE_PRESET", "ultrafast")
+
+
+def resolve_ffmpeg() -> Optional[str]:
+    """System-ffmpeg, sonst die Binary aus imageio-ffmpeg (kommt mit moviepy/imageio)."""
+    path = shutil.which("ffmpeg")
+    if path:
+        return path
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return None
+
+
+def frame_image(frame) -> Optional[np.ndarray]:
+    """BGR-Bild aus einem Runtime-Frame (ndarray oder bithuman VideoFrame mit .bgr_image)."""
+    if isinstance(frame, np.ndarray):
+        return frame
+    image = getattr(frame, "bgr_image", None)
+    return image if isinstance(image, np.ndarray) else None
+
+
+class StreamingVideoEncoder:
+    """Ein ffmpeg-Prozess pro Video; startet beim ersten Frame (Größe steht dann fest).
+
+    write()/awrite() nehmen BGR-Frames [H, W, 3] uint8, close() wartet auf ffmpeg
+    und liefert {path, frames, returncode, stderr, elapsed_s}.
+
+    Mit Audio (-shortest) beendet ffmpeg sich selbst, sobald das Audio zu Ende ist,
+    und schließt stdin – weitere Frames sind dann kein Fehler: `ended` wird True,
+    write() liefert False und close() entscheidet anhand des Returncodes.
+    """
+
+    def __init__(
+        self,
+        output_path: str,
+        fps: int = 30,
+        audio_path: Optional[str] = None,
+        ffmpeg_bin: Optional[str] = None,
+        crf: int = 20,
+        preset: Optional[str] = None,
+        audio_bitrate: str = "128k",
+    ):
+        self.output_path = output_path
+        self.fps = fps
+        self.audio_path = audio_path
+        self.ffmpeg_bin = ffmpeg_bin or resolve_ffmpeg()
+        if not self.ffmpeg_bin:
+            raise RuntimeError("ffmpeg nicht gefunden")
+        self.crf = crf
+        self.preset = preset or DEFAULT_PRESET
+        self.audio_bitrate = audio_bitrate
+        self.frames = 0
+        self.ended = False
+        self.size: Optional[tuple] = None
+        self._proc: Optional[subprocess.Popen] = None
+        self._stderr = None
+        self._t0 = time.perf_counter()
+
+    def build_cmd(self, width: int, height: int) -> list:
+        cmd = [
+            self.ffmpeg_bin, "-y", "-v", "error",
+            "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}", "-r", str(self.fps),
+            "-i", "pipe:0",
+        ]
+        if self.audio_path:
+            cmd += ["-i", self.audio_path, "-map", "0:v", "-map", "1:a",
+                    "-c:a", "aac", "-b:a", self.audio_bitrate, "-shortest"]
+        cmd += [
+            "-c:v", "libx264", "-preset", self.preset, "-crf", str(self.crf),
+            "-pix_fmt", "yuv420p",
+            # yuv420p braucht gerade Kantenlängen
+            "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+            "-movflags", "+faststart",
+            self.output_path,
+        ]
+        return cmd
+
+    def _start(self, image: np.ndarray):
+        height, width = image.shape[:2]
+        self.size = (width, height)
+        # stderr in eine Datei: eine volle stderr-Pipe würde ffmpeg (und damit stdin) blockieren
+        self._stderr = tempfile.TemporaryFile()
+        self._proc = subprocess.Popen(self.build_cmd(width, height), stdin=subprocess.PIPE,
+                                      stdout=subprocess.DEVNULL, stderr=self._stderr)
+
+    def _bytes(self, frame) -> Optional[bytes]:
+        image = frame_image(frame)
+        if image is None:
+            return None
+        if self._proc is None:
+            self._start(image)
+        if (image.shape[1], image.shape[0]) != self.size or image.ndim != 3 or image.shape[2] != 3:
+            raise ValueError(f"Frame {image.shape} passt nicht zur Videogröße {self.size}")
+        return np.ascontiguousarray(image, dtype=np.uint8).tobytes()
+
+    def write(self, frame) -> bool:
+        """Frame schreiben (blockiert bei Backpressure). False bei Frames ohne Bild oder nach Stream-Ende."""
+        data = None if self.ended else self._bytes(frame)
+        if data is None:
+            return False
+        try:
+            self._proc.stdin.write(data)
+        except BrokenPipeError:
+            return self._broken_pipe()
+        self.frames += 1
+        return True
+
+    async def awrite(self, frame) -> bool:
+        """Wie write(), der Pipe-Write läuft aber im Thread-Pool (Event-Loop bleibt frei)."""
+        data = None if self.ended else self._bytes(frame)
+        if data is None:
+            return False
+        try:
+            await asyncio.to_thread(self._proc.stdin.write, data)
+        except BrokenPipeError:
+            return self._broken_pipe()
+        self.frames += 1
+        return True
+
+    def _broken_pipe(self) -> bool:
+        if not self.audio_path:
+            raise RuntimeError(f"ffmpeg beendet: {self._read_stderr()[-500:]}")
+        # -shortest: Audio zu Ende → ffmpeg fertig; ob das Video gut ist, sagt close()
+        self.ended = True
+        return False
+
+    def _read_stderr(self) -> str:
+        if self._stderr is None:
+            return ""
+        self._stderr.seek(0)
+        return self._stderr.read().decode("utf-8", "replace")
+
+    def close(self, timeout: float = 300.0) -> dict:
+        returncode = None
+        stderr = ""
+        if self._proc is not None:
+            try:
+                self._proc.stdin.close()
+            except BrokenPipeError:
+                pass
+            try:
+                returncode = self._proc.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                self._proc.kill()
+                returncode = self._proc.wait()
+            stderr = self._read_stderr()
+            self._stderr.close()
+        return {
+            "path": self.output_path,
+            "frames": self.frames,
+            "ended": self.ended,
+            "size": self.size,
+            "returncode": returncode,
+            "stderr": stderr,
+            "ok": returncode == 0 and self.frames > 0 and os.path.exists(self.output_path),
+            "elapsed_s": time.perf_counter() - self._t0,
+        }
+
+    async def aclose(self, timeout: float = 300.0) -> dict:
+        return await asyncio.to_thread(self.close, timeout)
+
+    def abort(self):
+        if self._proc is not None and self._proc.poll() is None:
+            self._proc.kill()
+            self._proc.wait()
+        if self._stderr is not None:
+            self._stderr.close()
+            self._stderr = None
+
+
+async def encode_stream(
+    frames,
+    output_path: str,
+    audio_path: Optional[str] = None,
+    fps: int = 30,
+    max_frames: Optional[int] = None,
+    **encoder_kwargs,
+) -> dict:
+    """Frames aus einem (async) Iterator direkt encoden, bis max_frames oder Ende.
+
+    Iterationsfehler der Quelle beenden den Stream (wie bisher: was bis dahin kam, wird
+    encodet) und stehen im Ergebnis unter "source_error".
+    """
+    encoder = StreamingVideoEncoder(output_path, fps=fps, audio_path=audio_path, **encoder_kwargs)
+    is_async = hasattr(frames, "__aiter__")
+    it = frames.__aiter__() if is_async else iter(frames)
+    source_error = None
+    try:
+        while not (max_frames and encoder.frames >= max_frames):
+            try:
+                frame = await it.__anext__() if is_async else next(it)
+            except (StopAsyncIteration, StopIteration):
+                break
+            except Exception as e:
+                source_error = str(e) or type(e).__name__
+                break
+            await encoder.awrite(frame)
+            if encoder.ended:
+                break
+        result = await encoder.aclose()
+    except BaseException:
+        encoder.abort()
+        raise
+    result["source_error"] = source_error
+    return result
+
+
+def encode_still(
+    image_path: str,
+    output_path: str,
+    audio_path: Optional[str] = None,
+    fps: int = 30,
+    duration_s: Optional[float] = None,
+    ffmpeg_bin: Optional[str] = None,
+) -> dict:
+    """Standbild + Audio in einem ffmpeg-Lauf (Fallback, wenn die Runtime keine Frames liefert)."""
+    ffmpeg_bin = ffmpeg_bin or resolve_ffmpeg()
+    if not ffmpeg_bin:
+        raise RuntimeError("ffmpeg nicht gefunden")
+    t0 = time.perf_counter()
+    cmd = [ffmpeg_bin, "-y", "-v", "error", "-loop", "1", "-framerate", str(fps), "-i", image_path]
+    if audio_path:
+        cmd += ["-i", audio_path, "-map", "0:v", "-map", "1:a", "-c:a", "aac", "-shortest"]
+    if duration_s:
+        cmd += ["-t", f"{duration_s:.3f}"]
+    cmd += ["-c:v", "libx264", "-preset", "veryfast", "-tune", "stillimage", "-pix_fmt", "yuv420p",
+            "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", "-movflags", "+faststart", output_path]
+    res = subprocess.run(cmd, capture_output=True, text=True)
+    return {
+        "path": output_path,
+        "returncode": res.returncode,
+        "stderr": res.stderr,
+        "ok": res.returncode == 0 and os.path.exists(output_path),
+        "elapsed_s": time.perf_counter() - t0,
+    }
@@ -0,0 +1 @@
+"""Bausteine der Dynamics-Pipeline (modal_dynamics.py / backend)."""
@@ -0,0 +1,325 @@
+"""Datengetriebene Schätzung der Dynamics-Generierungszeit.
+
+Fertige Jobs liefern Stage-Dauern (download, trim, inference, encode, upload)
+plus Eingabe-Features. Pro Stage wird eine kleine Ridge-Regression gefittet;
+die Schätzung kommt mit Vorhersageintervall. Solange zu wenige Messungen da
+sind, gelten die statischen Stage-Werte (DEFAULT_STAGE_SECONDS) als Prior.
+
+Offline-Auswertung gegen aufgezeichnete Daten:
+  python -m dynamics_pipeline.estimator evaluate --db /tmp/dynamics_timings.sqlite3
+"""
+import argparse
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from .jobs import DEFAULT_STAGE_SECONDS, STAGES, stage_durations
+
+# Reihenfolge = Spalten der Design-Matrix (bias kommt implizit dazu)
+FEATURES = ("video_seconds", "megapixels", "input_mb", "scale", "cold_start", "trt_cache_hit")
+
+Z_90 = 1.645  # zweiseitiges 90%-Intervall
+
+
+def features_for(
+    parameters: Optional[dict] = None,
+    video_seconds: Optional[float] = None,
+    input_bytes: Optional[int] = None,
+    cold_start: Optional[bool] = None,
+    trt_cache_hit: Optional[bool] = None,
+) -> Dict[str, float]:
+    """Feature-Dict aus Request-Parametern + (falls bekannt) gemessenen Eingaben."""
+    p = parameters or {}
+    dim = p.get("source_max_dim", p.get("sourceMaxDim"))
+    feats: Dict[str, float] = {}
+    if dim:
+        # LivePortrait skaliert die Quelle auf max_dim → quadratisch in der Pixelzahl
+        feats["megapixels"] = (float(dim) ** 2) / 1e6
+    if p.get("scale") is not None:
+        feats["scale"] = float(p["scale"])
+    if video_seconds is not None:
+        feats["video_seconds"] = float(video_seconds)
+    if input_bytes is not None:
+        feats["input_mb"] = float(input_bytes) / 1e6
+    if cold_start is not None:
+        feats["cold_start"] = 1.0 if cold_start else 0.0
+    if trt_cache_hit is not None:
+        feats["trt_cache_hit"] = 1.0 if trt_cache_hit else 0.0
+    return feats
+
+
+def static_estimate(source_max_dim: int) -> int:
+    """Alte Tabelle aus backend/main.py – nur noch Baseline für evaluate()."""
+    base_time = 180
+    if source_max_dim <= 512:
+        return int(base_time * 0.5)
+    if source_max_dim <= 1024:
+        return int(base_time * 0.7)
+    if source_max_dim <= 1600:
+        return int(base_time * 1.0)
+    return int(base_time * 1.5)
+
+
+# ---------------------------------------------------------------------------
+# Store
+# ---------------------------------------------------------------------------
+
+class TimingStore:
+    """Stage-Dauern fertiger Jobs (SQLite): features + stages als JSON."""
+
+    def __init__(self, path: str):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS timings ("
+            " job_id TEXT PRIMARY KEY, recorded_at REAL, features TEXT, stages TEXT)"
+        )
+
+    def record(self, job_id: str, features: Dict[str, float], stages: Dict[str, float]):
+        if not stages:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO timings (job_id, recorded_at, features, stages) VALUES (?,?,?,?)",
+                (job_id, time.time(), json.dumps(features), json.dumps(stages)),
+            )
+
+    def record_job(self, job: dict):
+        """Fertigen Job (jobs.py-Record) übernehmen – nur erfolgreiche, nicht gecachte Läufe."""
+        rec = record_from_job(job)
+        if rec:
+            self.record(job["id"], rec["features"], rec["stages"])
+
+    def records(self, limit: int = 5000) -> List[dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT job_id, recorded_at, features, stages FROM timings ORDER BY recorded_at DESC LIMIT ?",
+                (int(limit),),
+            ).fetchall()
+        return [
+            {"job_id": r[0], "recorded_at": r[1], "features": json.loads(r[2]), "stages": json.loads(r[3])}
+            for r in rows
+        ]
+
+
+def record_from_job(job: dict) -> Optional[dict]:
+    if job.get("status") != "succeeded" or (job.get("result") or {}).get("cached"):
+        return None
+    stages = stage_durations(job)
+    if not stages:
+        return None
+    features = dict(features_for(job.get("parameters")))
+    features.update(job.get("features") or {})
+    return {"job_id": job.get("id"), "features": features, "stages": stages}
+
+
+# ---------------------------------------------------------------------------
+# Regression
+# ---------------------------------------------------------------------------
+
+def _solve(a: List[List[float]], b: List[float]) -> List[float]:
+    """Gauss-Elimination mit Pivoting (kleine, symmetrische Systeme)."""
+    n = len(b)
+    m = [row[:] + [b[i]] for i, row in enumerate(a)]
+    for col in range(n):
+        piv = max(range(col, n), key=lambda r: abs(m[r][col]))
+        m[col], m[piv] = m[piv], m[col]
+        if abs(m[col][col]) < 1e-12:
+            continue
+        for r in range(n):
+            if r != col:
+                f = m[r][col] / m[col][col]
+                if f:
+                    for c in range(col, n + 1):
+                        m[r][c] -= f * m[col][c]
+    return [m[i][n] / m[i][i] if abs(m[i][i]) > 1e-12 else 0.0 for i in range(n)]
+
+
+def _invert(a: List[List[float]]) -> List[List[float]]:
+    n = len(a)
+    cols = [_solve(a, [1.0 if i == j else 0.0 for i in range(n)]) for j in range(n)]
+    return [[cols[j][i] for j in range(n)] for i in range(n)]
+
+
+class StageModel:
+    """Ridge-Regression y = w·[1, x] mit Vorhersageintervall (Residuen-Std)."""
+
+    def __init__(self, features: Sequence[str], ridge: float = 1.0):
+        self.features = list(features)
+        self.ridge = ridge
+        self.coef: List[float] = []
+        self.means: Dict[str, float] = {}
+        self.scales: Dict[str, float] = {}
+        self.sigma = 0.0
+        self.n = 0
+        self._cov: List[List[float]] = []
+
+    def _row(self, feats: Dict[str, float]) -> List[float]:
+        row = [1.0]
+        for f in self.features:
+            v = feats.get(f, self.means.get(f, 0.0))
+            row.append((v - self.means.get(f, 0.0)) / (self.scales.get(f) or 1.0))
+        return row
+
+    def fit(self, xs: List[Dict[str, float]], ys: List[float]) -> "StageModel":
+        self.n = len(ys)
+        for f in self.features:
+            vals = [x[f] for x in xs if f in x]
+            mean = sum(vals) / len(vals) if vals else 0.0
+            var = sum((v - mean) ** 2 for v in vals) / len(vals) if vals else 0.0
+            self.means[f] = mean
+            self.scales[f] = math.sqrt(var) if var > 1e-12 else 0.0
+        # konstante/fehlende Features tragen nichts bei
+        self.features = [f for f in self.features if self.scales.get(f)]
+        rows = [self._row(x) for x in xs]
+        k = len(rows[0])
+        xtx = [[sum(r[i] * r[j] for r in rows) + (self.ridge if i == j and i > 0 else 0.0) for j in range(k)]
+               for i in range(k)]
+        xty = [sum(r[i] * y for r, y in zip(rows, ys)) for i in range(k)]
+        self.coef = _solve(xtx, xty)
+        resid = [y - sum(c * v for c, v in zip(self.coef, r)) for r, y in zip(rows, ys)]
+        dof = max(1, self.n - k)
+        self.sigma = math.sqrt(sum(e * e for e in resid) / dof)
+        self._cov = _invert(xtx)
+        return self
+
+    def predict(self, feats: Dict[str, float]) -> Dict[str, float]:
+        row = self._row(feats)
+        mean = max(0.0, sum(c * v for c, v in zip(self.coef, row)))
+        leverage = sum(row[i] * self._cov[i][j] * row[j] for i in range(len(row)) for j in range(len(row)))
+        std = self.sigma * math.sqrt(1.0 + max(0.0, leverage))
+        return {"mean": mean, "std": std}
+
+
+class GenerationTimeEstimator:
+    """Schätzung pro Stage; Stages mit < min_samples Messungen nutzen den Prior."""
+
+    def __init__(
+        self,
+        records: Iterable[dict] = (),
+        min_samples: int = 8,
+        prior: Optional[Dict[str, float]] = None,
+        prior_rel_std: float = 0.5,
+        features: Sequence[str] = FEATURES,
+    ):
+        self.min_samples = min_samples
+        self.prior = dict(prior or DEFAULT_STAGE_SECONDS)
+        self.prior_rel_std = prior_rel_std
+        self.feature_names = tuple(features)
+        self.models: Dict[str, StageModel] = {}
+        self.fit(records)
+
+    def fit(self, records: Iterable[dict]) -> "GenerationTimeEstimator":
+        records = list(records)
+        self.models = {}
+        for stage in STAGES:
+            xs, ys = [], []
+            for rec in records:
+                dur = (rec.get("stages") or {}).get(stage)
+                if dur is not None and dur >= 0:
+                    xs.append(rec.get("features") or {})
+                    ys.append(float(dur))
+            if len(ys) >= self.min_samples:
+                self.models[stage] = StageModel(self.feature_names).fit(xs, ys)
+        self.n_records = len(records)
+        return self
+
+    def estimate(self, features: Optional[Dict[str, float]] = None, z: float = Z_90) -> dict:
+        features = features or {}
+        stages, total, var = {}, 0.0, 0.0
+        for stage in STAGES:
+            model = self.models.get(stage)
+            if model is not None:
+                pred = model.predict(features)
+                source = "model"
+            else:
+                mean = float(self.prior.get(stage, 0.0))
+                pred = {"mean": mean, "std": mean * self.prior_rel_std}
+                source = "prior"
+            stages[stage] = {
+                "seconds": round(pred["mean"], 1),
+                "low": round(max(0.0, pred["mean"] - z * pred["std"]), 1),
+                "high": round(pred["mean"] + z * pred["std"], 1),
+                "source": source,
+            }
+            total += pred["mean"]
+            var += pred["std"] ** 2  # Stages als unabhängig angenommen
+        std = math.sqrt(var)
+        return {
+            "seconds": int(round(total)),
+            "low": int(max(0.0, math.floor(total - z * std))),
+            "high": int(math.ceil(total + z * std)),
+            "stages": stages,
+            "samples": self.n_records,
+        }
+
+    def stage_seconds(self, features: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+        """Nur die Mittelwerte pro Stage (Format von jobs.JobScheduler.stage_seconds)."""
+        return {s: v["seconds"] for s, v in self.estimate(features)["stages"].items()}
+
+
+# ---------------------------------------------------------------------------
+# Offline-Auswertung
+# ---------------------------------------------------------------------------
+
+def evaluate(records: List[dict], folds: int = 5, min_samples: int = 8) -> dict:
+    """k-fold Cross-Validation: MAE/MAPE/Intervall-Abdeckung vs. statischer Tabelle."""
+    records = [r for r in records if r.get("stages")]
+    if len(records) < 2:
+        return {"records": len(records), "error": "zu wenige Datensätze"}
+    folds = max(2, min(folds, len(records)))
+    errs, pct, covered, base_errs = [], [], 0, []
+    for k in range(folds):
+        test = records[k::folds]
+        train = [r for i, r in enumerate(records) if i % folds != k]
+        est = GenerationTimeEstimator(train, min_samples=min_samples)
+        for rec in test:
+            actual = sum(rec["stages"].get(s, 0.0) for s in STAGES)
+            pred = est.estimate(rec.get("features") or {})
+            errs.append(abs(pred["seconds"] - actual))
+            if actual > 0:
+                pct.append(abs(pred["seconds"] - actual) / actual)
+            covered += 1 if pred["low"] <= actual <= pred["high"] else 0
+            mp = (rec.get("features") or {}).get("megapixels")
+            dim = int(math.sqrt(mp * 1e6)) if mp else 1600
+            base_errs.append(abs(static_estimate(dim) - actual))
+    n = len(errs)
+    return {
+        "records": len(records),
+        "folds": folds,
+        "mae_s": round(sum(errs) / n, 1),
+        "mape": round(sum(pct) / len(pct), 3) if pct else None,
+        "interval_coverage": round(covered / n, 3),
+        "baseline_static_mae_s": round(sum(base_errs) / n, 1),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Dynamics generation-time estimator")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    ev = sub.add_parser("evaluate", help="Cross-Validation gegen aufgezeichnete Timings")
+    ev.add_argument("--db", default=os.getenv("DYNAMICS_TIMINGS_DB", "/tmp/dynamics_timings.sqlite3"))
+    ev.add_argument("--folds", type=int, default=5)
+    ev.add_argument("--min-samples", type=int, default=8)
+    est = sub.add_parser("estimate", help="Schätzung für Parameter/Features ausgeben")
+    est.add_argument("--db", default=os.getenv("DYNAMICS_TIMINGS_DB", "/tmp/dynamics_timings.sqlite3"))
+    est.add_argument("--features", default="{}", help='JSON, z.B. {"megapixels": 2.56, "video_seconds": 10}')
+    args = ap.parse_args()
+
+    records = TimingStore(args.db).records()
+    if args.cmd == "evaluate":
+        out = evaluate(records, folds=args.folds, min_samples=args.min_samples)
+    else:
+        out = GenerationTimeEstimator(records).estimate(json.loads(args.features))
+    print(json.dumps(out, indent=2))
+
+
+if __name__ == "__main__":
+    main()
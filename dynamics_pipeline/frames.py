@@ -0,0 +1,165 @@
+"""Frames direkt aus der ffmpeg-Pipe: ZIP-Archiv und Latents ohne PNG-Zwischendateien.
+
+ffmpeg liefert rgb24-Rohframes auf stdout → numpy [N, H, W, 3] uint8. Daraus
+entstehen im Speicher:
+
+- frames.zip: frame_001.png … (gleiche Namen wie bisher), PNG per zlib mit
+  "Up"-Filter – kein PIL nötig
+- latents.npz: kompakte Darstellung für den Cold Start
+
+Latents-Format (LATENTS_VERSION 1), np.savez_compressed mit:
+    latents      uint8  [N, 3, h, w]   NCHW, RGB, per Blockmittel um `downsample` verkleinert
+    scale        float32 []            Dequantisierung: x = (q - zero_point) * scale  → [0, 1]
+    zero_point   float32 []
+    fps          float32 []
+    source_size  int32  [2]            (H, W) der Originalframes
+    version      int32  []
+"""
+import io
+import re
+import struct
+import subprocess
+import zipfile
+import zlib
+from typing import Optional, Tuple
+
+import numpy as np
+
+LATENTS_VERSION = 1
+
+
+def probe_video_size(path: str, ffmpeg_bin: str = "ffmpeg") -> Optional[Tuple[int, int]]:
+    """(width, height) des ersten Videostreams aus `ffmpeg -i` (ohne Decode, ohne ffprobe)."""
+    proc = subprocess.run([ffmpeg_bin, "-hide_banner", "-i", path], capture_output=True, text=True)
+    m = re.search(r"Stream #\d+:\d+.*?Video:.*?\b(\d{2,5})x(\d{2,5})\b", proc.stderr)
+    return (int(m.group(1)), int(m.group(2))) if m else None
+
+
+def read_raw_frames(stream, width: int, height: int, count: int) -> np.ndarray:
+    """Bis zu `count` rgb24-Frames aus einem Byte-Stream (z.B. proc.stdout) lesen."""
+    frame_bytes = width * height * 3
+    buf = bytearray(frame_bytes * count)
+    view = memoryview(buf)
+    got = 0
+    while got < len(buf):
+        n = stream.readinto(view[got:])
+        if not n:
+            break
+        got += n
+    n_frames = got // frame_bytes
+    return np.frombuffer(bytes(buf[:n_frames * frame_bytes]), dtype=np.uint8).reshape(n_frames, height, width, 3)
+
+
+def read_frames(src: str, count: int = 25, fps: Optional[int] = 25, ffmpeg_bin: str = "ffmpeg") -> np.ndarray:
+    """Erste `count` Frames (optional auf fps umgerechnet) als [N, H, W, 3] uint8."""
+    size = probe_video_size(src, ffmpeg_bin)
+    if not size:
+        raise RuntimeError(f"Videogröße nicht ermittelbar: {src}")
+    vf = [f"fps={fps}"] if fps else []
+    cmd = [ffmpeg_bin, "-v", "error", "-i", src]
+    if vf:
+        cmd += ["-vf", ",".join(vf)]
+    cmd += ["-frames:v", str(count), "-f", "rawvideo", "-pix_fmt", "rgb24", "pipe:1"]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        frames = read_raw_frames(proc.stdout, size[0], size[1], count)
+    finally:
+        proc.stdout.close()
+        err = proc.stderr.read().decode("utf-8", "replace")
+        proc.wait()
+    if proc.returncode != 0 or not len(frames):
+        raise RuntimeError(f"Frame-Extraktion fehlgeschlagen: {err[-500:]}")
+    return frames
+
+
+# ---------------------------------------------------------------------------
+# Archiv
+# ---------------------------------------------------------------------------
+
+def _png_chunk(tag: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+
+def encode_png(frame: np.ndarray, level: int = 6) -> bytes:
+    """RGB-Frame [H, W, 3] uint8 → PNG (8 bit, Filter "Up" für alle Zeilen)."""
+    h, w, _ = frame.shape
+    rows = frame.reshape(h, w * 3)
+    up = np.empty_like(rows)
+    up[0] = rows[0]
+    up[1:] = rows[1:] - rows[:-1]  # uint8-Arithmetik = mod 256 wie im PNG-Standard
+    raw = np.empty((h, w * 3 + 1), dtype=np.uint8)
+    raw[:, 0] = 2
+    raw[0, 0] = 0  # erste Zeile ungefiltert
+    raw[:, 1:] = up
+    ihdr = struct.pack(">IIBBBBB", w, h, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + _png_chunk(b"IHDR", ihdr)
+            + _png_chunk(b"IDAT", zlib.compress(raw.tobytes(), level)) + _png_chunk(b"IEND", b""))
+
+
+def frames_zip_bytes(frames: np.ndarray, name_fmt: str = "frame_{:03d}.png") -> bytes:
+    buf = io.BytesIO()
+    # PNGs sind schon komprimiert → STORED wie bisher
+    with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_STORED) as zf:
+        for i, frame in enumerate(frames, start=1):
+            zf.writestr(name_fmt.format(i), encode_png(frame))
+    return buf.getvalue()
+
+
+# ---------------------------------------------------------------------------
+# Latents
+# ---------------------------------------------------------------------------
+
+def _block_mean(frames: np.ndarray, factor: int) -> np.ndarray:
+    if factor <= 1:
+        return frames.astype(np.float32)
+    n, h, w, c = frames.shape
+    h2, w2 = h // factor, w // factor
+    cropped = frames[:, :h2 * factor, :w2 * factor].astype(np.float32)
+    return cropped.reshape(n, h2, factor, w2, factor, c).mean(axis=(2, 4))
+
+
+def build_latents(frames: np.ndarray, downsample: int = 2, fps: float = 25.0) -> dict:
+    """[N, H, W, 3] uint8 → Latents-Dict (siehe Modul-Docstring)."""
+    if frames.ndim != 4 or frames.shape[-1] != 3 or frames.dtype != np.uint8:
+        raise ValueError(f"erwartet [N, H, W, 3] uint8, bekommen {frames.shape} {frames.dtype}")
+    small = _block_mean(frames, downsample)  # [N, h, w, 3] float32 in 0..255
+    q = np.clip(np.rint(small), 0, 255).astype(np.uint8).transpose(0, 3, 1, 2)
+    return {
+        "latents": np.ascontiguousarray(q),
+        "scale": np.float32(1.0 / 255.0),
+        "zero_point": np.float32(0.0),
+        "fps": np.float32(fps),
+        "source_size": np.array(frames.shape[1:3], dtype=np.int32),
+        "version": np.int32(LATENTS_VERSION),
+    }
+
+
+def latents_npz_bytes(latents: dict) -> bytes:
+    buf = io.BytesIO()
+    np.savez_compressed(buf, **latents)
+    return buf.getvalue()
+
+
+def load_latents(source) -> Tuple[np.ndarray, dict]:
+    """Pfad/Bytes/Dateiobjekt → (float32 [N, 3, h, w] in [0, 1], Metadaten). Prüft das Format."""
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    with np.load(source, allow_pickle=False) as data:
+        missing = {"latents", "scale", "zero_point", "fps", "source_size", "version"} - set(data.files)
+        if missing:
+            raise ValueError(f"Latents unvollständig, fehlt: {sorted(missing)}")
+        version = int(data["version"])
+        if version != LATENTS_VERSION:
+            raise ValueError(f"Latents-Version {version} nicht unterstützt")
+        q = data["latents"]
+        if q.dtype != np.uint8 or q.ndim != 4 or q.shape[1] != 3:
+            raise ValueError(f"Latents müssen uint8 [N, 3, h, w] sein, sind {q.dtype} {q.shape}")
+        scale, zero_point = float(data["scale"]), float(data["zero_point"])
+        meta = {
+            "version": version,
+            "fps": float(data["fps"]),
+            "source_size": tuple(int(v) for v in data["source_size"]),
+            "scale": scale,
+            "zero_point": zero_point,
+        }
+        return (q.astype(np.float32) - zero_point) * scale, meta
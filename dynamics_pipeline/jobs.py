@@ -0,0 +1,636 @@
+"""Job-Scheduler für Dynamics-Generierung.
+
+- persistente Job-Records (SQLite lokal, Firestore auf Modal)
+- Fortschritt pro Stage (download, trim, inference, encode, upload) + ETA
+- Prioritätsklassen und Limit gleichzeitiger Jobs pro User
+- Abbruch beendet den laufenden Subprozess (inkl. LivePortrait-Kindprozesse)
+- Backends: SubprocessBackend (Worker-Skript) und InProcessBackend (Tests)
+
+Worker melden Fortschritt über `report_stage()` / `report_progress()`: eine
+Zeile `@@dynamics {...}` auf stdout, die das SubprocessBackend mitliest.
+"""
+import json
+import os
+import signal
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import traceback
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+STAGES = ("download", "trim", "inference", "encode", "upload")
+
+# Erwartete Sekunden pro Stage (GPU), solange keine gemessenen Werte vorliegen
+DEFAULT_STAGE_SECONDS = {"download": 5.0, "trim": 3.0, "inference": 90.0, "encode": 15.0, "upload": 8.0}
+
+PRIORITIES = {"paid": 0, "standard": 1, "free": 2}
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+FINAL_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+PROGRESS_PREFIX = "@@dynamics "
+
+
+class JobCancelled(Exception):
+    pass
+
+
+# ---------------------------------------------------------------------------
+# Worker-Seite: Fortschritt melden (stdout-Protokoll)
+# ---------------------------------------------------------------------------
+
+def report_stage(stage: str):
+    print(f"{PROGRESS_PREFIX}{json.dumps({'stage': stage})}", flush=True)
+
+
+def report_progress(fraction: float):
+    print(f"{PROGRESS_PREFIX}{json.dumps({'progress': round(float(fraction), 3)})}", flush=True)
+
+
+def report_features(**features):
+    """Gemessene Eingabe-Features (Videolänge, Cold Start, ...) für den Zeit-Schätzer."""
+    clean = {k: v for k, v in features.items() if v is not None}
+    print(f"{PROGRESS_PREFIX}{json.dumps({'features': clean}, default=str)}", flush=True)
+
+
+def report_result(result: dict):
+    print(f"{PROGRESS_PREFIX}{json.dumps({'result': result}, default=str)}", flush=True)
+
+
+# ---------------------------------------------------------------------------
+# Stores
+# ---------------------------------------------------------------------------
+
+class SqliteJobStore:
+    """Job-Records in SQLite (eine Zeile pro Job, Details als JSON)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, status TEXT, priority INTEGER, user_id TEXT,"
+            " created_at REAL, updated_at REAL, data TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, priority, created_at)")
+
+    def create(self, job: dict):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, priority, user_id, created_at, updated_at, data) VALUES (?,?,?,?,?,?,?)",
+                (job["id"], job["status"], job["priority_rank"], job.get("user_id"),
+                 job["created_at"], job["updated_at"], json.dumps(job, default=str)),
+            )
+
+    def update(self, job_id: str, **fields) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM jobs WHERE id=?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            job = json.loads(row[0])
+            job.update(fields)
+            job["updated_at"] = time.time()
+            self._conn.execute(
+                "UPDATE jobs SET status=?, updated_at=?, data=? WHERE id=?",
+                (job["status"], job["updated_at"], json.dumps(job, default=str), job_id),
+            )
+            return job
+
+    def update_if(self, job_id: str, expected_status: str, **fields) -> Optional[dict]:
+        """Wie update(), aber nur solange der Job noch expected_status hat – sonst None.
+
+        Ein Statuswechsel (z. B. QUEUED → RUNNING) kann so keinen parallelen
+        Abbruch überschreiben, auch nicht aus einem anderen Prozess.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT data FROM jobs WHERE id=? AND status=?", (job_id, expected_status)).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                job = json.loads(row[0])
+                job.update(fields)
+                job["updated_at"] = time.time()
+                self._conn.execute(
+                    "UPDATE jobs SET status=?, updated_at=?, data=? WHERE id=? AND status=?",
+                    (job["status"], job["updated_at"], json.dumps(job, default=str), job_id, expected_status),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return job
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM jobs WHERE id=?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def list(self, status: Optional[str] = None, user_id: Optional[str] = None, limit: int = 100) -> List[dict]:
+        sql, args = "SELECT data FROM jobs WHERE 1=1", []
+        if status:
+            sql += " AND status=?"
+            args.append(status)
+        if user_id:
+            sql += " AND user_id=?"
+            args.append(user_id)
+        sql += " ORDER BY priority ASC, created_at ASC LIMIT ?"
+        args.append(int(limit))
+        with self._lock:
+            rows = self._conn.execute(sql, args).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+
+class FirestoreJobStore:
+    """Job-Records in Firestore (`dynamicsJobs/{id}`) – für Modal, wo es keinen lokalen Zustand gibt."""
+
+    def __init__(self, db, collection: str = "dynamicsJobs"):
+        self._db = db
+        self._col = db.collection(collection)
+
+    def create(self, job: dict):
+        self._col.document(job["id"]).set(job)
+
+    def update(self, job_id: str, **fields) -> Optional[dict]:
+        fields["updated_at"] = time.time()
+        ref = self._col.document(job_id)
+        ref.update(fields)
+        return self.get(job_id)
+
+    def update_if(self, job_id: str, expected_status: str, **fields) -> Optional[dict]:
+        """Statuswechsel in einer Transaktion – None, wenn der Job nicht mehr expected_status hat."""
+        from google.cloud import firestore
+
+        fields["updated_at"] = time.time()
+        ref = self._col.document(job_id)
+
+        @firestore.transactional
+        def _apply(transaction):
+            snap = ref.get(transaction=transaction)
+            if not snap.exists or (snap.to_dict() or {}).get("status") != expected_status:
+                return None
+            transaction.update(ref, fields)
+            return {**snap.to_dict(), **fields}
+
+        return _apply(self._db.transaction())
+
+    def get(self, job_id: str) -> Optional[dict]:
+        doc = self._col.document(job_id).get()
+        return doc.to_dict() if doc.exists else None
+
+    def list(self, status: Optional[str] = None, user_id: Optional[str] = None, limit: int = 100) -> List[dict]:
+        q = self._col
+        if status:
+            q = q.where("status", "==", status)
+        if user_id:
+            q = q.where("user_id", "==", user_id)
+        return [d.to_dict() for d in q.limit(int(limit)).stream()]
+
+
+# ---------------------------------------------------------------------------
+# Fortschritt / ETA
+# ---------------------------------------------------------------------------
+
+def new_job(avatar_id: str, dynamics_id: str, parameters: dict, user_id: Optional[str] = None,
+            priority: str = "standard", stage_seconds: Optional[Dict[str, float]] = None) -> dict:
+    now = time.time()
+    expected = {s: float((stage_seconds or DEFAULT_STAGE_SECONDS).get(s, 0.0)) for s in STAGES}
+    return {
+        "id": uuid.uuid4().hex,
+        "avatar_id": avatar_id,
+        "dynamics_id": dynamics_id,
+        "parameters": parameters or {},
+        "user_id": user_id,
+        "priority": priority if priority in PRIORITIES else "standard",
+        "priority_rank": PRIORITIES.get(priority, PRIORITIES["standard"]),
+        "status": QUEUED,
+        "stage": None,
+        "stage_progress": 0.0,
+        "progress": 0.0,
+        "eta_seconds": int(sum(expected.values())),
+        "expected_stage_seconds": expected,
+        "stages": {},
+        "created_at": now,
+        "updated_at": now,
+        "started_at": None,
+        "finished_at": None,
+        "error": None,
+        "result": None,
+        "backend_ref": None,
+        "features": {},
+    }
+
+
+def compute_progress(job: dict, now: Optional[float] = None) -> dict:
+    """Gesamtfortschritt + ETA aus Stage-Zeiten und erwarteter Stage-Dauer."""
+    now = now or time.time()
+    expected = job.get("expected_stage_seconds") or DEFAULT_STAGE_SECONDS
+    total = sum(expected.get(s, 0.0) for s in STAGES) or 1.0
+    done_s, remaining = 0.0, 0.0
+    stage = job.get("stage")
+    stages = job.get("stages") or {}
+    for s in STAGES:
+        exp = expected.get(s, 0.0)
+        info = stages.get(s) or {}
+        if info.get("finished_at"):
+            done_s += exp
+        elif s == stage and info.get("started_at"):
+            frac = job.get("stage_progress") or 0.0
+            elapsed = now - info["started_at"]
+            if not frac and exp > 0:
+                # ohne Rückmeldung aus der Stage: nach Zeit schätzen, max 95%
+                frac = min(0.95, elapsed / exp)
+            done_s += exp * frac
+            remaining += max(exp * (1.0 - frac), 1.0) if frac < 1.0 else 0.0
+        else:
+            remaining += exp
+    return {"progress": round(min(1.0, done_s / total), 3), "eta_seconds": int(round(remaining))}
+
+
+def apply_stage(store, job_id: str, stage: str):
+    """Stage-Wechsel im Store festhalten (vorherige Stage abschließen, ETA neu rechnen)."""
+    if stage not in STAGES:
+        return
+    job = store.get(job_id)
+    if job is None:
+        return
+    now = time.time()
+    stages = dict(job.get("stages") or {})
+    prev = job.get("stage")
+    if prev and prev != stage and prev in stages and not stages[prev].get("finished_at"):
+        stages[prev]["finished_at"] = now
+    # übersprungene Stages (z.B. Cache-Treffer) als erledigt markieren
+    for s in STAGES[:STAGES.index(stage)]:
+        stages.setdefault(s, {"started_at": now, "finished_at": now, "skipped": True})
+    stages.setdefault(stage, {"started_at": now})
+    job.update(stage=stage, stage_progress=0.0, stages=stages)
+    job.update(compute_progress(job, now))
+    store.update(job_id, stage=stage, stage_progress=0.0, stages=stages,
+                 progress=job["progress"], eta_seconds=job["eta_seconds"])
+
+
+def apply_progress(store, job_id: str, fraction: float):
+    job = store.get(job_id)
+    if job is None:
+        return
+    job["stage_progress"] = max(0.0, min(1.0, float(fraction)))
+    job.update(compute_progress(job))
+    store.update(job_id, stage_progress=job["stage_progress"],
+                 progress=job["progress"], eta_seconds=job["eta_seconds"])
+
+
+def apply_features(store, job_id: str, features: dict):
+    job = store.get(job_id)
+    if job is None or not features:
+        return
+    store.update(job_id, features={**(job.get("features") or {}), **features})
+
+
+def start_job(store, job_id: str, **fields) -> Optional[dict]:
+    """QUEUED → RUNNING; None, wenn der Job inzwischen abgebrochen (oder schon gestartet) ist."""
+    return store.update_if(job_id, QUEUED, status=RUNNING, started_at=time.time(), error=None, **fields)
+
+
+def finish_job(store, job_id: str, status: str, error: Optional[str] = None,
+               result: Optional[dict] = None) -> Optional[dict]:
+    """Endzustand schreiben; laufende Stage wird bei Erfolg abgeschlossen."""
+    current = store.get(job_id)
+    if current is None:
+        return None
+    now = time.time()
+    stages = dict(current.get("stages") or {})
+    if status == SUCCEEDED and current.get("stage") in stages:
+        stages[current["stage"]]["finished_at"] = now
+    return store.update(
+        job_id, status=status, error=error, result=result, finished_at=now, stages=stages,
+        progress=1.0 if status == SUCCEEDED else current.get("progress", 0.0), eta_seconds=0,
+    )
+
+
+def fail_job(store, job_id: str, error: str) -> Optional[dict]:
+    """FAILED schreiben, außer der Job ist schon final (z. B. vom Client abgebrochen)."""
+    current = store.get(job_id)
+    if current is None or current["status"] in FINAL_STATES:
+        return current
+    return finish_job(store, job_id, FAILED, error=error)
+
+
+def stage_durations(job: dict) -> Dict[str, float]:
+    """Gemessene Stage-Dauern eines fertigen Jobs (übersprungene Stages ausgenommen)."""
+    out = {}
+    for s, info in (job.get("stages") or {}).items():
+        if info.get("started_at") and info.get("finished_at") and not info.get("skipped"):
+            out[s] = info["finished_at"] - info["started_at"]
+    return out
+
+
+class JobContext:
+    """Wird an den Runner gereicht: Stages melden, Abbruch prüfen, Prozesse registrieren."""
+
+    def __init__(self, scheduler: "JobScheduler", job_id: str, user_id: Optional[str] = None):
+        self._scheduler = scheduler
+        self.job_id = job_id
+        self.user_id = user_id
+        self.cancel_event = threading.Event()
+        self._procs: List[subprocess.Popen] = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def check_cancelled(self):
+        if self.cancelled:
+            raise JobCancelled(self.job_id)
+
+    def set_stage(self, stage: str):
+        self.check_cancelled()
+        self._scheduler._on_stage(self.job_id, stage)
+
+    def set_progress(self, fraction: float):
+        self._scheduler._on_progress(self.job_id, fraction)
+
+    def set_features(self, **features):
+        apply_features(self._scheduler.store, self.job_id, {k: v for k, v in features.items() if v is not None})
+
+    @contextmanager
+    def stage(self, stage: str):
+        self.set_stage(stage)
+        yield
+        self.check_cancelled()
+
+    def register_process(self, proc: subprocess.Popen):
+        with self._lock:
+            self._procs.append(proc)
+        if self.cancelled:
+            self.kill_processes()
+
+    def kill_processes(self, grace_s: float = 5.0):
+        with self._lock:
+            procs = list(self._procs)
+        for proc in procs:
+            _terminate(proc, grace_s)
+
+
+def _terminate(proc: subprocess.Popen, grace_s: float = 5.0):
+    """Prozessgruppe beenden (SIGTERM, dann SIGKILL) – erwischt auch LivePortrait-Kinder."""
+    if proc.poll() is not None:
+        return
+    try:
+        pgid = os.getpgid(proc.pid)
+    except Exception:
+        pgid = None
+    try:
+        if pgid is not None and pgid != os.getpgid(0):
+            os.killpg(pgid, signal.SIGTERM)
+        else:
+            proc.terminate()
+        proc.wait(timeout=grace_s)
+    except subprocess.TimeoutExpired:
+        try:
+            if pgid is not None and pgid != os.getpgid(0):
+                os.killpg(pgid, signal.SIGKILL)
+            else:
+                proc.kill()
+        except Exception:
+            pass
+    except Exception:
+        pass
+
+
+# ---------------------------------------------------------------------------
+# Backends
+# ---------------------------------------------------------------------------
+
+class InProcessBackend:
+    """Runner läuft als Funktion im Scheduler-Thread: runner(job, ctx) -> result dict."""
+
+    def __init__(self, runner: Callable[[dict, JobContext], Optional[dict]]):
+        self.runner = runner
+
+    def run(self, job: dict, ctx: JobContext) -> Optional[dict]:
+        return self.runner(job, ctx)
+
+
+class SubprocessBackend:
+    """Startet pro Job einen Worker-Prozess und liest `@@dynamics`-Zeilen mit.
+
+    build_cmd(job) -> (cmd, cwd). Alle anderen Zeilen werden durchgereicht (Logs).
+    """
+
+    def __init__(self, build_cmd: Callable[[dict], tuple], env: Optional[dict] = None):
+        self.build_cmd = build_cmd
+        self.env = env
+
+    def run(self, job: dict, ctx: JobContext) -> Optional[dict]:
+        cmd, cwd = self.build_cmd(job)
+        env = dict(self.env or os.environ)
+        env.setdefault("PYTHONUNBUFFERED", "1")  # Logs und @@dynamics-Zeilen in Reihenfolge
+        proc = subprocess.Popen(
+            cmd, cwd=cwd, env=env,
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1,
+            start_new_session=True,  # eigene Prozessgruppe → Abbruch killt auch Kinder
+        )
+        ctx.register_process(proc)
+        ctx._scheduler.store.update(job["id"], backend_ref={"pid": proc.pid})
+        result = None
+        for line in proc.stdout:
+            if line.startswith(PROGRESS_PREFIX):
+                try:
+                    msg = json.loads(line[len(PROGRESS_PREFIX):])
+                except ValueError:
+                    continue
+                if "stage" in msg:
+                    ctx._scheduler._on_stage(job["id"], msg["stage"])
+                if "progress" in msg:
+                    ctx.set_progress(msg["progress"])
+                if "features" in msg:
+                    ctx.set_features(**msg["features"])
+                if "result" in msg:
+                    result = msg["result"]
+            else:
+                sys.stdout.write(line)
+        rc = proc.wait()
+        ctx.check_cancelled()
+        if rc != 0:
+            raise RuntimeError(f"Worker beendet mit Code {rc}")
+        return result
+
+
+# ---------------------------------------------------------------------------
+# Scheduler
+# ---------------------------------------------------------------------------
+
+class JobScheduler:
+    def __init__(
+        self,
+        store,
+        backend,
+        max_concurrent: int = 1,
+        per_user_limit: int = 1,
+        stage_seconds: Optional[Callable[[dict], Dict[str, float]]] = None,
+        on_finished: Optional[Callable[[dict], None]] = None,
+        poll_s: float = 0.5,
+    ):
+        self.store = store
+        self.backend = backend
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.per_user_limit = max(1, int(per_user_limit))
+        self._stage_seconds = stage_seconds
+        self._on_finished = on_finished
+        self._poll_s = poll_s
+        self._running: Dict[str, JobContext] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # --- Lifecycle ---
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        # Jobs, die beim letzten Prozessende noch liefen, neu einreihen
+        for job in self.store.list(status=RUNNING, limit=1000):
+            self.store.update_if(job["id"], RUNNING, status=QUEUED, stage=None, stage_progress=0.0, stages={},
+                                 error="requeued after restart")
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._dispatch_loop, name="dynamics-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, cancel_running: bool = False):
+        self._stop.set()
+        self._wake.set()
+        if cancel_running:
+            for job_id in list(self._running):
+                self.cancel(job_id)
+        if self._thread:
+            self._thread.join(timeout=10)
+
+    # --- API ---
+    def submit(self, avatar_id: str, dynamics_id: str, parameters: dict,
+               user_id: Optional[str] = None, priority: str = "standard") -> dict:
+        job = new_job(avatar_id, dynamics_id, parameters, user_id=user_id, priority=priority)
+        if self._stage_seconds:
+            try:
+                expected = self._stage_seconds(job)
+                job["expected_stage_seconds"] = {s: float(expected.get(s, 0.0)) for s in STAGES}
+                job["eta_seconds"] = int(sum(job["expected_stage_seconds"].values()))
+            except Exception as e:
+                print(f"⚠️ Stage-Schätzung fehlgeschlagen: {e}")
+        self.store.create(job)
+        print(f"🗂️ Job {job['id']} eingereiht ({job['priority']}, user={user_id})")
+        self._wake.set()
+        return job
+
+    def get(self, job_id: str) -> Optional[dict]:
+        job = self.store.get(job_id)
+        if job and job["status"] == RUNNING:
+            job.update(compute_progress(job))
+        if job and job["status"] == QUEUED:
+            job["queue_position"] = self._queue_position(job)
+        return job
+
+    def cancel(self, job_id: str) -> Optional[dict]:
+        job = self.store.get(job_id)
+        if job is None or job["status"] in FINAL_STATES:
+            return job
+        with self._lock:
+            ctx = self._running.get(job_id)
+        if ctx is None:
+            cancelled = self.store.update_if(job_id, QUEUED, status=CANCELLED, finished_at=time.time(),
+                                             eta_seconds=0)
+            if cancelled is not None:
+                return cancelled
+            # inzwischen vom Dispatcher übernommen (oder schon final)
+            with self._lock:
+                ctx = self._running.get(job_id)
+            if ctx is None:
+                return self.store.get(job_id)
+        ctx.cancel_event.set()
+        threading.Thread(target=ctx.kill_processes, daemon=True).start()
+        return self.store.update(job_id, cancel_requested=True)
+
+    # --- Dispatch ---
+    def _queue_position(self, job: dict) -> int:
+        queued = self.store.list(status=QUEUED, limit=1000)
+        for i, j in enumerate(queued):
+            if j["id"] == job["id"]:
+                return i
+        return len(queued)
+
+    def _next_job(self) -> Optional[dict]:
+        with self._lock:
+            if len(self._running) >= self.max_concurrent:
+                return None
+            per_user: Dict[str, int] = {}
+            for ctx in self._running.values():
+                uid = ctx.user_id
+                if uid:
+                    per_user[uid] = per_user.get(uid, 0) + 1
+        for job in self.store.list(status=QUEUED, limit=200):
+            uid = job.get("user_id")
+            if uid and per_user.get(uid, 0) >= self.per_user_limit:
+                continue
+            return job
+        return None
+
+    def _dispatch_loop(self):
+        while not self._stop.is_set():
+            job = self._next_job()
+            if job is None:
+                self._wake.wait(self._poll_s)
+                self._wake.clear()
+                continue
+            ctx = JobContext(self, job["id"], user_id=job.get("user_id"))
+            with self._lock:
+                self._running[job["id"]] = ctx
+            # nur wenn noch QUEUED – ein Abbruch seit _next_job() gewinnt
+            if start_job(self.store, job["id"]) is None:
+                with self._lock:
+                    self._running.pop(job["id"], None)
+                continue
+            threading.Thread(target=self._run_job, args=(job, ctx), name=f"dynamics-job-{job['id'][:8]}",
+                             daemon=True).start()
+
+    def _run_job(self, job: dict, ctx: JobContext):
+        status, error, result = SUCCEEDED, None, None
+        try:
+            result = self.backend.run(job, ctx)
+            ctx.check_cancelled()
+        except JobCancelled:
+            status = CANCELLED
+        except Exception as e:
+            status = CANCELLED if ctx.cancelled else FAILED
+            error = str(e)
+            if status == FAILED:
+                traceback.print_exc()
+        finally:
+            with self._lock:
+                self._running.pop(job["id"], None)
+        final = finish_job(self.store, job["id"], status, error=error, result=result)
+        icon = {"succeeded": "✅", "cancelled": "🛑"}.get(status, "❌")
+        print(f"{icon} Job {job['id']} {status}" + (f": {error}" if error else ""))
+        if self._on_finished and final:
+            try:
+                self._on_finished(final)
+            except Exception as e:
+                print(f"⚠️ on_finished fehlgeschlagen: {e}")
+        self._wake.set()
+
+    # --- Fortschritt (vom Backend/Context) ---
+    def _on_stage(self, job_id: str, stage: str):
+        apply_stage(self.store, job_id, stage)
+
+    def _on_progress(self, job_id: str, fraction: float):
+        apply_progress(self.store, job_id, fraction)
+
@@ -0,0 +1,560 @@
+"""Media-Fetch: Hero-Video/-Image streamend auf Platte statt komplett in den RAM.
+
+- Download in Chunks direkt in eine `.part`-Datei, harte Größengrenze
+- Content-Type (Header + Magic Bytes) wird vor dem Body geprüft – bei
+  generischen Typen (octet-stream) müssen die Magic Bytes passen; Dauer aus
+  dem `mvhd`-Atom, sobald `moov` im Stream auftaucht (faststart → nach
+  wenigen KB, sonst nach dem Download); Video ohne ermittelbare Dauer wird abgelehnt
+- Abbruch mitten im Download → Fortsetzung per `Range: bytes=N-` (If-Range)
+- optional läuft ffmpeg schon während des Downloads auf `pipe:0`, wenn der
+  Container das erlaubt (MP4 mit moov vor mdat, Matroska/WebM, MPEG-TS);
+  schlägt das fehl, läuft ffmpeg danach noch einmal auf der fertigen Datei
+- `MediaCache`: gemeinsamer lokaler Cache über Jobs/Requests hinweg,
+  Revalidierung per If-None-Match/If-Modified-Since (304 → kein Body)
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import struct
+import subprocess
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+CHUNK_SIZE = 1024 * 1024
+DEFAULT_MAX_BYTES = int(float(os.getenv("MEDIA_MAX_MB", "500")) * 1024 * 1024)
+HEAD_SCAN_BYTES = 4 * 1024 * 1024  # so weit wird nach moov/mvhd gesucht
+
+_ALLOWED_TYPES = {
+    "video": ("video/", "application/mp4", "application/octet-stream", "binary/octet-stream"),
+    "image": ("image/", "application/octet-stream", "binary/octet-stream"),
+}
+# sagen nichts über den Inhalt → Magic Bytes müssen passen
+_GENERIC_TYPES = ("application/octet-stream", "binary/octet-stream")
+
+
+class MediaFetchError(RuntimeError):
+    """Quelle unbrauchbar (HTTP-Fehler, falscher Typ, zu groß, zu lang)."""
+
+
+# ---------------------------------------------------------------------------
+# Container-Erkennung
+# ---------------------------------------------------------------------------
+
+def sniff_kind(head: bytes) -> Optional[str]:
+    """'video' / 'image' anhand der Magic Bytes, None wenn unbekannt."""
+    if len(head) >= 8 and head[4:8] in (b"ftyp", b"moov", b"mdat", b"free", b"wide", b"skip"):
+        return "video"
+    if head.startswith(b"\x1a\x45\xdf\xa3") or head[:1] == b"\x47":  # Matroska/WebM, MPEG-TS
+        return "video"
+    if head[:4] == b"RIFF" and head[8:12] == b"AVI ":
+        return "video"
+    if head.startswith((b"\xff\xd8\xff", b"\x89PNG", b"GIF8")) or (head[:4] == b"RIFF" and head[8:12] == b"WEBP"):
+        return "image"
+    return None
+
+
+def iter_boxes(buf: bytes, start: int, end: int):
+    """(type, box_start, header_len, size) der ISO-BMFF-Boxen in buf[start:end]."""
+    pos = start
+    while pos + 8 <= end:
+        size, btype = struct.unpack(">I4s", buf[pos:pos + 8])
+        header = 8
+        if size == 1:
+            if pos + 16 > end:
+                return
+            size = struct.unpack(">Q", buf[pos + 8:pos + 16])[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header:
+            return
+        yield btype.decode("latin-1"), pos, header, size
+        pos += size
+
+
+def _mvhd_duration(moov: bytes) -> Optional[float]:
+    for btype, pos, header, size in iter_boxes(moov, 0, len(moov)):
+        if btype != "mvhd":
+            continue
+        body = moov[pos + header:pos + size]
+        if len(body) < 20:
+            return None
+        if body[0] == 1:
+            timescale, duration = struct.unpack(">IQ", body[20:32])
+        else:
+            timescale, duration = struct.unpack(">II", body[12:20])
+        return duration / timescale if timescale else None
+    return None
+
+
+def mp4_layout(head: bytes) -> dict:
+    """Top-Level-Layout aus den ersten Bytes.
+
+    Returns {"mp4": bool, "moov_first": True/False/None, "duration_s": float|None};
+    moov_first None = noch nicht entscheidbar (mehr Bytes nötig).
+    """
+    out = {"mp4": len(head) >= 8 and head[4:8] == b"ftyp", "moov_first": None, "duration_s": None}
+    if not out["mp4"]:
+        return out
+    for btype, pos, header, size in iter_boxes(head, 0, len(head)):
+        if btype == "mdat":
+            out["moov_first"] = False
+            break
+        if btype == "moov":
+            if pos + size <= len(head):
+                out["moov_first"] = True
+                out["duration_s"] = _mvhd_duration(head[pos + header:pos + size])
+            break
+    return out
+
+
+def read_moov(path: str) -> Optional[bytes]:
+    """Payload der moov-Box einer fertigen Datei (moov darf am Ende liegen)."""
+    try:
+        with open(path, "rb") as f:
+            file_size = os.fstat(f.fileno()).st_size
+            pos = 0
+            while pos + 8 <= file_size:
+                f.seek(pos)
+                hdr = f.read(16)
+                size, btype = struct.unpack(">I4s", hdr[:8])
+                header = 8
+                if size == 1:
+                    size, header = struct.unpack(">Q", hdr[8:16])[0], 16
+                elif size == 0:
+                    size = file_size - pos
+                if size < header:
+                    return None
+                if btype == b"moov":
+                    f.seek(pos + header)
+                    return f.read(size - header)
+                pos += size
+    except (OSError, struct.error):
+        return None
+    return None
+
+
+def mp4_file_duration(path: str) -> Optional[float]:
+    moov = read_moov(path)
+    return _mvhd_duration(moov) if moov else None
+
+
+def probe_duration(path: str, ffmpeg_bin: str = "ffmpeg") -> Optional[float]:
+    """Dauer in Sekunden – mvhd für MP4/MOV, sonst `ffmpeg -i` (kein ffprobe nötig)."""
+    duration = mp4_file_duration(path)
+    if duration is not None:
+        return duration
+    try:
+        proc = subprocess.run([ffmpeg_bin, "-hide_banner", "-i", path], capture_output=True, text=True, timeout=30)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    m = re.search(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)", proc.stderr)
+    if not m:
+        return None
+    return int(m.group(1)) * 3600 + int(m.group(2)) * 60 + float(m.group(3))
+
+
+# ---------------------------------------------------------------------------
+# Cache
+# ---------------------------------------------------------------------------
+
+_KEY_LOCKS: Dict[tuple, threading.Lock] = {}
+_KEY_LOCKS_GUARD = threading.Lock()
+
+
+def _url_key(url: str) -> str:
+    # Query (z.B. Firebase-Token) gehört nicht zur Identität – Revalidierung per ETag sichert ab
+    parts = urlsplit(url)
+    return hashlib.sha256(urlunsplit((parts.scheme, parts.netloc, parts.path, "", "")).encode("utf-8")).hexdigest()
+
+
+class MediaCache:
+    """Lokaler Download-Cache: blobs/<key> + index/<key>.json (ETag, Last-Modified, Größe).
+
+    Mehrere Prozesse dürfen denselben Root nutzen (tmp-Datei + rename); LRU
+    über die mtime der Blobs.
+    """
+
+    def __init__(self, root: str, max_bytes: int = 10 * 1024 ** 3):
+        self.root = root
+        self.max_bytes = int(max_bytes)
+        self._blobs = os.path.join(root, "blobs")
+        self._index = os.path.join(root, "index")
+        os.makedirs(self._blobs, exist_ok=True)
+        os.makedirs(self._index, exist_ok=True)
+
+    def lock(self, key: str) -> threading.Lock:
+        # prozessweit pro (root, key): parallele Requests auf dieselbe URL laden nur einmal
+        with _KEY_LOCKS_GUARD:
+            return _KEY_LOCKS.setdefault((os.path.abspath(self.root), key), threading.Lock())
+
+    def blob_path(self, key: str) -> str:
+        return os.path.join(self._blobs, key)
+
+    def lookup(self, key: str) -> Optional[dict]:
+        try:
+            with open(os.path.join(self._index, f"{key}.json"), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        path = self.blob_path(key)
+        if not os.path.exists(path) or os.path.getsize(path) != entry.get("bytes"):
+            return None
+        return {**entry, "path": path}
+
+    def store(self, key: str, src: str, entry: dict) -> str:
+        """Fertigen Download übernehmen (rename, kein Kopieren)."""
+        path = self.blob_path(key)
+        os.replace(src, path)
+        tmp = os.path.join(self._index, f".{key}.{uuid.uuid4().hex}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp, os.path.join(self._index, f"{key}.json"))
+        self.evict()
+        return path
+
+    def touch(self, key: str):
+        try:
+            os.utime(self.blob_path(key))
+        except OSError:
+            pass
+
+    def evict(self) -> int:
+        blobs = []
+        for name in os.listdir(self._blobs):
+            if name.endswith(".part"):
+                continue  # laufender Download
+            p = os.path.join(self._blobs, name)
+            try:
+                st = os.stat(p)
+            except OSError:
+                continue
+            blobs.append((st.st_mtime, name, st.st_size))
+        total = sum(s for _, _, s in blobs)
+        removed = 0
+        for _, name, size in sorted(blobs):
+            if total <= self.max_bytes:
+                break
+            for p in (os.path.join(self._blobs, name), os.path.join(self._index, f"{name}.json")):
+                try:
+                    os.remove(p)
+                except OSError:
+                    pass
+            total -= size
+            removed += 1
+        return removed
+
+
+def default_cache() -> MediaCache:
+    return MediaCache(
+        os.getenv("MEDIA_CACHE_DIR", "/tmp/media_cache"),
+        max_bytes=int(float(os.getenv("MEDIA_CACHE_MAX_GB", "5")) * 1024 ** 3),
+    )
+
+
+# ---------------------------------------------------------------------------
+# ffmpeg während des Downloads
+# ---------------------------------------------------------------------------
+
+class _PipeFeeder:
+    """Liest die wachsende .part-Datei nach und schreibt sie in ffmpeg-stdin.
+
+    Der Download wird nie durch ffmpeg gebremst; beendet sich ffmpeg früher
+    (z.B. `-t 10`), wird einfach nicht mehr nachgeschoben.
+    """
+
+    def __init__(self, cmd: List[str], part_path: str):
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                     stderr=subprocess.PIPE)
+        self._part = part_path
+        self._written = 0
+        self._done = False
+        self._aborted = False
+        self._cond = threading.Condition()
+        self._stderr = b""
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._err_thread = threading.Thread(target=self._drain_stderr, daemon=True)
+        self._err_thread.start()
+
+    def _drain_stderr(self):
+        self._stderr = self.proc.stderr.read()
+
+    def advance(self, written: int):
+        with self._cond:
+            self._written = written
+            self._cond.notify()
+
+    def finish(self):
+        with self._cond:
+            self._done = True
+            self._cond.notify()
+
+    def abort(self):
+        self._aborted = True
+        self.finish()
+        try:
+            self.proc.kill()
+        except OSError:
+            pass
+
+    def _run(self):
+        offset = 0
+        try:
+            with open(self._part, "rb") as f:
+                while not self._aborted:
+                    with self._cond:
+                        while offset >= self._written and not self._done:
+                            self._cond.wait(0.5)
+                        limit, done = self._written, self._done
+                    while offset < limit:
+                        data = f.read(min(CHUNK_SIZE, limit - offset))
+                        if not data:
+                            break
+                        self.proc.stdin.write(data)
+                        offset += len(data)
+                    if done and offset >= limit:
+                        break
+        except (BrokenPipeError, OSError, ValueError):
+            pass  # ffmpeg hat genug gelesen oder ist abgestürzt
+        finally:
+            try:
+                self.proc.stdin.close()
+            except OSError:
+                pass
+
+    def wait(self, timeout: Optional[float] = None) -> dict:
+        self._thread.join(timeout)
+        rc = self.proc.wait(timeout)
+        self._err_thread.join(5)
+        return {"returncode": rc, "stderr": self._stderr.decode("utf-8", "replace")}
+
+
+def _render(cmd: List[str], source: str) -> List[str]:
+    return [source if part == "{input}" else part for part in cmd]
+
+
+def _run_ffmpeg(cmd: List[str], path: str) -> dict:
+    proc = subprocess.run(_render(cmd, path), capture_output=True)
+    return {"returncode": proc.returncode, "stderr": proc.stderr.decode("utf-8", "replace")}
+
+
+# ---------------------------------------------------------------------------
+# Fetch
+# ---------------------------------------------------------------------------
+
+def _check_type(kind: Optional[str], content_type: str, head: bytes, url: str):
+    if not kind:
+        return
+    ctype = (content_type or "").split(";")[0].strip().lower()
+    sniffed = sniff_kind(head)
+    if ctype and not ctype.startswith(_ALLOWED_TYPES[kind]):
+        raise MediaFetchError(f"Falscher Content-Type '{ctype}' für {kind}: {url.split('?', 1)[0]}")
+    if head and sniffed and sniffed != kind:
+        raise MediaFetchError(f"Datei ist kein {kind} (erkannt: {sniffed})")
+    if head and sniffed is None and (not ctype or ctype in _GENERIC_TYPES):
+        raise MediaFetchError(f"Datei ist kein {kind} (Content-Type '{ctype or '-'}', Format unbekannt)")
+
+
+def fetch_media(
+    url: str,
+    kind: Optional[str] = "video",
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    max_duration_s: Optional[float] = None,
+    cache: Optional[MediaCache] = None,
+    dest: Optional[str] = None,
+    ffmpeg_cmd: Optional[List[str]] = None,
+    ffmpeg_bin: str = "ffmpeg",
+    timeout: float = 60.0,
+    retries: int = 3,
+    chunk_size: int = CHUNK_SIZE,
+    session=None,
+) -> dict:
+    """URL nach Platte holen (Cache → Datei), optional ffmpeg parallel dazu.
+
+    ffmpeg_cmd: Kommando mit "{input}" als Platzhalter; läuft auf pipe:0
+    während des Downloads, wenn der Container streambar ist, sonst danach
+    auf der Datei. Ohne cache landet die Datei in dest (Pflicht).
+
+    Returns {"path", "bytes", "content_type", "duration_s", "cached",
+             "resumed", "elapsed_s", "ffmpeg": {"returncode", "stderr", "streamed"}}
+    """
+    import requests
+
+    if cache is None and not dest:
+        raise ValueError("dest oder cache erforderlich")
+    http = session or requests
+    t0 = time.perf_counter()
+    key = _url_key(url)
+    lock = cache.lock(key) if cache else threading.Lock()
+
+    with lock:
+        entry = cache.lookup(key) if cache else None
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        part = (cache.blob_path(key) if cache else dest) + f".{uuid.uuid4().hex[:8]}.part"
+        written, resumed = 0, 0
+        content_type = ""
+        etag = last_modified = None
+        head = b""
+        layout = {"mp4": False, "moov_first": None, "duration_s": None}
+        feeder: Optional[_PipeFeeder] = None
+        feeder_broken = False
+        resp = None
+        try:
+            attempt = 0
+            while True:
+                attempt += 1
+                req_headers = dict(headers)
+                if written:
+                    req_headers = {"Range": f"bytes={written}-"}
+                    if etag or last_modified:
+                        req_headers["If-Range"] = etag or last_modified
+                try:
+                    if resp is not None:
+                        resp.close()
+                    resp = http.get(url, headers=req_headers, stream=True, timeout=timeout)
+                    if resp.status_code == 304 and entry:
+                        resp.close()
+                        cache.touch(key)
+                        if dest:
+                            _link_or_copy(entry["path"], dest)
+                        result = {
+                            "path": dest or entry["path"], "bytes": entry["bytes"],
+                            "content_type": entry.get("content_type", ""),
+                            "duration_s": entry.get("duration_s"), "cached": True, "resumed": 0,
+                        }
+                        _check_duration(result["duration_s"], max_duration_s)
+                        if ffmpeg_cmd:
+                            result["ffmpeg"] = {**_run_ffmpeg(ffmpeg_cmd, result["path"]), "streamed": False}
+                        result["elapsed_s"] = time.perf_counter() - t0
+                        return result
+                    if resp.status_code >= 400:
+                        raise MediaFetchError(f"HTTP {resp.status_code} beim Laden von {url.split('?', 1)[0]}")
+                    if written and resp.status_code != 206:
+                        # Server ignoriert Range (oder Datei geändert) → von vorne
+                        written = 0
+                        head = b""
+                        if feeder:
+                            feeder.abort()
+                            feeder, feeder_broken = None, True
+                    if not written:
+                        content_type = resp.headers.get("Content-Type", "")
+                        etag = resp.headers.get("ETag")
+                        last_modified = resp.headers.get("Last-Modified")
+                        length = resp.headers.get("Content-Length")
+                        if length and int(length) > max_bytes:
+                            raise MediaFetchError(
+                                f"Datei zu groß: {int(length) / 1e6:.1f} MB > {max_bytes / 1e6:.0f} MB"
+                            )
+                        _check_type(kind, content_type, b"", url)
+                    else:
+                        resumed += 1
+                        print(f"🔁 Download fortgesetzt ab {written / 1e6:.1f} MB")
+                    with open(part, "r+b" if written else "wb") as f:
+                        f.seek(written)
+                        f.truncate()
+                        for data in resp.iter_content(chunk_size=chunk_size):
+                            if not data:
+                                continue
+                            if written + len(data) > max_bytes:
+                                raise MediaFetchError(f"Datei zu groß: > {max_bytes / 1e6:.0f} MB")
+                            f.write(data)
+                            f.flush()
+                            written += len(data)
+                            if len(head) < HEAD_SCAN_BYTES and layout["moov_first"] is None:
+                                head = (head + data)[:HEAD_SCAN_BYTES]
+                                if written == len(data):  # erster Chunk: Magic Bytes prüfen
+                                    _check_type(kind, content_type, head, url)
+                                layout = mp4_layout(head)
+                                _check_duration(layout["duration_s"], max_duration_s)
+                                if ffmpeg_cmd and feeder is None and not feeder_broken and _streamable(head, layout):
+                                    feeder = _PipeFeeder(_render(ffmpeg_cmd, "pipe:0"), part)
+                            if feeder:
+                                feeder.advance(written)
+                    break
+                except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                    if attempt >= retries:
+                        raise MediaFetchError(f"Download fehlgeschlagen nach {attempt} Versuchen: {e}")
+                    print(f"⚠️ Download unterbrochen ({e}) – Versuch {attempt + 1}/{retries}")
+                    time.sleep(min(4.0, 0.5 * 2 ** (attempt - 1)))
+
+            if written == 0:
+                raise MediaFetchError("Leere Antwort")
+            duration = layout["duration_s"]
+            if duration is None and kind == "video":
+                duration = probe_duration(part, ffmpeg_bin)
+                if duration is None:
+                    raise MediaFetchError("Videodauer nicht ermittelbar – keine lesbare Videodatei")
+            _check_duration(duration, max_duration_s)
+
+            ff = None
+            if feeder:
+                feeder.finish()
+                ff = {**feeder.wait(), "streamed": True}
+                feeder = None
+
+            meta = {
+                "url": url.split("?", 1)[0], "etag": etag, "last_modified": last_modified,
+                "bytes": written, "content_type": content_type, "duration_s": duration,
+                "fetched_at": time.time(),
+            }
+            if cache:
+                # ohne ETag/Last-Modified wird beim nächsten Mal einfach neu geladen
+                path = cache.store(key, part, meta)
+                if dest:
+                    _link_or_copy(path, dest)
+                    path = dest
+            else:
+                path = dest
+                os.replace(part, path)
+
+            if ffmpeg_cmd and (ff is None or ff["returncode"] != 0):
+                if ff is not None:
+                    print("⚠️ ffmpeg auf dem Stream fehlgeschlagen – erneut auf der fertigen Datei")
+                ff = {**_run_ffmpeg(ffmpeg_cmd, path), "streamed": False}
+            result = {**meta, "path": path, "cached": False, "resumed": resumed}
+            if ff is not None:
+                result["ffmpeg"] = ff
+            result["elapsed_s"] = time.perf_counter() - t0
+            return result
+        finally:
+            if resp is not None:
+                resp.close()
+            if feeder:
+                feeder.abort()
+            if os.path.exists(part):
+                try:
+                    os.remove(part)
+                except OSError:
+                    pass
+
+
+def _streamable(head: bytes, layout: dict) -> bool:
+    if layout["mp4"]:
+        return layout["moov_first"] is True
+    # Matroska/WebM und MPEG-TS lassen sich sequentiell lesen
+    return head.startswith(b"\x1a\x45\xdf\xa3") or head[:1] == b"\x47"
+
+
+def _check_duration(duration: Optional[float], max_duration_s: Optional[float]):
+    if max_duration_s and duration and duration > max_duration_s:
+        raise MediaFetchError(f"Video zu lang: {duration:.1f}s > {max_duration_s:.0f}s")
+
+
+def _link_or_copy(src: str, dst: str):
+    try:
+        if os.path.exists(dst):
+            os.remove(dst)
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
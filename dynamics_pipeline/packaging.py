@@ -0,0 +1,203 @@
+"""Media-Packaging für Dynamics: ein Decode, ein Encode, alle Artefakte.
+
+Bisher wurde der LivePortrait-Output fünfmal angefasst (Re-Encode 25fps,
+Frame-Extraktion, Hero-Frame, drei Chunk-Encodes). Hier läuft EIN ffmpeg:
+
+    [0:v] fps=25,yuv420p ─ split ─┬─ libx264 (GOP 2s, Keyframes an den Chunk-Grenzen)
+                                  │     └─ tee ─┬─ idle.mp4 (faststart)
+                                  │             └─ segment (stream copy) → idle_chunk1..3.mp4
+                                  ├─ hero.jpg (erster Frame)
+                                  └─ rawvideo rgb24 → stdout → numpy → frames.zip (im Speicher)
+
+Die Chunks sind Stream-Copies des Idle-Videos; dafür werden Keyframes exakt
+auf die Chunk-Grenzen gelegt (GOP 50 @ 25fps + force_key_frames).
+Die Frames kommen als Rohdaten über die Pipe (keine PNG-Zwischendateien);
+ZIP und Latents baut dynamics_pipeline.frames daraus im Speicher.
+"""
+import os
+import subprocess
+import tempfile
+import time
+from typing import List, Optional, Sequence, Tuple
+
+from dynamics_pipeline.frames import frames_zip_bytes, probe_video_size, read_raw_frames
+
+
+def _fmt_times(times: Sequence[float]) -> str:
+    return ",".join(f"{t:g}" for t in times)
+
+
+def build_package_cmd(
+    ffmpeg_bin: str,
+    src: str,
+    idle_path: str,
+    chunk_pattern: Optional[str],
+    hero_path: Optional[str],
+    frames_pipe: bool,
+    fps: int = 25,
+    crf: int = 18,
+    preset: str = "slow",
+    gop_seconds: float = 2.0,
+    chunk_bounds: Sequence[float] = (2.0, 6.0),
+    frame_count: int = 25,
+) -> List[str]:
+    """ffmpeg-Kommando für den Single-Pass (ohne Ausführung, z.B. für Logs)."""
+    branches = ["enc"]
+    if hero_path:
+        branches.append("hero")
+    if frames_pipe:
+        branches.append("frames")
+    graph = f"[0:v]fps={fps},format=yuv420p"
+    if len(branches) > 1:
+        graph += f",split={len(branches)}" + "".join(f"[{b}]" for b in branches)
+    else:
+        graph += "[enc]"
+
+    gop = max(1, int(round(fps * gop_seconds)))
+    cmd = [
+        ffmpeg_bin, "-y", "-v", "error",
+        "-i", src,
+        "-filter_complex", graph,
+        "-map", "[enc]", "-an",
+        "-c:v", "libx264", "-preset", preset, "-crf", str(crf),
+        "-pix_fmt", "yuv420p",
+        "-g", str(gop), "-keyint_min", str(gop), "-sc_threshold", "0",
+        "-force_key_frames", _fmt_times([0.0, *chunk_bounds]),
+    ]
+    if chunk_pattern:
+        outputs = [f"[f=mp4:movflags=+faststart]{idle_path}"]
+        outputs.append(
+            "[f=segment:segment_times={}:reset_timestamps=1:segment_format=mp4:"
+            "segment_format_options=movflags=+faststart]{}".format(
+                _fmt_times(chunk_bounds), chunk_pattern
+            )
+        )
+        cmd += ["-f", "tee", "|".join(outputs)]
+    else:
+        cmd += ["-movflags", "+faststart", idle_path]
+    if hero_path:
+        cmd += ["-map", "[hero]", "-frames:v", "1", "-q:v", "2", hero_path]
+    if frames_pipe:
+        cmd += ["-map", "[frames]", "-frames:v", str(frame_count),
+                "-f", "rawvideo", "-pix_fmt", "rgb24", "pipe:1"]
+    return cmd
+
+
+def _run_package(cmd: List[str], frame_size: Optional[Tuple[int, int]], frame_count: int):
+    """ffmpeg ausführen; bei frame_size die Rohframes von stdout lesen.
+
+    stderr geht in eine Temp-Datei, damit ffmpeg nicht auf einer vollen
+    stderr-Pipe blockiert, während wir stdout lesen.
+    Returns (returncode, stderr, frames|None).
+    """
+    if not frame_size:
+        res = subprocess.run(cmd, capture_output=True, text=True)
+        return res.returncode, res.stderr, None
+    with tempfile.TemporaryFile() as err:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=err)
+        try:
+            frames = read_raw_frames(proc.stdout, frame_size[0], frame_size[1], frame_count)
+            proc.stdout.read()  # Rest verwerfen, falls ffmpeg mehr liefert
+        finally:
+            proc.stdout.close()
+            proc.wait()
+        err.seek(0)
+        return proc.returncode, err.read().decode("utf-8", "replace"), frames
+
+
+def _segment_copy(ffmpeg_bin: str, idle_path: str, chunk_pattern: str, chunk_bounds: Sequence[float]) -> bool:
+    """Fallback ohne tee: Chunks per Stream-Copy aus dem fertigen idle.mp4 schneiden."""
+    res = subprocess.run([
+        ffmpeg_bin, "-y", "-v", "error",
+        "-i", idle_path,
+        "-map", "0:v", "-c", "copy",
+        "-f", "segment", "-segment_times", _fmt_times(chunk_bounds),
+        "-reset_timestamps", "1",
+        "-segment_format_options", "movflags=+faststart",
+        chunk_pattern,
+    ], capture_output=True, text=True)
+    if res.returncode != 0:
+        print(f"⚠️ Segment-Copy fehlgeschlagen: {res.stderr[-500:]}")
+    return res.returncode == 0
+
+
+def package_idle_media(
+    src: str,
+    out_dir: str,
+    prefix: str,
+    ffmpeg_bin: str = "ffmpeg",
+    fps: int = 25,
+    crf: int = 18,
+    preset: str = "slow",
+    chunk_bounds: Sequence[float] = (2.0, 6.0),
+    frame_count: int = 25,
+    with_hero: bool = True,
+    with_frames: bool = True,
+    keep_frames: bool = False,
+) -> dict:
+    """LivePortrait-Output in einem ffmpeg-Lauf paketieren.
+
+    Returns dict mit idle_path, chunk_paths, hero_path, frames_zip_path,
+    frames (numpy [N, H, W, 3] uint8, nur bei keep_frames, sonst None) und elapsed_s.
+    Wirft RuntimeError, wenn nicht einmal idle.mp4 entsteht.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    idle_path = os.path.join(out_dir, f"{prefix}_idle.mp4")
+    chunk_pattern = os.path.join(out_dir, f"{prefix}_idle_seg%d.mp4") if chunk_bounds else None
+    hero_path = os.path.join(out_dir, f"{prefix}_hero_chunk.jpg") if with_hero else None
+
+    t0 = time.perf_counter()
+    frame_size = probe_video_size(src, ffmpeg_bin) if with_frames else None
+    if with_frames and not frame_size:
+        print(f"⚠️ Videogröße von {src} unbekannt – Frames/ZIP werden übersprungen")
+    cmd = build_package_cmd(
+        ffmpeg_bin, src, idle_path, chunk_pattern, hero_path, bool(frame_size),
+        fps=fps, crf=crf, preset=preset, chunk_bounds=chunk_bounds, frame_count=frame_count,
+    )
+    returncode, stderr, frames = _run_package(cmd, frame_size, frame_count)
+    if returncode != 0 and chunk_pattern:
+        # Ältere ffmpeg-Builds ohne tee/segment-Optionen: Idle encoden, Chunks danach kopieren
+        print(f"⚠️ Single-Pass (tee) fehlgeschlagen, Fallback: {stderr[-500:]}")
+        cmd = build_package_cmd(
+            ffmpeg_bin, src, idle_path, None, hero_path, bool(frame_size),
+            fps=fps, crf=crf, preset=preset, chunk_bounds=chunk_bounds, frame_count=frame_count,
+        )
+        returncode, stderr, frames = _run_package(cmd, frame_size, frame_count)
+        if returncode == 0:
+            _segment_copy(ffmpeg_bin, idle_path, chunk_pattern, chunk_bounds)
+    if returncode != 0 or not os.path.exists(idle_path):
+        raise RuntimeError(f"Packaging fehlgeschlagen: {stderr[-1000:]}")
+
+    # segment zählt ab 0 → auf idle_chunk1..N umbenennen (bestehende Storage-Namen)
+    chunk_paths: List[str] = []
+    if chunk_pattern:
+        for i in range(len(chunk_bounds) + 1):
+            seg = chunk_pattern % i
+            if not os.path.exists(seg):
+                break
+            dst = os.path.join(out_dir, f"{prefix}_idle_chunk{i + 1}.mp4")
+            os.replace(seg, dst)
+            chunk_paths.append(dst)
+        if len(chunk_paths) != len(chunk_bounds) + 1:
+            print(f"⚠️ Erwartet {len(chunk_bounds) + 1} Chunks, erzeugt: {len(chunk_paths)}")
+            chunk_paths = []
+
+    frames_zip_path = None
+    if frames is not None and len(frames):
+        frames_zip_path = os.path.join(out_dir, f"{prefix}_frames.zip")
+        with open(frames_zip_path, "wb") as f:
+            f.write(frames_zip_bytes(frames))
+    if not keep_frames:
+        frames = None
+
+    if hero_path and not os.path.exists(hero_path):
+        hero_path = None
+
+    return {
+        "idle_path": idle_path,
+        "chunk_paths": chunk_paths,
+        "hero_path": hero_path,
+        "frames_zip_path": frames_zip_path,
+        "frames": frames if frames is not None and len(frames) else None,
+        "elapsed_s": time.perf_counter() - t0,
+    }
@@ -0,0 +1,433 @@
+"""Readiness pro Worker-Container: Weights + TensorRT-Engines einmal prüfen, dann warm.
+
+Bisher prüfte jeder Job grob die .pth-Dateien (Anzahl/Größe) und lud bei einem
+LivePortrait-Fehler ALLE Weights neu herunter und startete den Lauf erneut.
+Der ReadinessManager macht das einmal pro Container:
+
+    cold → validating (Weights per SHA-256 gegen Manifest, Engines gegen Engine-Manifest)
+         → warming (optional: Stub-/Warmup-Inferenz)
+         → ready | failed
+
+- Weights-Manifest wird beim Image-Build erzeugt (`python -m dynamics_pipeline.readiness
+  manifest <dir>`); ohne Manifest gilt die grobe Prüfung und das Manifest wird geschrieben
+- defekte Weights: nur die betroffenen Dateien neu laden (fetch_weights(files))
+- defekte/abgeschnittene TensorRT-Engines werden gelöscht (ORT baut sie neu),
+  statt den Job scheitern zu lassen
+- probe() liefert den Zustand für Readiness-Endpoints und die Worker-Registry
+- Cold/Warm-Timings der Jobs werden mitgeschrieben
+
+Worker-Registry (Memory / Firestore): Container melden ihren Probe-Zustand, die
+API erkennt daran warme, freie Worker (Routing und ETA ohne Cold-Start-Aufschlag).
+
+CLI:
+    python -m dynamics_pipeline.readiness manifest <dir> [--out F] [--pattern '**/*.pth']
+    python -m dynamics_pipeline.readiness check <weights_dir> [--engines DIR] [--warmup-cmd '...']
+"""
+import argparse
+import fnmatch
+import hashlib
+import json
+import os
+import shlex
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Iterable, List, Optional
+
+COLD, VALIDATING, WARMING, READY, FAILED = "cold", "validating", "warming", "ready", "failed"
+
+WEIGHT_PATTERNS = ("*.pth", "*.onnx", "*.pt", "*.safetensors")
+ENGINE_PATTERNS = ("*.engine", "*.profile", "*.timing")
+MANIFEST_VERSION = 1
+TIMING_HISTORY = 50
+
+
+def sha256_file(path: str, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def scan_files(root: str, patterns: Iterable[str]) -> List[str]:
+    """Relative Pfade (sortiert) aller Dateien unter root, deren Name auf ein Muster passt."""
+    patterns = tuple(patterns)
+    out = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if not d.startswith(".")]  # .cache von huggingface_hub
+        for name in filenames:
+            if any(fnmatch.fnmatch(name, p) for p in patterns):
+                out.append(os.path.relpath(os.path.join(dirpath, name), root))
+    return sorted(out)
+
+
+def build_manifest(root: str, patterns: Iterable[str], previous: Optional[dict] = None) -> dict:
+    """Manifest {files: {rel: {size, mtime_ns, sha256}}}; unveränderte Dateien (size+mtime) nicht neu hashen."""
+    old = (previous or {}).get("files", {})
+    files = {}
+    for rel in scan_files(root, patterns):
+        st = os.stat(os.path.join(root, rel))
+        prev = old.get(rel)
+        if prev and prev.get("size") == st.st_size and prev.get("mtime_ns") == st.st_mtime_ns:
+            files[rel] = prev
+        else:
+            files[rel] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns,
+                          "sha256": sha256_file(os.path.join(root, rel))}
+    return {"version": MANIFEST_VERSION, "created_at": time.time(), "files": files}
+
+
+def verify_manifest(root: str, manifest: dict) -> dict:
+    """Dateien gegen das Manifest prüfen (Größe, dann SHA-256) → {ok, missing, mismatched, checked}."""
+    missing, mismatched = [], []
+    for rel, entry in sorted(manifest.get("files", {}).items()):
+        path = os.path.join(root, rel)
+        if not os.path.isfile(path):
+            missing.append(rel)
+        elif os.path.getsize(path) != entry["size"] or sha256_file(path) != entry["sha256"]:
+            mismatched.append(rel)
+    return {"ok": not missing and not mismatched, "missing": missing, "mismatched": mismatched,
+            "checked": len(manifest.get("files", {}))}
+
+
+def load_manifest(path: Optional[str]) -> Optional[dict]:
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get("version") == MANIFEST_VERSION else None
+
+
+def save_manifest(path: str, manifest: dict):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+class ReadinessManager:
+    """Einmal pro Container: Weights/Engines prüfen (+ Warmup), danach nur noch probe()."""
+
+    def __init__(
+        self,
+        weights_dir: str,
+        weights_manifest: Optional[str] = None,
+        engine_dir: Optional[str] = None,
+        fetch_weights: Optional[Callable[[Optional[List[str]]], None]] = None,
+        warmup_cmd: Optional[List[str]] = None,
+        warmup_env: Optional[dict] = None,
+        warmup_timeout_s: float = 600.0,
+        weight_patterns: Iterable[str] = WEIGHT_PATTERNS,
+        engine_patterns: Iterable[str] = ENGINE_PATTERNS,
+        min_weight_files: int = 5,
+        worker_id: Optional[str] = None,
+    ):
+        self.weights_dir = weights_dir
+        self.weights_manifest = weights_manifest or os.path.join(weights_dir, ".weights.manifest.json")
+        self.engine_dir = engine_dir
+        self.engine_manifest = os.path.join(engine_dir, ".engines.manifest.json") if engine_dir else None
+        self.fetch_weights = fetch_weights
+        self.warmup_cmd = warmup_cmd
+        self.warmup_env = warmup_env
+        self.warmup_timeout_s = warmup_timeout_s
+        self.weight_patterns = tuple(weight_patterns)
+        self.engine_patterns = tuple(engine_patterns)
+        self.min_weight_files = min_weight_files
+        self.worker_id = worker_id or os.getenv("MODAL_TASK_ID") or f"worker-{uuid.uuid4().hex[:8]}"
+        self.state = COLD
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.ready_at: Optional[float] = None
+        self.timings: Dict[str, float] = {}
+        self.weights: dict = {}
+        self.engines: dict = {}
+        self.busy = 0
+        self.last_job_at: Optional[float] = None
+        self.job_timings: Dict[str, List[float]] = {"cold": [], "warm": []}
+        self._lock = threading.RLock()
+
+    # --- Lifecycle ---
+    def ensure_ready(self) -> dict:
+        """Blockiert bis ready/failed. Ready-Container kehren sofort zurück; failed versucht es erneut."""
+        with self._lock:
+            if self.state == READY:
+                return self.probe()
+            t0 = time.perf_counter()
+            self.timings = {}
+            self.error = None
+            try:
+                self.state = VALIDATING
+                self._validate_weights()
+                self._validate_engines()
+                if self.warmup_cmd:
+                    self.state = WARMING
+                    self._warmup()
+                self.state = READY
+                self.ready_at = time.time()
+            except Exception as e:
+                self.state = FAILED
+                self.error = str(e) or type(e).__name__
+                print(f"❌ Worker nicht bereit: {self.error}")
+            self.timings["ready_s"] = round(time.perf_counter() - t0, 3)
+            if self.state == READY:
+                print(f"✅ Worker bereit in {self.timings['ready_s']:.1f}s "
+                      f"({self.weights.get('checked', 0)} Weights, {self.engines.get('files', 0)} Engines)")
+            return self.probe()
+
+    def _timed(self, name: str, fn, *args):
+        t0 = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self.timings[name] = round(self.timings.get(name, 0.0) + time.perf_counter() - t0, 3)
+
+    def _fetch(self, files: Optional[List[str]]):
+        if not self.fetch_weights:
+            raise RuntimeError(f"Weights defekt und kein Download konfiguriert: {files or 'alle'}")
+        print(f"⬇️ Lade Weights neu: {', '.join(files) if files else 'alle'}")
+        self._timed("fetch_s", self.fetch_weights, files)
+
+    def _validate_weights(self):
+        manifest = load_manifest(self.weights_manifest)
+        res = None
+        if manifest:
+            res = self._timed("validate_weights_s", verify_manifest, self.weights_dir, manifest)
+            if not res["ok"]:
+                print(f"⚠️ Weights weichen vom Manifest ab: fehlend={res['missing']} defekt={res['mismatched']}")
+                self._fetch(res["missing"] + res["mismatched"])
+                res = self._timed("validate_weights_s", verify_manifest, self.weights_dir, manifest)
+                if not res["ok"]:
+                    raise RuntimeError(f"Weights nach Download weiterhin defekt: {res['missing'] + res['mismatched']}")
+        # Grobe Prüfung zusätzlich: ein Manifest über einen abgebrochenen Build-Download wäre "ok"
+        if not self._weights_plausible():
+            self._fetch(None)
+            if not self._weights_plausible():
+                raise RuntimeError(f"Weights unvollständig in {self.weights_dir}")
+            manifest = None
+        if manifest:
+            self.weights = {**res, "manifest": "verified"}
+            return
+        # Manifest (neu) schreiben – die nächsten Prüfungen vergleichen Checksummen
+        manifest = self._timed("validate_weights_s", build_manifest, self.weights_dir, self.weight_patterns)
+        try:
+            save_manifest(self.weights_manifest, manifest)
+        except OSError as e:
+            print(f"⚠️ Weights-Manifest nicht geschrieben: {e}")
+        self.weights = {"ok": True, "missing": [], "mismatched": [], "checked": len(manifest["files"]),
+                        "manifest": "created"}
+
+    def _weights_plausible(self) -> bool:
+        if not os.path.isdir(self.weights_dir):
+            return False
+        files = scan_files(self.weights_dir, self.weight_patterns)
+        return len(files) >= self.min_weight_files and all(
+            os.path.getsize(os.path.join(self.weights_dir, f)) > 1024 for f in files)
+
+    def _validate_engines(self):
+        if not self.engine_dir:
+            self.engines = {"files": 0, "verified": 0, "removed": []}
+            return
+        os.makedirs(self.engine_dir, exist_ok=True)
+        manifest = load_manifest(self.engine_manifest) or {"files": {}}
+        res = self._timed("validate_engines_s", verify_manifest, self.engine_dir, manifest)
+        removed = []
+        for rel in res["mismatched"]:
+            # halb geschriebene Engine (Container-Abbruch beim Build) → löschen, ORT kompiliert neu
+            try:
+                os.remove(os.path.join(self.engine_dir, rel))
+                removed.append(rel)
+            except OSError:
+                pass
+        if removed:
+            print(f"🧹 Defekte TensorRT-Engines entfernt: {removed}")
+        present = scan_files(self.engine_dir, self.engine_patterns)
+        verified = [f for f in present if f in manifest["files"] and f not in removed]
+        self.engines = {"files": len(present), "verified": len(verified), "removed": removed}
+
+    def commit_engines(self) -> bool:
+        """Nach einem erfolgreichen Lauf: neue Engines ins Manifest. True, wenn sich etwas geändert hat."""
+        if not self.engine_dir:
+            return False
+        with self._lock:
+            previous = load_manifest(self.engine_manifest)
+            manifest = build_manifest(self.engine_dir, self.engine_patterns, previous)
+            if previous and previous.get("files") == manifest["files"]:
+                return False
+            save_manifest(self.engine_manifest, manifest)
+            self.engines.update(files=len(manifest["files"]), verified=len(manifest["files"]))
+            return True
+
+    def _warmup(self):
+        env = {**os.environ, **(self.warmup_env or {})}
+        for attempt in (1, 2):
+            res = self._timed("warmup_s", lambda: subprocess.run(
+                self.warmup_cmd, env=env, capture_output=True, text=True, timeout=self.warmup_timeout_s))
+            if res.returncode == 0:
+                return
+            print(f"⚠️ Warmup fehlgeschlagen (Versuch {attempt}): {(res.stderr or res.stdout)[-500:]}")
+            if attempt == 1:
+                self._fetch(None)
+        raise RuntimeError("Warmup-Inferenz fehlgeschlagen")
+
+    def repair(self) -> bool:
+        """Nach einem Inferenz-Fehler: Weights erneut prüfen und nur Defektes nachladen.
+
+        True, wenn etwas repariert wurde (Retry sinnvoll). Ohne Befund kein Download und
+        kein Retry – der Fehler liegt dann nicht an den Weights.
+        """
+        with self._lock:
+            manifest = load_manifest(self.weights_manifest)
+            if not manifest:
+                return False
+            res = self._timed("validate_weights_s", verify_manifest, self.weights_dir, manifest)
+            bad = res["missing"] + res["mismatched"]
+            if not bad:
+                return False
+            try:
+                self._fetch(bad)
+            except Exception as e:
+                print(f"⚠️ Weights-Reparatur fehlgeschlagen: {e}")
+                self.state, self.error = FAILED, str(e)
+                return False
+            ok = verify_manifest(self.weights_dir, manifest)["ok"]
+            if not ok:
+                self.state, self.error = FAILED, f"Weights defekt: {bad}"
+            return ok
+
+    # --- Jobs ---
+    def begin_job(self) -> bool:
+        """Job-Start melden; True = warm (Container war schon bereit)."""
+        with self._lock:
+            warm = self.state == READY
+            self.busy += 1
+        return warm
+
+    def end_job(self, warm: bool, seconds: Optional[float] = None):
+        with self._lock:
+            self.busy = max(0, self.busy - 1)
+            self.last_job_at = time.time()
+            if seconds is not None:
+                hist = self.job_timings["warm" if warm else "cold"]
+                hist.append(round(float(seconds), 3))
+                del hist[:-TIMING_HISTORY]
+
+    # --- Probe ---
+    def probe(self) -> dict:
+        with self._lock:
+            jobs = {
+                kind: {"count": len(v), "mean_s": round(sum(v) / len(v), 3) if v else None}
+                for kind, v in self.job_timings.items()
+            }
+            return {
+                "worker_id": self.worker_id,
+                "state": self.state,
+                "ready": self.state == READY,
+                "busy": self.busy,
+                "error": self.error,
+                "created_at": self.created_at,
+                "ready_at": self.ready_at,
+                "last_job_at": self.last_job_at,
+                "updated_at": time.time(),
+                "timings": dict(self.timings),
+                "weights": dict(self.weights),
+                "engines": dict(self.engines),
+                "trt_cache_hit": bool(self.engines.get("verified")),
+                "jobs": jobs,
+            }
+
+
+# ---------------------------------------------------------------------------
+# Worker-Registry (Routing/ETA in der API)
+# ---------------------------------------------------------------------------
+
+def warm_idle_workers(probes: Iterable[dict], idle_window_s: float, now: Optional[float] = None) -> List[dict]:
+    """Bereite, freie Worker, die ihr Idle-Fenster (Modal scaledown_window) noch nicht überschritten haben.
+
+    Sortiert nach zuletzt benutzt zuerst – der Container lebt am längsten weiter.
+    """
+    now = time.time() if now is None else now
+    out = []
+    for p in probes:
+        if not p.get("ready") or p.get("busy"):
+            continue
+        last = p.get("last_job_at") or p.get("ready_at") or 0
+        if now - last <= idle_window_s:
+            out.append(p)
+    return sorted(out, key=lambda p: p.get("last_job_at") or p.get("ready_at") or 0, reverse=True)
+
+
+class MemoryWorkerRegistry:
+    def __init__(self):
+        self._workers: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def publish(self, probe: dict):
+        with self._lock:
+            self._workers[probe["worker_id"]] = dict(probe)
+
+    def list(self, max_age_s: Optional[float] = None) -> List[dict]:
+        now = time.time()
+        with self._lock:
+            return [dict(p) for p in self._workers.values()
+                    if max_age_s is None or now - p.get("updated_at", 0) <= max_age_s]
+
+
+class FirestoreWorkerRegistry:
+    """Probe-Zustand pro Container in Firestore (Collection dynamicsWorkers)."""
+
+    def __init__(self, db, collection: str = "dynamicsWorkers"):
+        self._col = db.collection(collection)
+
+    def publish(self, probe: dict):
+        self._col.document(probe["worker_id"]).set(probe)
+
+    def list(self, max_age_s: Optional[float] = None) -> List[dict]:
+        query = self._col
+        if max_age_s is not None:
+            query = query.where("updated_at", ">=", time.time() - max_age_s)
+        return [d.to_dict() for d in query.stream()]
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(description="Worker-Readiness: Manifeste und Checks")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    m = sub.add_parser("manifest", help="SHA-256-Manifest für ein Weights-Verzeichnis schreiben")
+    m.add_argument("root")
+    m.add_argument("--out")
+    m.add_argument("--pattern", action="append")
+    c = sub.add_parser("check", help="Readiness einmal durchlaufen und Probe ausgeben")
+    c.add_argument("weights_dir")
+    c.add_argument("--manifest")
+    c.add_argument("--engines")
+    c.add_argument("--warmup-cmd", help="Stub-/Warmup-Inferenz, z.B. \"python warmup.py\"")
+    c.add_argument("--min-weight-files", type=int, default=5)
+    args = ap.parse_args(argv)
+
+    if args.cmd == "manifest":
+        manifest = build_manifest(args.root, args.pattern or WEIGHT_PATTERNS)
+        out = args.out or os.path.join(args.root, ".weights.manifest.json")
+        save_manifest(out, manifest)
+        print(f"✅ Manifest: {len(manifest['files'])} Dateien → {out}")
+        return
+    mgr = ReadinessManager(
+        args.weights_dir, weights_manifest=args.manifest, engine_dir=args.engines,
+        warmup_cmd=shlex.split(args.warmup_cmd) if args.warmup_cmd else None,
+        min_weight_files=args.min_weight_files,
+    )
+    probe = mgr.ensure_ready()
+    print(json.dumps(probe, indent=2))
+    sys.exit(0 if probe["ready"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""Content-addressed Cache für Dynamics-Ergebnisse.
+
+Schlüssel = sha256(Hero-Image-Bytes + Hero-Video-Bytes + normalisierte
+Parameter + PIPELINE_VERSION). Gleiche Eingaben → LivePortrait/Packaging
+werden übersprungen, die gespeicherten Assets direkt verwendet.
+
+Layout unter `root`:
+    entries/<key>/meta.json       files, results, created_at, size_bytes
+    entries/<key>/<dateien>       idle.mp4, idle_chunk1..3.mp4, hero, frames.zip, latents
+    requests/<fingerprint>.json   URL/ETag-Fingerprint → key (Treffer ohne Download)
+
+Die mtime von meta.json ist der letzte Zugriff (LRU). Eviction nach Alter
+und Gesamtgröße.
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from typing import Callable, Dict, Iterable, Optional
+
+# Erhöhen, wenn sich Encoding/Packaging ändert → alte Einträge werden nicht mehr getroffen
+PIPELINE_VERSION = "dynamics-v3-npz-latents"
+
+# Steuer-Flags, die das Ergebnis nicht beeinflussen
+_NON_KEY_PARAMS = {"force"}
+
+
+def _canonical_params(params: dict) -> str:
+    clean = {k: v for k, v in (params or {}).items() if k not in _NON_KEY_PARAMS}
+    return json.dumps(clean, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def cache_key(media_paths: Iterable[str], params: dict, version: str = PIPELINE_VERSION) -> str:
+    """Hash über die Eingabe-Bytes (in Reihenfolge) und die Parameter."""
+    h = hashlib.sha256()
+    h.update(version.encode("utf-8"))
+    for path in media_paths:
+        h.update(b"\0file\0")
+        with open(path, "rb") as f:
+            for data in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(data)
+    h.update(b"\0params\0")
+    h.update(_canonical_params(params).encode("utf-8"))
+    return h.hexdigest()
+
+
+def request_fingerprint(
+    media_validators: Iterable[str], params: dict, version: str = PIPELINE_VERSION
+) -> str:
+    """Günstiger Vorab-Schlüssel aus URL + ETag/Länge (HEAD), ohne die Medien zu laden."""
+    h = hashlib.sha256()
+    h.update(version.encode("utf-8"))
+    for v in media_validators:
+        h.update(b"\0")
+        h.update(v.encode("utf-8"))
+    h.update(b"\0params\0")
+    h.update(_canonical_params(params).encode("utf-8"))
+    return h.hexdigest()
+
+
+def head_validator(url: str, timeout: float = 5.0) -> Optional[str]:
+    """URL ohne Token-Query + ETag/Content-Length/Last-Modified; None wenn nicht ermittelbar."""
+    import requests
+
+    try:
+        resp = requests.head(url, timeout=timeout, allow_redirects=True)
+        if resp.status_code >= 400:
+            return None
+        etag = resp.headers.get("ETag") or resp.headers.get("x-goog-hash")
+        length = resp.headers.get("Content-Length")
+        if not etag and not length:
+            return None
+        return "|".join([url.split("?", 1)[0], etag or "", length or "", resp.headers.get("Last-Modified", "")])
+    except Exception:
+        return None
+
+
+class DynamicsResultCache:
+    def __init__(
+        self,
+        root: str,
+        max_bytes: int = 20 * 1024 ** 3,
+        max_age_s: float = 30 * 86400,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.root = root
+        self.max_bytes = int(max_bytes)
+        self.max_age_s = float(max_age_s)
+        self._clock = clock
+        self._entries = os.path.join(root, "entries")
+        self._requests = os.path.join(root, "requests")
+        os.makedirs(self._entries, exist_ok=True)
+        os.makedirs(self._requests, exist_ok=True)
+
+    # --- Einträge ---
+    def _dir(self, key: str) -> str:
+        return os.path.join(self._entries, key)
+
+    def _read_meta(self, key: str) -> Optional[dict]:
+        try:
+            with open(os.path.join(self._dir(key), "meta.json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, key: str, meta: dict):
+        path = os.path.join(self._dir(key), "meta.json")
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=1, default=str)
+        os.replace(tmp, path)
+
+    def get(self, key: str) -> Optional[dict]:
+        """Eintrag mit absoluten Dateipfaden oder None (fehlend, abgelaufen, unvollständig)."""
+        meta = self._read_meta(key)
+        if meta is None:
+            return None
+        if self._clock() - float(meta.get("created_at", 0)) > self.max_age_s:
+            self.delete(key)
+            return None
+        files = {}
+        for name, fname in meta.get("files", {}).items():
+            p = os.path.join(self._dir(key), fname)
+            if not os.path.exists(p):
+                return None
+            files[name] = p
+        os.utime(os.path.join(self._dir(key), "meta.json"))
+        return {**meta, "key": key, "dir": self._dir(key), "files": files}
+
+    def put(self, key: str, files: Dict[str, Optional[str]], extra: Optional[dict] = None) -> Optional[dict]:
+        """Dateien kopieren (tmp-Verzeichnis + rename, damit Leser nie halbe Einträge sehen)."""
+        tmp_dir = os.path.join(self._entries, f".tmp-{key}-{uuid.uuid4().hex[:8]}")
+        os.makedirs(tmp_dir)
+        try:
+            stored, size = {}, 0
+            for name, src in files.items():
+                if not src or not os.path.exists(src):
+                    continue
+                fname = f"{name}{os.path.splitext(src)[1]}"
+                shutil.copyfile(src, os.path.join(tmp_dir, fname))
+                stored[name] = fname
+                size += os.path.getsize(src)
+            meta = {
+                "version": PIPELINE_VERSION,
+                "files": stored,
+                "results": {},
+                "created_at": self._clock(),
+                "size_bytes": size,
+                **(extra or {}),
+            }
+            with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump(meta, f, indent=1, default=str)
+            shutil.rmtree(self._dir(key), ignore_errors=True)
+            os.replace(tmp_dir, self._dir(key))
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        self.evict()
+        return self.get(key)
+
+    def record_result(self, key: str, result_key: str, result: dict):
+        """Hochgeladene URLs pro avatar/dynamics merken → Wiederholung ohne Upload."""
+        meta = self._read_meta(key)
+        if meta is None:
+            return
+        meta.setdefault("results", {})[result_key] = result
+        self._write_meta(key, meta)
+
+    def delete(self, key: str):
+        shutil.rmtree(self._dir(key), ignore_errors=True)
+
+    # --- Request-Index (Treffer ohne Download) ---
+    def remember_request(self, fingerprint: str, key: str):
+        path = os.path.join(self._requests, f"{fingerprint}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"key": key, "at": self._clock()}, f)
+
+    def lookup_request(self, fingerprint: str) -> Optional[str]:
+        try:
+            with open(os.path.join(self._requests, f"{fingerprint}.json"), "r", encoding="utf-8") as f:
+                return json.load(f).get("key")
+        except (OSError, ValueError):
+            return None
+
+    # --- Eviction ---
+    def evict(self) -> dict:
+        """Abgelaufene Einträge löschen, danach LRU bis Gesamtgröße <= max_bytes."""
+        now = self._clock()
+        live = []
+        removed = 0
+        for key in os.listdir(self._entries):
+            if key.startswith(".tmp-"):
+                continue
+            meta = self._read_meta(key)
+            if meta is None or now - float(meta.get("created_at", 0)) > self.max_age_s:
+                self.delete(key)
+                removed += 1
+                continue
+            try:
+                last = os.path.getmtime(os.path.join(self._dir(key), "meta.json"))
+            except OSError:
+                last = 0.0
+            live.append((last, key, int(meta.get("size_bytes", 0))))
+        total = sum(s for _, _, s in live)
+        for _, key, size in sorted(live):
+            if total <= self.max_bytes:
+                break
+            self.delete(key)
+            total -= size
+            removed += 1
+        # Request-Index auf gelöschte Einträge aufräumen
+        keys = {k for _, k, _ in live if os.path.isdir(self._dir(k))}
+        for name in os.listdir(self._requests):
+            try:
+                with open(os.path.join(self._requests, name), "r", encoding="utf-8") as f:
+                    ref = json.load(f).get("key")
+            except (OSError, ValueError):
+                ref = None
+            if ref not in keys:
+                try:
+                    os.remove(os.path.join(self._requests, name))
+                except OSError:
+                    pass
+        return {"entries": len(keys), "bytes": total, "removed": removed}
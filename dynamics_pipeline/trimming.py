@@ -0,0 +1,377 @@
+"""Trim-Engine für /trim-video: Stream-Copy ganzer GOPs, Re-Encode nur an den Rändern.
+
+    Quelle:  |K....|K....|K....|K....|K....|
+    Schnitt:     [s                  e]
+                 head │  copy (GOPs) │ tail
+                 x264 │  -c copy     │ x264
+
+- Keyframe-Index direkt aus dem MP4 (stss/stts/ctts/elst, kein Decode),
+  sonst per ffprobe
+- mode="accurate": Start/Ende framegenau; nur die angeschnittenen GOPs werden
+  neu encodiert (Smart Cut). Ohne B-Frames ist das Ende per Copy exakt → kein Tail.
+- mode="keyframe": Start auf den vorherigen Keyframe ziehen, reiner Stream-Copy
+- mode="reencode" oder wenn Smart Cut nicht geht (kein H.264, kein Index,
+  Übergänge fehlerhaft): kompletter Re-Encode des Bereichs (Input-Seek)
+
+Teilstücke laufen als NUT mit Annex-B-Bitstream (SPS/PPS in-band vor jedem
+Keyframe) durch den concat-Demuxer – sonst würden Copy- und x264-Teile mit den
+Parameter-Sets des ersten Teils dekodiert. Audio wird aus der Quelle
+dazugemuxt (AAC per Copy, sonst AAC-Encode).
+"""
+import os
+import re
+import shutil
+import struct
+import subprocess
+import tempfile
+import time
+from bisect import bisect_left
+from typing import List, Optional
+
+from .media_fetch import iter_boxes, read_moov
+
+MODES = ("accurate", "keyframe", "reencode")
+
+# x264-Profile, die wir für Head/Tail nachbauen können (profile_idc aus avcC)
+_H264_PROFILES = {66: "baseline", 77: "main", 100: "high"}
+
+
+# ---------------------------------------------------------------------------
+# Keyframe-Index
+# ---------------------------------------------------------------------------
+
+def _child(buf: bytes, *path: str) -> Optional[bytes]:
+    for name in path:
+        for btype, pos, header, size in iter_boxes(buf, 0, len(buf)):
+            if btype == name:
+                buf = buf[pos + header:pos + size]
+                break
+        else:
+            return None
+    return buf
+
+
+def _children(buf: bytes, name: str) -> List[bytes]:
+    return [buf[pos + header:pos + size] for btype, pos, header, size in iter_boxes(buf, 0, len(buf)) if btype == name]
+
+
+def _mp4_video_index(moov: bytes) -> Optional[dict]:
+    for trak in _children(moov, "trak"):
+        hdlr = _child(trak, "mdia", "hdlr")
+        if not hdlr or hdlr[8:12] != b"vide":
+            continue
+        mdhd = _child(trak, "mdia", "mdhd")
+        stbl = _child(trak, "mdia", "minf", "stbl")
+        if not mdhd or not stbl:
+            return None
+        timescale = struct.unpack(">I", mdhd[20:24] if mdhd[0] == 1 else mdhd[12:16])[0]
+        stts = _child(stbl, "stts")
+        if not timescale or not stts:
+            return None
+
+        dts, t = [], 0
+        for i in range(struct.unpack(">I", stts[4:8])[0]):
+            count, delta = struct.unpack(">II", stts[8 + 8 * i:16 + 8 * i])
+            for _ in range(count):
+                dts.append(t)
+                t += delta
+        n = len(dts)
+
+        offsets = [0] * n
+        ctts = _child(stbl, "ctts")
+        if ctts:
+            fmt = ">Ii" if ctts[0] == 1 else ">II"
+            k = 0
+            for i in range(struct.unpack(">I", ctts[4:8])[0]):
+                count, off = struct.unpack(fmt, ctts[8 + 8 * i:16 + 8 * i])
+                for _ in range(count):
+                    if k < n:
+                        offsets[k] = off
+                        k += 1
+
+        # Edit-List: erster media_time != -1 verschiebt die Präsentationszeit
+        shift = 0
+        elst = _child(trak, "edts", "elst")
+        if elst:
+            fmt, step = (">Qq", 20) if elst[0] == 1 else (">Ii", 12)
+            for i in range(struct.unpack(">I", elst[4:8])[0]):
+                _, media_time = struct.unpack(fmt, elst[8 + step * i:8 + step * i + struct.calcsize(fmt)])
+                if media_time != -1:
+                    shift = media_time
+                    break
+
+        pts = [(d + o - shift) / timescale for d, o in zip(dts, offsets)]
+        stss = _child(stbl, "stss")
+        if stss:
+            sync = [struct.unpack(">I", stss[8 + 4 * i:12 + 4 * i])[0] - 1
+                    for i in range(struct.unpack(">I", stss[4:8])[0])]
+        else:
+            sync = list(range(n))  # alle Samples sync (Intra-only)
+
+        codec, profile = None, None
+        stsd = _child(stbl, "stsd")
+        if stsd and len(stsd) >= 16:
+            codec = stsd[12:16].decode("latin-1")
+            entry = stsd[8:]
+            avcc = _child(entry[8 + 78:], "avcC") if codec in ("avc1", "avc3") else None
+            if avcc and len(avcc) >= 4:
+                profile = avcc[1]
+
+        frames = sorted(pts)
+        return {
+            "source": "mp4",
+            "codec": codec,
+            "h264_profile": profile,
+            "frames": frames,
+            "keyframes": sorted(pts[i] for i in sync if 0 <= i < n),
+            "has_bframes": any(o != offsets[0] for o in offsets),
+            "frame_duration": (frames[-1] - frames[0]) / (n - 1) if n > 1 else 0.04,
+            "duration_s": (t - shift) / timescale,
+        }
+    return None
+
+
+def _ffprobe_video_index(path: str, ffprobe_bin: str) -> Optional[dict]:
+    try:
+        proc = subprocess.run(
+            [ffprobe_bin, "-v", "error", "-select_streams", "v:0",
+             "-show_entries", "packet=pts_time,flags:stream=codec_name,has_b_frames,profile",
+             "-of", "compact=p=1:nk=0", path],
+            capture_output=True, text=True, timeout=120,
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if proc.returncode != 0:
+        return None
+    frames, keyframes, codec, has_b, profile = [], [], None, False, None
+    for line in proc.stdout.splitlines():
+        fields = dict(kv.split("=", 1) for kv in line.split("|")[1:] if "=" in kv)
+        if line.startswith("packet"):
+            try:
+                ts = float(fields.get("pts_time", ""))
+            except ValueError:
+                continue
+            frames.append(ts)
+            if "K" in fields.get("flags", ""):
+                keyframes.append(ts)
+        elif line.startswith("stream"):
+            codec = fields.get("codec_name")
+            has_b = fields.get("has_b_frames", "0") not in ("0", "")
+            profile = {"Baseline": 66, "Constrained Baseline": 66, "Main": 77, "High": 100}.get(fields.get("profile"))
+    if not frames:
+        return None
+    frames.sort()
+    return {
+        "source": "ffprobe",
+        "codec": "avc1" if codec == "h264" else codec,
+        "h264_profile": profile,
+        "frames": frames,
+        "keyframes": sorted(keyframes),
+        "has_bframes": has_b,
+        "frame_duration": (frames[-1] - frames[0]) / (len(frames) - 1) if len(frames) > 1 else 0.04,
+        "duration_s": frames[-1] + ((frames[-1] - frames[0]) / (len(frames) - 1) if len(frames) > 1 else 0.04),
+    }
+
+
+def keyframe_index(path: str, ffprobe_bin: str = "ffprobe") -> Optional[dict]:
+    """Frame-/Keyframe-Zeiten (Präsentationszeit, Sekunden) des ersten Videostreams."""
+    moov = read_moov(path)
+    if moov:
+        try:
+            index = _mp4_video_index(moov)
+        except struct.error:
+            index = None
+        if index and index["frames"]:
+            return index
+    return _ffprobe_video_index(path, ffprobe_bin)
+
+
+# ---------------------------------------------------------------------------
+# Plan
+# ---------------------------------------------------------------------------
+
+def _count(frames: List[float], t0: float, t1: float, eps: float) -> int:
+    return bisect_left(frames, t1 - eps) - bisect_left(frames, t0 - eps)
+
+
+def plan_trim(index: Optional[dict], start: float, end: float, mode: str = "accurate") -> dict:
+    """Strategie + Segmente [(art, t0, t1, frames)] für den Bereich [start, end)."""
+    plan = {"strategy": "reencode", "start": start, "end": end, "segments": [], "reason": None}
+    if mode == "reencode":
+        plan["reason"] = "mode=reencode"
+        return plan
+    if not index or not index.get("keyframes"):
+        plan["reason"] = "kein Keyframe-Index"
+        return plan
+
+    frames, keys = index["frames"], index["keyframes"]
+    eps = index["frame_duration"] / 2
+    end = min(end, index["duration_s"])
+    plan["end"] = end
+
+    if mode == "keyframe":
+        k0 = max([k for k in keys if k <= start + eps] or [keys[0]])
+        plan.update(strategy="copy", start=k0,
+                    segments=[("copy", k0, end, _count(frames, k0, end, eps))])
+        return plan
+
+    inside = [k for k in keys if start - eps <= k <= end - eps]
+    if not inside:
+        plan["reason"] = "kein Keyframe im Bereich"
+        return plan
+    k1 = inside[0]
+    # Ende per Copy nur exakt, wenn keine B-Frames umsortiert werden (oder Dateiende)
+    copy_to_end = not index["has_bframes"] or end >= index["duration_s"] - eps
+    k2 = end if copy_to_end else inside[-1]
+
+    segments = []
+    if k1 - start > eps:
+        segments.append(("encode", start, k1, _count(frames, start, k1, eps)))
+    if k2 - k1 > eps:
+        segments.append(("copy", k1, k2, _count(frames, k1, k2, eps)))
+    if end - k2 > eps:
+        segments.append(("encode", k2, end, _count(frames, k2, end, eps)))
+
+    encoded = sum(t1 - t0 for kind, t0, t1, _ in segments if kind == "encode")
+    if not any(kind == "copy" for kind, *_ in segments):
+        plan["reason"] = "nur Teil-GOPs"
+        return plan
+    if encoded and (index.get("codec") not in ("avc1", "avc3") or index.get("h264_profile") not in _H264_PROFILES):
+        plan["reason"] = f"Smart Cut nicht möglich für {index.get('codec')}/{index.get('h264_profile')}"
+        return plan
+    plan.update(strategy="smart" if encoded else "copy", segments=segments)
+    return plan
+
+
+# ---------------------------------------------------------------------------
+# Ausführung
+# ---------------------------------------------------------------------------
+
+def _run(cmd: List[str]):
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg fehlgeschlagen ({proc.returncode}): {proc.stderr.strip()[-800:]}")
+    return proc
+
+
+def _audio_codec(path: str, ffmpeg_bin: str) -> Optional[str]:
+    proc = subprocess.run([ffmpeg_bin, "-hide_banner", "-i", path], capture_output=True, text=True)
+    m = re.search(r"Stream #\d+:\d+.*?: Audio: (\w+)", proc.stderr)
+    return m.group(1) if m else None
+
+
+def _seek(t: float) -> str:
+    # knapp hinter den Keyframe: Rückwärts-Seek landet sicher auf genau diesem Keyframe
+    return f"{max(0.0, t + 0.001):.6f}"
+
+
+def _video_frames(path: str, ffprobe_bin: str) -> Optional[int]:
+    index = keyframe_index(path, ffprobe_bin)
+    return len(index["frames"]) if index else None
+
+
+def _joins_decode_clean(path: str, joins: List[float], ffmpeg_bin: str) -> bool:
+    """Nur die Übergänge dekodieren (±0.5s) – Decoder-Fehler = Smart Cut unbrauchbar."""
+    for t in joins:
+        proc = subprocess.run(
+            [ffmpeg_bin, "-v", "error", "-nostdin", "-ss", f"{max(0.0, t - 0.5):.3f}", "-i", path,
+             "-t", "1.0", "-map", "0:v:0", "-f", "null", "-"],
+            capture_output=True, text=True,
+        )
+        if proc.returncode != 0 or proc.stderr.strip():
+            return False
+    return True
+
+
+def _reencode(src: str, dst: str, start: float, end: float, ffmpeg_bin: str, audio: bool):
+    cmd = [ffmpeg_bin, "-y", "-v", "error", "-ss", f"{start:.6f}", "-i", src, "-t", f"{end - start:.6f}",
+           "-map", "0:v:0", "-c:v", "libx264"]
+    if audio:
+        cmd += ["-map", "0:a:0?", "-c:a", "aac"]
+    else:
+        cmd += ["-an"]
+    _run(cmd + ["-movflags", "+faststart", dst])
+
+
+def trim_video(
+    src: str,
+    dst: str,
+    start: float,
+    end: float,
+    mode: str = "accurate",
+    ffmpeg_bin: str = "ffmpeg",
+    ffprobe_bin: str = "ffprobe",
+    crf: int = 18,
+    preset: str = "veryfast",
+    audio: bool = True,
+    validate: bool = True,
+) -> dict:
+    """Bereich [start, end) von src nach dst (MP4, faststart).
+
+    Returns {"strategy", "segments", "start", "end", "fallback", "reason", "elapsed_s"}.
+    """
+    if mode not in MODES:
+        raise ValueError(f"mode muss einer von {MODES} sein")
+    if end <= start:
+        raise ValueError("end_time muss größer als start_time sein")
+    t0 = time.perf_counter()
+    index = keyframe_index(src, ffprobe_bin) if mode != "reencode" else None
+    plan = plan_trim(index, start, end, mode)
+    plan["fallback"] = False
+
+    if plan["strategy"] != "reencode":
+        work = tempfile.mkdtemp(prefix="trim_")
+        try:
+            _smart_cut(src, dst, plan, index, work, ffmpeg_bin, crf, preset, audio)
+            if validate and plan["strategy"] == "smart":
+                expected = sum(n for *_, n in plan["segments"])
+                got = _video_frames(dst, ffprobe_bin)
+                joins = [seg[1] - plan["start"] for seg in plan["segments"][1:]]
+                if got != expected or not _joins_decode_clean(dst, joins, ffmpeg_bin):
+                    raise RuntimeError(f"Validierung fehlgeschlagen (Frames {got}/{expected})")
+        except Exception as e:
+            print(f"⚠️ Smart Cut fehlgeschlagen, Re-Encode: {e}")
+            plan.update(strategy="reencode", fallback=True, reason=str(e)[:300])
+        finally:
+            shutil.rmtree(work, ignore_errors=True)
+
+    if plan["strategy"] == "reencode":
+        _reencode(src, dst, start, plan["end"], ffmpeg_bin, audio)
+    plan["elapsed_s"] = time.perf_counter() - t0
+    return plan
+
+
+def _smart_cut(src, dst, plan, index, work, ffmpeg_bin, crf, preset, audio):
+    pieces = []
+    for i, (kind, t0, t1, frames) in enumerate(plan["segments"]):
+        if frames <= 0:
+            continue
+        piece = os.path.join(work, f"part{i}.nut")
+        if kind == "copy":
+            cmd = [ffmpeg_bin, "-y", "-v", "error", "-ss", _seek(t0), "-i", src,
+                   "-map", "0:v:0", "-c:v", "copy", "-frames:v", str(frames)]
+            if index.get("codec") in ("avc1", "avc3"):
+                cmd += ["-bsf:v", "h264_mp4toannexb"]
+        else:
+            # genauer Input-Seek: Decode ab Keyframe davor, Frames vor t0 werden verworfen
+            cmd = [ffmpeg_bin, "-y", "-v", "error", "-ss", f"{t0:.6f}", "-i", src,
+                   "-map", "0:v:0", "-frames:v", str(frames),
+                   "-c:v", "libx264", "-preset", preset, "-crf", str(crf), "-pix_fmt", "yuv420p",
+                   "-profile:v", _H264_PROFILES[index["h264_profile"]],
+                   "-bsf:v", "dump_extra=freq=keyframe"]
+        _run(cmd + ["-an", "-f", "nut", piece])
+        pieces.append(piece)
+
+    listing = os.path.join(work, "list.txt")
+    with open(listing, "w") as f:
+        for p in pieces:
+            f.write(f"file '{p}'\n")
+
+    cmd = [ffmpeg_bin, "-y", "-v", "error", "-f", "concat", "-safe", "0", "-i", listing]
+    acodec = _audio_codec(src, ffmpeg_bin) if audio else None
+    if acodec:
+        cmd += ["-ss", f"{plan['start']:.6f}", "-t", f"{plan['end'] - plan['start']:.6f}", "-i", src,
+                "-map", "0:v:0", "-map", "1:a:0", "-c:a", "copy" if acodec == "aac" else "aac"]
+    else:
+        cmd += ["-map", "0:v:0"]
+    _run(cmd + ["-c:v", "copy", "-movflags", "+faststart", dst])
@@ -0,0 +1,266 @@
+"""Upload-Stage für Dynamics-Assets (idle.mp4, Chunks, Hero, frames.zip, Latents).
+
+- parallele Uploads mit begrenzter Anzahl Worker
+- große Dateien als Resumable Upload in Chunks (GCS `blob.chunk_size`)
+- Retries pro Datei mit Backoff. FirebaseStorage: ein Retry überträgt die
+  ganze Datei neu (upload_from_filename startet jedes Mal eine neue
+  Resumable-Session; Chunk-Fehler innerhalb eines Versuchs wiederholt die
+  GCS-Library selbst). LocalFsStorage setzt am Offset fort
+- Manifest pro Job (im Storage selbst): bereits hochgeladene Assets mit
+  gleichem Inhalt (sha256) und noch gültigem Download-Token werden beim
+  erneuten Lauf übersprungen
+
+Storage-Backends haben dieselbe kleine Schnittstelle; `LocalFsStorage` ist
+ein Dateisystem-Stand-in für lokale Tests ohne Firebase.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+from urllib.parse import quote
+
+CHUNK_SIZE = 8 * 1024 * 1024  # Vielfaches von 256 KB (GCS-Vorgabe)
+RESUMABLE_THRESHOLD = 8 * 1024 * 1024
+
+
+def file_sha256(path: str, block: int = 1024 * 1024) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for data in iter(lambda: f.read(block), b""):
+            h.update(data)
+    return h.hexdigest()
+
+
+class FirebaseStorage:
+    """Firebase Storage (GCS Bucket) mit Download-Token-URLs wie in der Firebase Console."""
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+
+    def upload(self, local_path: str, remote_path: str, content_type: str, token: str,
+               chunk_size: Optional[int] = None):
+        # chunk_size gesetzt → Resumable Upload (GCS wiederholt einzelne Chunks); schlägt der
+        # Aufruf trotzdem fehl, startet der nächste Versuch eine neue Session ab Byte 0
+        blob = self.bucket.blob(remote_path, chunk_size=chunk_size)
+        # Metadata wird mit dem Upload geschrieben – kein extra patch() nötig
+        blob.metadata = {"firebaseStorageDownloadTokens": token}
+        blob.upload_from_filename(local_path, content_type=content_type)
+
+    def exists(self, remote_path: str) -> bool:
+        return self.bucket.blob(remote_path).exists()
+
+    def download_tokens(self, remote_path: str) -> Optional[List[str]]:
+        """Aktuelle Download-Tokens des Blobs (None = Blob fehlt); Console kann sie widerrufen/ersetzen."""
+        blob = self.bucket.get_blob(remote_path)
+        if blob is None:
+            return None
+        tokens = (blob.metadata or {}).get("firebaseStorageDownloadTokens") or ""
+        return [t for t in tokens.split(",") if t]
+
+    def url(self, remote_path: str, token: str) -> str:
+        return (
+            f"https://firebasestorage.googleapis.com/v0/b/{self.bucket.name}/o/"
+            f"{remote_path.replace('/', '%2F')}?alt=media&token={token}"
+        )
+
+    def read_text(self, remote_path: str) -> Optional[str]:
+        blob = self.bucket.blob(remote_path)
+        if not blob.exists():
+            return None
+        return blob.download_as_text()
+
+    def write_text(self, remote_path: str, text: str, content_type: str = "application/json"):
+        self.bucket.blob(remote_path).upload_from_string(text, content_type=content_type)
+
+
+class LocalFsStorage:
+    """Dateisystem-Stand-in für FirebaseStorage (lokale Tests, Benchmarks).
+
+    Uploads laufen chunkweise in eine `.part`-Datei (pro Token) und werden erst
+    am Ende atomar umbenannt; ein abgebrochener Upload setzt am Offset wieder auf.
+    `fail_hook(remote_path, offset)` kann Fehler injizieren (Retry-Tests).
+    """
+
+    def __init__(self, root: str, base_url: str = "file://",
+                 fail_hook: Optional[Callable[[str, int], None]] = None):
+        self.root = root
+        self.base_url = base_url
+        self.fail_hook = fail_hook
+        self.name = os.path.basename(os.path.abspath(root))
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, remote_path: str) -> str:
+        return os.path.join(self.root, *remote_path.split("/"))
+
+    def upload(self, local_path: str, remote_path: str, content_type: str, token: str,
+               chunk_size: Optional[int] = None):
+        dst = self._path(remote_path)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        part = f"{dst}.{token}.part"
+        step = chunk_size or os.path.getsize(local_path) or 1
+        offset = os.path.getsize(part) if (chunk_size and os.path.exists(part)) else 0
+        with open(local_path, "rb") as src, open(part, "ab" if offset else "wb") as out:
+            src.seek(offset)
+            while True:
+                if self.fail_hook:
+                    self.fail_hook(remote_path, offset)
+                data = src.read(step)
+                if not data:
+                    break
+                out.write(data)
+                out.flush()
+                offset += len(data)
+        os.replace(part, dst)
+        with open(dst + ".meta.json", "w") as f:
+            json.dump({"contentType": content_type, "firebaseStorageDownloadTokens": token}, f)
+
+    def exists(self, remote_path: str) -> bool:
+        return os.path.exists(self._path(remote_path))
+
+    def download_tokens(self, remote_path: str) -> Optional[List[str]]:
+        p = self._path(remote_path)
+        if not os.path.exists(p):
+            return None
+        try:
+            with open(p + ".meta.json", "r", encoding="utf-8") as f:
+                tokens = json.load(f).get("firebaseStorageDownloadTokens") or ""
+        except (OSError, ValueError):
+            return []
+        return [t for t in tokens.split(",") if t]
+
+    def url(self, remote_path: str, token: str) -> str:
+        return f"{self.base_url}{quote(os.path.abspath(self._path(remote_path)))}?token={token}"
+
+    def read_text(self, remote_path: str) -> Optional[str]:
+        p = self._path(remote_path)
+        if not os.path.exists(p):
+            return None
+        with open(p, "r", encoding="utf-8") as f:
+            return f.read()
+
+    def write_text(self, remote_path: str, text: str, content_type: str = "application/json"):
+        p = self._path(remote_path)
+        os.makedirs(os.path.dirname(p), exist_ok=True)
+        tmp = p + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, p)
+
+    def clear(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+        os.makedirs(self.root, exist_ok=True)
+
+
+class UploadManifest:
+    """Pro Asset: remote_path, sha256, size, token, url, uploaded_at (JSON im Storage)."""
+
+    def __init__(self, storage, path: str):
+        self.storage = storage
+        self.path = path
+        self.entries: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def load(self) -> "UploadManifest":
+        try:
+            raw = self.storage.read_text(self.path)
+            if raw:
+                self.entries = json.loads(raw).get("assets", {})
+        except Exception as e:
+            print(f"⚠️ Upload-Manifest nicht lesbar ({self.path}): {e}")
+            self.entries = {}
+        return self
+
+    def reusable(self, key: str, remote_path: str, sha256: str) -> Optional[dict]:
+        entry = self.entries.get(key)
+        if not entry or entry.get("remote_path") != remote_path or entry.get("sha256") != sha256:
+            return None
+        # Blob muss noch existieren und den gespeicherten Token haben – sonst wäre die URL tot
+        tokens = self.storage.download_tokens(remote_path)
+        return entry if tokens and entry.get("token") in tokens else None
+
+    def record(self, key: str, entry: dict):
+        with self._lock:
+            self.entries[key] = entry
+            payload = json.dumps({"assets": self.entries, "updated_at": datetime.now(timezone.utc).isoformat()}, indent=1)
+            try:
+                self.storage.write_text(self.path, payload)
+            except Exception as e:
+                # Manifest ist Optimierung – Upload selbst ist erfolgreich
+                print(f"⚠️ Upload-Manifest nicht gespeichert: {e}")
+
+
+def upload_assets(
+    storage,
+    assets: List[dict],
+    manifest_path: Optional[str] = None,
+    max_workers: int = 4,
+    retries: int = 3,
+    backoff_s: float = 1.0,
+    resumable_threshold: int = RESUMABLE_THRESHOLD,
+    chunk_size: int = CHUNK_SIZE,
+) -> Dict[str, dict]:
+    """Assets parallel hochladen.
+
+    assets: [{"key", "local_path", "remote_path", "content_type"}]
+    Returns {key: {"url", "token", "skipped", ...}} für erfolgreiche Assets;
+    fehlgeschlagene Keys fehlen im Ergebnis (und im Manifest).
+    """
+    manifest = UploadManifest(storage, manifest_path).load() if manifest_path else None
+    results: Dict[str, dict] = {}
+
+    def _one(asset: dict) -> dict:
+        key = asset["key"]
+        local_path = asset["local_path"]
+        remote_path = asset["remote_path"]
+        size = os.path.getsize(local_path)
+        sha = file_sha256(local_path)
+        if manifest is not None:
+            entry = manifest.reusable(key, remote_path, sha)
+            if entry:
+                return {**entry, "skipped": True}
+        token = str(uuid.uuid4())
+        use_chunks = chunk_size if size >= resumable_threshold else None
+        last_err: Optional[Exception] = None
+        for attempt in range(1, retries + 1):
+            try:
+                storage.upload(local_path, remote_path, asset.get("content_type", "application/octet-stream"),
+                               token, chunk_size=use_chunks)
+                last_err = None
+                break
+            except Exception as e:
+                last_err = e
+                print(f"⚠️ Upload {key} Versuch {attempt}/{retries} fehlgeschlagen: {e}")
+                if attempt < retries:
+                    time.sleep(backoff_s * (2 ** (attempt - 1)))
+        if last_err is not None:
+            raise last_err
+        entry = {
+            "remote_path": remote_path,
+            "sha256": sha,
+            "size": size,
+            "token": token,
+            "url": storage.url(remote_path, token),
+            "uploaded_at": datetime.now(timezone.utc).isoformat(),
+        }
+        if manifest is not None:
+            manifest.record(key, entry)
+        return {**entry, "skipped": False}
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        futures = {pool.submit(_one, a): a["key"] for a in assets}
+        for fut in as_completed(futures):
+            key = futures[fut]
+            try:
+                results[key] = fut.result()
+            except Exception as e:
+                print(f"❌ Upload {key} endgültig fehlgeschlagen: {e}")
+    skipped = sum(1 for r in results.values() if r.get("skipped"))
+    print(f"📤 Uploads: {len(results)}/{len(assets)} ok ({skipped} aus Manifest) in {time.perf_counter() - t0:.1f}s")
+    return results
@@ -0,0 +1,335 @@
+"""Request-Workspaces: ein eigenes Temp-Verzeichnis pro Request/Job, garantiert aufgeräumt.
+
+Bisher legten /generate-avatar, /trim-video, /speak und der Dynamics-Worker
+Dateien per tempfile.mkdtemp()/gettempdir() ab und löschten sie nie – lang
+laufende Instanzen liefen voll.
+
+    manager = default_manager("bithuman")
+    async with manager.aworkspace("generate-avatar") as ws:
+        img = await ws.save_upload(image, "avatar.png")     # Quota wird beim Schreiben geprüft
+        ...
+        return FileResponse(out, background=ws.handoff())  # löschen NACH dem Senden
+
+- Verzeichnis unter root/<prefix>-<id>/ mit Marker-Datei (.workspace.json)
+- Aufräumen bei Erfolg, Exception und Abbruch (CancelledError); handoff()
+  überträgt das Löschen an den Response (Starlette-BackgroundTask) bzw.
+  keep() lässt das Verzeichnis bis zur Ablaufzeit stehen (Downloads)
+- Quota pro Workspace: save_upload()/write_bytes() zählen mit,
+  check_quota() misst nach externen Schritten (ffmpeg, LivePortrait)
+- Janitor-Thread entfernt verwaiste Verzeichnisse (Prozess abgestürzt,
+  Client hat den Download abgebrochen, keep()-Ablauf) nach Alter
+- metrics(): aktive Workspaces, belegte Bytes, freier Platz, Reaps, Quota-Verstöße
+"""
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from pathlib import Path
+from typing import Dict, Optional
+
+CHUNK_SIZE = 1024 * 1024
+MARKER = ".workspace.json"
+
+
+class WorkspaceQuotaExceeded(RuntimeError):
+    """Workspace überschreitet seine Disk-Quota."""
+
+
+def dir_bytes(path) -> int:
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def _safe_filename(name: Optional[str], default: str = "upload") -> str:
+    name = Path(name or "").name.strip()
+    name = re.sub(r"[^\w.\-]+", "_", name)
+    return name if name and name not in (".", "..") else default
+
+
+class Workspace:
+    def __init__(self, manager: "WorkspaceManager", path: Path, quota_bytes: int, keep_s: float):
+        self.manager = manager
+        self.path = path
+        self.id = path.name
+        self.quota_bytes = quota_bytes
+        self.keep_s = keep_s
+        self.written = 0
+        self.created = time.time()
+        self._owned = True  # False nach handoff()/keep() → Kontext-Ende löscht nicht
+
+    def file(self, name: str) -> Path:
+        """Pfad innerhalb des Workspaces (Dateiname wird bereinigt, kein ../)."""
+        return self.path / _safe_filename(name)
+
+    # --- Schreiben mit Quota ---
+    def _account(self, n: int):
+        self.written += n
+        if self.written > self.quota_bytes:
+            self.manager._counters["quota_violations"] += 1
+            raise WorkspaceQuotaExceeded(
+                f"Workspace {self.id}: {self.written / 1e6:.1f} MB > Quota {self.quota_bytes / 1e6:.1f} MB")
+
+    def write_bytes(self, name: str, data: bytes) -> Path:
+        self._account(len(data))
+        target = self.file(name)
+        target.write_bytes(data)
+        return target
+
+    def copy_stream(self, name: str, src) -> Path:
+        """Dateiobjekt chunkweise in den Workspace kopieren (bricht bei Quota-Überschreitung ab)."""
+        target = self.file(name)
+        with open(target, "wb") as out:
+            for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+                self._account(len(chunk))
+                out.write(chunk)
+        return target
+
+    async def save_upload(self, upload, name: Optional[str] = None) -> Path:
+        """FastAPI-UploadFile → Datei im Workspace."""
+        target = self.file(name or upload.filename)
+        with open(target, "wb") as out:
+            while True:
+                chunk = await upload.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                self._account(len(chunk))
+                out.write(chunk)
+        return target
+
+    def check_quota(self) -> int:
+        """Tatsächliche Belegung messen (nach Schritten, die selbst schreiben)."""
+        used = dir_bytes(self.path)
+        self.written = max(self.written, used)
+        if used > self.quota_bytes:
+            self.manager._counters["quota_violations"] += 1
+            raise WorkspaceQuotaExceeded(
+                f"Workspace {self.id}: {used / 1e6:.1f} MB > Quota {self.quota_bytes / 1e6:.1f} MB")
+        return used
+
+    # --- Lebensdauer ---
+    def keep(self, seconds: Optional[float] = None) -> "Workspace":
+        """Nicht beim Kontext-Ende löschen; der Janitor entfernt es nach `seconds`."""
+        self._owned = False
+        self.manager._mark(self, expires=time.time() + (seconds if seconds is not None else self.keep_s))
+        self.manager._release(self)
+        return self
+
+    def handoff(self):
+        """Löschen an den Response übergeben → Starlette-BackgroundTask.
+
+        Bricht der Client den Download ab, läuft der Task evtl. nicht – dann
+        räumt der Janitor nach keep_s auf.
+        """
+        from starlette.background import BackgroundTask
+        self.keep()
+        return BackgroundTask(self.cleanup)
+
+    def cleanup(self):
+        self.manager._remove(self)
+
+    def close(self):
+        """Ende des Requests: löschen, außer es wurde per keep()/handoff() übergeben."""
+        if self._owned:
+            self.cleanup()
+
+
+class WorkspaceManager:
+    def __init__(self, root, quota_bytes: int = 2 * 1024 ** 3, max_age_s: float = 6 * 3600,
+                 keep_s: float = 3600, janitor_interval_s: float = 300):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.quota_bytes = int(quota_bytes)
+        self.max_age_s = max_age_s
+        self.keep_s = keep_s
+        self.janitor_interval_s = janitor_interval_s
+        self._active: Dict[str, Workspace] = {}
+        self._lock = threading.Lock()
+        self._janitor: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._counters = {"created": 0, "cleaned": 0, "reaped": 0, "reaped_bytes": 0,
+                          "quota_violations": 0, "cleanup_errors": 0}
+
+    # --- Anlegen / Freigeben ---
+    def create(self, prefix: str = "req", quota_bytes: Optional[int] = None) -> Workspace:
+        name = f"{_safe_filename(prefix, 'req')}-{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        path = self.root / name
+        path.mkdir(parents=True)
+        ws = Workspace(self, path, int(quota_bytes or self.quota_bytes), self.keep_s)
+        self._mark(ws, expires=None)
+        with self._lock:
+            self._active[ws.id] = ws
+        self._counters["created"] += 1
+        return ws
+
+    @contextmanager
+    def workspace(self, prefix: str = "req", quota_bytes: Optional[int] = None):
+        ws = self.create(prefix, quota_bytes)
+        try:
+            yield ws
+        finally:
+            ws.close()
+
+    @asynccontextmanager
+    async def aworkspace(self, prefix: str = "req", quota_bytes: Optional[int] = None):
+        # finally greift auch bei asyncio.CancelledError (Client-Abbruch, Timeout)
+        ws = self.create(prefix, quota_bytes)
+        try:
+            yield ws
+        finally:
+            ws.close()
+
+    def _mark(self, ws: Workspace, expires: Optional[float]):
+        try:
+            with open(ws.path / MARKER, "w") as f:
+                json.dump({"pid": os.getpid(), "created": ws.created, "expires": expires}, f)
+        except OSError:
+            pass
+
+    def _release(self, ws: Workspace):
+        with self._lock:
+            self._active.pop(ws.id, None)
+
+    def _remove(self, ws: Workspace):
+        self._release(ws)
+        if not ws.path.exists():
+            return
+        try:
+            shutil.rmtree(ws.path)
+            self._counters["cleaned"] += 1
+        except OSError as e:
+            self._counters["cleanup_errors"] += 1
+            print(f"⚠️ Workspace {ws.id} nicht gelöscht: {e}")
+
+    def find(self, filename: str) -> Optional[Path]:
+        """Datei in einem (per keep() behaltenen) Workspace suchen – für Download-Endpunkte."""
+        name = _safe_filename(filename)
+        for candidate in self.root.glob(f"*/{name}"):
+            if candidate.is_file():
+                return candidate
+        return None
+
+    # --- Janitor ---
+    def reap(self, now: Optional[float] = None) -> dict:
+        """Verwaiste Workspaces löschen (nie die aktiven dieses Prozesses)."""
+        now = now or time.time()
+        removed, freed = [], 0
+        with self._lock:
+            active = set(self._active)
+        for path in self.root.iterdir():
+            if not path.is_dir() or path.name in active:
+                continue
+            meta = {}
+            try:
+                with open(path / MARKER) as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                pass
+            try:
+                mtime = path.stat().st_mtime
+            except OSError:
+                continue
+            age = now - (meta.get("created") or mtime)
+            pid = meta.get("pid")
+            if meta.get("expires") is not None:
+                stale = now >= meta["expires"]  # keep()/handoff() abgelaufen
+            elif pid != os.getpid() and _pid_alive(pid):
+                stale = age > 4 * self.max_age_s  # anderer Prozess (Worker) arbeitet evtl. noch daran
+            elif pid != os.getpid() and pid is not None:
+                stale = age > 60  # Besitzer-Prozess existiert nicht mehr (Crash, kill)
+            else:
+                stale = age > self.max_age_s
+            if not stale:
+                continue
+            size = dir_bytes(path)
+            shutil.rmtree(path, ignore_errors=True)
+            if not path.exists():
+                removed.append(path.name)
+                freed += size
+        if removed:
+            self._counters["reaped"] += len(removed)
+            self._counters["reaped_bytes"] += freed
+            print(f"🧹 Janitor: {len(removed)} Workspaces entfernt ({freed / 1e6:.1f} MB)")
+        return {"removed": removed, "bytes": freed}
+
+    def start_janitor(self) -> "WorkspaceManager":
+        if self._janitor and self._janitor.is_alive():
+            return self
+        self._stop.clear()
+
+        def _loop():
+            while not self._stop.is_set():
+                try:
+                    self.reap()
+                except Exception as e:
+                    print(f"⚠️ Janitor-Fehler: {e}")
+                self._stop.wait(self.janitor_interval_s)
+        self._janitor = threading.Thread(target=_loop, name="workspace-janitor", daemon=True)
+        self._janitor.start()
+        return self
+
+    def stop_janitor(self):
+        self._stop.set()
+
+    # --- Metriken ---
+    def metrics(self) -> dict:
+        with self._lock:
+            active = list(self._active.values())
+        try:
+            disk = shutil.disk_usage(self.root)
+            disk_info = {"total": disk.total, "used": disk.used, "free": disk.free}
+        except OSError:
+            disk_info = None
+        entries = [p for p in self.root.iterdir() if p.is_dir()]
+        return {
+            **self._counters,
+            "root": str(self.root),
+            "active": len(active),
+            "active_bytes": sum(ws.written for ws in active),
+            "directories": len(entries),
+            "root_bytes": sum(dir_bytes(p) for p in entries),
+            "quota_bytes": self.quota_bytes,
+            "disk": disk_info,
+            "oldest_active_s": round(time.time() - min(ws.created for ws in active), 1) if active else None,
+        }
+
+
+def _pid_alive(pid) -> bool:
+    if not isinstance(pid, int) or pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+_managers: Dict[str, WorkspaceManager] = {}
+
+
+def default_manager(service: str, start_janitor: bool = True) -> WorkspaceManager:
+    """Ein Manager pro Service unter WORKSPACE_ROOT (Default /tmp/workspaces/<service>)."""
+    manager = _managers.get(service)
+    if manager is None:
+        manager = WorkspaceManager(
+            os.path.join(os.getenv("WORKSPACE_ROOT", "/tmp/workspaces"), service),
+            quota_bytes=int(float(os.getenv("WORKSPACE_QUOTA_MB", "2048")) * 1024 * 1024),
+            max_age_s=float(os.getenv("WORKSPACE_MAX_AGE_S", str(6 * 3600))),
+            keep_s=float(os.getenv("WORKSPACE_KEEP_S", "3600")),
+            janitor_interval_s=float(os.getenv("WORKSPACE_JANITOR_INTERVAL_S", "300")),
+        )
+        _managers[service] = manager
+    if start_janitor:
+        manager.start_janitor()
+    return manager
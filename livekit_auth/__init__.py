@@ -0,0 +1 @@
+"""LiveKit-Token-Signatur und Rate-Limit – gemeinsam für Orchestrator, Backend und Agents."""
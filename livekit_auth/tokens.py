@@ -0,0 +1,152 @@
+"""LiveKit Access-Token Service (Orchestrator, Backend, Agents).
+
+- HS256-Signatur-Fast-Path: Header-Segment und HMAC-Key einmal vorberechnen,
+  pro Token nur Payload serialisieren + HMAC (kompatibel zu PyJWT/LiveKit).
+- Token-Cache pro (room, identity, name, grants) bis kurz vor Ablauf.
+- Token-Bucket-Rate-Limit pro Identity bzw. Client (Reconnect-Schleifen von Clients).
+
+Einzige Implementierung im Repo: orchestrator/py_asgi_app.py, das Backend
+(backend/app/livekit_tokens.py) und bithuman_pipeline.live_agent importieren
+von hier; die Images bringen das Paket mit (add_local_dir/add_local_python_source/COPY).
+"""
+import base64
+import hashlib
+import hmac
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+
+def _b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+class FastHS256Signer:
+    """JWT HS256 ohne PyJWT-Overhead; Ergebnis ist ein Standard-JWT."""
+
+    def __init__(self, secret: str):
+        self._header = _b64url(b'{"alg":"HS256","typ":"JWT"}')
+        self._mac = hmac.new(secret.encode("utf-8"), digestmod=hashlib.sha256)
+
+    def sign(self, payload: dict) -> str:
+        body = _b64url(json.dumps(payload, separators=(",", ":"), sort_keys=True).encode("utf-8"))
+        signing_input = f"{self._header}.{body}"
+        mac = self._mac.copy()
+        mac.update(signing_input.encode("ascii"))
+        return f"{signing_input}.{_b64url(mac.digest())}"
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"rate limited, retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class IdentityRateLimiter:
+    """Token Bucket pro Identity (burst Anfragen sofort, danach rate/s)."""
+
+    def __init__(self, rate_per_sec: float = 2.0, burst: int = 10, max_identities: int = 10000,
+                 clock: Callable[[], float] = time.monotonic):
+        self.rate = float(rate_per_sec)
+        self.burst = float(burst)
+        self.max_identities = max_identities
+        self._clock = clock
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, identity: str):
+        if self.rate <= 0:
+            return
+        now = self._clock()
+        with self._lock:
+            tokens, last = self._buckets.pop(identity, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens < 1.0:
+                self._buckets[identity] = (tokens, now)
+                raise RateLimited((1.0 - tokens) / self.rate)
+            self._buckets[identity] = (tokens - 1.0, now)
+            while len(self._buckets) > self.max_identities:
+                self._buckets.popitem(last=False)
+
+
+class LiveKitTokenService:
+    def __init__(
+        self,
+        api_key: str,
+        api_secret: str,
+        ttl_seconds: int = 3600,
+        refresh_margin_seconds: int = 300,
+        max_entries: int = 5000,
+        rate_limiter: Optional[IdentityRateLimiter] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.api_key = api_key
+        self.ttl = int(ttl_seconds)
+        self.refresh_margin = int(refresh_margin_seconds)
+        self.max_entries = max_entries
+        self.rate_limiter = rate_limiter
+        self._clock = clock
+        self._signer = FastHS256Signer(api_secret)
+        self._cache: OrderedDict[tuple, tuple[str, int]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "rate_limited": 0}
+
+    def _mint(self, identity: str, name: Optional[str], grant_key: str, grants: dict) -> tuple[str, int]:
+        now = int(self._clock())
+        exp = now + self.ttl
+        payload = {
+            "iss": self.api_key,
+            "sub": identity,
+            "nbf": now,
+            "exp": exp,
+            grant_key: grants,
+        }
+        if name:
+            payload["name"] = name
+        return self._signer.sign(payload), exp
+
+    def get_token(
+        self,
+        room: str,
+        identity: str,
+        name: Optional[str] = None,
+        grant_key: str = "video",
+        grants: Optional[dict] = None,
+        cacheable: bool = True,
+        rate_limit: bool = True,
+        rate_key: Optional[str] = None,
+    ) -> str:
+        """Signiertes Token liefern; aus dem Cache solange es > refresh_margin gültig ist.
+
+        rate_key: Bucket fürs Rate-Limit (Default: identity), z. B. Client-IP bei anonymen Anfragen.
+        """
+        if rate_limit and self.rate_limiter is not None:
+            try:
+                self.rate_limiter.check(rate_key or identity)
+            except RateLimited:
+                self.stats["rate_limited"] += 1
+                raise
+        grants = grants or {"room": room, "roomJoin": True}
+        key = (room, identity, name or "", grant_key, json.dumps(grants, sort_keys=True))
+        now = self._clock()
+        if cacheable:
+            with self._lock:
+                hit = self._cache.get(key)
+                if hit and hit[1] - now > self.refresh_margin:
+                    self._cache.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return hit[0]
+        token, exp = self._mint(identity, name, grant_key, grants)
+        self.stats["misses"] += 1
+        if cacheable:
+            with self._lock:
+                self._cache[key] = (token, exp)
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+        return token
+
+    def metrics(self) -> dict:
+        return {**self.stats, "cached": len(self._cache)}
@@ -11,8 +11,6 @@ Deploy: modal deploy modal_bithuman_worker_serve.py
 import modal
 import logging
 import os
-import json
-from typing import Dict, Any
 
 # Modal Image
 image = (
@@ -26,6 +24,7 @@ image = (
         "pinecone>=5.0.0",
         "openai>=1.35.0",
     )
+    .add_local_python_source("bithuman_pipeline")
 )
 
 app = modal.App("bithuman-worker-serve", image=image)
@@ -49,7 +48,7 @@ from livekit.agents import (
     WorkerType,
     cli,
 )
-from livekit.plugins import bithuman, openai, silero
+from livekit.plugins import bithuman, openai
 
 try:
     from livekit.plugins import elevenlabs
@@ -57,17 +56,13 @@ try:
 except ImportError:
     ELEVENLABS_AVAILABLE = False
 
-try:
-    import firebase_admin
-    from firebase_admin import credentials, firestore
-    FIREBASE_AVAILABLE = True
-except ImportError:
-    FIREBASE_AVAILABLE = False
+from bithuman_pipeline.agent_bootstrap import ParticipantTimeout, PhaseTimer, get_model, prewarm, wait_for_participant
+from bithuman_pipeline.agent_config import config_service
+from bithuman_pipeline.grounded_llm import GroundedResponder, PineconeMistralLLM
 
 try:
-    from pinecone import Pinecone
-    from openai import OpenAI as OpenAIClient
-    import asyncio
+    import pinecone  # noqa: F401
+    from bithuman_pipeline.knowledge import KnowledgeBase
     PINECONE_AVAILABLE = True
 except ImportError:
     PINECONE_AVAILABLE = False
@@ -76,91 +71,22 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("bithuman-worker")
 
 
-# Knowledge Base (Pinecone)
-class KnowledgeBase:
-    def __init__(self, pc_key: str, index_name: str, openai_key: str, namespace: str = None):
-        self.namespace = namespace
-        self.openai_client = OpenAIClient(api_key=openai_key)
-        self.pc = Pinecone(api_key=pc_key)
-        self.index = self.pc.Index(index_name)
-    
-    async def query(self, question: str, top_k: int = 5):
-        try:
-            # Embedding
-            resp = await asyncio.to_thread(
-                self.openai_client.embeddings.create,
-                model="text-embedding-ada-002",
-                input=question
-            )
-            vec = resp.data[0].embedding
-            
-            # Query Pinecone
-            params = {"vector": vec, "top_k": top_k, "include_metadata": True}
-            if self.namespace:
-                params["namespace"] = self.namespace
-            
-            results = await asyncio.to_thread(self.index.query, **params)
-            
-            matches = [m for m in results.matches if m.score > 0.7]
-            if not matches:
-                return None
-            
-            context = "\\n\\n".join([
-                f"[{m.metadata.get('source', 'Unknown')}]: {m.metadata.get('text', '')}"
-                for m in matches[:3]
-            ])
-            logger.info(f"✅ Pinecone: {len(matches)} matches")
-            return context
-        except Exception as e:
-            logger.error(f"❌ Pinecone: {e}")
-            return None
-
-
-def get_config(agent_id: str) -> Dict[str, Any]:
-    """Load config from Firebase"""
-    if not FIREBASE_AVAILABLE:
-        return {}
-    try:
-        if not firebase_admin._apps:
-            creds = os.getenv("FIREBASE_CREDENTIALS")
-            if creds:
-                cred = credentials.Certificate(json.loads(creds))
-                firebase_admin.initialize_app(cred)
-        
-        db = firestore.client()
-        query = db.collection("avatars").where("liveAvatar.agentId", "==", agent_id).limit(1)
-        
-        for doc in query.stream():
-            data = doc.to_dict()
-            voice = data.get("training", {}).get("voice", {})
-            vid = voice.get("cloneVoiceId") or voice.get("elevenVoiceId")
-            if vid == "__CLONE__":
-                vid = None
-            
-            live_avatar = data.get("liveAvatar", {})
-            bh_model = live_avatar.get("model", "essence")
-            
-            return {
-                "voice_id": vid.strip() if vid else None,
-                "namespace": f"{data.get('userId', '')}_{doc.id}",
-                "instructions": data.get("personality"),
-                "name": data.get("name", "Avatar"),
-                "bithuman_model": bh_model,
-            }
-        return {}
-    except Exception as e:
-        logger.error(f"Firebase error: {e}")
-        return {}
-
-
 async def entrypoint(ctx: JobContext):
     """Main entrypoint"""
+    timer = PhaseTimer()
     await ctx.connect()
+    timer.mark("connect")
     logger.info(f"✅ Connected to room: {ctx.room.name}")
     
-    # Wait for participant
+    # Wait for participant (Room-Events, kein Polling)
     logger.info("⏳ Waiting for participant...")
-    await ctx.wait_for_participant()
+    try:
+        await wait_for_participant(ctx.room)
+    except ParticipantTimeout as e:
+        logger.warning(f"⏱️ {e} → Job beendet")
+        ctx.shutdown(reason="no participant")
+        return
+    timer.mark("participant")
     logger.info("✅ Participant joined!")
     
     # Get Agent ID from room metadata
@@ -171,11 +97,12 @@ async def entrypoint(ctx: JobContext):
     
     logger.info(f"🤖 Agent ID: {agent_id}")
     
-    # Load config
-    config = get_config(agent_id)
+    # Config aus dem Index des Workers (kein Firestore-Query pro Join)
+    config = await config_service().aget(agent_id)
+    timer.mark("config")
     voice_id = config.get("voice_id") or os.getenv("ELEVEN_DEFAULT_VOICE_ID")
     namespace = config.get("namespace")
-    bh_model = config.get("bithuman_model", "essence")
+    bh_model = config.get("bithuman_model") or "essence"
     
     logger.info(f"🎤 Voice: {voice_id}, NS: {namespace}, Model: {bh_model}")
     
@@ -183,64 +110,22 @@ async def entrypoint(ctx: JobContext):
     kb = None
     if PINECONE_AVAILABLE and os.getenv("PINECONE_API_KEY"):
         try:
-            kb = KnowledgeBase(
-                os.getenv("PINECONE_API_KEY"),
-                os.getenv("PINECONE_INDEX_NAME", "avatars-index"),
-                os.getenv("OPENAI_API_KEY"),
-                namespace
-            )
+            kb = KnowledgeBase.from_env(namespace)
+            kb.start_prefetch()  # häufige Chunks/Fragen des Avatars im Hintergrund vorladen
             logger.info(f"✅ Knowledge Base initialized (index=avatars-index, namespace={namespace})")
         except Exception as e:
             logger.warning(f"⚠️ Knowledge Base init failed: {e}")
             kb = None
     
-    # LLM Setup - Mistral AI (kein OpenAI für LLM!)
-    from mistralai import Mistral as MistralClient
-    mistral = MistralClient(api_key=os.getenv("MISTRAL_API_KEY"))
-    
-    # Custom LLM Wrapper mit Pinecone + Mistral
-    class PineconeMistralLLM:
-        def __init__(self, mistral_client, kb):
-            self.mistral = mistral_client
-            self.kb = kb
-        
-        async def chat(self, chat_ctx):
-            # Letzten User-Prompt holen
-            last_msg = chat_ctx.messages[-1] if chat_ctx.messages else None
-            if not last_msg or last_msg.role != "user":
-                # Fallback ohne Kontext
-                resp = await asyncio.to_thread(
-                    self.mistral.chat.complete,
-                    model="mistral-small-latest",
-                    messages=[{"role": m.role, "content": m.content} for m in chat_ctx.messages]
-                )
-                return resp.choices[0].message.content
-            
-            prompt = last_msg.content
-            
-            # 1. Pinecone abfragen
-            ctx = await self.kb.query(prompt) if self.kb else None
-            
-            # 2. Wenn Pinecone Kontext hat → DIREKT zurückgeben (KEINE LLM Moderation!)
-            if ctx and ctx.strip():
-                logger.info("✅ Pinecone Kontext gefunden → DIREKTE Antwort (kein LLM)")
-                return ctx
-            
-            # 3. Nur wenn KEIN Pinecone Kontext → Mistral AI
-            logger.info("⚠️ Kein Pinecone Kontext → Mistral AI Fallback")
-            resp = await asyncio.to_thread(
-                self.mistral.chat.complete,
-                model="mistral-small-latest",
-                messages=[{"role": m.role, "content": m.content} for m in chat_ctx.messages]
-            )
-            return resp.choices[0].message.content
-    
-    llm = PineconeMistralLLM(mistral, kb) if kb else openai.LLM(model="gpt-4o-mini")
-    logger.info("✅ LLM: Pinecone + Mistral (BitHuman Voice aktiv!)")
+    # LLM: immer aus dem KB-Kontext generiert, Token gestreamt (Mistral, Fallback OpenAI)
+    responder = GroundedResponder.from_env(kb)
+    llm = PineconeMistralLLM(responder) if responder else openai.LLM(model="gpt-4o-mini")
+    logger.info(f"✅ LLM: Pinecone + {responder.client.model if responder else 'gpt-4o-mini'} (Streaming)")
     
     # Agent Session (VAD + LLM) - KEIN TTS! BitHuman nutzt seine eigene Voice!
     logger.info("🎵 Using BitHuman's own voice (from avatar creation)")
-    session = AgentSession(llm=llm, vad=silero.VAD.load())
+    session = AgentSession(llm=llm, vad=get_model("vad", ctx.proc.userdata))  # aus prewarm
+    timer.mark("session")
     
     # BitHuman Avatar
     logger.info(f"🎬 Creating BitHuman Avatar (model={bh_model})...")
@@ -254,6 +139,7 @@ async def entrypoint(ctx: JobContext):
     # Start Avatar
     logger.info("🚀 Starting Avatar...")
     await avatar.start(session, room=ctx.room)
+    timer.mark("avatar")
     logger.info("🎥 Avatar STARTED!")
     
     # Start Agent
@@ -263,6 +149,8 @@ async def entrypoint(ctx: JobContext):
         room=ctx.room,
         room_output_options=RoomOutputOptions(audio_enabled=False)
     )
+    timer.mark("agent")
+    timer.report(ctx.room.name)
     logger.info("✅ Agent running!")
 
 
@@ -277,12 +165,16 @@ async def entrypoint(ctx: JobContext):
 )
 def run_worker():
     """Runs the LiveKit Worker"""
+    # Agent-Configs einmal laden + Listener; Job-Prozesse lesen den Snapshot
+    config_service().start()
     cli.run_app(
         WorkerOptions(
             entrypoint_fnc=entrypoint,
+            prewarm_fnc=prewarm,  # VAD einmal pro Job-Prozess, vor dem Job
             worker_type=WorkerType.ROOM,
             job_memory_warn_mb=4000,
-            num_idle_processes=0,
+            # ein vorgewärmter Prozess wartet auf den nächsten Join (Container läuft ohnehin)
+            num_idle_processes=int(os.getenv("AGENT_IDLE_PROCESSES", "1")),
             initialize_process_timeout=180,
         )
     )
@@ -10,14 +10,15 @@ import sys
 import os
 import subprocess
 import json
-from pathlib import Path
 from datetime import datetime
-from typing import List
-import uuid
 
 # FFmpeg-/FFprobe-Pfade robust bestimmen (nutze /usr/local wenn vorhanden, sonst PATH)
 FFMPEG_BIN = '/usr/local/bin/ffmpeg' if os.path.exists('/usr/local/bin/ffmpeg') else 'ffmpeg'
 FFPROBE_BIN = '/usr/local/bin/ffprobe' if os.path.exists('/usr/local/bin/ffprobe') else 'ffprobe'
+MEDIA_CACHE_DIR = '/tmp/media_cache'  # Download-Cache pro Container (warme Container teilen ihn)
+LP_WEIGHTS_DIR = '/opt/liveportrait/pretrained_weights'
+ENGINE_CACHE_DIR = '/tensorrt_cache'
+WORKER_IDLE_WINDOW_S = 20  # = scaledown_window von generate_dynamics
 
 # Modal App
 app = modal.App("sunriza-dynamics")
@@ -25,6 +26,10 @@ app = modal.App("sunriza-dynamics")
 # TensorRT Cache Volume (persistent für alle Requests!)
 tensorrt_cache = modal.Volume.from_name("tensorrt-engine-cache", create_if_missing=True)
 
+# Ergebnis-Cache (content-addressed: Input-Bytes + Parameter → fertige Assets)
+result_cache_volume = modal.Volume.from_name("dynamics-result-cache", create_if_missing=True)
+RESULT_CACHE_DIR = "/result_cache"
+
 # Docker Image mit GPU Support - NVIDIA CUDA 12.6 Base Image für neueste onnxruntime-gpu!
 # FORCE REBUILD v9: 2025-10-16-09:26 - FFmpeg 8.0 REQUIRED for xfade!
 image = (
@@ -57,18 +62,169 @@ image = (
         # Force rebuild marker - edit to force rebuild
         "echo 'REBUILD: 2025-10-31-19:30'",  # ← Change date/time to force rebuild
     )
+    # SHA-256-Manifest der Weights beim Build → Container prüfen gegen Checksummen statt Dateigrößen
+    .add_local_file("dynamics_pipeline/readiness.py", "/opt/readiness.py", copy=True)
+    .run_commands(f"python3 /opt/readiness.py manifest {LP_WEIGHTS_DIR}")
+    # Pipeline-Bausteine (Packaging etc.) als lokales Python-Paket mitliefern
+    .add_local_python_source("dynamics_pipeline")
 )
 
+
+def _init_firebase():
+    """Firebase initialisieren (Modal: aus Secret, lokal: Default Credentials) → (bucket, db)"""
+    import firebase_admin
+    from firebase_admin import credentials, storage, firestore
+    if not firebase_admin._apps:
+        cred_json = os.getenv("FIREBASE_CREDENTIALS")
+        if cred_json:
+            cred_dict = json.loads(cred_json)
+            cred = credentials.Certificate(cred_dict)
+        else:
+            cred = None
+        
+        # Hauau-Prod Bucket verwenden (neues Firebase-Projekt)
+        firebase_admin.initialize_app(cred, {
+            'storageBucket': 'hauau-prod.firebasestorage.app'
+        })
+    return storage.bucket(), firestore.client()
+
+
+def _norm_params(p: dict) -> dict:
+    """Parameter normalisieren (camelCase ➜ snake_case) und Defaults setzen"""
+    p = p or {}
+    m = {
+        'drivingMultiplier': 'driving_multiplier',
+        'normalizeLip': 'flag_normalize_lip',
+        'flagNormalizeLip': 'flag_normalize_lip',
+        'pasteback': 'flag_pasteback',
+        'flagPasteback': 'flag_pasteback',
+        'animationRegion': 'animation_region',
+        'sourceMaxDim': 'source_max_dim',
+        'source_maxdim': 'source_max_dim',
+    }
+    out = {}
+    for k, v in p.items():
+        key = m.get(k, k)
+        out[key] = v
+    # Defaults wie lokal
+    out.setdefault('driving_multiplier', 0.41)
+    out.setdefault('flag_normalize_lip', True)
+    out.setdefault('flag_pasteback', True)
+    out.setdefault('animation_region', 'all')
+    out.setdefault('source_max_dim', 1600)
+    out.setdefault('scale', 2.0)
+    return out
+
+
+def _result_cache():
+    from dynamics_pipeline.result_cache import DynamicsResultCache
+    return DynamicsResultCache(
+        RESULT_CACHE_DIR,
+        max_bytes=int(float(os.getenv("DYNAMICS_CACHE_MAX_GB", "20")) * 1024 ** 3),
+        max_age_s=float(os.getenv("DYNAMICS_CACHE_MAX_AGE_DAYS", "30")) * 86400,
+    )
+
+
+def _request_fingerprint(avatar_data: dict, parameters: dict):
+    """Vorab-Schlüssel aus Hero-URLs + ETag/Länge (HEAD) – None, wenn nicht ermittelbar."""
+    from dynamics_pipeline.result_cache import head_validator, request_fingerprint
+    urls = [avatar_data.get('avatarImageUrl'), (avatar_data.get('training') or {}).get('heroVideoUrl')]
+    if not all(urls):
+        return None
+    validators = [head_validator(u) for u in urls]
+    if not all(validators):
+        return None
+    return request_fingerprint(validators, _norm_params(parameters))
+
+
+def _write_dynamics_doc(avatar_ref, dynamics_id: str, parameters: dict, urls: dict):
+    """Firestore dynamics.{id} schreiben (idleVideoUrl, Chunks, frames/latents)."""
+    print(f"💾 Updating Firestore...")
+    dynamics_data = {
+        **urls,  # idleVideoUrl, framesZipUrl, latentsUrl, idleChunk1..3Url, heroImageChunkUrl
+        'parameters': parameters,
+        'generatedAt': datetime.utcnow(),
+        'status': 'ready'
+    }
+    avatar_ref.update({
+        f'dynamics.{dynamics_id}': dynamics_data
+    })
+
+
+def _publish_dynamics(bucket, avatar_id: str, dynamics_id: str, local_files: dict) -> dict:
+    """
+    Assets zu Firebase Storage hochladen – parallel, Retries pro Datei,
+    Manifest im Storage: ein erneuter Lauf überspringt bereits hochgeladene Assets.
+    
+    local_files: idle, hero_chunk, chunk1..3, frames_zip, latents → lokaler Pfad (oder None)
+    Returns: Firestore-Felder (URLs) + 'idleBlob'
+    """
+    from dynamics_pipeline.uploads import FirebaseStorage, upload_assets
+    
+    dyn_prefix = f"avatars/{avatar_id}/dynamics/{dynamics_id}"
+    chunks_prefix = f"avatars/{avatar_id}/dynamics/basic/idle_chunks"
+    targets = {
+        # idle.mp4 (mit Download-Token, damit die Console einen klickbaren Link zeigt)
+        'idle': (f"{dyn_prefix}/idle.mp4", 'video/mp4'),
+        # Hero Frame → avatars/{id}/dynamics/basic/idle_chunks/heroImage_chunk.jpg
+        'hero_chunk': (f"{chunks_prefix}/heroImage_chunk.jpg", 'image/jpeg'),
+        'chunk1': (f"{chunks_prefix}/idle_chunk1.mp4", 'video/mp4'),
+        'chunk2': (f"{chunks_prefix}/idle_chunk2.mp4", 'video/mp4'),
+        'chunk3': (f"{chunks_prefix}/idle_chunk3.mp4", 'video/mp4'),
+        'frames_zip': (f"{dyn_prefix}/frames.zip", 'application/zip'),
+        # latents (pre-computed für schnellen MuseTalk Cold Start!)
+        'latents': (f"{dyn_prefix}/latents.npz", 'application/octet-stream'),
+    }
+    if not all(local_files.get(f'chunk{i}') for i in (1, 2, 3)):
+        print(f"⚠️ Chunk-Generierung fehlgeschlagen – Chunks werden nicht hochgeladen")
+        local_files = {k: v for k, v in local_files.items() if not k.startswith('chunk')}
+    assets = [
+        {'key': key, 'local_path': path, 'remote_path': targets[key][0], 'content_type': targets[key][1]}
+        for key, path in local_files.items()
+        if key in targets and path and os.path.exists(path)
+    ]
+    
+    # (keine Uploads von atlas/mask/roi)
+    uploaded = upload_assets(
+        FirebaseStorage(bucket),
+        assets,
+        manifest_path=f"{dyn_prefix}/upload_manifest.json",
+        max_workers=int(os.getenv("DYNAMICS_UPLOAD_WORKERS", "4")),
+        retries=int(os.getenv("DYNAMICS_UPLOAD_RETRIES", "3")),
+    )
+    if 'idle' not in uploaded:
+        raise RuntimeError("idle.mp4 Upload fehlgeschlagen")
+    
+    urls = {'idleVideoUrl': uploaded['idle']['url'], 'idleBlob': targets['idle'][0]}
+    # Chunks nur komplett übernehmen (Client erwartet alle drei)
+    if all(f'chunk{i}' in uploaded for i in (1, 2, 3)):
+        for i in (1, 2, 3):
+            urls[f'idleChunk{i}Url'] = uploaded[f'chunk{i}']['url']
+        if 'hero_chunk' in uploaded:
+            urls['heroImageChunkUrl'] = uploaded['hero_chunk']['url']
+        print(f"✅ 3 Chunks uploaded")
+    if 'frames_zip' in uploaded:
+        urls['framesZipUrl'] = uploaded['frames_zip']['url']
+    if 'latents' in uploaded:
+        urls['latentsUrl'] = uploaded['latents']['url']
+        print(f"✅ Latents uploaded: {urls['latentsUrl']}")
+    print(f"✅ Uploaded ALLE Assets!")
+    return urls
+
+
 @app.function(
     image=image,
     gpu="T4",
     timeout=900,  # bis zu 15 Minuten für Cold Start + LP-Run
     min_containers=0,  # scale-to-zero (keine Fixkosten)
-    scaledown_window=20,  # schneller Shutdown spart Kosten
+    scaledown_window=WORKER_IDLE_WINDOW_S,  # schneller Shutdown spart Kosten
     secrets=[modal.Secret.from_name("firebase-credentials")],
-    volumes={"/tensorrt_cache": tensorrt_cache},  # TensorRT Cache persistent mounten
+    volumes={
+        ENGINE_CACHE_DIR: tensorrt_cache,  # TensorRT Cache persistent mounten
+        RESULT_CACHE_DIR: result_cache_volume,
+    },
 )
-def generate_dynamics(avatar_id: str, dynamics_id: str, parameters: dict):
+def generate_dynamics(avatar_id: str, dynamics_id: str, parameters: dict, force: bool = False, job_id: str = None):
     """
     1:1 KOPIE von backend/generate_dynamics_endpoint.py
     Generiere Dynamics für einen Avatar
@@ -77,546 +233,628 @@ def generate_dynamics(avatar_id: str, dynamics_id: str, parameters: dict):
         avatar_id: Firestore avatar document ID
         dynamics_id: Name der Dynamics (z.B. 'basic', 'lachen')
         parameters: Dict mit driving_multiplier, scale, source_max_dim
+        force: Ergebnis-Cache ignorieren und neu generieren
+        job_id: Job-Record in Firestore (dynamicsJobs) für Stage-Fortschritt/ETA
     """
-    import firebase_admin
-    from firebase_admin import credentials, storage, firestore
-    import requests
-    from huggingface_hub import snapshot_download
-    # Sicherstellen, dass die LivePortrait-Weights vollständig vorhanden sind
-    def _ensure_lp_weights(force: bool = False) -> None:
-        weights_dir = "/opt/liveportrait/pretrained_weights"
+    bucket, db = _init_firebase()
+    
+    # Job-Record: Stage-Fortschritt + ETA für GET /jobs/{id} (ohne job_id nur Logs)
+    from dynamics_pipeline import jobs as dyn_jobs
+    job_store = dyn_jobs.FirestoreJobStore(db) if job_id else None
+    
+    def _job(action: str, *args, **kwargs):
+        if job_store is None:
+            return
         try:
-            os.makedirs(weights_dir, exist_ok=True)
-            # Prüfe grob, ob genügend .pth Dateien vorhanden sind und nicht 0 Bytes groß
-            pth_files: List[Path] = list(Path(weights_dir).rglob("*.pth"))
-            ok = (len(pth_files) >= 5) and all(f.stat().st_size > 1024 for f in pth_files)
-            if force or not ok:
-                print("⬇️ Lade/prüfe LivePortrait Weights von HuggingFace…")
-                snapshot_download(
-                    repo_id="KwaiVGI/LivePortrait",
-                    local_dir=weights_dir,
-                    local_dir_use_symlinks=False,
-                    allow_patterns=["pretrained_weights/*"],
-                    resume_download=True,
-                )
+            getattr(dyn_jobs, action)(job_store, job_id, *args, **kwargs)
         except Exception as e:
-            print(f"⚠️ Konnte Weights nicht verifizieren/laden: {e}")
-    
-    # Firebase initialisieren (Modal: aus Secret, lokal: aus File)
-    if not firebase_admin._apps:
-        cred_json = os.getenv("FIREBASE_CREDENTIALS")
-        if cred_json:
-            cred_dict = json.loads(cred_json)
-            cred = credentials.Certificate(cred_dict)
-        else:
-            cred = None
-        
-        # Hauau-Prod Bucket verwenden (neues Firebase-Projekt)
-        firebase_admin.initialize_app(cred, {
-            'storageBucket': 'hauau-prod.firebasestorage.app'
-        })
+            print(f"⚠️ Job-Fortschritt nicht gespeichert: {e}")
     
-    bucket = storage.bucket()
-    db = firestore.client()
+    from dynamics_pipeline.estimator import features_for
     
-    print(f"🎭 Generiere Dynamics '{dynamics_id}' für Avatar {avatar_id}")
+    _job('start_job')
     
-    # 1. Avatar-Daten laden
-    avatar_ref = db.collection('avatars').document(avatar_id)
-    avatar_doc = avatar_ref.get()
+    # Readiness einmal pro Container (Weights-Checksummen, TensorRT-Engines) – läuft parallel
+    # zu Download/Trim, vor der Inferenz wird darauf gewartet
+    import threading
+    readiness = _readiness()
+    warm_start = readiness.begin_job()
+    # busy wird im finally wieder freigegeben – auch bei Exceptions und sys.exit
+    job_seconds = None
     
-    if not avatar_doc.exists:
-        raise Exception(f"Avatar {avatar_id} nicht gefunden")
-    
-    avatar_data = avatar_doc.to_dict()
-    
-    # Hilfsfunktion: Parameter normalisieren (camelCase ➜ snake_case) und Defaults setzen
-    def _norm_params(p: dict) -> dict:
-        p = p or {}
-        m = {
-            'drivingMultiplier': 'driving_multiplier',
-            'normalizeLip': 'flag_normalize_lip',
-            'flagNormalizeLip': 'flag_normalize_lip',
-            'pasteback': 'flag_pasteback',
-            'flagPasteback': 'flag_pasteback',
-            'animationRegion': 'animation_region',
-            'sourceMaxDim': 'source_max_dim',
-            'source_maxdim': 'source_max_dim',
-        }
-        out = {}
-        for k, v in p.items():
-            key = m.get(k, k)
-            out[key] = v
-        # Defaults wie lokal
-        out.setdefault('driving_multiplier', 0.41)
-        out.setdefault('flag_normalize_lip', True)
-        out.setdefault('flag_pasteback', True)
-        out.setdefault('animation_region', 'all')
-        out.setdefault('source_max_dim', 1600)
-        out.setdefault('scale', 2.0)
-        return out
-
-    # 2. Hero-Image & Hero-Video laden
-    hero_image_url = avatar_data.get('avatarImageUrl')
-    hero_video_url = avatar_data.get('training', {}).get('heroVideoUrl')
-    
-    if not hero_image_url or not hero_video_url:
-        raise Exception("Hero-Image oder Hero-Video fehlt")
-    
-    # 3. Assets herunterladen
-    hero_image_path = f'/tmp/{avatar_id}_hero.jpg'
-    hero_video_path = f'/tmp/{avatar_id}_hero_video.mp4'
-    
-    print(f"📥 Lade Hero-Image...")
-    resp = requests.get(hero_image_url, stream=True, timeout=60)
-    resp.raise_for_status()
-    with open(hero_image_path, 'wb') as f:
-        for chunk in resp.iter_content(chunk_size=8192):
-            f.write(chunk)
-    
-    print(f"📥 Lade Hero-Video...")
-    resp = requests.get(hero_video_url, stream=True, timeout=60)
-    resp.raise_for_status()
-    with open(hero_video_path, 'wb') as f:
-        for chunk in resp.iter_content(chunk_size=8192):
-            f.write(chunk)
-    
-    # 4. Video trimmen (10 Sekunden) - EXAKT wie lokal!
-    trimmed_video_path = f'/tmp/{avatar_id}_trimmed.mp4'
-    print(f"✂️ Trimme Video auf 10 Sekunden...")
-    
-    # Zeige Input-Größen
-    hero_video_size = os.path.getsize(hero_video_path)
-    hero_image_size = os.path.getsize(hero_image_path)
-    print(f"📊 Hero-Video: {hero_video_size / 1024 / 1024:.2f} MB")
-    print(f"📊 Hero-Image: {hero_image_size / 1024:.2f} KB")
-    
-    # WICHTIG:
-    # - Wir wollen IMMER ein sauberes 10‑Sekunden‑Video mit VIDEOSTREAM erzeugen.
-    # - Deshalb NICHT mehr nur `-c:v copy`, sondern neu nach H.264 encoden.
-    # - Audio ist für LivePortrait egal → wir deaktivieren Audio explizit.
-    trim_cmd = [
-        FFMPEG_BIN,
-        '-y',
-        '-i', hero_video_path,
-        '-ss', '0',
-        '-t', '10',
-        '-c:v', 'libx264',
-        '-preset', 'ultrafast',
-        '-crf', '18',
-        '-an',  # kein Audio nötig
-        trimmed_video_path,
-    ]
-    result = subprocess.run(trim_cmd, capture_output=True)
-    if result.returncode != 0:
-        print(f"❌ Trimmen fehlgeschlagen!")
+    def _exit_failed(reason: str):
+        # Client liest Firestore – ohne FAILED bliebe der Job "running" und blockiert das User-Limit
+        _job('fail_job', reason)
         sys.exit(1)
     
-    # Zeige getrimte Video-Größe
-    trimmed_size = os.path.getsize(trimmed_video_path)
-    print(f"📊 Getrimtes Video: {trimmed_size / 1024 / 1024:.2f} MB")
-    
-    # 5. LivePortrait starten
-    print(f"🎬 Starte LivePortrait...")
-    
-    lp_output_dir = f'/tmp/{avatar_id}_lp_output'
-    os.makedirs(lp_output_dir, exist_ok=True)
-    
-    # Modal: LivePortrait in /opt/liveportrait installiert
-    python_executable = sys.executable
-    liveportrait_path = '/opt/liveportrait/inference.py'
-    
-    norm = _norm_params(parameters)
-    # LivePortrait soll IMMER mit dem neuen, 10s getrimmten Video laufen.
-    driving_video_path = trimmed_video_path
+    try:
+        _publish_worker(db, readiness.probe())
+        threading.Thread(target=readiness.ensure_ready, name='readiness', daemon=True).start()
+        print(f"🌡️ Container {'warm' if warm_start else 'kalt'} ({readiness.worker_id})")
+    
+        print(f"🎭 Generiere Dynamics '{dynamics_id}' für Avatar {avatar_id}")
+    
+        # 1. Avatar-Daten laden
+        avatar_ref = db.collection('avatars').document(avatar_id)
+        avatar_doc = avatar_ref.get()
+    
+        if not avatar_doc.exists:
+            raise Exception(f"Avatar {avatar_id} nicht gefunden")
+    
+        avatar_data = avatar_doc.to_dict()
+    
+        # 2. Hero-Image & Hero-Video laden
+        hero_image_url = avatar_data.get('avatarImageUrl')
+        hero_video_url = avatar_data.get('training', {}).get('heroVideoUrl')
+    
+        if not hero_image_url or not hero_video_url:
+            raise Exception("Hero-Image oder Hero-Video fehlt")
+    
+        # 3. Ergebnis-Cache vor dem Download: Request-Fingerprint (HEAD: ETag/Länge + Parameter)
+        #    → bei Treffer weder Download noch Trim
+        from dynamics_pipeline.result_cache import cache_key
+        norm = _norm_params(parameters)
+        result_cache = _result_cache()
+        result_key = f"{avatar_id}/{dynamics_id}"
+        fingerprint = _request_fingerprint(avatar_data, parameters)
+        content_key = cached = None
+        if fingerprint and not force:
+            content_key = result_cache.lookup_request(fingerprint)
+            cached = result_cache.get(content_key) if content_key else None
+    
+        hero_image_path = f'/tmp/{avatar_id}_hero.jpg'
+        hero_video_path = f'/tmp/{avatar_id}_hero_video.mp4'
+        trimmed_video_path = f'/tmp/{avatar_id}_trimmed.mp4'
+        if not cached:
+            # 3a. Assets herunterladen – streamend auf Platte (Container-Cache über Jobs hinweg)
+            _job('apply_stage', 'download')
+            from dynamics_pipeline.media_fetch import MediaCache, fetch_media
+            media_cache = MediaCache(MEDIA_CACHE_DIR, max_bytes=int(float(os.getenv('MEDIA_CACHE_MAX_GB', '5')) * 1024 ** 3))
+    
+            print(f"📥 Lade Hero-Image...")
+            fetch_media(hero_image_url, kind='image', cache=media_cache, dest=hero_image_path)
+    
+            print(f"📥 Lade Hero-Video...")
+            fetched = fetch_media(
+                hero_video_url,
+                kind='video',
+                max_duration_s=float(os.getenv('MEDIA_MAX_DURATION_S', '900')),
+                cache=media_cache,
+                dest=hero_video_path,
+                ffmpeg_bin=FFMPEG_BIN,
+            )
+            print(f"📥 Hero-Video: {'Cache' if fetched['cached'] else 'Download'} in {fetched['elapsed_s']:.1f}s")
+    
+            # 3b. gleiche Input-Bytes + Parameter (z. B. neue URL, gleicher Inhalt) → LivePortrait überspringen
+            content_key = cache_key([hero_image_path, hero_video_path], norm)
+            cached = None if force else result_cache.get(content_key)
+        if cached:
+            print(f"♻️ Ergebnis-Cache Treffer: {content_key[:12]}…")
+            _job('apply_stage', 'upload')
+            urls = cached.get('results', {}).get(result_key)
+            if not (urls and bucket.blob(urls['idleBlob']).exists()):
+                urls = _publish_dynamics(bucket, avatar_id, dynamics_id, cached['files'])
+                result_cache.record_result(content_key, result_key, urls)
+            if fingerprint:
+                result_cache.remember_request(fingerprint, content_key)
+            result_cache_volume.commit()
+            _write_dynamics_doc(avatar_ref, dynamics_id, parameters, {k: v for k, v in urls.items() if k != 'idleBlob'})
+            print(f"🎉 Dynamics '{dynamics_id}' aus Cache bereitgestellt!")
+            _job('finish_job', dyn_jobs.SUCCEEDED, result={'idle_url': urls['idleVideoUrl'], 'cached': True})
+            return {
+                'status': 'success',
+                'video_url': urls['idleVideoUrl'],
+                'avatar_id': avatar_id,
+                'dynamics_id': dynamics_id,
+                'idle_url': urls['idleVideoUrl'],
+                'cached': True,
+            }
+    
+        # 4. Video trimmen (10 Sekunden) - EXAKT wie lokal! Erst nach dem Cache-Miss
+        _job('apply_stage', 'trim')
+        print(f"✂️ Trimme Video auf 10 Sekunden...")
+    
+        # Zeige Input-Größen
+        hero_video_size = os.path.getsize(hero_video_path)
+        hero_image_size = os.path.getsize(hero_image_path)
+        print(f"📊 Hero-Video: {hero_video_size / 1024 / 1024:.2f} MB")
+        print(f"📊 Hero-Image: {hero_image_size / 1024:.2f} KB")
+    
+        # WICHTIG:
+        # - Wir wollen IMMER ein sauberes 10‑Sekunden‑Video mit VIDEOSTREAM erzeugen.
+        # - Deshalb NICHT mehr nur `-c:v copy`, sondern neu nach H.264 encoden.
+        # - Audio ist für LivePortrait egal → wir deaktivieren Audio explizit.
+        trim_cmd = [
+            FFMPEG_BIN,
+            '-y',
+            '-i', hero_video_path,
+            '-ss', '0',
+            '-t', '10',
+            '-c:v', 'libx264',
+            '-preset', 'ultrafast',
+            '-crf', '18',
+            '-an',  # kein Audio nötig
+            trimmed_video_path,
+        ]
+        trim_result = subprocess.run(trim_cmd, capture_output=True, text=True)
+        if trim_result.returncode != 0 or not os.path.exists(trimmed_video_path):
+            print(f"❌ Trimmen fehlgeschlagen!")
+            print(trim_result.stderr[-2000:])
+            _exit_failed("Trimmen fehlgeschlagen")
+    
+        # Zeige getrimte Video-Größe
+        trimmed_size = os.path.getsize(trimmed_video_path)
+        print(f"📊 Getrimtes Video: {trimmed_size / 1024 / 1024:.2f} MB")
+    
+        # 5. LivePortrait starten
+        _job('apply_stage', 'inference')
+        print(f"🎬 Starte LivePortrait...")
+    
+        lp_output_dir = f'/tmp/{avatar_id}_lp_output'
+        os.makedirs(lp_output_dir, exist_ok=True)
+    
+        # Modal: LivePortrait in /opt/liveportrait installiert
+        python_executable = sys.executable
+        liveportrait_path = '/opt/liveportrait/inference.py'
+    
+        # LivePortrait soll IMMER mit dem neuen, 10s getrimmten Video laufen.
+        driving_video_path = trimmed_video_path
 
-    lp_cmd = [
-        python_executable,
-        liveportrait_path,
-        '-s', hero_image_path,
-        '-d', driving_video_path,
-        '-o', lp_output_dir,
-        '--driving_multiplier', str(norm.get('driving_multiplier')),
-    ]
-    
-    # Flags in EXAKT derselben Reihenfolge wie lokaler Test!
-    if bool(norm.get('flag_normalize_lip')):
-        lp_cmd.append('--flag-normalize-lip')
-    
-    lp_cmd.extend([
-        '--animation-region', str(norm.get('animation_region')),
-    ])
-    
-    if bool(norm.get('flag_pasteback')):
-        lp_cmd.append('--flag-pasteback')
-    
-    lp_cmd.extend([
-        '--source-max-dim', str(norm.get('source_max_dim')),
-        '--scale', str(norm.get('scale')),
-        '--flag-do-crop',  # Face Detection & Auto-Crop aktivieren (vermeidet manuelles Cropping)
-    ])
-    
-    env = os.environ.copy()
-    env['PYTORCH_ENABLE_MPS_FALLBACK'] = '1'
-    # ONNX Runtime GPU forcieren (wichtig für LivePortrait!)
-    env['CUDA_VISIBLE_DEVICES'] = '0'  # GPU 0 nutzen
-    # TensorRT Engine Caching (KRITISCH für Speed!)
-    engine_cache_dir = '/tensorrt_cache'  # Persistent Modal Volume!
-    os.makedirs(engine_cache_dir, exist_ok=True)
-    
-    # DEBUG: Prüfe ob Cache existiert
-    cache_files = list(Path(engine_cache_dir).glob('**/*'))
-    print(f"🔍 TensorRT Cache Status: {len(cache_files)} Dateien in {engine_cache_dir}")
-    if cache_files:
-        print(f"✅ Cache existiert! Dateien: {[f.name for f in cache_files[:5]]}")
-    else:
-        print(f"⚠️ Cache leer - erste Generierung wird Engines kompilieren")
-    
-    env['ORT_TENSORRT_ENGINE_CACHE_ENABLE'] = '1'  # TensorRT Cache aktivieren
-    env['ORT_TENSORRT_CACHE_PATH'] = engine_cache_dir  # Cache-Pfad setzen
-    env['ORT_TENSORRT_FP16_ENABLE'] = '1'  # FP16 für TensorRT (schneller!)
-    # TensorRT als primären Provider forcieren (falls verfügbar)
-    env['ORT_TENSORRT_MAX_WORKSPACE_SIZE'] = '2147483648'  # 2GB TensorRT Workspace
-    env['ORT_TENSORRT_MIN_SUBGRAPH_SIZE'] = '1'  # Nutze TensorRT auch für kleine Subgraphs
-    
-    # EXAKT wie lokaler Test: OHNE cwd, OHNE check, nur capture_output=False!
-    print(f"🧩 LP-Parameter (normalisiert): {norm}")
-    print(f"🎬 LivePortrait Command: {' '.join(lp_cmd)}")
-    print(f"🎬 Starte LivePortrait Ausführung...")
-    
-    # WICHTIG: Prüfe ob GPU verfügbar ist!
-    import torch
-    gpu_available = torch.cuda.is_available()
-    gpu_count = torch.cuda.device_count() if gpu_available else 0
-    print(f"🔥 GPU verfügbar: {gpu_available} (Anzahl: {gpu_count})")
-    if gpu_available:
-        print(f"🔥 GPU Name: {torch.cuda.get_device_name(0)}")
-    
-    # ONNX Runtime GPU Check (KRITISCH für LivePortrait!)
-    import onnxruntime as ort
-    available_providers = ort.get_available_providers()
-    print(f"🔥 ONNX Runtime Providers: {available_providers}")
-    
-    # Prüfe welcher Provider tatsächlich PRIORITÄT hat
-    if 'TensorrtExecutionProvider' in available_providers:
-        print(f"🚀 TensorRT verfügbar! (schnellster Provider)")
-    if 'CUDAExecutionProvider' in available_providers:
-        print(f"✅ CUDA verfügbar! (schnell)")
-    if len(available_providers) == 1 and available_providers[0] == 'CPUExecutionProvider':
-        print(f"⚠️ WARNING: Nur CPU verfügbar! LivePortrait wird LANGSAM sein!")
-    
-    # DEBUG: Welches FFmpeg nutzt imageio-ffmpeg?
-    import imageio_ffmpeg
-    ffmpeg_exe = imageio_ffmpeg.get_ffmpeg_exe()
-    ffmpeg_version_result = subprocess.run([ffmpeg_exe, '-version'], capture_output=True, text=True)
-    print(f"🎬 imageio-ffmpeg nutzt: {ffmpeg_version_result.stdout.split(chr(10))[0]}")
-    print(f"🎬 FFmpeg binary path: {ffmpeg_exe}")
-    # Für den Re-Encode verwenden wir dieselbe FFmpeg-Binary wie LivePortrait (keine Mischversionen)
-    ENCODE_FFMPEG_BIN = ffmpeg_exe if os.path.exists(ffmpeg_exe) else FFMPEG_BIN
-    print(f"🎬 Encode FFmpeg gewählt: {ENCODE_FFMPEG_BIN}")
-    
-    import time
-    start_time = time.time()
+        lp_cmd = [
+            python_executable,
+            liveportrait_path,
+            '-s', hero_image_path,
+            '-d', driving_video_path,
+            '-o', lp_output_dir,
+            '--driving_multiplier', str(norm.get('driving_multiplier')),
+        ]
+    
+        # Flags in EXAKT derselben Reihenfolge wie lokaler Test!
+        if bool(norm.get('flag_normalize_lip')):
+            lp_cmd.append('--flag-normalize-lip')
+    
+        lp_cmd.extend([
+            '--animation-region', str(norm.get('animation_region')),
+        ])
+    
+        if bool(norm.get('flag_pasteback')):
+            lp_cmd.append('--flag-pasteback')
+    
+        lp_cmd.extend([
+            '--source-max-dim', str(norm.get('source_max_dim')),
+            '--scale', str(norm.get('scale')),
+            '--flag-do-crop',  # Face Detection & Auto-Crop aktivieren (vermeidet manuelles Cropping)
+        ])
+    
+        env = os.environ.copy()
+        env['PYTORCH_ENABLE_MPS_FALLBACK'] = '1'
+        # ONNX Runtime GPU forcieren (wichtig für LivePortrait!)
+        env['CUDA_VISIBLE_DEVICES'] = '0'  # GPU 0 nutzen
+        # TensorRT Engine Caching (KRITISCH für Speed!)
+        engine_cache_dir = ENGINE_CACHE_DIR  # Persistent Modal Volume!
+    
+        # Readiness abwarten (Weights geprüft/repariert, defekte Engines entfernt)
+        ready = readiness.ensure_ready()
+        _publish_worker(db, ready)
+        if not ready['ready']:
+            print(f"❌ Worker nicht bereit: {ready['error']}")
+            _exit_failed(f"Worker nicht bereit: {ready['error']}")
+        engines = ready['engines']
+        print(f"🔍 TensorRT Cache Status: {engines['files']} Engine-Dateien ({engines['verified']} geprüft) in {engine_cache_dir}")
+        if not engines['files']:
+            print(f"⚠️ Cache leer - erste Generierung wird Engines kompilieren")
+    
+        # Eingabe-Features für den Zeit-Schätzer (Cold Start / TensorRT-Cache dominieren die Inference-Zeit)
+        try:
+            probe = subprocess.run([
+                FFPROBE_BIN, '-v', 'error', '-show_entries', 'format=duration',
+                '-of', 'default=noprint_wrappers=1:nokey=1', trimmed_video_path
+            ], capture_output=True, text=True, check=True)
+            trimmed_seconds = float(probe.stdout.strip())
+        except (subprocess.CalledProcessError, ValueError, OSError):
+            trimmed_seconds = None
+        _job('apply_features', features_for(
+            video_seconds=trimmed_seconds,
+            input_bytes=hero_video_size,
+            cold_start=not warm_start,
+            trt_cache_hit=ready['trt_cache_hit'],
+        ))
+    
+        env['ORT_TENSORRT_ENGINE_CACHE_ENABLE'] = '1'  # TensorRT Cache aktivieren
+        env['ORT_TENSORRT_CACHE_PATH'] = engine_cache_dir  # Cache-Pfad setzen
+        env['ORT_TENSORRT_FP16_ENABLE'] = '1'  # FP16 für TensorRT (schneller!)
+        # TensorRT als primären Provider forcieren (falls verfügbar)
+        env['ORT_TENSORRT_MAX_WORKSPACE_SIZE'] = '2147483648'  # 2GB TensorRT Workspace
+        env['ORT_TENSORRT_MIN_SUBGRAPH_SIZE'] = '1'  # Nutze TensorRT auch für kleine Subgraphs
+    
+        # EXAKT wie lokaler Test: OHNE cwd, OHNE check, nur capture_output=False!
+        print(f"🧩 LP-Parameter (normalisiert): {norm}")
+        print(f"🎬 LivePortrait Command: {' '.join(lp_cmd)}")
+        print(f"🎬 Starte LivePortrait Ausführung...")
+    
+        # WICHTIG: Prüfe ob GPU verfügbar ist!
+        import torch
+        gpu_available = torch.cuda.is_available()
+        gpu_count = torch.cuda.device_count() if gpu_available else 0
+        print(f"🔥 GPU verfügbar: {gpu_available} (Anzahl: {gpu_count})")
+        if gpu_available:
+            print(f"🔥 GPU Name: {torch.cuda.get_device_name(0)}")
+    
+        # ONNX Runtime GPU Check (KRITISCH für LivePortrait!)
+        import onnxruntime as ort
+        available_providers = ort.get_available_providers()
+        print(f"🔥 ONNX Runtime Providers: {available_providers}")
+    
+        # Prüfe welcher Provider tatsächlich PRIORITÄT hat
+        if 'TensorrtExecutionProvider' in available_providers:
+            print(f"🚀 TensorRT verfügbar! (schnellster Provider)")
+        if 'CUDAExecutionProvider' in available_providers:
+            print(f"✅ CUDA verfügbar! (schnell)")
+        if len(available_providers) == 1 and available_providers[0] == 'CPUExecutionProvider':
+            print(f"⚠️ WARNING: Nur CPU verfügbar! LivePortrait wird LANGSAM sein!")
+    
+        # DEBUG: Welches FFmpeg nutzt imageio-ffmpeg?
+        import imageio_ffmpeg
+        ffmpeg_exe = imageio_ffmpeg.get_ffmpeg_exe()
+        ffmpeg_version_result = subprocess.run([ffmpeg_exe, '-version'], capture_output=True, text=True)
+        print(f"🎬 imageio-ffmpeg nutzt: {ffmpeg_version_result.stdout.split(chr(10))[0]}")
+        print(f"🎬 FFmpeg binary path: {ffmpeg_exe}")
+        # Für den Re-Encode verwenden wir dieselbe FFmpeg-Binary wie LivePortrait (keine Mischversionen)
+        ENCODE_FFMPEG_BIN = ffmpeg_exe if os.path.exists(ffmpeg_exe) else FFMPEG_BIN
+        print(f"🎬 Encode FFmpeg gewählt: {ENCODE_FFMPEG_BIN}")
+    
+        import time
+        start_time = time.time()
     
-    # Weights verifizieren (vor dem ersten Lauf)
-    _ensure_lp_weights(force=False)
-
-    result = subprocess.run(lp_cmd, env=env, capture_output=False, text=True)
+        result = subprocess.run(lp_cmd, env=env, capture_output=False, text=True)
     
-    elapsed = time.time() - start_time
-    print(f"⏱️ LivePortrait dauerte: {elapsed:.1f} Sekunden")
+        elapsed = time.time() - start_time
+        print(f"⏱️ LivePortrait dauerte: {elapsed:.1f} Sekunden ({'warm' if warm_start else 'kalt'})")
     
-    if result.returncode != 0:
-        print(f"❌ LivePortrait fehlgeschlagen – versuche Weights neu zu laden und einmal neu zu starten…")
-        _ensure_lp_weights(force=True)
-        result = subprocess.run(lp_cmd, env=env, capture_output=False, text=True)
         if result.returncode != 0:
-            print(f"❌ LivePortrait erneut fehlgeschlagen!")
-            sys.exit(1)
-    
-    print(f"✅ LivePortrait erfolgreich beendet (returncode: {result.returncode})")
-    
-    # 6. Output-Video finden – PRODUKTIONS-VERSION (ohne Vergleichspanels!)
-    # LivePortrait schreibt u.a.:
-    #  - *_trimmed.mp4            ← gewünschtes Produktionsvideo (ohne Audio)
-    #  - *_trimmed_with_audio.mp4
-    #  - *_trimmed_concat.mp4     ← Seiten-by-Seiten Vergleich (NICHT verwenden!)
-    import glob
-    candidates = glob.glob(f"{lp_output_dir}/*_trimmed.mp4")
-    # Filter aus: keine _with_audio oder _concat
-    candidates = [c for c in candidates if ('_with_audio' not in c and '_concat' not in c)]
-    
-    if not candidates:
-        print(f"❌ *_trimmed.mp4 nicht gefunden, prüfe generische .mp4 ohne _concat/_with_audio...")
-        all_candidates = glob.glob(f"{lp_output_dir}/*.mp4")
-        candidates = [c for c in all_candidates if ('_with_audio' not in c and '_concat' not in c)]
-    
-    if not candidates:
-        print(f"❌ LivePortrait Output nicht gefunden!")
-        sys.exit(1)
-    
-    # Falls mehrere, wähle die größte Datei (robuster gegen Benennungsvarianten)
-    lp_output = max(candidates, key=lambda p: os.path.getsize(p))
-    print(f"✅ Gefunden (ohne Vergleichspanels): {lp_output}")
-    
-    # WICHTIG: Zeige LivePortrait Output-Größe VOR FFmpeg!
-    lp_size = os.path.getsize(lp_output)
-    print(f"📊 LivePortrait Output Größe: {lp_size} bytes ({lp_size / 1024 / 1024:.2f} MB)")
-    print(f"📊 LivePortrait Output Pfad: {lp_output}")
-    
-    # 7. MuseTalk‑kompatibles Re‑Encode: H.264 yuv420p, 25fps, faststart (Auflösung beibehalten!)
-    print("🔧 Re-Encode (MuseTalk): 25 fps, yuv420p, faststart – originale Auflösung bleibt…")
-    temp_final = f'/tmp/{avatar_id}_{dynamics_id}_idle.mp4'
-    encode_cmd = [
-        ENCODE_FFMPEG_BIN,
-        '-y',
-        '-i', lp_output,
-        '-an',
-        '-r', '25',
-        '-c:v', 'libx264',
-        '-preset', 'slow',
-        '-crf', '18',
-        '-pix_fmt', 'yuv420p',
-        # Profil/Level offen lassen für bessere Qualität/Kompatibilität
-        '-movflags', '+faststart',
-        temp_final,
-    ]
-    enc_res = subprocess.run(encode_cmd, capture_output=True, text=True)
-    if enc_res.returncode != 0:
-        print(f"❌ Re-Encode fehlgeschlagen: {enc_res.stderr}")
-        sys.exit(1)
-    final_output = temp_final
-    final_size = os.path.getsize(final_output)
-    print(f"✅ Final (All‑I, stumm): {final_output}")
-    print(f"📊 Final: {final_size} bytes ({final_size / 1024 / 1024:.2f} MB)")
-    
-    # Debug-Uploads in Firebase Storage (brain/hilfeLP/...) entfernt – Produktion ohne Zusatzdateien
-    
-    # 8. (OBSOLET) Atlas/Mask/ROI – deaktiviert
-    print("🎨 Atlas/Mask/ROI: übersprungen (LivePortrait-Overlay nicht mehr genutzt)")
-    
-    # 9. Zusätzlich: 25 PNG‑Frames als ZIP für MuseTalk (frames-first)
-    print("🧩 Erzeuge 25 PNG‑Frames + ZIP…")
-    import tempfile, shutil, zipfile, glob as _glob
-    frames_dir = tempfile.mkdtemp(prefix="idle_frames_")
-    frames_pattern = f"{frames_dir}/frame_%03d.png"
-    extract_cmd = [
-        ENCODE_FFMPEG_BIN,
-        '-y', '-v', 'error',
-        '-i', final_output,
-        '-vframes', '25',
-        frames_pattern,
-    ]
-    ex_res = subprocess.run(extract_cmd, capture_output=True, text=True)
-    if ex_res.returncode != 0:
-        print(f"⚠️ Frame‑Extraktion fehlgeschlagen: {ex_res.stderr}")
-        frames_zip_path = None
-        frame_files = []
-    else:
-        frame_files = sorted(_glob.glob(f"{frames_dir}/frame_*.png"))[:25]
-        frames_zip_path = f"/tmp/{avatar_id}_{dynamics_id}_frames.zip"
-        with zipfile.ZipFile(frames_zip_path, 'w', compression=zipfile.ZIP_STORED) as zf:
-            for p in frame_files:
-                zf.write(p, arcname=os.path.basename(p))
-    
-    # 9b. Pre-compute Latents für schnellen MuseTalk Cold Start (0.5s statt 7s!)
-    print("🧠 Pre-compute VAE Latents für MuseTalk...")
-    latents_path = None
-    if frame_files:
+            # Retry nur, wenn die Checksummen-Prüfung defekte Weights gefunden und repariert hat
+            if not readiness.repair():
+                print(f"❌ LivePortrait fehlgeschlagen (Weights intakt – kein Retry)")
+                _exit_failed(f"LivePortrait fehlgeschlagen (Code {result.returncode})")
+            print(f"❌ LivePortrait fehlgeschlagen – Weights repariert, starte einmal neu…")
+            result = subprocess.run(lp_cmd, env=env, capture_output=False, text=True)
+            if result.returncode != 0:
+                print(f"❌ LivePortrait erneut fehlgeschlagen!")
+                _exit_failed(f"LivePortrait erneut fehlgeschlagen (Code {result.returncode})")
+        inference_seconds = time.time() - start_time
+    
+        print(f"✅ LivePortrait erfolgreich beendet (returncode: {result.returncode})")
+    
+        # 6. Output-Video finden – PRODUKTIONS-VERSION (ohne Vergleichspanels!)
+        # LivePortrait schreibt u.a.:
+        #  - *_trimmed.mp4            ← gewünschtes Produktionsvideo (ohne Audio)
+        #  - *_trimmed_with_audio.mp4
+        #  - *_trimmed_concat.mp4     ← Seiten-by-Seiten Vergleich (NICHT verwenden!)
+        import glob
+        candidates = glob.glob(f"{lp_output_dir}/*_trimmed.mp4")
+        # Filter aus: keine _with_audio oder _concat
+        candidates = [c for c in candidates if ('_with_audio' not in c and '_concat' not in c)]
+    
+        if not candidates:
+            print(f"❌ *_trimmed.mp4 nicht gefunden, prüfe generische .mp4 ohne _concat/_with_audio...")
+            all_candidates = glob.glob(f"{lp_output_dir}/*.mp4")
+            candidates = [c for c in all_candidates if ('_with_audio' not in c and '_concat' not in c)]
+    
+        if not candidates:
+            print(f"❌ LivePortrait Output nicht gefunden!")
+            _exit_failed("LivePortrait Output nicht gefunden")
+    
+        # Falls mehrere, wähle die größte Datei (robuster gegen Benennungsvarianten)
+        lp_output = max(candidates, key=lambda p: os.path.getsize(p))
+        print(f"✅ Gefunden (ohne Vergleichspanels): {lp_output}")
+    
+        # WICHTIG: Zeige LivePortrait Output-Größe VOR FFmpeg!
+        lp_size = os.path.getsize(lp_output)
+        print(f"📊 LivePortrait Output Größe: {lp_size} bytes ({lp_size / 1024 / 1024:.2f} MB)")
+        print(f"📊 LivePortrait Output Pfad: {lp_output}")
+    
+        _job('apply_stage', 'encode')
+        # 7. Packaging in EINEM ffmpeg-Lauf: idle.mp4 (H.264 yuv420p, 25fps, faststart),
+        #    keyframe-genaue Chunks (0-2s, 2-6s, 6-10s als Stream-Copy), Hero-Frame, 25 Rohframes (Pipe) → ZIP
+        #    (vorher: Re-Encode + Frame-Extraktion + Hero-Extraktion + 3 Chunk-Encodes)
+        print("🔧 Packaging (Single-Pass): 25 fps, yuv420p, faststart, Chunks, Hero-Frame, 25 PNG‑Frames…")
+        from dynamics_pipeline.packaging import package_idle_media
         try:
-            from PIL import Image as PILImage
-            import numpy as np
-            latent_list = []
-            for frame_path in frame_files:
-                with PILImage.open(frame_path) as im:
-                    arr = np.array(im.convert('RGB'))
-                    # Normalize zu [0,1] tensor
-                    img_tensor = torch.from_numpy(arr).permute(2, 0, 1).unsqueeze(0).float() / 255.0
-                    img_tensor = img_tensor.to(device)
-                    # VAE encode (simple AutoEncoder-style, kein MuseTalk VAE nötig!)
-                    # WICHTIG: Wir speichern nur die RGB Frames als Tensor (MuseTalk VAE läuft serverseitig)
-                    latent_list.append(img_tensor.cpu())
-            
-            # Stack als Tensor und speichern
-            latents_tensor = torch.cat(latent_list, dim=0)  # Shape: [25, 3, H, W]
-            latents_path = f"/tmp/{avatar_id}_{dynamics_id}_latents.pt"
-            torch.save(latents_tensor, latents_path)
-            latents_size = os.path.getsize(latents_path)
-            print(f"✅ Latents gespeichert: {latents_path} ({latents_size / 1024 / 1024:.2f} MB)")
+            packaged = package_idle_media(
+                lp_output,
+                out_dir='/tmp',
+                prefix=f"{avatar_id}_{dynamics_id}",
+                ffmpeg_bin=ENCODE_FFMPEG_BIN,
+                fps=25,
+                crf=18,
+                preset='slow',
+                chunk_bounds=(2.0, 6.0),
+                frame_count=25,
+                keep_frames=True,  # für Latents (9b)
+            )
+        except RuntimeError as e:
+            print(f"❌ Packaging fehlgeschlagen: {e}")
+            _exit_failed(f"Packaging fehlgeschlagen: {e}")
+        final_output = packaged['idle_path']
+        final_size = os.path.getsize(final_output)
+        print(f"✅ Final (stumm): {final_output} – Packaging {packaged['elapsed_s']:.1f}s")
+        print(f"📊 Final: {final_size} bytes ({final_size / 1024 / 1024:.2f} MB)")
+    
+        # Debug-Uploads in Firebase Storage (brain/hilfeLP/...) entfernt – Produktion ohne Zusatzdateien
+    
+        # 8. (OBSOLET) Atlas/Mask/ROI – deaktiviert
+        print("🎨 Atlas/Mask/ROI: übersprungen (LivePortrait-Overlay nicht mehr genutzt)")
+    
+        # 9. 25 PNG‑Frames als ZIP für MuseTalk (frames-first) – im Packaging aus der Pipe gebaut
+        frames_zip_path = packaged['frames_zip_path']
+        if not frames_zip_path:
+            print("⚠️ Frame‑Extraktion fehlgeschlagen (keine Frames)")
+    
+        # 9b. Kompakte Latents für schnellen MuseTalk Cold Start (npz, uint8, halbe Auflösung)
+        print("🧠 Latents (npz) aus den Pipe-Frames…")
+        latents_path = None
+        if packaged['frames'] is not None:
+            try:
+                from dynamics_pipeline.frames import build_latents, latents_npz_bytes
+                latents_path = f"/tmp/{avatar_id}_{dynamics_id}_latents.npz"
+                with open(latents_path, 'wb') as f:
+                    f.write(latents_npz_bytes(build_latents(packaged['frames'], downsample=2, fps=25)))
+                latents_size = os.path.getsize(latents_path)
+                print(f"✅ Latents gespeichert: {latents_path} ({latents_size / 1024 / 1024:.2f} MB)")
+            except Exception as e:
+                print(f"⚠️ Latents-Generierung fehlgeschlagen: {e}")
+                latents_path = None
+
+        # 10. Ergebnis cachen, dann ALLE Assets zu Firebase Storage hochladen
+        hero_frame_path = packaged['hero_path']
+        chunk_paths = packaged['chunk_paths']
+        local_files = {
+            'idle': final_output,
+            'hero_chunk': hero_frame_path,
+            **{f'chunk{i}': p for i, p in enumerate(chunk_paths, start=1)},
+            'frames_zip': frames_zip_path,
+            'latents': latents_path,
+        }
+        try:
+            result_cache.put(content_key, local_files, extra={'parameters': norm})
         except Exception as e:
-            print(f"⚠️ Latents-Generierung fehlgeschlagen: {e}")
-            latents_path = None
-    
-    # Cleanup frames_dir
-    shutil.rmtree(frames_dir, ignore_errors=True)
-
-    # 10. ALLE Assets zu Firebase Storage hochladen
-    print(f"📤 Uploading ALLE Assets zu Firebase Storage...")
-    
-    # idle.mp4 (mit Download-Token, damit die Console einen klickbaren Link zeigt)
-    idle_blob = bucket.blob(f"avatars/{avatar_id}/dynamics/{dynamics_id}/idle.mp4")
-    idle_token = str(uuid.uuid4())
-    idle_blob.metadata = {'firebaseStorageDownloadTokens': idle_token}
-    idle_blob.upload_from_filename(final_output, content_type='video/mp4')
-    idle_blob.patch()
-    idle_url = f"https://firebasestorage.googleapis.com/v0/b/{bucket.name}/o/{idle_blob.name.replace('/', '%2F')}?alt=media&token={idle_token}"
-    
-    # 10b. Extrahiere ersten Frame als Hero Image (für nahtlosen Übergang!)
-    print("🖼️ Extrahiere ersten Frame als Hero Image...")
-    hero_frame_path = f"/tmp/{avatar_id}_{dynamics_id}_hero_chunk.jpg"
-    try:
-        subprocess.run([
-            'ffmpeg', '-y', '-i', final_output,
-            '-vframes', '1', '-q:v', '2',  # Hohe Qualität JPEG
-            hero_frame_path
-        ], check=True, capture_output=True)
-        print(f"✅ Hero Frame extrahiert: {os.path.getsize(hero_frame_path) / 1024:.1f} KB")
-    except Exception as e:
-        print(f"⚠️ Hero Frame Extraktion fehlgeschlagen: {e}")
-        hero_frame_path = None
-    
-    # 10c. Schneide idle.mp4 in 3 Chunks für schnelleren Initial Load (Chunk1 lädt in 0.5s!)
-    print("✂️ Schneide idle.mp4 in 3 Chunks...")
-    chunk1_path = f"/tmp/{avatar_id}_{dynamics_id}_idle_chunk1.mp4"
-    chunk2_path = f"/tmp/{avatar_id}_{dynamics_id}_idle_chunk2.mp4"
-    chunk3_path = f"/tmp/{avatar_id}_{dynamics_id}_idle_chunk3.mp4"
+            print(f"⚠️ Ergebnis-Cache nicht geschrieben: {e}")
     
-    chunk_urls = {}
-    try:
-        # Chunk1: 0-2s (EXAKT geschnitten, re-encode für seamless transitions!)
-        subprocess.run([
-            'ffmpeg', '-y', '-i', final_output,
-            '-ss', '0', '-t', '2', 
-            '-c:v', 'libx264', '-preset', 'ultrafast', '-crf', '18',
-            '-g', '50', '-keyint_min', '50',  # Keyframe alle 2s bei 25fps
-            '-an',  # Kein Audio (spart Zeit/Größe)
-            chunk1_path
-        ], check=True, capture_output=True)
-        
-        # Chunk2: 2-6s (EXAKT geschnitten)
-        subprocess.run([
-            'ffmpeg', '-y', '-i', final_output,
-            '-ss', '2', '-t', '4',
-            '-c:v', 'libx264', '-preset', 'ultrafast', '-crf', '18',
-            '-g', '100', '-keyint_min', '100',  # Keyframe alle 4s bei 25fps
-            '-an',
-            chunk2_path
-        ], check=True, capture_output=True)
-        
-        # Chunk3: 6-10s (EXAKT geschnitten)
-        subprocess.run([
-            'ffmpeg', '-y', '-i', final_output,
-            '-ss', '6', '-t', '4',
-            '-c:v', 'libx264', '-preset', 'ultrafast', '-crf', '18',
-            '-g', '100', '-keyint_min', '100',
-            '-an',
-            chunk3_path
-        ], check=True, capture_output=True)
-        
-        # Upload Hero Frame → avatars/{id}/dynamics/basic/idle_chunks/heroImage_chunk.jpg
-        if hero_frame_path and os.path.exists(hero_frame_path):
-            h_blob = bucket.blob(f"avatars/{avatar_id}/dynamics/basic/idle_chunks/heroImage_chunk.jpg")
-            h_token = str(uuid.uuid4())
-            h_blob.metadata = {'firebaseStorageDownloadTokens': h_token}
-            h_blob.upload_from_filename(hero_frame_path, content_type='image/jpeg')
-            h_blob.patch()
-            chunk_urls['heroImageChunkUrl'] = f"https://firebasestorage.googleapis.com/v0/b/{bucket.name}/o/{h_blob.name.replace('/', '%2F')}?alt=media&token={h_token}"
-            print(f"✅ Hero Frame uploaded")
-        
-        # Upload Chunk1 → avatars/{id}/dynamics/basic/idle_chunks/
-        c1_blob = bucket.blob(f"avatars/{avatar_id}/dynamics/basic/idle_chunks/idle_chunk1.mp4")
-        c1_token = str(uuid.uuid4())
-        c1_blob.metadata = {'firebaseStorageDownloadTokens': c1_token}
-        c1_blob.upload_from_filename(chunk1_path, content_type='video/mp4')
-        c1_blob.patch()
-        chunk_urls['idleChunk1Url'] = f"https://firebasestorage.googleapis.com/v0/b/{bucket.name}/o/{c1_blob.name.replace('/', '%2F')}?alt=media&token={c1_token}"
-        
-        # Upload Chunk2 → avatars/{id}/dynamics/basic/idle_chunks/
-        c2_blob = bucket.blob(f"avatars/{avatar_id}/dynamics/basic/idle_chunks/idle_chunk2.mp4")
-        c2_token = str(uuid.uuid4())
-        c2_blob.metadata = {'firebaseStorageDownloadTokens': c2_token}
-        c2_blob.upload_from_filename(chunk2_path, content_type='video/mp4')
-        c2_blob.patch()
-        chunk_urls['idleChunk2Url'] = f"https://firebasestorage.googleapis.com/v0/b/{bucket.name}/o/{c2_blob.name.replace('/', '%2F')}?alt=media&token={c2_token}"
-        
-        # Upload Chunk3 → avatars/{id}/dynamics/basic/idle_chunks/
-        c3_blob = bucket.blob(f"avatars/{avatar_id}/dynamics/basic/idle_chunks/idle_chunk3.mp4")
-        c3_token = str(uuid.uuid4())
-        c3_blob.metadata = {'firebaseStorageDownloadTokens': c3_token}
-        c3_blob.upload_from_filename(chunk3_path, content_type='video/mp4')
-        c3_blob.patch()
-        chunk_urls['idleChunk3Url'] = f"https://firebasestorage.googleapis.com/v0/b/{bucket.name}/o/{c3_blob.name.replace('/', '%2F')}?alt=media&token={c3_token}"
-        
-        print(f"✅ 3 Chunks uploaded: {len(chunk_urls)} URLs")
-        
-        # Cleanup
-        for chunk_path in [chunk1_path, chunk2_path, chunk3_path]:
+        print(f"📤 Uploading ALLE Assets zu Firebase Storage...")
+        _job('apply_stage', 'upload')
+        try:
+            urls = _publish_dynamics(bucket, avatar_id, dynamics_id, local_files)
+        except RuntimeError as e:
+            print(f"❌ {e}")
+            _exit_failed(str(e))
+        idle_url = urls['idleVideoUrl']
+        for chunk_path in chunk_paths:
             if os.path.exists(chunk_path):
                 os.remove(chunk_path)
-    except Exception as e:
-        print(f"⚠️ Chunk-Generierung fehlgeschlagen: {e}")
-        chunk_urls = {}
-    
-    # frames.zip (optional)
-    frames_zip_url = None
-    if frames_zip_path and os.path.exists(frames_zip_path):
-        f_blob = bucket.blob(f"avatars/{avatar_id}/dynamics/{dynamics_id}/frames.zip")
-        f_token = str(uuid.uuid4())
-        f_blob.metadata = {'firebaseStorageDownloadTokens': f_token}
-        f_blob.upload_from_filename(frames_zip_path, content_type='application/zip')
-        f_blob.patch()
-        frames_zip_url = f"https://firebasestorage.googleapis.com/v0/b/{bucket.name}/o/{f_blob.name.replace('/', '%2F')}?alt=media&token={f_token}"
-    
-    # latents.pt (pre-computed für schnellen MuseTalk Cold Start!)
-    latents_url = None
-    if latents_path and os.path.exists(latents_path):
-        l_blob = bucket.blob(f"avatars/{avatar_id}/dynamics/{dynamics_id}/latents.pt")
-        l_token = str(uuid.uuid4())
-        l_blob.metadata = {'firebaseStorageDownloadTokens': l_token}
-        l_blob.upload_from_filename(latents_path, content_type='application/octet-stream')
-        l_blob.patch()
-        latents_url = f"https://firebasestorage.googleapis.com/v0/b/{bucket.name}/o/{l_blob.name.replace('/', '%2F')}?alt=media&token={l_token}"
-        print(f"✅ Latents uploaded: {latents_url}")
-
-    # (keine Uploads von atlas/mask/roi)
-    
-    print(f"✅ Uploaded ALLE Assets!")
-    
-    # 11. Firestore aktualisieren
-    print(f"💾 Updating Firestore...")
+        result_cache.record_result(content_key, result_key, urls)
+        if fingerprint:
+            result_cache.remember_request(fingerprint, content_key)
+        result_cache_volume.commit()
     
-    dynamics_data = {
-        'idleVideoUrl': idle_url,
-        **({'framesZipUrl': frames_zip_url} if frames_zip_url else {}),
-        **({'latentsUrl': latents_url} if latents_url else {}),
-        **chunk_urls,  # idleChunk1Url, idleChunk2Url, idleChunk3Url (für schnellen Initial Load)
-        'parameters': parameters,
-        'generatedAt': datetime.utcnow(),
-        'status': 'ready'
-    }
+        # 11. Firestore aktualisieren
+        _write_dynamics_doc(avatar_ref, dynamics_id, parameters, {k: v for k, v in urls.items() if k != 'idleBlob'})
     
-    avatar_ref.update({
-        f'dynamics.{dynamics_id}': dynamics_data
-    })
+        print(f"🎉 Dynamics '{dynamics_id}' erfolgreich generiert!")
     
-    print(f"🎉 Dynamics '{dynamics_id}' erfolgreich generiert!")
-    
-    # TensorRT Cache persistent speichern
-    tensorrt_cache.commit()
+        # TensorRT Cache persistent speichern (neue Engines ins Manifest, damit andere Container sie prüfen können)
+        readiness.commit_engines()
+        tensorrt_cache.commit()
+        _job('finish_job', dyn_jobs.SUCCEEDED, result={'idle_url': idle_url})
+        job_seconds = inference_seconds  # nur erfolgreiche Inferenzen in die Warm/Kalt-Timings
     
+        return {
+            'status': 'success',  # Flutter erwartet 'success'!
+            'video_url': idle_url,  # Flutter erwartet 'video_url'!
+            'avatar_id': avatar_id,
+            'dynamics_id': dynamics_id,
+            'idle_url': idle_url,  # Für Kompatibilität
+        }
+    except Exception as e:
+        # Avatar/Hero fehlt, Download/Firestore-Fehler … → Job nicht ewig "running"
+        _job('fail_job', f"{type(e).__name__}: {e}"[:500])
+        raise
+    finally:
+        readiness.end_job(warm_start, job_seconds)
+        _publish_worker(db, readiness.probe())
+
+
+# Readiness dieses Worker-Containers (Weights/Engines einmal prüfen, Cold/Warm-Timings)
+_readiness_manager = None
+
+
+def _readiness():
+    global _readiness_manager
+    if _readiness_manager is None:
+        from dynamics_pipeline.readiness import ReadinessManager
+
+        def _fetch_weights(files):
+            from huggingface_hub import snapshot_download
+            # Nur defekte Dateien gezielt neu laden; ohne Liste das komplette Repo (wie im Image-Build)
+            snapshot_download(
+                repo_id="KwaiVGI/LivePortrait",
+                local_dir=LP_WEIGHTS_DIR,
+                allow_patterns=files or None,
+                force_download=bool(files),
+            )
+
+        _readiness_manager = ReadinessManager(
+            LP_WEIGHTS_DIR,
+            engine_dir=ENGINE_CACHE_DIR,
+            fetch_weights=_fetch_weights,
+        )
+    return _readiness_manager
+
+
+def _worker_registry(db):
+    from dynamics_pipeline.readiness import FirestoreWorkerRegistry
+    return FirestoreWorkerRegistry(db)
+
+
+def _publish_worker(db, probe: dict):
+    """Probe-Zustand für Routing/ETA der API veröffentlichen (Fehler nur loggen)."""
+    try:
+        _worker_registry(db).publish(probe)
+    except Exception as e:
+        print(f"⚠️ Worker-Status nicht veröffentlicht: {e}")
+
+
+def _warm_workers() -> list:
+    """Bereite, freie Worker-Container, die noch im scaledown_window sind (Modal vergibt Inputs zuerst an sie)."""
+    from dynamics_pipeline.readiness import warm_idle_workers
+    _, db = _init_firebase()
+    probes = _worker_registry(db).list(max_age_s=float(os.getenv("DYNAMICS_WORKER_MAX_AGE_S", "3600")))
+    return warm_idle_workers(probes, WORKER_IDLE_WINDOW_S)
+
+# Schätzer aus fertigen Jobs in Firestore, pro API-Container kurz gecacht
+_estimator_cache = {"at": 0.0, "estimator": None}
+ESTIMATOR_TTL_S = 600
+
+
+def _generation_estimator():
+    import time
+    from dynamics_pipeline.estimator import GenerationTimeEstimator, record_from_job
+    from dynamics_pipeline.jobs import SUCCEEDED
+    if _estimator_cache["estimator"] is None or time.time() - _estimator_cache["at"] > ESTIMATOR_TTL_S:
+        try:
+            jobs = _job_store().list(status=SUCCEEDED, limit=int(os.getenv("DYNAMICS_ESTIMATOR_JOBS", "500")))
+            records = [r for r in (record_from_job(j) for j in jobs) if r]
+        except Exception as e:
+            print(f"⚠️ Job-Timings nicht lesbar, nutze Standardwerte: {e}")
+            records = []
+        _estimator_cache.update(at=time.time(), estimator=GenerationTimeEstimator(records))
+    return _estimator_cache["estimator"]
+
+
+def _job_store():
+    from dynamics_pipeline.jobs import FirestoreJobStore
+    _, db = _init_firebase()
+    return FirestoreJobStore(db)
+
+
+def _create_job(avatar_id: str, dynamics_id: str, parameters: dict, user_id, priority: str):
+    """Job-Record anlegen; None wenn der User schon DYNAMICS_PER_USER_LIMIT Jobs offen hat."""
+    from dynamics_pipeline.jobs import FINAL_STATES, QUEUED, RUNNING, new_job
+    store = _job_store()
+    if user_id:
+        open_jobs = store.list(status=QUEUED, user_id=user_id) + store.list(status=RUNNING, user_id=user_id)
+        # abgestürzte Worker zählen nicht (sonst 429 für immer, der Client pollt nur Firestore)
+        open_jobs = [j for j in (_reconcile_job(store, j) for j in open_jobs) if j['status'] not in FINAL_STATES]
+        if len(open_jobs) >= int(os.getenv("DYNAMICS_PER_USER_LIMIT", "1")):
+            return None
+    from dynamics_pipeline.estimator import features_for
+    # Freier warmer Worker → Modal vergibt den Input an ihn (kein Cold Start in der ETA)
+    try:
+        warm = _warm_workers()
+    except Exception as e:
+        print(f"⚠️ Worker-Registry nicht lesbar: {e}")
+        warm = []
+    features = features_for(parameters, cold_start=not warm,
+                            trt_cache_hit=warm[0].get("trt_cache_hit") if warm else None)
+    estimate = _generation_estimator().estimate(features)
+    job = new_job(avatar_id, dynamics_id, parameters, user_id=user_id, priority=priority,
+                  stage_seconds={k: v["seconds"] for k, v in estimate["stages"].items()})
+    job["estimated_range"] = [estimate["low"], estimate["high"]]
+    job["routing"] = {"warm_workers": len(warm), "worker_id": warm[0]["worker_id"] if warm else None}
+    store.create(job)
+    return job
+
+
+def _reconcile_job(store, job: dict) -> dict:
+    """Offenen Job mit seinem Modal-Call abgleichen (Worker abgestürzt/fertig ohne Firestore-Update)."""
+    import time
+    from dynamics_pipeline.jobs import FAILED, FINAL_STATES, SUCCEEDED, finish_job
+    if job['status'] in FINAL_STATES:
+        return job
+    call_id = (job.get('backend_ref') or {}).get('call_id')
+    if call_id:
+        try:
+            result = modal.FunctionCall.from_id(call_id).get(timeout=0)
+            job = finish_job(store, job['id'], SUCCEEDED, result=result) or job
+        except TimeoutError:
+            pass  # läuft noch
+        except Exception as e:
+            # sys.exit(1)/Exception/OOM im Worker → Job sonst ewig "running"
+            job = finish_job(store, job['id'], FAILED, error=str(e) or type(e).__name__) or job
+    elif time.time() - (job.get('created_at') or 0) > float(os.getenv("DYNAMICS_STALE_QUEUED_S", "600")):
+        # nie gestartet (spawn fehlgeschlagen, call_id nie geschrieben)
+        job = finish_job(store, job['id'], FAILED, error="Job nie gestartet") or job
+    return job
+
+
+def _job_status(job_id: str):
+    """Job inkl. berechnetem Fortschritt/ETA; gleicht abgestürzte/fertige Modal-Calls ab."""
+    from dynamics_pipeline.jobs import FINAL_STATES, compute_progress
+    store = _job_store()
+    job = store.get(job_id)
+    if job is None or job['status'] in FINAL_STATES:
+        return job
+    job = _reconcile_job(store, job)
+    if job['status'] not in FINAL_STATES:
+        job.update(compute_progress(job))
+    return job
+
+
+def _cancel_job(job_id: str):
+    from dynamics_pipeline.jobs import CANCELLED, FINAL_STATES, finish_job
+    store = _job_store()
+    job = store.get(job_id)
+    if job is None or job['status'] in FINAL_STATES:
+        return job
+    call_id = (job.get('backend_ref') or {}).get('call_id')
+    if call_id:
+        # beendet den Container-Input samt LivePortrait-Subprozess
+        modal.FunctionCall.from_id(call_id).cancel()
+    return finish_job(store, job_id, CANCELLED)
+
+
+def _cached_dynamics(avatar_id: str, dynamics_id: str, parameters: dict):
+    """Cache-Treffer über den Request-Fingerprint (HEAD statt Download) → Antwort oder None."""
+    bucket, db = _init_firebase()
+    avatar_ref = db.collection('avatars').document(avatar_id)
+    avatar_doc = avatar_ref.get()
+    if not avatar_doc.exists:
+        return None
+    fingerprint = _request_fingerprint(avatar_doc.to_dict(), parameters)
+    if not fingerprint:
+        return None
+    try:
+        result_cache_volume.reload()  # Commits anderer Container sehen
+    except Exception:
+        pass
+    result_cache = _result_cache()
+    content_key = result_cache.lookup_request(fingerprint)
+    entry = result_cache.get(content_key) if content_key else None
+    urls = (entry or {}).get('results', {}).get(f"{avatar_id}/{dynamics_id}")
+    if not urls or not bucket.blob(urls['idleBlob']).exists():
+        return None
+    _write_dynamics_doc(avatar_ref, dynamics_id, parameters, {k: v for k, v in urls.items() if k != 'idleBlob'})
+    print(f"♻️ Dynamics '{dynamics_id}' für {avatar_id} aus Cache ({content_key[:12]}…)")
     return {
-        'status': 'success',  # Flutter erwartet 'success'!
-        'video_url': idle_url,  # Flutter erwartet 'video_url'!
-        'avatar_id': avatar_id,
-        'dynamics_id': dynamics_id,
-        'idle_url': idle_url,  # Für Kompatibilität
+        "status": "success",
+        "video_url": urls['idleVideoUrl'],
+        "avatar_id": avatar_id,
+        "dynamics_id": dynamics_id,
+        "idle_url": urls['idleVideoUrl'],
+        "cached": True,
     }
 
 
-@app.function(image=image, min_containers=0, scaledown_window=20)
+@app.function(
+    image=image,
+    min_containers=0,
+    scaledown_window=20,
+    secrets=[modal.Secret.from_name("firebase-credentials")],
+    volumes={RESULT_CACHE_DIR: result_cache_volume},
+)
 @modal.asgi_app()
 def api_generate_dynamics():
     """REST API Endpoint für Flutter App"""
+    import asyncio
     from fastapi import FastAPI, Request, HTTPException
     from fastapi.middleware.cors import CORSMiddleware
     
@@ -640,18 +878,71 @@ def api_generate_dynamics():
         
         if not avatar_id:
             raise HTTPException(status_code=400, detail="avatar_id required")
+        force = bool(data.get("force") or parameters.pop("force", False))
 
-        # Job asynchron starten (Cold Start erlaubt). Sofort antworten.
-        generate_dynamics.spawn(avatar_id, dynamics_id, parameters)
-        # Client zeigt Countdown und pollt Firestore auf Fertigstellung
+        # Ergebnis-Cache: unveränderte Hero-Medien + Parameter → sofort fertig (kein GPU-Job)
+        if not force:
+            try:
+                cached = await asyncio.to_thread(_cached_dynamics, avatar_id, dynamics_id, parameters)
+            except Exception as e:
+                print(f"⚠️ Cache-Lookup fehlgeschlagen: {e}")
+                cached = None
+            if cached:
+                return cached
+
+        # Job-Record (Priorität, Limit pro User), dann asynchron starten (Cold Start erlaubt)
+        user_id = data.get("user_id")
+        job = await asyncio.to_thread(
+            _create_job, avatar_id, dynamics_id, parameters, user_id, data.get("priority", "standard")
+        )
+        if job is None:
+            raise HTTPException(status_code=429, detail="Es läuft bereits eine Dynamics-Generierung für diesen User")
+        try:
+            call = generate_dynamics.spawn(avatar_id, dynamics_id, parameters, force, job["id"])
+        except Exception as e:
+            from dynamics_pipeline.jobs import fail_job
+            await asyncio.to_thread(fail_job, _job_store(), job["id"], f"Start fehlgeschlagen: {e}")
+            raise HTTPException(status_code=503, detail="Dynamics-Worker nicht erreichbar")
+        await asyncio.to_thread(lambda: _job_store().update(job["id"], backend_ref={"call_id": call.object_id}))
+        # Client zeigt Countdown und pollt Firestore (oder GET /jobs/{job_id}) auf Fertigstellung
         return {
             "status": "generating",
+            "job_id": job["id"],
             "avatar_id": avatar_id,
             "dynamics_id": dynamics_id,
-            "estimated_seconds": 120,
+            "estimated_seconds": job["eta_seconds"],
+            "estimated_range": job["estimated_range"],
             "message": "Dynamics-Generierung gestartet"
         }
     
+    @web_app.get("/workers")
+    async def workers():
+        """Readiness-Probe: Zustand der GPU-Worker (Weights/Engines geprüft, Cold/Warm-Timings)."""
+        from dynamics_pipeline.readiness import warm_idle_workers
+        _, db = _init_firebase()
+        probes = await asyncio.to_thread(
+            lambda: _worker_registry(db).list(max_age_s=float(os.getenv("DYNAMICS_WORKER_MAX_AGE_S", "3600"))))
+        warm = warm_idle_workers(probes, WORKER_IDLE_WINDOW_S)
+        return {
+            "ready": bool(warm),
+            "warm_idle": [p["worker_id"] for p in warm],
+            "workers": sorted(probes, key=lambda p: p.get("updated_at") or 0, reverse=True),
+        }
+    
+    @web_app.get("/jobs/{job_id}")
+    async def job_status(job_id: str):
+        job = await asyncio.to_thread(_job_status, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="job not found")
+        return job
+    
+    @web_app.post("/jobs/{job_id}/cancel")
+    async def cancel_job(job_id: str):
+        job = await asyncio.to_thread(_cancel_job, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="job not found")
+        return job
+    
     return web_app
 
 
@@ -0,0 +1,218 @@
+"""Pacing + adaptiver Jitter-Buffer für LiveKit-Audio (48k mono int16).
+
+ElevenLabs liefert PCM burstig und meist schneller als Echtzeit. Ohne Pacing
+landen die Bytes sofort in rtc.AudioSource → Buffer-Bloat oder Underruns
+(hörbare Klicks). Der AudioPacer
+
+- gibt feste 10/20ms-Frames auf einer monotonen Uhr aus,
+- puffert adaptiv (Zielfüllstand aus geschätztem Ankunfts-Jitter, RFC 3550),
+- füllt Underruns mit Stille,
+- bremst den Produzenten über await push() (Backpressure) statt zu wachsen,
+- zählt Underruns/Overruns pro Room.
+"""
+import asyncio
+import inspect
+import time
+from typing import Any, Callable, Optional
+
+
+class AudioPacer:
+    def __init__(
+        self,
+        sink: Callable[[bytes], Any],
+        sample_rate: int = 48000,
+        frame_ms: int = 20,
+        min_buffer_ms: int = 40,
+        max_buffer_ms: int = 400,
+        hard_limit_ms: int = 2000,
+        idle_stop_ms: int = 2000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if frame_ms not in (10, 20):
+            raise ValueError("frame_ms must be 10 or 20")
+        self._sink = sink
+        self.sample_rate = sample_rate
+        self.frame_ms = frame_ms
+        self.frame_bytes = sample_rate * frame_ms // 1000 * 2
+        self.min_buffer_ms = min_buffer_ms
+        self.max_buffer_ms = max(max_buffer_ms, min_buffer_ms + frame_ms)
+        self.hard_limit_ms = max(hard_limit_ms, self.max_buffer_ms)
+        self.idle_stop_ms = idle_stop_ms
+        self._clock = clock
+        self._buf = bytearray()
+        self._data_event = asyncio.Event()
+        self._space_event = asyncio.Event()
+        self._space_event.set()
+        self._task: Optional[asyncio.Task] = None
+        self._ended = False
+        self._closed = False
+        # Jitter-Schätzung (RFC 3550: J += (|D| - J) / 16)
+        self._last_arrival: Optional[float] = None
+        self._last_push_ms = 0.0
+        self._jitter_ms = 0.0
+        self._underrun_boost_ms = 0.0
+        self.stats = {
+            "frames_out": 0,
+            "silence_frames": 0,
+            "underruns": 0,
+            "overruns": 0,
+            "dropped_ms": 0,
+            "backpressure_waits": 0,
+            "late_frames": 0,
+        }
+
+    # --- Füllstand ---
+    def _ms(self, nbytes: int) -> float:
+        return nbytes / 2 / self.sample_rate * 1000.0
+
+    @property
+    def buffered_ms(self) -> float:
+        return self._ms(len(self._buf))
+
+    @property
+    def target_ms(self) -> float:
+        target = self.frame_ms + 2.0 * self._jitter_ms + self._underrun_boost_ms
+        return max(self.min_buffer_ms, min(self.max_buffer_ms, target))
+
+    # --- Produzent ---
+    async def push(self, data: bytes):
+        """PCM anhängen; wartet, solange der Buffer über max_buffer_ms liegt."""
+        if self._closed or not data:
+            return
+        now = self._clock()
+        if self._last_arrival is not None:
+            deviation = abs((now - self._last_arrival) * 1000.0 - self._last_push_ms)
+            self._jitter_ms += (deviation - self._jitter_ms) / 16.0
+        self._last_arrival = now
+        self._last_push_ms = self._ms(len(data))
+
+        if self.buffered_ms >= self.max_buffer_ms and self._task is not None:
+            self.stats["backpressure_waits"] += 1
+            self._space_event.clear()
+            try:
+                await asyncio.wait_for(self._space_event.wait(), timeout=self.hard_limit_ms / 1000.0)
+            except asyncio.TimeoutError:
+                pass
+
+        self._buf.extend(data)
+        excess = len(self._buf) - int(self.hard_limit_ms * self.sample_rate / 1000) * 2
+        if excess > 0:
+            # Senke hängt: älteste Samples verwerfen statt unbegrenzt zu wachsen
+            excess += (-excess) % 2
+            del self._buf[:excess]
+            self.stats["overruns"] += 1
+            self.stats["dropped_ms"] += int(self._ms(excess))
+        self._ended = False
+        self._data_event.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def end(self):
+        """Äußerung zu Ende: Rest abspielen, danach kein Underrun mehr zählen."""
+        self._ended = True
+        # Pause bis zur nächsten Äußerung ist kein Jitter
+        self._last_arrival = None
+        self._data_event.set()
+
+    async def close(self):
+        self._closed = True
+        self._data_event.set()
+        self._space_event.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+
+    # --- Ausgabe ---
+    async def _emit(self, frame: bytes):
+        res = self._sink(frame)
+        if inspect.isawaitable(res):
+            await res
+
+    def _pop_frame(self) -> Optional[bytes]:
+        if not self._buf:
+            return None
+        if len(self._buf) < self.frame_bytes and not self._ended:
+            return None
+        frame = bytes(self._buf[:self.frame_bytes])
+        del self._buf[:self.frame_bytes]
+        if len(frame) < self.frame_bytes:
+            frame += bytes(self.frame_bytes - len(frame))
+        if self.buffered_ms < self.max_buffer_ms:
+            self._space_event.set()
+        return frame
+
+    async def _wait_data(self, timeout_s: float) -> bool:
+        self._data_event.clear()
+        try:
+            await asyncio.wait_for(self._data_event.wait(), timeout=timeout_s)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _run(self):
+        frame_s = self.frame_ms / 1000.0
+        silence = bytes(self.frame_bytes)
+        playing = False
+        silence_run = 0
+        next_t = self._clock()
+        while not self._closed:
+            if not playing:
+                # Vorpuffern bis Zielfüllstand (oder Äußerungsende mit Restdaten)
+                if self._buf and (self.buffered_ms >= self.target_ms or self._ended):
+                    playing = True
+                    next_t = self._clock()
+                    continue
+                if not await self._wait_data(self.idle_stop_ms / 1000.0):
+                    if not self._buf:
+                        return
+                    # Produzent ist weg ohne end() und der Rest erreicht das Ziel nie:
+                    # wie end() behandeln – Rest (mit Stille aufgefüllt) ausspielen, dann Ende
+                    self._ended = True
+                continue
+
+            frame = self._pop_frame()
+            if frame is None:
+                if self._ended:
+                    # Sauber ausgelaufen – zurück in den Vorpuffer-Zustand
+                    playing = False
+                    self._ended = False
+                    self._underrun_boost_ms = max(0.0, self._underrun_boost_ms - self.frame_ms)
+                    continue
+                silence_run += 1
+                if silence_run * self.frame_ms >= self.idle_stop_ms:
+                    # Produzent ist weg ohne end() – Stille nicht endlos senden
+                    playing = False
+                    silence_run = 0
+                    continue
+                if silence_run == 1:
+                    self.stats["underruns"] += 1
+                self.stats["silence_frames"] += 1
+                self._underrun_boost_ms = min(float(self.max_buffer_ms), self._underrun_boost_ms + self.frame_ms)
+                frame = silence
+            else:
+                silence_run = 0
+            await self._emit(frame)
+            self.stats["frames_out"] += 1
+
+            next_t += frame_s
+            delay = next_t - self._clock()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            elif delay < -5 * frame_s:
+                # Senke/Loop hing (Backpressure von rtc.AudioSource) → Uhr neu ansetzen
+                self.stats["late_frames"] += 1
+                next_t = self._clock()
+
+    def metrics(self) -> dict:
+        return {
+            **self.stats,
+            "frame_ms": self.frame_ms,
+            "buffered_ms": round(self.buffered_ms, 1),
+            "target_ms": round(self.target_ms, 1),
+            "jitter_ms": round(self._jitter_ms, 1),
+            "running": bool(self._task and not self._task.done()),
+        }
@@ -0,0 +1,271 @@
+"""ElevenLabs stream-input WebSocket Pool für den Orchestrator.
+
+Statt pro "speak" eine neue stream-input Verbindung aufzubauen (Handshake +
+Voice-Warmup bei jeder Äußerung), hält der Pool warme Sockets pro
+(voice_id, model_id, output_format).
+
+Wiederverwendung läuft über den multi-stream-input Endpoint: jede Äußerung
+bekommt einen eigenen context_id, wird per flush + close_context beendet und
+liefert ein isFinal für genau diesen Context – der Socket bleibt offen.
+"""
+import asyncio
+import json
+import time
+import uuid
+from collections import deque
+from typing import AsyncIterator, Optional
+
+import websockets
+from websockets.exceptions import ConnectionClosed
+
+DEFAULT_VOICE_SETTINGS = {"stability": 0.5, "similarity_boost": 0.8, "speed": 1}
+
+PoolKey = tuple[str, str, str]
+
+
+def _ws_is_open(ws) -> bool:
+    """Funktioniert mit legacy und neuer websockets-API (close_code bleibt None solange offen)."""
+    try:
+        return ws is not None and getattr(ws, "close_code", None) is None
+    except Exception:
+        return False
+
+
+class _PooledSocket:
+    def __init__(self, key: PoolKey, ws):
+        self.key = key
+        self.ws = ws
+        self.created = time.monotonic()
+        self.last_used = self.created
+        self.uses = 0
+
+
+class ElevenWsPool:
+    """Begrenzter Pool warmer ElevenLabs multi-stream-input WebSockets.
+
+    - max_sockets: Obergrenze gleichzeitig offener Sockets (alle Keys zusammen)
+    - max_idle_per_key: wie viele freie Sockets pro Key warm bleiben
+    - idle_ttl: freie Sockets werden danach verworfen (muss unter dem
+      ElevenLabs inactivity_timeout liegen)
+    """
+
+    def __init__(
+        self,
+        base: str,
+        api_key: Optional[str],
+        max_sockets: int = 8,
+        max_idle_per_key: int = 2,
+        idle_ttl: float = 150.0,
+        inactivity_timeout: int = 180,
+        connect_timeout: float = 10.0,
+        recv_timeout: float = 30.0,
+        scheme: str = "wss",
+    ):
+        self.base = base
+        self.api_key = api_key
+        self.max_sockets = max(1, int(max_sockets))
+        self.max_idle_per_key = max(0, int(max_idle_per_key))
+        self.idle_ttl = float(idle_ttl)
+        self.inactivity_timeout = int(inactivity_timeout)
+        self.connect_timeout = float(connect_timeout)
+        self.recv_timeout = float(recv_timeout)
+        self.scheme = scheme
+        self._idle: dict[PoolKey, list[_PooledSocket]] = {}
+        self._open = 0
+        self._cond: Optional[asyncio.Condition] = None
+        self._ttfa_ms: deque[float] = deque(maxlen=200)
+        self.stats = {
+            "connects": 0,
+            "reuses": 0,
+            "reconnects": 0,
+            "evictions": 0,
+            "errors": 0,
+            "utterances": 0,
+        }
+
+    # --- intern ---
+    def _condition(self) -> asyncio.Condition:
+        # Lazy, damit der Pool beim Modul-Import noch keinen Event Loop braucht
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    def _url(self, key: PoolKey) -> str:
+        voice_id, model_id, output_format = key
+        return (
+            f"{self.scheme}://{self.base}/v1/text-to-speech/{voice_id}/multi-stream-input"
+            f"?model_id={model_id}&output_format={output_format}"
+            f"&inactivity_timeout={self.inactivity_timeout}"
+        )
+
+    async def _connect(self, key: PoolKey):
+        headers = [("xi-api-key", self.api_key or "")]
+        ws = await asyncio.wait_for(
+            websockets.connect(self._url(key), additional_headers=headers),
+            timeout=self.connect_timeout,
+        )
+        self.stats["connects"] += 1
+        return ws
+
+    def _discard(self, s: _PooledSocket):
+        """Socket schließen (Hintergrund) – Aufrufer hält die Condition."""
+        self._open -= 1
+        try:
+            asyncio.get_running_loop().create_task(s.ws.close())
+        except Exception:
+            pass
+
+    def _pop_idle(self, key: PoolKey) -> Optional[_PooledSocket]:
+        now = time.monotonic()
+        bucket = self._idle.get(key) or []
+        while bucket:
+            s = bucket.pop()
+            if _ws_is_open(s.ws) and (now - s.last_used) < self.idle_ttl:
+                return s
+            self._discard(s)
+        return None
+
+    def _evict_one_idle(self) -> bool:
+        oldest: Optional[_PooledSocket] = None
+        for bucket in self._idle.values():
+            for s in bucket:
+                if oldest is None or s.last_used < oldest.last_used:
+                    oldest = s
+        if oldest is None:
+            return False
+        self._idle[oldest.key].remove(oldest)
+        self._discard(oldest)
+        self.stats["evictions"] += 1
+        return True
+
+    async def _checkout(self, key: PoolKey) -> _PooledSocket:
+        cond = self._condition()
+        async with cond:
+            while True:
+                s = self._pop_idle(key)
+                if s is not None:
+                    self.stats["reuses"] += 1
+                    return s
+                if self._open < self.max_sockets:
+                    self._open += 1
+                    break
+                if self._evict_one_idle():
+                    continue
+                await cond.wait()
+        try:
+            ws = await self._connect(key)
+        except Exception:
+            async with cond:
+                self._open -= 1
+                cond.notify_all()
+            raise
+        return _PooledSocket(key, ws)
+
+    async def _checkin(self, s: _PooledSocket, healthy: bool):
+        cond = self._condition()
+        async with cond:
+            bucket = self._idle.setdefault(s.key, [])
+            if healthy and _ws_is_open(s.ws) and len(bucket) < self.max_idle_per_key:
+                s.last_used = time.monotonic()
+                bucket.append(s)
+            else:
+                self._discard(s)
+            cond.notify_all()
+
+    # --- public API ---
+    async def prewarm(self, voice_id: str, model_id: str, output_format: str):
+        """Öffnet einen Socket für den Key und legt ihn in den Idle-Pool."""
+        key = (voice_id, model_id, output_format)
+        s = await self._checkout(key)
+        await self._checkin(s, healthy=True)
+
+    async def stream(
+        self,
+        voice_id: str,
+        text: str,
+        model_id: str,
+        output_format: str,
+        voice_settings: Optional[dict] = None,
+    ) -> AsyncIterator[dict]:
+        """Eine Äußerung über einen gepoolten Socket streamen.
+
+        Liefert die ElevenLabs-Nachrichten (audio/alignment/isFinal) des
+        eigenen Contexts. Bricht der Konsument vorzeitig ab, wird der Socket
+        verworfen statt mit halbem Context zurück in den Pool zu gehen.
+        """
+        key = (voice_id, model_id, output_format)
+        settings = voice_settings or DEFAULT_VOICE_SETTINGS
+        self.stats["utterances"] += 1
+        for attempt in range(2):
+            s = await self._checkout(key)
+            reused = s.uses > 0
+            s.uses += 1
+            ctx = uuid.uuid4().hex[:16]
+            healthy = False
+            received = False
+            try:
+                t0 = time.perf_counter()
+                await s.ws.send(json.dumps({"text": " ", "voice_settings": settings, "context_id": ctx}))
+                await s.ws.send(json.dumps({"text": text, "context_id": ctx}))
+                await s.ws.send(json.dumps({"context_id": ctx, "flush": True}))
+                await s.ws.send(json.dumps({"context_id": ctx, "close_context": True}))
+                while True:
+                    raw = await asyncio.wait_for(s.ws.recv(), timeout=self.recv_timeout)
+                    try:
+                        msg = json.loads(raw)
+                    except Exception:
+                        continue
+                    msg_ctx = msg.get("contextId") or msg.get("context_id")
+                    if msg_ctx and msg_ctx != ctx:
+                        # Reste eines früheren Contexts – ignorieren
+                        continue
+                    if msg.get("audio") and not received:
+                        ttfa = (time.perf_counter() - t0) * 1000.0
+                        self._ttfa_ms.append(ttfa)
+                        print(f"🎧 ElevenLabs first audio: {ttfa:.0f}ms fmt={output_format} reused={reused}")
+                    received = True
+                    yield msg
+                    if msg.get("isFinal") or msg.get("is_final"):
+                        healthy = True
+                        break
+            except (ConnectionClosed, OSError, asyncio.TimeoutError):
+                self.stats["errors"] += 1
+                # Wiederverwendeter Socket war tot bevor etwas kam → einmal neu verbinden
+                if reused and not received and attempt == 0:
+                    self.stats["reconnects"] += 1
+                    continue
+                raise
+            finally:
+                await self._checkin(s, healthy)
+            return
+
+    def metrics(self) -> dict:
+        samples = sorted(self._ttfa_ms)
+
+        def _pct(p: float) -> Optional[float]:
+            if not samples:
+                return None
+            idx = min(len(samples) - 1, int(round(p * (len(samples) - 1))))
+            return round(samples[idx], 1)
+
+        return {
+            **self.stats,
+            "open": self._open,
+            "idle": sum(len(b) for b in self._idle.values()),
+            "max_sockets": self.max_sockets,
+            "first_audio_ms": {
+                "last": round(self._ttfa_ms[-1], 1) if self._ttfa_ms else None,
+                "p50": _pct(0.5),
+                "p95": _pct(0.95),
+                "samples": len(samples),
+            },
+        }
+
+    async def close(self):
+        cond = self._condition()
+        async with cond:
+            for bucket in self._idle.values():
+                for s in bucket:
+                    self._discard(s)
+            self._idle.clear()
+            cond.notify_all()
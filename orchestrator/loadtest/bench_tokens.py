@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark für /livekit/token: Tokens/s für PyJWT (alter Pfad),
+FastHS256Signer (frisch signiert) und Cache-Treffer.
+
+  python orchestrator/loadtest/bench_tokens.py --n 20000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from livekit_auth.tokens import FastHS256Signer, LiveKitTokenService  # noqa: E402
+
+KEY = "APIfakeKey"
+SECRET = "fake-secret-with-enough-length-for-hs256"
+
+
+def _rate(fn, n: int) -> float:
+    t0 = time.perf_counter()
+    for i in range(n):
+        fn(i)
+    return n / (time.perf_counter() - t0)
+
+
+def _payload(i: int) -> dict:
+    now = int(time.time())
+    return {
+        "iss": KEY,
+        "sub": f"user{i}-avatar",
+        "name": "avatar",
+        "nbf": now,
+        "exp": now + 3600,
+        "video": {"room": f"room-{i}", "roomJoin": True},
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="LiveKit token microbenchmark")
+    ap.add_argument("--n", type=int, default=20000)
+    ap.add_argument("--rooms", type=int, default=100, help="verschiedene (room, identity) im Cache-Lauf")
+    args = ap.parse_args()
+
+    results = {}
+    try:
+        import jwt
+
+        results["pyjwt_sign"] = _rate(lambda i: jwt.encode(_payload(i), SECRET, algorithm="HS256"), args.n)
+        # Fast-Path muss von PyJWT verifizierbar sein
+        tok = FastHS256Signer(SECRET).sign(_payload(0))
+        jwt.decode(tok, SECRET, algorithms=["HS256"])
+    except ImportError:
+        pass
+
+    signer = FastHS256Signer(SECRET)
+    results["fast_sign"] = _rate(lambda i: signer.sign(_payload(i)), args.n)
+
+    svc = LiveKitTokenService(KEY, SECRET)
+    results["cached"] = _rate(
+        lambda i: svc.get_token(f"room-{i % args.rooms}", f"user{i % args.rooms}-avatar", name="avatar"),
+        args.n,
+    )
+
+    for name, rate in results.items():
+        print(f"{name:12s} {rate:12,.0f} tokens/s")
+    print(f"cache: {svc.metrics()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Fake ElevenLabs (REST + stream-input/multi-stream-input WebSockets) für lokale Tests.
+
+Liefert deterministisches Audio (PCM-Sinus pro Zeichen bzw. stille MP3-Frames)
+mit Alignment-Daten und konfigurierbarer Latenz/Jitter – kein API-Key, keine Kosten.
+
+Start:
+  python orchestrator/loadtest/fake_eleven.py --port 8901 --first-chunk-ms 150 --jitter-ms 30
+
+Orchestrator dagegen laufen lassen:
+  ELEVENLABS_BASE=127.0.0.1:8901 ELEVENLABS_WS_SCHEME=ws ELEVENLABS_HTTP_SCHEME=http \
+  ELEVENLABS_API_KEY=fake uvicorn py_asgi_app:app
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import math
+import random
+import struct
+from functools import lru_cache
+from typing import Optional
+
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import Response
+
+# 128 kbps / 44.1 kHz, ohne Padding: 417 Bytes, 1152 Samples ≈ 26.1 ms; Nullen = Stille
+MP3_FRAME = b"\xff\xfb\x90\x64" + bytes(413)
+MP3_FRAME_MS = 1152 / 44100 * 1000
+
+
+class FakeElevenConfig:
+    def __init__(
+        self,
+        char_ms: int = 60,
+        chunk_ms: int = 250,
+        first_chunk_ms: int = 150,
+        realtime_factor: float = 4.0,
+        jitter_ms: int = 0,
+        burst: int = 1,
+        seed: int = 1,
+    ):
+        self.char_ms = char_ms              # Audio-Dauer pro Zeichen
+        self.chunk_ms = chunk_ms            # Audio pro WS-Nachricht
+        self.first_chunk_ms = first_chunk_ms
+        self.realtime_factor = realtime_factor  # >1: schneller als Echtzeit (wie ElevenLabs)
+        self.jitter_ms = jitter_ms
+        self.burst = max(1, burst)          # n Chunks direkt hintereinander (burstige Lieferung)
+        self.seed = seed
+
+
+def _sample_rate(output_format: str) -> int:
+    try:
+        return int(output_format.split("_")[1])
+    except Exception:
+        return 16000
+
+
+@lru_cache(maxsize=256)
+def synth_pcm16(text: str, sample_rate: int, char_ms: int) -> bytes:
+    """Ein Sinuston pro Zeichen (Frequenz aus dem Zeichen), Leerzeichen = Stille."""
+    per_char = int(sample_rate * char_ms / 1000)
+    out = bytearray()
+    for ch in text:
+        if ch.isspace():
+            out.extend(bytes(per_char * 2))
+            continue
+        freq = 180 + (ord(ch) % 24) * 15
+        step = 2 * math.pi * freq / sample_rate
+        out.extend(struct.pack(
+            "<" + "h" * per_char,
+            *(int(9830 * math.sin(step * i)) for i in range(per_char)),
+        ))
+    return bytes(out)
+
+
+def synth_mp3(text: str, char_ms: int) -> bytes:
+    frames = max(1, math.ceil(len(text) * char_ms / MP3_FRAME_MS))
+    return MP3_FRAME * frames
+
+
+def utterance_chunks(text: str, output_format: str, cfg: FakeElevenConfig) -> list[dict]:
+    """Audio + Alignment in Nachrichten à chunk_ms aufteilen (Zeiten absolut ab Äußerungsbeginn)."""
+    total_ms = len(text) * cfg.char_ms
+    if output_format.startswith("mp3"):
+        audio = synth_mp3(text, cfg.char_ms)
+        frames_per_chunk = max(1, int(cfg.chunk_ms / MP3_FRAME_MS))
+        step = len(MP3_FRAME) * frames_per_chunk
+        chunk_ms = frames_per_chunk * MP3_FRAME_MS
+    else:
+        rate = _sample_rate(output_format)
+        audio = synth_pcm16(text, rate, cfg.char_ms)
+        step = int(rate * cfg.chunk_ms / 1000) * 2
+        chunk_ms = float(cfg.chunk_ms)
+    msgs = []
+    t = 0.0
+    for off in range(0, max(len(audio), 1), step):
+        idx = [i for i in range(len(text)) if t <= i * cfg.char_ms < t + chunk_ms]
+        msg: dict = {"audio": base64.b64encode(audio[off:off + step]).decode("ascii")}
+        if idx and t < total_ms:
+            msg["alignment"] = {
+                "chars": [text[i] for i in idx],
+                "charStartTimesMs": [i * cfg.char_ms for i in idx],
+                "charDurationsMs": [cfg.char_ms] * len(idx),
+            }
+        msgs.append(msg)
+        t += chunk_ms
+    return msgs
+
+
+def create_app(cfg: FakeElevenConfig) -> FastAPI:
+    web = FastAPI()
+    rng = random.Random(cfg.seed)
+    stats = {"ws_connections": 0, "utterances": 0, "rest_requests": 0}
+
+    def _delay(base_ms: float) -> float:
+        j = rng.uniform(-cfg.jitter_ms, cfg.jitter_ms) if cfg.jitter_ms else 0.0
+        return max(0.0, (base_ms + j) / 1000.0)
+
+    async def _send_utterance(ws: WebSocket, text: str, output_format: str, ctx: Optional[str]):
+        stats["utterances"] += 1
+        msgs = utterance_chunks(text, output_format, cfg)
+        await asyncio.sleep(_delay(cfg.first_chunk_ms))
+        for i, msg in enumerate(msgs):
+            if ctx:
+                msg["contextId"] = ctx
+            await ws.send_text(json.dumps(msg))
+            if (i + 1) % cfg.burst == 0 and i + 1 < len(msgs):
+                await asyncio.sleep(_delay(cfg.burst * cfg.chunk_ms / cfg.realtime_factor))
+
+    @web.get("/health")
+    async def health():
+        return {"ok": True, **stats}
+
+    @web.get("/v1/voices")
+    async def voices():
+        stats["rest_requests"] += 1
+        return {"voices": [{"voice_id": "fake-voice", "name": "Fake Voice"}]}
+
+    @web.post("/v1/text-to-speech/{voice_id}")
+    async def tts(voice_id: str, req: Request):
+        stats["rest_requests"] += 1
+        body = await req.json()
+        await asyncio.sleep(_delay(cfg.first_chunk_ms))
+        return Response(content=synth_mp3(body.get("text", ""), cfg.char_ms), media_type="audio/mpeg")
+
+    @web.websocket("/v1/text-to-speech/{voice_id}/stream-input")
+    async def stream_input(ws: WebSocket, voice_id: str, output_format: str = "mp3_44100_128"):
+        await ws.accept()
+        stats["ws_connections"] += 1
+        buf = ""
+        try:
+            while True:
+                msg = json.loads(await ws.receive_text())
+                text = msg.get("text")
+                if text == "":
+                    await _send_utterance(ws, buf.strip(), output_format, None)
+                    await ws.send_text(json.dumps({"isFinal": True}))
+                    await ws.close()
+                    return
+                if text and text != " ":
+                    buf += text
+        except WebSocketDisconnect:
+            return
+
+    @web.websocket("/v1/text-to-speech/{voice_id}/multi-stream-input")
+    async def multi_stream_input(ws: WebSocket, voice_id: str, output_format: str = "mp3_44100_128"):
+        await ws.accept()
+        stats["ws_connections"] += 1
+        buffers: dict[str, str] = {}
+        try:
+            while True:
+                msg = json.loads(await ws.receive_text())
+                ctx = msg.get("context_id") or "default"
+                if msg.get("close_socket"):
+                    await ws.close()
+                    return
+                text = msg.get("text")
+                if text and text != " ":
+                    buffers[ctx] = buffers.get(ctx, "") + text
+                if msg.get("flush") and buffers.get(ctx, "").strip():
+                    await _send_utterance(ws, buffers.pop(ctx).strip(), output_format, ctx)
+                if msg.get("close_context"):
+                    rest = buffers.pop(ctx, "").strip()
+                    if rest:
+                        await _send_utterance(ws, rest, output_format, ctx)
+                    await ws.send_text(json.dumps({"isFinal": True, "contextId": ctx}))
+        except WebSocketDisconnect:
+            return
+
+    return web
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Fake ElevenLabs server")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8901)
+    ap.add_argument("--char-ms", type=int, default=60)
+    ap.add_argument("--chunk-ms", type=int, default=250)
+    ap.add_argument("--first-chunk-ms", type=int, default=150)
+    ap.add_argument("--realtime-factor", type=float, default=4.0)
+    ap.add_argument("--jitter-ms", type=int, default=0)
+    ap.add_argument("--burst", type=int, default=1)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    import uvicorn
+
+    cfg = FakeElevenConfig(
+        char_ms=args.char_ms,
+        chunk_ms=args.chunk_ms,
+        first_chunk_ms=args.first_chunk_ms,
+        realtime_factor=args.realtime_factor,
+        jitter_ms=args.jitter_ms,
+        burst=args.burst,
+        seed=args.seed,
+    )
+    uvicorn.run(create_app(cfg), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Fake LiveKit-Audio-Senke für Lasttests des Orchestrators.
+
+Ersetzt py_asgi_app.lk_audio_pub (gleiche Schnittstelle wie _LkAudioPub) und
+zeichnet pro Room die Ankunftszeit jedes 48k-Frames auf, statt zu LiveKit zu
+verbinden. Daraus lassen sich Frame-Jitter und Lücken auswerten.
+"""
+import statistics
+import time
+from typing import Optional
+
+
+class FakeLiveKitSink:
+    def __init__(self, frame_ms: float = 20.0):
+        self.frame_ms = frame_ms
+        self._connected_room: Optional[str] = None
+        self._source = True  # /debug/audio erwartet ein Source-Objekt
+        self.connects = 0
+        self.frames: dict[str, list[float]] = {}
+
+    async def ensure_connected(self, room_name: str):
+        if self._connected_room == room_name:
+            return
+        self._connected_room = room_name
+        self.connects += 1
+
+    async def disconnect(self):
+        self._connected_room = None
+
+    def publish_pcm16_48k_mono(self, data: bytes, room: Optional[str] = None):
+        if not data:
+            return
+        key = room or self._connected_room or "?"
+        self.frames.setdefault(key, []).append(time.perf_counter())
+
+    def jitter_report(self) -> dict:
+        """Abweichung der Frame-Abstände vom Soll (frame_ms), pro Room und gesamt."""
+        rooms = {}
+        all_dev: list[float] = []
+        for room, ts in self.frames.items():
+            gaps = [(b - a) * 1000.0 for a, b in zip(ts, ts[1:])]
+            dev = [abs(g - self.frame_ms) for g in gaps]
+            all_dev.extend(dev)
+            rooms[room] = {
+                "frames": len(ts),
+                "gap_mean_ms": round(statistics.fmean(gaps), 2) if gaps else None,
+                "gap_max_ms": round(max(gaps), 2) if gaps else None,
+                "jitter_mean_ms": round(statistics.fmean(dev), 2) if dev else None,
+            }
+        return {
+            "rooms": rooms,
+            "frames_total": sum(len(t) for t in self.frames.values()),
+            "jitter_mean_ms": round(statistics.fmean(all_dev), 2) if all_dev else None,
+            "jitter_p95_ms": round(sorted(all_dev)[int(0.95 * (len(all_dev) - 1))], 2) if all_dev else None,
+        }
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Lastgenerator für orchestrator/py_asgi_app.py – komplett lokal.
+
+- startet fake_eleven.py als Subprozess (eigene CPU-Messung)
+- startet den Orchestrator in-process (uvicorn) mit FakeLiveKitSink statt LiveKit
+- fährt N "speak"-Sessions (je eine WS-Verbindung) mit begrenzter Parallelität
+
+Report: Time-to-first-audio, Frame-Jitter der LiveKit-Senke, CPU pro Session.
+
+Beispiel:
+  python orchestrator/loadtest/run_load.py --sessions 40 --concurrency 10 --jitter-ms 40 --burst 3
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ORCH_DIR = os.path.dirname(HERE)
+
+DEFAULT_TEXT = "Hallo, schön dass du da bist. Ich erzähle dir heute etwas über den Sonnenaufgang am Meer."
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _wait_port(port: int, timeout: float = 15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, w = await asyncio.open_connection("127.0.0.1", port)
+            w.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.05)
+    raise RuntimeError(f"port {port} not ready")
+
+
+def _pct(values: list[float], p: float):
+    if not values:
+        return None
+    s = sorted(values)
+    return round(s[min(len(s) - 1, int(round(p * (len(s) - 1))))], 1)
+
+
+async def _session(orch_port: int, idx: int, args) -> dict:
+    import websockets
+
+    msg = {
+        "type": "speak",
+        "voice_id": "fake-voice",
+        "text": args.text,
+        "mp3": not args.no_mp3,
+        "pcm": True,
+        "room": f"load-{idx}",
+        "seq": idx,
+        "viseme_mode": args.viseme_mode,
+    }
+    res = {"ttfa_ms": None, "messages": 0, "audio_msgs": 0, "pcm_msgs": 0, "done": False, "error": None}
+    t0 = time.perf_counter()
+    try:
+        async with websockets.connect(f"ws://127.0.0.1:{orch_port}/") as ws:
+            await ws.send(json.dumps(msg))
+            async for raw in ws:
+                res["messages"] += 1
+                if isinstance(raw, bytes):
+                    continue
+                data = json.loads(raw)
+                kind = data.get("type")
+                if kind in ("audio", "pcm") and res["ttfa_ms"] is None:
+                    res["ttfa_ms"] = (time.perf_counter() - t0) * 1000.0
+                if kind == "audio":
+                    res["audio_msgs"] += 1
+                elif kind == "pcm":
+                    res["pcm_msgs"] += 1
+                elif kind == "done":
+                    res["done"] = True
+                elif kind == "error":
+                    res["error"] = data.get("message")
+    except Exception as e:
+        res["error"] = str(e)
+    res["total_ms"] = (time.perf_counter() - t0) * 1000.0
+    return res
+
+
+async def run(args) -> dict:
+    eleven_port = _free_port()
+    orch_port = _free_port()
+
+    fake = subprocess.Popen([
+        sys.executable, os.path.join(HERE, "fake_eleven.py"),
+        "--port", str(eleven_port),
+        "--first-chunk-ms", str(args.first_chunk_ms),
+        "--chunk-ms", str(args.chunk_ms),
+        "--jitter-ms", str(args.jitter_ms),
+        "--burst", str(args.burst),
+        "--realtime-factor", str(args.realtime_factor),
+    ])
+    try:
+        await _wait_port(eleven_port)
+
+        # Orchestrator gegen den Fake konfigurieren (vor dem Import!)
+        os.environ.update({
+            "ELEVENLABS_BASE": f"127.0.0.1:{eleven_port}",
+            "ELEVENLABS_WS_SCHEME": "ws",
+            "ELEVENLABS_HTTP_SCHEME": "http",
+            "ELEVENLABS_API_KEY": "fake",
+            "ORCH_PUBLISH_AUDIO": "1",
+        })
+        sys.path.insert(0, ORCH_DIR)
+        sys.path.insert(0, HERE)
+        import uvicorn
+        import py_asgi_app
+        from fake_livekit import FakeLiveKitSink
+
+        sink = FakeLiveKitSink()
+        py_asgi_app.lk_audio_pub = sink
+
+        server = uvicorn.Server(uvicorn.Config(py_asgi_app.app, host="127.0.0.1", port=orch_port, log_level="warning"))
+        server_task = asyncio.create_task(server.serve())
+        await _wait_port(orch_port)
+
+        sem = asyncio.Semaphore(args.concurrency)
+
+        async def _bounded(i: int):
+            async with sem:
+                return await _session(orch_port, i, args)
+
+        cpu0 = time.process_time()
+        wall0 = time.perf_counter()
+        results = await asyncio.gather(*[_bounded(i) for i in range(args.sessions)])
+        wall = time.perf_counter() - wall0
+        cpu = time.process_time() - cpu0
+
+        server.should_exit = True
+        await server_task
+        pool_metrics = py_asgi_app.eleven_pool.metrics()
+        pacer_metrics = [p.metrics() for p in getattr(py_asgi_app, "audio_pacers", {}).values()]
+    finally:
+        fake.terminate()
+        fake.wait()
+    fake_cpu = resource.getrusage(resource.RUSAGE_CHILDREN)
+    ttfa = [r["ttfa_ms"] for r in results if r["ttfa_ms"] is not None]
+    return {
+        "sessions": args.sessions,
+        "concurrency": args.concurrency,
+        "ok": sum(1 for r in results if not r["error"]),
+        "errors": sorted({r["error"] for r in results if r["error"]})[:5],
+        "wall_s": round(wall, 2),
+        "ttfa_ms": {
+            "p50": _pct(ttfa, 0.5),
+            "p95": _pct(ttfa, 0.95),
+            "max": round(max(ttfa), 1) if ttfa else None,
+        },
+        "session_ms_mean": round(statistics.fmean(r["total_ms"] for r in results), 1) if results else None,
+        "messages_per_session": round(statistics.fmean(r["messages"] for r in results), 1) if results else None,
+        "cpu_ms_per_session": {
+            # Orchestrator + Lastgenerator teilen sich den Prozess
+            "orchestrator": round(cpu * 1000.0 / max(1, args.sessions), 2),
+            "fake_eleven": round((fake_cpu.ru_utime + fake_cpu.ru_stime) * 1000.0 / max(1, args.sessions), 2),
+        },
+        "frames": sink.jitter_report(),
+        "pacing": {
+            k: sum(m.get(k, 0) for m in pacer_metrics)
+            for k in ("underruns", "silence_frames", "overruns", "backpressure_waits", "late_frames")
+        },
+        "eleven_pool": pool_metrics,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Orchestrator load generator (fake ElevenLabs/LiveKit)")
+    ap.add_argument("--sessions", type=int, default=20)
+    ap.add_argument("--concurrency", type=int, default=5)
+    ap.add_argument("--text", default=DEFAULT_TEXT)
+    ap.add_argument("--no-mp3", action="store_true", help="nur PCM anfordern (wie die Flutter-App)")
+    ap.add_argument("--viseme-mode", default="char", choices=["char", "batch", "binary"])
+    ap.add_argument("--first-chunk-ms", type=int, default=150)
+    ap.add_argument("--chunk-ms", type=int, default=250)
+    ap.add_argument("--jitter-ms", type=int, default=0)
+    ap.add_argument("--burst", type=int, default=1)
+    ap.add_argument("--realtime-factor", type=float, default=4.0)
+    ap.add_argument("--per-room", action="store_true", help="Frame-Statistik pro Room ausgeben")
+    ap.add_argument("--json-out", default="")
+    args = ap.parse_args()
+
+    report = asyncio.run(run(args))
+    if not args.per_room:
+        report["frames"].pop("rooms", None)
+    out = json.dumps(report, indent=2)
+    print(out)
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            f.write(out)
+
+
+if __name__ == "__main__":
+    main()
@@ -17,6 +17,10 @@ image = (
         "echo 'REBUILD: 2025-10-31-19:30'",  # ← Change date/time to force rebuild
     )
     .add_local_file("orchestrator/py_asgi_app.py", "/app/py_asgi_app.py")
+    .add_local_file("orchestrator/eleven_pool.py", "/app/eleven_pool.py")
+    .add_local_file("orchestrator/viseme_timeline.py", "/app/viseme_timeline.py")
+    .add_local_file("orchestrator/audio_pacer.py", "/app/audio_pacer.py")
+    .add_local_dir("livekit_auth", "/app/livekit_auth")
 )
 
 app = modal.App("lipsync-orchestrator", image=image)
@@ -6,13 +6,15 @@ import os
 import json
 import base64
 import asyncio
-import websockets
-import datetime as dt
-import jwt
 import struct
 from typing import Optional, Any
 import time
 
+from eleven_pool import ElevenWsPool
+from viseme_timeline import VisemeTimelineEncoder
+from audio_pacer import AudioPacer
+from livekit_auth.tokens import IdentityRateLimiter, LiveKitTokenService, RateLimited
+
 try:
     from livekit import rtc
 except Exception:
@@ -31,6 +33,19 @@ app.add_middleware(
 ELEVEN_BASE = os.getenv("ELEVENLABS_BASE", "api.elevenlabs.io")
 ELEVEN_MODEL = os.getenv("ELEVENLABS_MODEL_ID", "eleven_multilingual_v2")
 ELEVEN_KEY = os.getenv("ELEVENLABS_API_KEY")
+# Nur für lokale Tests gegen loadtest/fake_eleven.py ("http"/"ws")
+ELEVEN_HTTP_SCHEME = os.getenv("ELEVENLABS_HTTP_SCHEME", "https")
+ELEVEN_WS_SCHEME = os.getenv("ELEVENLABS_WS_SCHEME", "wss")
+
+# Warme ElevenLabs-Sockets, geteilt von /ws und /tts/stream
+eleven_pool = ElevenWsPool(
+    ELEVEN_BASE,
+    ELEVEN_KEY,
+    max_sockets=int(os.getenv("ELEVEN_POOL_MAX_SOCKETS", "8")),
+    max_idle_per_key=int(os.getenv("ELEVEN_POOL_IDLE_PER_KEY", "2")),
+    idle_ttl=float(os.getenv("ELEVEN_POOL_IDLE_TTL", "150")),
+    scheme=ELEVEN_WS_SCHEME,
+)
 
 # --- PCM Utils ---
 def _pcm_float32_to_int16le(data: bytes) -> bytes:
@@ -85,7 +100,11 @@ def _upsample_16k_to_48k_int16le(data: bytes) -> bytes:
 ORCH_PUBLISH_AUDIO = os.getenv("ORCH_PUBLISH_AUDIO", "1").strip() not in ("0", "false", "False")
 current_audio_room: Optional[str] = None
 last_client_room: Optional[str] = None  # Fallback: letzter room aus speak-Request
-_audio48k_buf = bytearray()  # Frames für LiveKit in 20ms Stücken puffern
+# Pro Room ein Pacer: feste 10/20ms-Frames + Jitter-Buffer statt Bursts direkt in die AudioSource
+ORCH_AUDIO_FRAME_MS = int(os.getenv("ORCH_AUDIO_FRAME_MS", "20"))
+ORCH_JITTER_MIN_MS = int(os.getenv("ORCH_JITTER_MIN_MS", "40"))
+ORCH_JITTER_MAX_MS = int(os.getenv("ORCH_JITTER_MAX_MS", "400"))
+audio_pacers: dict[str, AudioPacer] = {}
 room_to_agent: dict[str, str] = {}
 
 # MuseTalk entfernt – keine globalen Forwarder mehr
@@ -119,16 +138,8 @@ class _LkAudioPub:
                     token = j.get("token")
                     url = j.get("url", url)
             else:
-                now = dt.datetime.utcnow()
-                exp = now + dt.timedelta(hours=1)
-                payload = {
-                    "iss": LIVEKIT_API_KEY,
-                    "sub": "orchestrator-audio",
-                    "nbf": int(now.timestamp()),
-                    "exp": int(exp.timestamp()),
-                    "audio": {"room": room_name, "roomJoin": True},
-                }
-                token = jwt.encode(payload, LIVEKIT_API_SECRET, algorithm="HS256")
+                # Room-Grants stehen bei LiveKit immer im "video"-Claim
+                token = _token_service().get_token(room_name, "orchestrator-audio", rate_limit=False)
 
             self._room = rtc.Room(room_options=rtc.RoomOptions(auto_subscribe=True))
             await self._room.connect(url, token)
@@ -145,11 +156,14 @@ class _LkAudioPub:
             self._track = None
             self._connected_room = None
 
-    def publish_pcm16_48k_mono(self, data: bytes):
+    async def publish_pcm16_48k_mono(self, data: bytes, room: Optional[str] = None):
         if not ORCH_PUBLISH_AUDIO or rtc is None:
             return
         if not self._source or not data:
             return
+        if room and room != self._connected_room:
+            # Frames eines anderen Rooms nicht in den verbundenen Room mischen
+            return
         samples = len(data) // 2
         try:
             frame = rtc.AudioFrame(
@@ -158,12 +172,44 @@ class _LkAudioPub:
                 num_channels=1,
                 samples_per_channel=samples,
             )
-            self._source.capture_frame(frame)
+            # Neuere SDKs: capture_frame ist async und blockiert bei voller Queue (Backpressure)
+            res = self._source.capture_frame(frame)
+            if asyncio.iscoroutine(res):
+                await res
         except Exception:
             return
 
+    async def disconnect(self):
+        room = self._room
+        self._room = None
+        self._source = None
+        self._track = None
+        self._connected_room = None
+        if room is not None:
+            try:
+                await room.disconnect()
+            except Exception:
+                pass
+
 lk_audio_pub = _LkAudioPub()
 
+
+def _pacer_for(room: str) -> AudioPacer:
+    pacer = audio_pacers.get(room)
+    if pacer is None:
+        # Idle Pacer anderer Rooms aufräumen (Task endet nach idle_stop_ms von selbst, auch mit Restdaten)
+        for other in [r for r, p in audio_pacers.items() if not p.metrics()["running"]]:
+            audio_pacers.pop(other, None)
+        # Sink über den Modul-Global auflösen (Loadtest ersetzt lk_audio_pub)
+        pacer = AudioPacer(
+            lambda frame: lk_audio_pub.publish_pcm16_48k_mono(frame, room=room),
+            frame_ms=ORCH_AUDIO_FRAME_MS,
+            min_buffer_ms=ORCH_JITTER_MIN_MS,
+            max_buffer_ms=ORCH_JITTER_MAX_MS,
+        )
+        audio_pacers[room] = pacer
+    return pacer
+
 @app.get("/health")
 async def health():
     return {"ok": True}
@@ -173,6 +219,61 @@ LIVEKIT_URL = os.getenv("LIVEKIT_URL", "").strip()
 LIVEKIT_API_KEY = os.getenv("LIVEKIT_API_KEY", "").strip()
 LIVEKIT_API_SECRET = os.getenv("LIVEKIT_API_SECRET", "").strip()
 
+# Token-Cache + Rate-Limit für /livekit/token (Clients in Reconnect-Schleifen)
+_lk_tokens: Optional[LiveKitTokenService] = None
+
+
+def _token_service() -> LiveKitTokenService:
+    global _lk_tokens
+    if _lk_tokens is None:
+        _lk_tokens = LiveKitTokenService(
+            LIVEKIT_API_KEY,
+            LIVEKIT_API_SECRET,
+            ttl_seconds=3600,
+            refresh_margin_seconds=int(os.getenv("LIVEKIT_TOKEN_REFRESH_MARGIN", "300")),
+            rate_limiter=IdentityRateLimiter(
+                rate_per_sec=float(os.getenv("LIVEKIT_TOKEN_RATE_PER_SEC", "2")),
+                burst=int(os.getenv("LIVEKIT_TOKEN_BURST", "10")),
+            ),
+        )
+    return _lk_tokens
+
+
+def _client_key(req: Request) -> str:
+    """Client-Adresse fürs Rate-Limit: letzter X-Forwarded-For-Eintrag (vom Proxy gesetzt,
+    nicht vom Client fälschbar), sonst die Socket-Adresse."""
+    forwarded = req.headers.get("x-forwarded-for", "")
+    if forwarded.strip():
+        return forwarded.split(",")[-1].strip()
+    return req.client.host if req.client else "unknown"
+
+
+def _mint_token_response(room: Optional[str], user_id: Optional[str], avatar_id: Optional[str],
+                         client_key: str) -> dict:
+    if not (LIVEKIT_URL and LIVEKIT_API_KEY and LIVEKIT_API_SECRET):
+        raise HTTPException(status_code=500, detail="LiveKit env missing")
+    anonymous = not (user_id or "").strip()
+    uid = (user_id or "anon").strip()
+    avatar = (avatar_id or "avatar").strip()
+    room = (room or "").strip()
+    # Nur explizite Rooms cachen – generierte Rooms sind pro Aufruf neu
+    cacheable = bool(room)
+    if not room:
+        short = uid[:8] if uid else "anon"
+        room = f"mt-{short}-{int(time.time()*1000)}"
+    identity = f"{uid}-{avatar}"
+    # Anonyme Anfragen teilen sich die Identity → Bucket pro Client, sonst drosselt einer alle
+    rate_key = f"anon@{client_key}" if anonymous else identity
+    try:
+        token = _token_service().get_token(room, identity, name=avatar, cacheable=cacheable, rate_key=rate_key)
+    except RateLimited as e:
+        raise HTTPException(
+            status_code=429,
+            detail="too many token requests",
+            headers={"Retry-After": str(max(1, int(e.retry_after + 0.999)))},
+        )
+    return {"url": LIVEKIT_URL, "room": room, "token": token}
+
 @app.websocket("/")
 async def ws_root(ws: WebSocket):
     await ws.accept()
@@ -190,6 +291,9 @@ async def ws_root(ws: WebSocket):
                 text = data.get("text", "")
                 mp3_needed = data.get("mp3", True)
                 pcm_needed = bool(data.get("pcm", False))
+                # "char" (Legacy: 1 Nachricht pro Zeichen), "batch" (JSON) oder "binary"
+                viseme_mode = str(data.get("viseme_mode") or "char").strip().lower()
+                seq = data.get("seq") if isinstance(data.get("seq"), int) else None
                 # Room speichern für Audio-Publishing
                 global last_client_room
                 room_from_client = data.get("room")
@@ -197,7 +301,12 @@ async def ws_root(ws: WebSocket):
                     last_client_room = room_from_client.strip()
                 # Einmalige TTS-Session ausführen und danach Verbindung schließen,
                 # damit der Container skalieren kann.
-                await stream_eleven(ws, voice_id, text, mp3_needed=mp3_needed, pcm_needed=pcm_needed)
+                await stream_eleven(
+                    ws, voice_id, text,
+                    mp3_needed=mp3_needed, pcm_needed=pcm_needed,
+                    viseme_mode=viseme_mode, seq=seq,
+                    room=room_from_client if isinstance(room_from_client, str) else None,
+                )
                 try:
                     await ws.close(code=1000)
                 except Exception:
@@ -216,55 +325,14 @@ async def ws_root(ws: WebSocket):
 
 @app.post("/livekit/token")
 async def mint_livekit_token(req: Request):
-    if not (LIVEKIT_URL and LIVEKIT_API_KEY and LIVEKIT_API_SECRET):
-        raise HTTPException(status_code=500, detail="LiveKit env missing")
     body = await req.json()
     # room optional: wenn nicht gesetzt, generieren wir einen eindeutigen
-    room = (body.get("room") or "").strip()
-    if not room:
-        uid = (body.get("user_id") or "anon").strip()
-        short = uid[:8] if uid else "anon"
-        import time
-        room = f"mt-{short}-{int(time.time()*1000)}"
-    uid = (body.get("user_id") or "anon").strip()
-    avatar_id = (body.get("avatar_id") or "avatar").strip()
-    identity = f"{uid}-{avatar_id}"
-    now = dt.datetime.utcnow()
-    exp = now + dt.timedelta(hours=1)
-    payload = {
-        "iss": LIVEKIT_API_KEY,
-        "sub": identity,
-        "name": avatar_id,
-        "nbf": int(now.timestamp()),
-        "exp": int(exp.timestamp()),
-        "video": {"room": room, "roomJoin": True}
-    }
-    token = jwt.encode(payload, LIVEKIT_API_SECRET, algorithm="HS256")
-    return {"url": LIVEKIT_URL, "room": room, "token": token}
+    return _mint_token_response(body.get("room"), body.get("user_id"), body.get("avatar_id"), _client_key(req))
 
 @app.get("/livekit/token")
-async def mint_livekit_token_get(room: Optional[str] = None, user_id: Optional[str] = None, avatar_id: Optional[str] = None):
-    if not (LIVEKIT_URL and LIVEKIT_API_KEY and LIVEKIT_API_SECRET):
-        raise HTTPException(status_code=500, detail="LiveKit env missing")
-    room = (room or "").strip()
-    if not room:
-        uid = (user_id or "anon").strip()
-        short = uid[:8] if uid else "anon"
-        import time
-        room = f"mt-{short}-{int(time.time()*1000)}"
-    identity = f"{(user_id or 'anon').strip()}-{(avatar_id or 'avatar').strip()}"
-    now = dt.datetime.utcnow()
-    exp = now + dt.timedelta(hours=1)
-    payload = {
-        "iss": LIVEKIT_API_KEY,
-        "sub": identity,
-        "name": (avatar_id or 'avatar').strip(),
-        "nbf": int(now.timestamp()),
-        "exp": int(exp.timestamp()),
-        "video": {"room": room, "roomJoin": True}
-    }
-    token = jwt.encode(payload, LIVEKIT_API_SECRET, algorithm="HS256")
-    return {"url": LIVEKIT_URL, "room": room, "token": token}
+async def mint_livekit_token_get(req: Request, room: Optional[str] = None, user_id: Optional[str] = None,
+                                 avatar_id: Optional[str] = None):
+    return _mint_token_response(room, user_id, avatar_id, _client_key(req))
 
 
 # MuseTalk entfernt – Publisher Integration deaktiviert
@@ -288,6 +356,13 @@ async def _stop_room_internal(room: str):
         pass
     musetalk_last_pcm_ts.pop(room, None)
     # MuseTalk Session Stop entfällt
+    # 2) Audio-Pacer des Rooms stoppen
+    pacer = audio_pacers.pop(room, None)
+    if pacer is not None:
+        try:
+            await pacer.close()
+        except Exception:
+            pass
     # 3) LiveKit Audio Publisher trennen
     try:
         await lk_audio_pub.disconnect()
@@ -425,64 +500,45 @@ async def publisher_stop(req: Request):
         except Exception:
             pass
 
-async def stream_eleven(ws: WebSocket, voice_id: str, text: str, mp3_needed: bool = True, pcm_needed: bool = False):
+async def stream_eleven(
+    ws: WebSocket,
+    voice_id: str,
+    text: str,
+    mp3_needed: bool = True,
+    pcm_needed: bool = False,
+    viseme_mode: str = "char",
+    seq: Optional[int] = None,
+    room: Optional[str] = None,
+):
     if not ELEVEN_KEY:
         await _safe_send(ws, {"type": "error", "message": "ELEVENLABS_API_KEY missing"})
         return
-    url_mp3 = (
-        f"wss://{ELEVEN_BASE}/v1/text-to-speech/{voice_id}/stream-input"
-        f"?model_id={ELEVEN_MODEL}&output_format=mp3_44100_128"
-    )
-    url_pcm = (
-        f"wss://{ELEVEN_BASE}/v1/text-to-speech/{voice_id}/stream-input"
-        f"?model_id={ELEVEN_MODEL}&output_format=pcm_16000"
-    )
-    headers = [("xi-api-key", ELEVEN_KEY)]  # websockets>=11 erwartet additional_headers
-    # Öffne zwei parallele Verbindungen: MP3 (Playback) und PCM (für LivePortrait)
-    # Optional MP3‑Stream (für HTTP-Streaming verwenden wir separaten Endpoint)
-    ew_mp3 = None
-    if mp3_needed:
-        ew_mp3 = await websockets.connect(url_mp3, additional_headers=headers)
-
-    # PCM‑Verbindung nur bei Bedarf öffnen (Kosten sparen)
-    if mp3_needed or pcm_needed:
-        ew_pcm = None
+    # Zwei gepoolte Streams: MP3 (Playback) und PCM (für LiveKit/LivePortrait)
+    # Warme Sockets aus eleven_pool → kein Handshake/Voice-Warmup pro Äußerung
+    viseme_enc = VisemeTimelineEncoder(seq=seq) if viseme_mode in ("batch", "binary") else None
+
+    async def send_visemes(runs):
+        if runs and viseme_mode == "binary":
+            await _safe_send_bytes(ws, viseme_enc.to_binary(runs))
+        elif runs:
+            await _safe_send(ws, viseme_enc.to_json(runs))
+
+    async def loop_mp3():
+        if not mp3_needed:
+            return
         try:
-            if pcm_needed:
-                ew_pcm = await websockets.connect(url_pcm, additional_headers=headers)
-                await ew_pcm.send(json.dumps({
-                    "text": " ",
-                    "voice_settings": {"stability": 0.5, "similarity_boost": 0.8, "speed": 1},
-                }))
-        except Exception:
-            ew_pcm = None
-        # INIT
-        if ew_mp3:
-            await ew_mp3.send(json.dumps({"text": " ", "voice_settings": {"stability": 0.5, "similarity_boost": 0.8, "speed": 1}}))
-        # TEXT
-        if ew_mp3:
-            await ew_mp3.send(json.dumps({"text": text}))
-        if pcm_needed and ew_pcm:
-            await ew_pcm.send(json.dumps({"text": text}))
-        # EOS
-        if ew_mp3:
-            await ew_mp3.send(json.dumps({"text": ""}))
-        if pcm_needed and ew_pcm:
-            await ew_pcm.send(json.dumps({"text": ""}))
-
-        async def loop_mp3():
-            if not ew_mp3:
-                return
-            async for raw in ew_mp3:
+            async for msg in eleven_pool.stream(voice_id, text, ELEVEN_MODEL, "mp3_44100_128"):
                 try:
-                    msg = json.loads(raw)
                     if msg.get("audio"):
                         await _safe_send(ws, {
                             "type": "audio",
                             "data": msg["audio"],
                             "format": "mp3_44100_128",
                         })
-                    if msg.get("alignment"):
+                    if msg.get("alignment") and viseme_enc is not None:
+                        # Ein Batch pro Audio-Chunk statt einer Nachricht pro Zeichen
+                        await send_visemes(viseme_enc.feed(msg["alignment"]))
+                    elif msg.get("alignment"):
                         al = msg["alignment"]
                         chars = al.get("chars", [])
                         starts = al.get("charStartTimesMs", [])
@@ -494,69 +550,61 @@ async def stream_eleven(ws: WebSocket, voice_id: str, text: str, mp3_needed: boo
                                 "pts_ms": starts[i] if i < len(starts) else 0,
                                 "duration_ms": durs[i] if i < len(durs) else 100,
                             })
-                    if msg.get("isFinal"):
-                        await _safe_send(ws, {"type": "done"})
-                        break
                 except Exception:
                     continue
+            if viseme_enc is not None:
+                # zurückgehaltener Digraph-Anfang vom letzten Chunk
+                await send_visemes(viseme_enc.flush())
+                print(f"👄 Visemes: {viseme_enc.chars_in} chars → {viseme_enc.items_out} items in {viseme_enc.batches_out} batches")
+            await _safe_send(ws, {"type": "done"})
+        except Exception as e:
+            print(f"⚠️ ElevenLabs MP3 stream error: {e}")
+            await _safe_send(ws, {"type": "error", "message": f"ElevenLabs: {e}"})
 
-        async def loop_pcm():
-            if not ew_pcm:
-                return
-            # PCM‑Chunks direkt an den Flutter‑Client weiterleiten
-            async for raw in ew_pcm:
+    async def loop_pcm():
+        if not pcm_needed:
+            return
+        global current_audio_room
+        pacer_room: Optional[str] = None
+        # PCM‑Chunks direkt an den Flutter‑Client weiterleiten
+        try:
+            async for msg in eleven_pool.stream(voice_id, text, ELEVEN_MODEL, "pcm_16000"):
                 try:
-                    msg = json.loads(raw)
-                    if msg.get("audio"):
-                        # Sende an Flutter
-                        await _safe_send(ws, {
-                            "type": "pcm",
-                            "data": msg["audio"],
-                            "pts_ms": 0,
-                        })
-                        # Optional: in LiveKit als Audio-Track publizieren (48k mono)
-                        # Auto-connect beim ersten PCM, falls noch nicht verbunden
-                        room_for_audio = current_audio_room or last_client_room
-                        if ORCH_PUBLISH_AUDIO and room_for_audio:
-                            try:
-                                if not lk_audio_pub._connected_room:
-                                    current_audio_room = room_for_audio
-                                    await lk_audio_pub.ensure_connected(room_for_audio)
-                                audio_b64 = msg["audio"]
-                                audio_bytes = base64.b64decode(audio_b64)
-                                audio_bytes = _ensure_int16_le(audio_bytes)
-                                up = _upsample_16k_to_48k_int16le(audio_bytes)
-                                # 20ms @ 48kHz mono int16 => 960 samples => 1920 bytes
-                                _audio48k_buf.extend(up)
-                                frame_bytes = 960 * 2
-                                while len(_audio48k_buf) >= frame_bytes:
-                                    chunk = _audio48k_buf[:frame_bytes]
-                                    del _audio48k_buf[:frame_bytes]
-                                    lk_audio_pub.publish_pcm16_48k_mono(bytes(chunk))
-                            except Exception:
-                                pass
-                        
-                    if msg.get("isFinal"):
-                        break
+                    if not msg.get("audio"):
+                        continue
+                    # Sende an Flutter
+                    await _safe_send(ws, {
+                        "type": "pcm",
+                        "data": msg["audio"],
+                        "pts_ms": 0,
+                    })
+                    # Optional: in LiveKit als Audio-Track publizieren (48k mono)
+                    # Auto-connect beim ersten PCM, falls noch nicht verbunden
+                    room_for_audio = (room or "").strip() or current_audio_room or last_client_room
+                    if ORCH_PUBLISH_AUDIO and room_for_audio:
+                        try:
+                            if not lk_audio_pub._connected_room:
+                                current_audio_room = room_for_audio
+                                await lk_audio_pub.ensure_connected(room_for_audio)
+                            audio_b64 = msg["audio"]
+                            audio_bytes = base64.b64decode(audio_b64)
+                            audio_bytes = _ensure_int16_le(audio_bytes)
+                            up = _upsample_16k_to_48k_int16le(audio_bytes)
+                            # Pacer taktet 48k-Frames aus; push() wartet bei vollem Buffer
+                            pacer_room = room_for_audio
+                            await _pacer_for(pacer_room).push(up)
+                        except Exception:
+                            pass
                 except Exception:
                     continue
+        except Exception as e:
+            print(f"⚠️ ElevenLabs PCM stream error: {e}")
+        finally:
+            if pacer_room and pacer_room in audio_pacers:
+                audio_pacers[pacer_room].end()
 
-        # Starte Loops parallel (PCM nur wenn benötigt)
-        await asyncio.gather(loop_mp3(), loop_pcm())
-        
-        # ElevenLabs WS schließen (wichtig für Container scale-down!)
-        if ew_mp3:
-            try:
-                await ew_mp3.close()
-            except Exception:
-                pass
-        if pcm_needed and ew_pcm:
-            try:
-                await ew_pcm.close()
-            except Exception:
-                pass
-        
-        # MuseTalk entfernt – keine WS zu schließen
+    # Starte Loops parallel (PCM nur wenn benötigt)
+    await asyncio.gather(loop_mp3(), loop_pcm())
 
 
 @app.post("/avatar/tts")
@@ -578,7 +626,7 @@ async def avatar_tts(req: Request):
             raise HTTPException(status_code=400, detail="voice_id required")
         
         import httpx
-        url = f"https://{ELEVEN_BASE}/v1/text-to-speech/{voice_id}"
+        url = f"{ELEVEN_HTTP_SCHEME}://{ELEVEN_BASE}/v1/text-to-speech/{voice_id}"
         headers = {"xi-api-key": ELEVEN_KEY, "Content-Type": "application/json"}
         payload = {
             "text": text,
@@ -603,33 +651,16 @@ async def avatar_tts(req: Request):
 async def tts_stream(voice_id: str, text: str):
     if not ELEVEN_KEY:
         raise HTTPException(status_code=500, detail="ELEVENLABS_API_KEY missing")
-    url_mp3 = (
-        f"wss://{ELEVEN_BASE}/v1/text-to-speech/{voice_id}/stream-input"
-        f"?model_id={ELEVEN_MODEL}&output_format=mp3_44100_128"
-    )
-
-    headers = [("xi-api-key", ELEVEN_KEY)]
 
     async def gen():
         try:
-            async with websockets.connect(url_mp3, additional_headers=headers) as ew_mp3:
-                # init
-                await ew_mp3.send(json.dumps({"text": " ", "voice_settings": {"stability": 0.5, "similarity_boost": 0.8, "speed": 1}}))
-                # text
-                await ew_mp3.send(json.dumps({"text": text}))
-                # eos
-                await ew_mp3.send(json.dumps({"text": ""}))
-
-                async for raw in ew_mp3:
-                    try:
-                        msg = json.loads(raw)
-                        if msg.get("audio"):
-                            yield base64.b64decode(msg["audio"])
-                        if msg.get("isFinal"):
-                            break
-                    except Exception:
-                        continue
-        except Exception as e:
+            async for msg in eleven_pool.stream(voice_id, text, ELEVEN_MODEL, "mp3_44100_128"):
+                try:
+                    if msg.get("audio"):
+                        yield base64.b64decode(msg["audio"])
+                except Exception:
+                    continue
+        except Exception:
             # end stream on error
             return
 
@@ -644,6 +675,16 @@ async def _safe_send(ws: WebSocket, obj: dict):
     except Exception:
         # Client bereits weg – ignorieren
         pass
+
+
+async def _safe_send_bytes(ws: WebSocket, data: bytes):
+    """Binär-Variante von _safe_send (z.B. Viseme-Batches)."""
+    try:
+        if ws.client_state == WebSocketState.CONNECTED:
+            await ws.send_bytes(data)
+    except Exception:
+        pass
+
 @app.post("/agent/join")
 async def agent_join(req: Request):
     """Proxy: BitHuman Agent in Room joinen lassen"""
@@ -693,6 +734,21 @@ async def speak(req: Request):
 # MuseTalk Debug-Endpoint entfernt
 
 
+@app.get("/debug/eleven")
+async def debug_eleven():
+    """Pool-Status + First-Audio-Latenz der ElevenLabs-Sockets."""
+    try:
+        return eleven_pool.metrics()
+    except Exception as e:
+        return {"error": str(e)}
+
+
+@app.get("/debug/tokens")
+async def debug_tokens():
+    """Token-Cache/Rate-Limit Zähler für /livekit/token."""
+    return _lk_tokens.metrics() if _lk_tokens is not None else {"hits": 0, "misses": 0, "rate_limited": 0, "cached": 0}
+
+
 @app.get("/debug/audio")
 async def debug_audio():
     try:
@@ -703,7 +759,7 @@ async def debug_audio():
             "last_client_room": last_client_room,
             "connected_room": getattr(lk_audio_pub, "_connected_room", None),
             "has_source": bool(getattr(lk_audio_pub, "_source", None)),
-            "buf_bytes": len(_audio48k_buf),
+            "pacers": {room: p.metrics() for room, p in audio_pacers.items()},
         }
     except Exception as e:
         return {"error": str(e)}
@@ -720,7 +776,7 @@ async def elevenlabs_voices_proxy():
         import httpx
         async with httpx.AsyncClient(timeout=10.0) as client:
             resp = await client.get(
-                f"https://{ELEVEN_BASE}/v1/voices",
+                f"{ELEVEN_HTTP_SCHEME}://{ELEVEN_BASE}/v1/voices",
                 headers={"xi-api-key": ELEVEN_KEY}
             )
             resp.raise_for_status()
@@ -740,7 +796,7 @@ async def elevenlabs_clone_proxy(req: Request):
         import httpx
         async with httpx.AsyncClient(timeout=30.0) as client:
             resp = await client.post(
-                f"https://{ELEVEN_BASE}/v1/voices/add",
+                f"{ELEVEN_HTTP_SCHEME}://{ELEVEN_BASE}/v1/voices/add",
                 headers={
                     "xi-api-key": ELEVEN_KEY,
                     "Content-Type": "application/json"
@@ -793,7 +849,7 @@ async def create_eleven_voice(req: Request):
             if voice_id and voice_id.strip() and voice_id != "__CLONE__":
                 try:
                     del_resp = await client.delete(
-                        f"https://{ELEVEN_BASE}/v1/voices/{voice_id.strip()}",
+                        f"{ELEVEN_HTTP_SCHEME}://{ELEVEN_BASE}/v1/voices/{voice_id.strip()}",
                         headers=headers_eleven,
                         timeout=30.0
                     )
@@ -821,7 +877,7 @@ async def create_eleven_voice(req: Request):
             
             # Multipart Request
             create_resp = await client.post(
-                f"https://{ELEVEN_BASE}/v1/voices/add",
+                f"{ELEVEN_HTTP_SCHEME}://{ELEVEN_BASE}/v1/voices/add",
                 headers={**headers_eleven, "Accept": "application/json"},
                 data=data,
                 files=files,
@@ -0,0 +1,180 @@
+"""Viseme-Timeline aus ElevenLabs-Alignment-Daten.
+
+Bisher ging pro Zeichen eine JSON-Nachricht an den Client. Der Encoder hier
+mappt Zeichen auf dieselben Viseme-Klassen wie orchestrator/src/viseme_mapper.ts,
+fasst Läufe gleicher Viseme zusammen und liefert pro Audio-Chunk genau einen
+Batch (JSON oder kompaktes Binärformat).
+
+Binärformat (little endian):
+  b"VIS1" | u32 seq | u16 count | count × (u8 viseme_id, u32 start_ms, u16 dur_ms)
+"""
+import struct
+from typing import Iterable, Optional
+
+# Gleiche Klassen wie im TS-Mapper, Index = Binär-ID
+VISEME_CLASSES: tuple[str, ...] = (
+    "Rest", "AI", "E", "O", "U", "MBP", "FV", "L", "WQ", "R", "CH", "TH",
+)
+_VISEME_ID = {v: i for i, v in enumerate(VISEME_CLASSES)}
+
+# Zwei-/Dreibuchstaben-Grapheme zuerst (längster Treffer gewinnt)
+_DIGRAPHS: dict[str, str] = {
+    "sch": "CH",
+    "ch": "CH",
+    "sh": "CH",
+    "th": "TH",
+    "ph": "FV",
+    "qu": "WQ",
+}
+
+# Chunk-Enden, mit denen ein Digraph beginnen könnte ("c", "s", "sc", "t", …)
+_DIGRAPH_PREFIXES = frozenset(g[:n] for g in _DIGRAPHS for n in range(1, len(g)))
+
+_CHARS: dict[str, str] = {
+    "a": "AI", "ä": "E", "e": "E", "i": "E", "y": "E",
+    "o": "O", "ö": "O", "u": "U", "ü": "U",
+    "m": "MBP", "b": "MBP", "p": "MBP",
+    "f": "FV", "v": "FV",
+    "l": "L",
+    "w": "WQ", "q": "WQ",
+    "r": "R",
+    "j": "CH", "s": "CH", "z": "CH", "c": "CH", "x": "CH", "ß": "CH",
+    # Zungen-/Gaumenlaute: Mund bleibt leicht offen
+    "t": "E", "d": "E", "n": "E", "k": "E", "g": "E", "h": "AI",
+}
+
+_HEADER = b"VIS1"
+_ITEM = struct.Struct("<BIH")
+
+
+def char_visemes(chars: list[str]) -> list[str]:
+    """Viseme-Klasse pro Zeichen (Digraphen bekommen für alle Zeichen dieselbe Klasse)."""
+    lower = [c.lower() for c in chars]
+    out: list[str] = []
+    i = 0
+    while i < len(lower):
+        for n in (3, 2):
+            gram = "".join(lower[i:i + n])
+            if len(gram) == n and gram in _DIGRAPHS:
+                out.extend([_DIGRAPHS[gram]] * n)
+                i += n
+                break
+        else:
+            out.append(_CHARS.get(lower[i], "Rest"))
+            i += 1
+    return out
+
+
+def merge_runs(
+    chars: list[str],
+    starts: list[float],
+    durs: list[float],
+    context: str = "",
+) -> list[tuple[str, int, int]]:
+    """Zeichen-Alignment → [(viseme, start_ms, dur_ms)], gleiche Nachbarn zusammengefasst.
+
+    context: letzte Zeichen des vorherigen Chunks, damit über die Chunkgrenze
+    laufende Digraphen ("c|h", "t|h") gleich gemappt werden.
+    """
+    visemes = char_visemes(list(context) + list(chars))[len(context):]
+    runs: list[tuple[str, int, int]] = []
+    for i, v in enumerate(visemes):
+        start = int(starts[i]) if i < len(starts) else (runs[-1][1] + runs[-1][2] if runs else 0)
+        dur = int(durs[i]) if i < len(durs) else 100
+        if runs and runs[-1][0] == v and runs[-1][1] + runs[-1][2] >= start:
+            prev_v, prev_s, prev_d = runs[-1]
+            runs[-1] = (prev_v, prev_s, max(prev_d, start + dur - prev_s))
+        else:
+            runs.append((v, start, dur))
+    return runs
+
+
+def _held_suffix(chars: list[str]) -> int:
+    """Anzahl Zeichen am Ende, die noch Anfang eines Digraphen sein können."""
+    for n in (2, 1):
+        if len(chars) >= n and "".join(chars[-n:]).lower() in _DIGRAPH_PREFIXES:
+            return n
+    return 0
+
+
+class VisemeTimelineEncoder:
+    """Ein Encoder pro Äußerung; feed() pro ElevenLabs-Nachricht mit Alignment, flush() am Ende.
+
+    Endet ein Chunk mit einem möglichen Digraph-Anfang ("…t" | "h…"), wird dieses
+    Zeichen zurückgehalten und mit dem nächsten feed() gemappt – so bekommt auch
+    die erste Hälfte die Klasse des Digraphen (wie bei der ganzen Äußerung).
+    """
+
+    def __init__(self, seq: Optional[int] = None):
+        self.seq = seq
+        self._tail = ""
+        self._held: tuple[list, list, list] = ([], [], [])
+        self.chars_in = 0
+        self.items_out = 0
+        self.batches_out = 0
+
+    def feed(self, alignment: dict) -> list[tuple[str, int, int]]:
+        new = alignment.get("chars", []) or []
+        held_chars, held_starts, held_durs = self._held
+        chars = held_chars + list(new)
+        starts = held_starts + list(alignment.get("charStartTimesMs", []) or [])
+        durs = held_durs + list(alignment.get("charDurationsMs", []) or [])
+        # nur mit vollständigen Zeiten zurückhalten, sonst verrutscht die Zuordnung
+        hold = _held_suffix(chars) if len(starts) >= len(chars) and len(durs) >= len(chars) else 0
+        cut = len(chars) - hold
+        self._held = (chars[cut:], starts[cut:len(chars)], durs[cut:len(chars)])
+        self.chars_in += len(new)
+        return self._emit(chars[:cut], starts[:cut], durs[:cut])
+
+    def flush(self) -> list[tuple[str, int, int]]:
+        """Zurückgehaltene Zeichen am Ende der Äußerung ausgeben."""
+        chars, starts, durs = self._held
+        self._held = ([], [], [])
+        return self._emit(chars, starts, durs)
+
+    def _emit(self, chars: list, starts: list, durs: list) -> list[tuple[str, int, int]]:
+        runs = merge_runs(chars, starts, durs, context=self._tail)
+        if chars:
+            self._tail = "".join(chars)[-2:]
+        if runs:
+            self.items_out += len(runs)
+            self.batches_out += 1
+        return runs
+
+    def to_json(self, runs: list[tuple[str, int, int]]) -> dict:
+        msg = {"type": "visemes", "items": [list(r) for r in runs]}
+        if self.seq is not None:
+            msg["seq"] = self.seq
+        return msg
+
+    def to_binary(self, runs: list[tuple[str, int, int]]) -> bytes:
+        parts = [_HEADER, struct.pack("<IH", (self.seq or 0) & 0xFFFFFFFF, len(runs))]
+        for v, start, dur in runs:
+            parts.append(_ITEM.pack(_VISEME_ID.get(v, 0), max(0, start), min(0xFFFF, max(0, dur))))
+        return b"".join(parts)
+
+
+def decode_binary(data: bytes) -> tuple[int, list[tuple[str, int, int]]]:
+    """Gegenstück zu VisemeTimelineEncoder.to_binary (Debug/Client-Referenz)."""
+    if data[:4] != _HEADER:
+        raise ValueError("not a viseme batch")
+    seq, count = struct.unpack_from("<IH", data, 4)
+    off = 10
+    items = []
+    for _ in range(count):
+        vid, start, dur = _ITEM.unpack_from(data, off)
+        off += _ITEM.size
+        items.append((VISEME_CLASSES[vid] if vid < len(VISEME_CLASSES) else "Rest", start, dur))
+    return seq, items
+
+
+def sample_timeline(items: Iterable[tuple[str, int, int]], step_ms: int = 10) -> dict[int, str]:
+    """Viseme pro Zeitraster – zum Vergleich von Per-Zeichen- und Batch-Timeline."""
+    out: dict[int, str] = {}
+    for v, start, dur in items:
+        t = (start // step_ms) * step_ms
+        while t < start + max(dur, 1):
+            if t >= start:
+                out[t] = v
+            t += step_ms
+    return out
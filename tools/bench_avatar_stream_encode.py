@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Benchmark: /generate-avatar alt (Frames sammeln → cv2 mp4v → ffmpeg-Mux) vs. Streaming-Encode.
+
+Synthetische Frame-Quelle (async Generator wie AsyncBithuman.run(), bewegter
+Gradient, BGR uint8) + Sinus-Audio. Die Quelle liefert --extra-s Sekunden mehr
+Frames als Audio da ist (wie die Runtime, die nach dem Audio Idle-Frames
+nachschiebt) – mit -shortest beendet ffmpeg den Stream vorher. Gemessen:
+  - Wall-Time
+  - Peak der Python/numpy-Allokationen (tracemalloc) – alt wächst mit der Cliplänge,
+    Streaming bleibt flach
+
+--preset vergleicht libx264-Presets des Streaming-Pfads (Default wie im
+Service: BITHUMAN_ENCODE_PRESET bzw. ultrafast).
+
+Ohne OpenCV schreibt der Legacy-Pfad die gesammelten Frames über eine rawvideo-
+Pipe (mpeg4) – der Speicherverlauf ist derselbe, nur der Encoder fehlt.
+
+Beispiel:
+  python tools/bench_avatar_stream_encode.py --seconds 10,30,60 --size 1280x720
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bithuman_pipeline.stream_encoder import DEFAULT_PRESET, encode_stream, resolve_ffmpeg  # noqa: E402
+
+
+async def synthetic_frames(width: int, height: int, count: int):
+    """Wie die Runtime: pro Frame ein neues BGR-Array."""
+    base = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+    for i in range(count):
+        frame = np.empty((height, width, 3), dtype=np.uint8)
+        frame[:] = ((base + i * 4) % 256).astype(np.uint8)
+        frame[: height // 4, (i * 8) % width:, 1] = 255
+        yield frame
+        await asyncio.sleep(0)
+
+
+def make_audio(ffmpeg_bin: str, path: str, seconds: float):
+    subprocess.run([ffmpeg_bin, "-y", "-v", "error", "-f", "lavfi",
+                    "-i", f"sine=frequency=220:duration={seconds}", "-ar", "16000", path],
+                   check=True, capture_output=True)
+
+
+async def legacy(ffmpeg_bin: str, audio: str, out: str, width: int, height: int, count: int, fps: int):
+    frames = []
+    async for frame in synthetic_frames(width, height, count):
+        frames.append(frame)
+    temp_video = out + ".no_audio.mp4"
+    try:
+        import cv2
+        writer = cv2.VideoWriter(temp_video, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+        for frame in frames:
+            writer.write(frame)
+        writer.release()
+    except ImportError:
+        proc = subprocess.Popen([ffmpeg_bin, "-y", "-v", "error", "-f", "rawvideo", "-pix_fmt", "bgr24",
+                                 "-s", f"{width}x{height}", "-r", str(fps), "-i", "pipe:0",
+                                 "-c:v", "mpeg4", "-q:v", "3", temp_video], stdin=subprocess.PIPE)
+        for frame in frames:
+            proc.stdin.write(frame.tobytes())
+        proc.stdin.close()
+        proc.wait()
+    subprocess.run([ffmpeg_bin, "-y", "-v", "error", "-i", temp_video, "-i", audio,
+                    "-c:v", "copy", "-c:a", "aac", "-shortest", out], check=True)
+    os.remove(temp_video)
+    return len(frames)
+
+
+async def streaming(audio: str, out: str, width: int, height: int, count: int, fps: int, preset: str):
+    res = await encode_stream(synthetic_frames(width, height, count), out, audio_path=audio, fps=fps,
+                              preset=preset)
+    assert res["ok"], res["stderr"][-500:]
+    return res["frames"], res["ended"]
+
+
+def measure(coro_fn, *args):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = asyncio.run(coro_fn(*args))
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 1024 / 1024
+
+
+def main():
+    ap = argparse.ArgumentParser(description="BitHuman Streaming-Encode Benchmark")
+    ap.add_argument("--ffmpeg", default=resolve_ffmpeg() or "ffmpeg")
+    ap.add_argument("--seconds", default="10,30,60", help="Cliplängen in Sekunden")
+    ap.add_argument("--size", default="1280x720")
+    ap.add_argument("--fps", type=int, default=30)
+    ap.add_argument("--extra-s", type=float, default=1.0, help="Frames über das Audio-Ende hinaus")
+    ap.add_argument("--preset", default=DEFAULT_PRESET, help="libx264-Preset des Streaming-Pfads")
+    ap.add_argument("--skip-legacy", action="store_true")
+    args = ap.parse_args()
+    width, height = (int(v) for v in args.size.split("x"))
+
+    work = tempfile.mkdtemp(prefix="bench_stream_")
+    rows = []
+    try:
+        for seconds in [float(x) for x in args.seconds.split(",")]:
+            count = int((seconds + args.extra_s) * args.fps)
+            audio = os.path.join(work, "audio.wav")
+            make_audio(args.ffmpeg, audio, seconds)
+            row = {"clip_s": seconds, "frames": count}
+            if not args.skip_legacy:
+                _, t, peak = measure(legacy, args.ffmpeg, audio, os.path.join(work, "legacy.mp4"),
+                                     width, height, count, args.fps)
+                row.update(legacy_s=round(t, 2), legacy_peak_mb=round(peak, 1))
+            (n, ended), t, peak = measure(streaming, audio, os.path.join(work, "stream.mp4"),
+                                         width, height, count, args.fps, args.preset)
+            row.update(stream_s=round(t, 2), stream_peak_mb=round(peak, 1), stream_frames=n, stream_ended=ended)
+            rows.append(row)
+            print(json.dumps(row))
+        print(json.dumps({"cpu_count": os.cpu_count(), "size": args.size, "fps": args.fps, "preset": args.preset,
+                          "results": rows}, indent=2))
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
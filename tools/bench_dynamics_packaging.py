@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Dynamics-Packaging alt (5+ ffmpeg-Läufe) vs. Single-Pass.
+
+Erzeugt einen synthetischen 10s-Clip (testsrc2, wie LivePortrait-Output) und
+misst die Wall-Time beider Varianten – nur CPU, kein GPU/LivePortrait nötig.
+
+Beispiel:
+  python tools/bench_dynamics_packaging.py --size 720x720 --runs 2
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dynamics_pipeline.packaging import package_idle_media  # noqa: E402
+
+
+def _run(cmd):
+    subprocess.run(cmd, check=True, capture_output=True)
+
+
+def make_clip(ffmpeg_bin: str, path: str, size: str, fps: int, seconds: float):
+    # LivePortrait schreibt ~30fps H.264 mit hoher Qualität (CRF 15 Patch)
+    _run([
+        ffmpeg_bin, "-y", "-v", "error",
+        "-f", "lavfi", "-i", f"testsrc2=size={size}:rate={fps}:duration={seconds}",
+        "-c:v", "libx264", "-preset", "ultrafast", "-crf", "15", "-pix_fmt", "yuv420p",
+        path,
+    ])
+
+
+def legacy_package(ffmpeg_bin: str, src: str, out_dir: str, preset: str) -> float:
+    """Bisherige Schritte 7, 9, 10b, 10c aus modal_dynamics.generate_dynamics."""
+    t0 = time.perf_counter()
+    idle = os.path.join(out_dir, "legacy_idle.mp4")
+    _run([ffmpeg_bin, "-y", "-i", src, "-an", "-r", "25", "-c:v", "libx264", "-preset", preset,
+          "-crf", "18", "-pix_fmt", "yuv420p", "-movflags", "+faststart", idle])
+    frames_dir = tempfile.mkdtemp(prefix="legacy_frames_", dir=out_dir)
+    _run([ffmpeg_bin, "-y", "-v", "error", "-i", idle, "-vframes", "25", f"{frames_dir}/frame_%03d.png"])
+    with zipfile.ZipFile(os.path.join(out_dir, "legacy_frames.zip"), "w", compression=zipfile.ZIP_STORED) as zf:
+        for name in sorted(os.listdir(frames_dir)):
+            zf.write(os.path.join(frames_dir, name), arcname=name)
+    shutil.rmtree(frames_dir, ignore_errors=True)
+    _run([ffmpeg_bin, "-y", "-i", idle, "-vframes", "1", "-q:v", "2", os.path.join(out_dir, "legacy_hero.jpg")])
+    for i, (ss, t, g) in enumerate([(0, 2, 50), (2, 4, 100), (6, 4, 100)], start=1):
+        _run([ffmpeg_bin, "-y", "-i", idle, "-ss", str(ss), "-t", str(t),
+              "-c:v", "libx264", "-preset", "ultrafast", "-crf", "18",
+              "-g", str(g), "-keyint_min", str(g), "-an", os.path.join(out_dir, f"legacy_chunk{i}.mp4")])
+    return time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Dynamics packaging benchmark (legacy vs single-pass)")
+    ap.add_argument("--ffmpeg", default=shutil.which("ffmpeg") or "ffmpeg")
+    ap.add_argument("--size", default="720x720")
+    ap.add_argument("--fps", type=int, default=30)
+    ap.add_argument("--seconds", type=float, default=10.0)
+    ap.add_argument("--preset", default="slow")
+    ap.add_argument("--runs", type=int, default=1)
+    args = ap.parse_args()
+
+    work = tempfile.mkdtemp(prefix="bench_pkg_")
+    try:
+        src = os.path.join(work, "lp_output.mp4")
+        make_clip(args.ffmpeg, src, args.size, args.fps, args.seconds)
+        legacy, single = [], []
+        for _ in range(args.runs):
+            legacy.append(legacy_package(args.ffmpeg, src, work, args.preset))
+            res = package_idle_media(src, work, "single", ffmpeg_bin=args.ffmpeg, preset=args.preset)
+            single.append(res["elapsed_s"])
+        report = {
+            "clip": {"size": args.size, "fps": args.fps, "seconds": args.seconds, "preset": args.preset},
+            "cpu_count": os.cpu_count(),
+            "legacy_s": round(min(legacy), 2),
+            "single_pass_s": round(min(single), 2),
+            "speedup": round(min(legacy) / max(1e-6, min(single)), 2),
+            "single_pass_outputs": {
+                "chunks": [os.path.basename(p) for p in res["chunk_paths"]],
+                "hero": bool(res["hero_path"]),
+                "frames_zip": bool(res["frames_zip_path"]),
+            },
+        }
+        print(json.dumps(report, indent=2))
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark: /trim-video alt (Output-Seek + kompletter libx264-Encode) vs. Trim-Engine.
+
+Erzeugt synthetische Videos (testsrc2 + Sinus-AAC, GOP 2s, B-Frames wie
+Handy-Videos) in mehreren Längen und schneidet jeweils:
+  - hero:    Bereich mit Schnittpunkten mitten im GOP
+  - aligned: Bereich genau auf Keyframes
+  - long:    fast das ganze Video
+Gemessen wird die Wall-Time; "exact" prüft die Frame-Anzahl gegen den Bereich.
+
+Beispiel:
+  python tools/bench_trim_video.py --lengths 20,60,180 --size 640x360
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dynamics_pipeline.trimming import keyframe_index, trim_video  # noqa: E402
+
+
+def make_video(ffmpeg_bin: str, path: str, size: str, fps: int, seconds: float):
+    subprocess.run([
+        ffmpeg_bin, "-y", "-v", "error",
+        "-f", "lavfi", "-i", f"testsrc2=size={size}:rate={fps}:duration={seconds}",
+        "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}",
+        "-c:v", "libx264", "-preset", "veryfast", "-g", str(2 * fps), "-keyint_min", str(2 * fps),
+        "-sc_threshold", "0", "-pix_fmt", "yuv420p", "-c:a", "aac", "-shortest", path,
+    ], check=True, capture_output=True)
+
+
+def legacy_trim(ffmpeg_bin: str, src: str, dst: str, start: float, end: float) -> float:
+    """Bisheriges Kommando aus backend/main.py /trim-video."""
+    t0 = time.perf_counter()
+    subprocess.run([ffmpeg_bin, "-i", src, "-ss", str(start), "-t", str(end - start),
+                    "-c:v", "libx264", "-c:a", "aac", "-y", dst], check=True, capture_output=True)
+    return time.perf_counter() - t0
+
+
+def frame_count(path: str) -> int:
+    index = keyframe_index(path)
+    return len(index["frames"]) if index else -1
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Trim benchmark (legacy vs smart cut)")
+    ap.add_argument("--ffmpeg", default=shutil.which("ffmpeg") or "ffmpeg")
+    ap.add_argument("--ffprobe", default=shutil.which("ffprobe") or "ffprobe")
+    ap.add_argument("--lengths", default="20,60,180", help="Videolängen in Sekunden")
+    ap.add_argument("--size", default="640x360")
+    ap.add_argument("--fps", type=int, default=30)
+    args = ap.parse_args()
+
+    work = tempfile.mkdtemp(prefix="bench_trim_")
+    rows = []
+    try:
+        for length in [float(x) for x in args.lengths.split(",")]:
+            src = os.path.join(work, f"src_{int(length)}.mp4")
+            make_video(args.ffmpeg, src, args.size, args.fps, length)
+            cases = {
+                "hero": (1.3, min(length, 11.3)),
+                "aligned": (4.0, min(length, 14.0)),
+                "long": (5.5, length - 3.2),
+            }
+            for name, (start, end) in cases.items():
+                expected = round((end - start) * args.fps)
+                dst = os.path.join(work, "out.mp4")
+                row = {"video_s": length, "case": name, "range": [start, end]}
+                row["legacy_s"] = round(legacy_trim(args.ffmpeg, src, dst, start, end), 2)
+                for mode in ("accurate", "keyframe"):
+                    res = trim_video(src, dst, start, end, mode=mode,
+                                     ffmpeg_bin=args.ffmpeg, ffprobe_bin=args.ffprobe)
+                    row[f"{mode}_s"] = round(res["elapsed_s"], 2)
+                    row[f"{mode}_strategy"] = res["strategy"] + (" (fallback)" if res["fallback"] else "")
+                    if mode == "accurate":
+                        row["accurate_exact"] = frame_count(dst) == expected
+                row["speedup_accurate"] = round(row["legacy_s"] / max(1e-3, row["accurate_s"]), 1)
+                rows.append(row)
+                print(json.dumps(row))
+        print(json.dumps({"cpu_count": os.cpu_count(), "size": args.size, "fps": args.fps, "results": rows}, indent=2))
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
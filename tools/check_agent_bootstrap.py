@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Prüft bithuman_pipeline.agent_bootstrap mit Fake-Room und Fake-Modell (kein LiveKit nötig):
+
+  - Teilnehmer über "participant_connected" statt 0.5-s-Polling (Latenz-Vergleich)
+  - Teilnehmer schon im Room, Identity-Filter, Timeout, Listener wird abgemeldet
+  - Kind-Filter: andere Agents (z. B. der BitHuman-Avatar) zählen nicht als Teilnehmer
+  - Modelle einmal pro Prozess: parallele Sessions laden VAD genau einmal,
+    prewarm(proc) füllt proc.userdata, zweite Session ohne Ladezeit
+  - PhaseTimer.report → startup_stats() (p50/p95 je Phase)
+
+Beispiel:
+  python tools/check_agent_bootstrap.py --join-after-ms 130 --vad-ms 400
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bithuman_pipeline import agent_bootstrap  # noqa: E402
+from bithuman_pipeline.agent_bootstrap import (  # noqa: E402
+    KIND_AGENT, KIND_SIP, ParticipantTimeout, PhaseTimer, aget_model, get_model, preload, prewarm, startup_stats,
+    wait_for_participant,
+)
+
+
+class FakeRoom:
+    def __init__(self):
+        self.remote_participants = {}
+        self.handlers = {}
+
+    def on(self, event, callback=None):
+        self.handlers.setdefault(event, []).append(callback)
+        return callback
+
+    def off(self, event, callback):
+        self.handlers.get(event, []).remove(callback)
+
+    def join(self, identity, kind=0):
+        p = SimpleNamespace(identity=identity, kind=kind)
+        self.remote_participants[identity] = p
+        for cb in list(self.handlers.get("participant_connected", [])):
+            cb(p)
+
+
+def check(name, cond):
+    print(f"{'✅' if cond else '❌'} {name}")
+    if not cond:
+        raise SystemExit(1)
+
+
+async def legacy_wait(room):
+    """Bisher im Complete Agent."""
+    while not room.remote_participants:
+        await asyncio.sleep(0.5)
+
+
+async def measure(waiter, join_after_s):
+    room = FakeRoom()
+    asyncio.get_running_loop().call_later(join_after_s, room.join, "user-1")
+    t = time.perf_counter()
+    await waiter(room)
+    return time.perf_counter() - join_after_s - t
+
+
+async def run(args):
+    join_after_s = args.join_after_ms / 1000
+
+    # --- Teilnehmer ---
+    old = [await measure(legacy_wait, join_after_s) for _ in range(3)]
+    new = [await measure(wait_for_participant, join_after_s) for _ in range(3)]
+    print(f"⏱️ Verzögerung nach Join: Polling {sum(old) / 3 * 1000:.0f} ms, Events {sum(new) / 3 * 1000:.1f} ms")
+    check("Events reagieren sofort", max(new) < 0.05 and max(new) < min(old))
+
+    room = FakeRoom()
+    room.join("schon-da")
+    check("Teilnehmer schon im Room", (await wait_for_participant(room, timeout_s=0.1)).identity == "schon-da")
+
+    room = FakeRoom()
+    loop = asyncio.get_running_loop()
+    loop.call_later(0.02, room.join, "orchestrator-audio")
+    loop.call_later(0.04, room.join, "user-7")
+    p = await wait_for_participant(room, timeout_s=1, identity="user-7")
+    check("Identity-Filter", p.identity == "user-7")
+
+    room = FakeRoom()
+    room.join("bithuman-avatar", kind=KIND_AGENT)
+    loop.call_later(0.02, room.join, "agent-zwei", KIND_AGENT)
+    loop.call_later(0.04, room.join, "user-8")
+    p = await wait_for_participant(room, timeout_s=1)
+    check("Agents werden übersprungen (schon im Room und beim Join)", p.identity == "user-8")
+    check("kind explizit: Agent", (await wait_for_participant(room, timeout_s=0.1, kind=KIND_AGENT)).kind == KIND_AGENT)
+    room = FakeRoom()
+    room.join("telefon", kind=KIND_SIP)
+    check("SIP zählt als Teilnehmer", (await wait_for_participant(room, timeout_s=0.1)).identity == "telefon")
+
+    room = FakeRoom()
+    t = time.perf_counter()
+    try:
+        await wait_for_participant(room, timeout_s=0.1)
+        timed_out = False
+    except ParticipantTimeout:
+        timed_out = True
+    check("Timeout → ParticipantTimeout", timed_out and time.perf_counter() - t < 0.5)
+    check("Listener abgemeldet", room.handlers.get("participant_connected") == [])
+
+    # --- Modelle ---
+    loads = []
+
+    def fake_vad():
+        loads.append(1)
+        time.sleep(args.vad_ms / 1000)
+        return object()
+
+    agent_bootstrap.register_model("vad", fake_vad)
+    t = time.perf_counter()
+    vads = await asyncio.gather(*(aget_model("vad") for _ in range(5)))
+    first = time.perf_counter() - t
+    check(f"5 parallele Sessions → 1 Ladevorgang ({first * 1000:.0f} ms)",
+          len(loads) == 1 and all(v is vads[0] for v in vads))
+    t = time.perf_counter()
+    check("zweite Session: geteiltes Modell", get_model("vad") is vads[0])
+    print(f"⏱️ VAD: bisher {args.vad_ms:.0f} ms pro Session, jetzt {(time.perf_counter() - t) * 1000:.2f} ms ab Session 2")
+    check("preload: schon geladen → 0", preload(["vad"]) == {"vad": 0.0})
+
+    agent_bootstrap._MODELS.clear()
+    proc = SimpleNamespace(userdata={})
+    prewarm(proc)
+    check("prewarm füllt proc.userdata", proc.userdata.get("vad") is not None
+          and proc.userdata["prewarm_timings"]["vad"] > 0 and len(loads) == 2)
+    check("Entrypoint nutzt proc.userdata", get_model("vad", proc.userdata) is proc.userdata["vad"] and len(loads) == 2)
+
+    # --- Timings ---
+    for i in range(10):
+        timer = PhaseTimer()
+        time.sleep(0.002)
+        timer.mark("connect")
+        time.sleep(0.001 * i)
+        timer.mark("participant")
+        timings = timer.report(f"room-{i}")
+    stats = startup_stats().metrics()
+    check("report() liefert Phasen + total", set(timings) == {"connect", "participant", "total"})
+    check("startup_stats p50/p95", stats["participant"]["n"] == 10
+          and stats["participant"]["p95"] >= stats["participant"]["p50"])
+    print(f"📊 {stats}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--join-after-ms", type=float, default=130)
+    ap.add_argument("--vad-ms", type=float, default=300, help="simuliertes silero.VAD.load()")
+    asyncio.run(run(ap.parse_args()))
+    print("✅ Agent-Bootstrap OK")
+
+
+if __name__ == "__main__":
+    main()
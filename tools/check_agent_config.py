@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Prüft bithuman_pipeline.agent_config (agentId → Config, statt Firestore-Query pro Join)
+gegen ein Fake-Firestore mit künstlicher Latenz:
+
+  - Warm-up: eine Query, danach Joins ohne Firestore (Reconnect-Sturm)
+  - Snapshot-Listener: geänderte/gelöschte Avatare sofort sichtbar
+  - gleichzeitige Misses derselben agentId → eine Query
+  - Firestore down: letzter bekannter Stand, unbekannte agentId → {}
+  - Job-Prozess: neue Instanz liest den Snapshot des Workers ohne Firestore
+  - Listener weg → TTL-Refresh
+
+Beispiel:
+  python tools/check_agent_config.py --latency-ms 40 --joins 200
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bithuman_pipeline.agent_config import AgentConfigService  # noqa: E402
+
+
+class FakeDoc:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class FakeQuery:
+    def __init__(self, db, filters=(), limit_n=None):
+        self.db = db
+        self.filters = list(filters)
+        self.limit_n = limit_n
+
+    def where(self, field, op, value):
+        return FakeQuery(self.db, self.filters + [(field, op, value)], self.limit_n)
+
+    def limit(self, n):
+        return FakeQuery(self.db, self.filters, n)
+
+    def _match(self, data):
+        for field, op, value in self.filters:
+            cur = data
+            for part in field.split("."):
+                cur = cur.get(part) if isinstance(cur, dict) else None
+            if op == "==" and cur != value:
+                return False
+            if op == ">" and not (isinstance(cur, str) and cur > value):
+                return False
+        return True
+
+    def stream(self):
+        self.db.call()
+        docs = [FakeDoc(i, d) for i, d in self.db.docs.items() if self._match(d)]
+        return iter(docs[: self.limit_n] if self.limit_n else docs)
+
+    def on_snapshot(self, callback):
+        if self.db.down:
+            raise ConnectionError("Firestore nicht erreichbar")
+        watch = SimpleNamespace(is_active=True, unsubscribe=lambda: None, query=self, callback=callback)
+        self.db.watches.append(watch)
+        changes = [SimpleNamespace(type=SimpleNamespace(name="ADDED"), document=FakeDoc(i, d))
+                   for i, d in self.db.docs.items() if self._match(d)]
+        callback([c.document for c in changes], changes, None)
+        return watch
+
+
+class FakeFirestore:
+    def __init__(self, latency_s=0.0):
+        self.latency_s = latency_s
+        self.docs = {}
+        self.queries = 0
+        self.down = False
+        self.watches = []
+        self._lock = threading.Lock()
+
+    def call(self):
+        with self._lock:
+            self.queries += 1
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        if self.down:
+            raise ConnectionError("Firestore nicht erreichbar")
+
+    def collection(self, name):
+        return FakeQuery(self)
+
+    def set(self, doc_id, data):
+        kind = "MODIFIED" if doc_id in self.docs else "ADDED"
+        self.docs[doc_id] = data
+        self._notify(kind, doc_id, data)
+
+    def delete(self, doc_id):
+        data = self.docs.pop(doc_id)
+        self._notify("REMOVED", doc_id, data)
+
+    def _notify(self, kind, doc_id, data):
+        for w in self.watches:
+            if w.is_active:
+                change = SimpleNamespace(type=SimpleNamespace(name=kind), document=FakeDoc(doc_id, data))
+                w.callback([], [change], None)
+
+
+def avatar(agent_id, voice, user="u1", model="essence"):
+    return {"userId": user, "name": f"Avatar {agent_id}", "personality": f"Du bist {agent_id}",
+            "training": {"voice": {"elevenVoiceId": f" {voice} "}},
+            "liveAvatar": {"agentId": agent_id, "model": model}}
+
+
+def check(name, cond):
+    print(f"{'✅' if cond else '❌'} {name}")
+    if not cond:
+        raise SystemExit(1)
+
+
+def legacy_get_config(db, agent_id):
+    """Bisheriges Verhalten: Query pro Sessionstart."""
+    for doc in db.collection("avatars").where("liveAvatar.agentId", "==", agent_id).limit(1).stream():
+        return doc.to_dict()
+    return {}
+
+
+async def run(args):
+    tmp = tempfile.mkdtemp(prefix="agent_cfg_")
+    snap = os.path.join(tmp, "agent_configs.json")
+    db = FakeFirestore(latency_s=args.latency_ms / 1000)
+    for i in range(20):
+        db.docs[f"av{i}"] = avatar(f"A{i}", f"voice{i}")
+    db.docs["no_agent"] = {"userId": "u2", "name": "ohne Live-Avatar"}
+
+    worker = AgentConfigService(lambda: db, ttl_s=60, snapshot_path=snap)
+    check("Warm-up lädt 20 Avatare", worker.start() == 20 and db.queries == 1)
+    cfg = await worker.aget("A3")
+    check("Config-Felder wie get_config", cfg["voice_id"] == "voice3" and cfg["namespace"] == "u1_av3"
+          and cfg["bithuman_model"] == "essence" and cfg["instructions"] == "Du bist A3")
+
+    # Reconnect-Sturm: alt (Query pro Join) vs. Index
+    joins = [f"A{i % 20}" for i in range(args.joins)]
+    q0, t = db.queries, time.perf_counter()
+    await asyncio.gather(*(asyncio.to_thread(legacy_get_config, db, a) for a in joins[:50]))
+    t_old = (time.perf_counter() - t) / 50 * len(joins)
+    q_old = db.queries - q0
+    q0, t = db.queries, time.perf_counter()
+    results = await asyncio.gather(*(worker.aget(a) for a in joins))
+    t_new = time.perf_counter() - t
+    print(f"⏱️ {len(joins)} Joins: bisher ~{t_old * 1000:.0f} ms / {len(joins)} Queries "
+          f"(gemessen {q_old} für 50), Cache {t_new * 1000:.1f} ms / {db.queries - q0} Queries")
+    check("Reconnect-Sturm ohne Firestore-Queries", db.queries == q0 and all(r.get("voice_id") for r in results))
+
+    db.set("av3", avatar("A3", "neueStimme"))
+    check("Listener: Änderung sofort sichtbar", worker.get("A3")["voice_id"] == "neueStimme" and db.queries == q0)
+    db.set("av99", avatar("A99", "voice99"))
+    check("Listener: neuer Avatar", worker.get("A99")["voice_id"] == "voice99" and db.queries == q0)
+    db.delete("av5")
+    check("Listener: gelöschter Avatar → {}", worker.get("A5") == {} and worker.get("A5") == {})
+    check("unbekannte agentId negativ gecacht", worker.metrics()["negative_hits"] >= 1)
+
+    # Job-Prozess: eigene Instanz, Firestore gar nicht erreichbar → Snapshot des Workers
+    def broken():
+        raise ConnectionError("kein Firestore im Job-Prozess")
+    job = AgentConfigService(broken, ttl_s=60, snapshot_path=snap)
+    cfg = job.get("A99")
+    check("Job-Prozess liest Snapshot", cfg.get("voice_id") == "voice99" and job.metrics()["snapshot_loads"] == 1)
+
+    # Ohne Listener: TTL, Firestore-Ausfall → letzter Stand
+    ttl = AgentConfigService(lambda: db, ttl_s=0.05)
+    ttl.get("A1")
+    db.down = True
+    time.sleep(0.06)
+    check("Firestore down → letzter bekannter Stand", ttl.get("A1").get("voice_id") == "voice1"
+          and ttl.metrics()["stale_served"] == 1)
+    check("Firestore down, unbekannt → {}", ttl.get("A7") == {})
+    down_start = AgentConfigService(lambda: db, ttl_s=60, snapshot_path=snap)
+    check("Start bei Ausfall → Snapshot", down_start.start() == 0 and down_start.get("A2").get("voice_id") == "voice2")
+    db.down = False
+
+    # Gleichzeitige Misses → eine Query
+    cold = AgentConfigService(lambda: db, ttl_s=60)
+    q0 = db.queries
+    await asyncio.gather(*(cold.aget("A8") for _ in range(20)))
+    check("20 gleichzeitige Misses → 1 Query", db.queries - q0 == 1)
+
+    # Listener fällt weg → TTL greift wieder
+    worker.ttl_s = 0.01
+    for w in db.watches:
+        w.is_active = False
+    time.sleep(0.02)
+    q0 = db.queries
+    worker.get("A1")
+    check("Listener weg → TTL-Refresh per Query", db.queries == q0 + 1 and worker.metrics()["listener_lost"] == 1)
+    print(f"📊 {worker.metrics()}")
+    shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--latency-ms", type=float, default=30)
+    ap.add_argument("--joins", type=int, default=200)
+    asyncio.run(run(ap.parse_args()))
+    print("✅ Agent-Config-Cache OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Prüft bithuman_pipeline.job_store + http_range (Job-API von /generate-avatar/jobs):
+
+  - Statusübergänge inkl. History, ungültige Übergänge werden abgelehnt
+  - Persistenz über eine neue Store-Instanz, recover() nach Neustart
+  - Keyset-Pagination ohne Duplikate/Lücken, Filter nach Status
+  - TTL: purge() löscht Ergebnisdatei, Record → expired, später ganz weg
+  - Speicherbudget max_result_bytes
+  - Range-Download (200/206/416) über einen Starlette-TestClient
+  - Workspace eines Jobs: Janitor lässt ihn während des Laufs in Ruhe, danach
+    bleibt nur das Ergebnis im results_dir (Eingaben weg, auch bei Fehlern)
+
+Beispiel:
+  python tools/check_avatar_jobs.py
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bithuman_pipeline.http_range import ranged_file_response  # noqa: E402
+from bithuman_pipeline.job_store import (  # noqa: E402
+    EXPIRED, FAILED, QUEUED, RUNNING, SUCCEEDED, AvatarJobStore, InvalidTransition,
+)
+from dynamics_pipeline.workspace import WorkspaceManager  # noqa: E402
+
+
+def check(name, cond):
+    print(f"{'✅' if cond else '❌'} {name}")
+    if not cond:
+        raise SystemExit(1)
+
+
+def make_result(tmp: str, name: str, size: int) -> str:
+    path = os.path.join(tmp, name)
+    with open(path, "wb") as f:
+        f.write(bytes(i % 256 for i in range(size)))
+    return path
+
+
+def check_store(tmp: str):
+    db = os.path.join(tmp, "jobs.sqlite3")
+    results = os.path.join(tmp, "results")
+    store = AvatarJobStore(db, results, ttl_s=60, record_ttl_s=120)
+
+    job = store.create("generate-avatar", params={"figure_id": "f1"}, user_id="u1")
+    check("neuer Job queued", job["status"] == QUEUED)
+    store.transition(job["id"], RUNNING)
+    dest = store.attach_result(job["id"], make_result(tmp, "a.mp4", 4096))
+    done = store.transition(job["id"], SUCCEEDED)
+    check("Ergebnis verschoben", os.path.exists(dest) and dest.startswith(results))
+    check("History vollständig", [h["status"] for h in done["history"]] == [QUEUED, RUNNING, SUCCEEDED])
+    check("expires_at gesetzt", done["expires_at"] and done["expires_at"] > time.time())
+    try:
+        store.transition(job["id"], RUNNING)
+        check("succeeded → running abgelehnt", False)
+    except InvalidTransition:
+        check("succeeded → running abgelehnt", True)
+
+    stuck = store.create("generate-avatar", user_id="u2")
+    store.transition(stuck["id"], RUNNING)
+
+    # Neuer Prozess: gleicher DB-Pfad
+    store = AvatarJobStore(db, results, ttl_s=60, record_ttl_s=120)
+    check("Job übersteht Neustart", store.get(job["id"])["status"] == SUCCEEDED)
+    check("recover() markiert laufende Jobs", store.recover() == 1 and store.get(stuck["id"])["status"] == FAILED)
+    check("result_path nach Neustart", store.result_path(job["id"]) == dest)
+
+    # Pagination
+    ids = {store.create("generate-avatar", user_id="page")["id"] for _ in range(23)}
+    seen, cursor, pages = [], None, 0
+    while True:
+        batch, cursor = store.list(user_id="page", limit=5, cursor=cursor)
+        seen += [j["id"] for j in batch]
+        pages += 1
+        if not cursor:
+            break
+    check(f"Pagination: 23 Jobs in {pages} Seiten, keine Duplikate", len(seen) == 23 and set(seen) == ids)
+    failed, _ = store.list(status=FAILED)
+    check("Filter status=failed", [j["id"] for j in failed] == [stuck["id"]])
+
+    # TTL
+    now = time.time()
+    stats = store.purge(now=now + 61)
+    check("TTL: Ergebnis gelöscht, Record expired",
+          stats["expired"] == 2 and not os.path.exists(dest) and store.get(job["id"])["status"] == EXPIRED)
+    check("result_path abgelaufen → None", store.result_path(job["id"]) is None)
+    store.purge(now=now + 61 + 121)
+    check("Record nach record_ttl_s entfernt", store.get(job["id"]) is None)
+    check("offene Jobs bleiben", store.count(QUEUED) == 23)
+
+    # Speicherbudget
+    small = AvatarJobStore(os.path.join(tmp, "budget.sqlite3"), os.path.join(tmp, "budget"),
+                           ttl_s=3600, max_result_bytes=10_000)
+    jobs = []
+    for i in range(3):
+        j = small.create("generate-avatar")
+        small.transition(j["id"], RUNNING)
+        small.attach_result(j["id"], make_result(tmp, f"b{i}.mp4", 4096))
+        small.transition(j["id"], SUCCEEDED)
+        jobs.append(j["id"])
+        time.sleep(0.01)
+    small.purge()
+    check("Budget: ältestes Ergebnis abgelaufen",
+          small.get(jobs[0])["status"] == EXPIRED and small.result_path(jobs[2]) is not None)
+    return store
+
+
+def check_workspace(tmp: str):
+    """Ablauf wie _run_avatar_job: Eingaben im Workspace, Video → attach_result, finally cleanup()."""
+    store = AvatarJobStore(os.path.join(tmp, "ws.sqlite3"), os.path.join(tmp, "ws_results"), ttl_s=3600)
+    manager = WorkspaceManager(os.path.join(tmp, "workspaces"), max_age_s=1)
+    for fail in (False, True):
+        ws = manager.create("avatar-job")
+        ws.write_bytes("audio_in.wav", b"\0" * 2048)
+        job = store.create("generate-avatar")
+        reaped = manager.reap(now=time.time() + 3600)["removed"]
+        check("laufender Job-Workspace wird nicht gereapt", ws.id not in reaped and ws.path.exists())
+        try:
+            store.transition(job["id"], RUNNING)
+            output = ws.file("avatar_video.mp4")
+            output.write_bytes(b"\1" * 4096)
+            if fail:
+                raise RuntimeError("Render fehlgeschlagen")
+            store.attach_result(job["id"], str(output))
+            store.transition(job["id"], SUCCEEDED)
+        except RuntimeError as e:
+            store.transition(job["id"], FAILED, error=str(e))
+        finally:
+            ws.cleanup()
+        label = "fehlgeschlagen" if fail else "fertig"
+        check(f"Job {label}: Workspace samt Eingaben gelöscht", not ws.path.exists())
+        path = store.result_path(job["id"])
+        check(f"Job {label}: Ergebnis {'fehlt' if fail else 'bleibt'}",
+              path is None if fail else os.path.getsize(path) == 4096)
+    check("keine Workspaces übrig", list(manager.root.iterdir()) == [])
+
+
+def check_range(tmp: str):
+    from starlette.applications import Starlette
+    from starlette.routing import Route
+    from starlette.testclient import TestClient
+
+    path = make_result(tmp, "range.mp4", 100_000)
+    with open(path, "rb") as f:
+        data = f.read()
+
+    async def video(request):
+        return ranged_file_response(path, request.headers.get("range"), media_type="video/mp4",
+                                    filename="avatar_video.mp4")
+
+    client = TestClient(Starlette(routes=[Route("/video", video)]))
+    r = client.get("/video")
+    check("ohne Range → 200, ganze Datei", r.status_code == 200 and r.content == data
+          and r.headers["accept-ranges"] == "bytes")
+    r = client.get("/video", headers={"Range": "bytes=1000-1999"})
+    check("bytes=1000-1999 → 206", r.status_code == 206 and r.content == data[1000:2000]
+          and r.headers["content-range"] == "bytes 1000-1999/100000")
+    r = client.get("/video", headers={"Range": "bytes=99000-"})
+    check("offenes Ende", r.status_code == 206 and r.content == data[99000:])
+    r = client.get("/video", headers={"Range": "bytes=-500"})
+    check("Suffix-Range", r.status_code == 206 and r.content == data[-500:])
+    r = client.get("/video", headers={"Range": "bytes=200000-"})
+    check("außerhalb → 416", r.status_code == 416 and r.headers["content-range"] == "bytes */100000")
+
+
+def main():
+    tmp = tempfile.mkdtemp(prefix="avatar_jobs_")
+    try:
+        check_store(tmp)
+        check_workspace(tmp)
+        check_range(tmp)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    print("✅ Avatar-Job-Store OK")
+
+
+if __name__ == "__main__":
+    main()
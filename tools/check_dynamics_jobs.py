@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Prüft dynamics_pipeline/jobs.py mit InProcessBackend + SqliteJobStore (ohne GPU/Modal):
+
+  - Prioritäten: paid vor standard vor free, innerhalb gleicher Klasse FIFO
+  - Limit gleichzeitiger Jobs pro User (andere User laufen parallel weiter)
+  - Abbruch eines wartenden und eines laufenden Jobs
+  - Race: Abbruch zwischen Auswahl und Start im Dispatcher → Job bleibt
+    CANCELLED und läuft nicht (QUEUED → RUNNING nur per update_if)
+  - update_if über zwei Verbindungen auf dieselbe DB (zweiter Prozess)
+  - Neustart: RUNNING-Jobs werden neu eingereiht und laufen zu Ende
+  - compute_progress: Fortschritt/ETA aus Stage-Zeiten
+
+Beispiel:
+  python tools/check_dynamics_jobs.py --timeout 5
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dynamics_pipeline.jobs import (  # noqa: E402
+    CANCELLED, QUEUED, RUNNING, SUCCEEDED, InProcessBackend, JobScheduler, SqliteJobStore, compute_progress,
+    new_job,
+)
+
+TIMEOUT_S = 5.0
+
+
+def check(name, cond):
+    print(f"{'✅' if cond else '❌'} {name}")
+    if not cond:
+        raise SystemExit(1)
+
+
+def wait_for(cond, timeout=None):
+    deadline = time.time() + (timeout or TIMEOUT_S)
+    while time.time() < deadline:
+        if cond():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class Runner:
+    """Runner, der pro Job auf ein Freigabe-Event wartet und Abbruch prüft."""
+
+    def __init__(self):
+        self.started = []
+        self.release = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, job, ctx):
+        with self._lock:
+            self.started.append(job["dynamics_id"])
+            ev = self.release.setdefault(job["dynamics_id"], threading.Event())
+        ctx.set_stage("download")
+        while not ev.wait(0.01):
+            ctx.check_cancelled()
+        ctx.set_stage("upload")
+        return {"idle_url": f"https://cdn/{job['dynamics_id']}.mp4"}
+
+    def finish(self, dynamics_id):
+        with self._lock:
+            self.release.setdefault(dynamics_id, threading.Event()).set()
+
+
+class CancelOnList(SqliteJobStore):
+    """Bricht den ersten wartenden Job ab, direkt nachdem der Dispatcher die Queue gelesen hat."""
+
+    scheduler = None
+    armed = False
+
+    def list(self, status=None, user_id=None, limit=100):
+        jobs = super().list(status=status, user_id=user_id, limit=limit)
+        if self.armed and status == QUEUED and jobs:
+            self.armed = False
+            self.scheduler.cancel(jobs[0]["id"])
+        return jobs
+
+
+def scheduler(db, runner, store_cls=SqliteJobStore, **kwargs):
+    store = store_cls(db)
+    sched = JobScheduler(store, InProcessBackend(runner), poll_s=0.02, **kwargs)
+    return store, sched
+
+
+def check_priorities(tmp):
+    runner = Runner()
+    store, sched = scheduler(os.path.join(tmp, "prio.sqlite3"), runner)
+    sched.start()
+    sched.submit("a", "blocker", {})
+    wait_for(lambda: runner.started == ["blocker"])
+    for dyn, prio in (("free1", "free"), ("std1", "standard"), ("paid1", "paid"), ("std2", "standard")):
+        sched.submit("a", dyn, {}, priority=prio)
+    positions = {j["dynamics_id"]: sched.get(j["id"])["queue_position"] for j in store.list(status=QUEUED)}
+    check(f"Queue-Position nach Priorität: {positions}",
+          positions == {"paid1": 0, "std1": 1, "std2": 2, "free1": 3})
+    for dyn in ("blocker", "paid1", "std1", "std2", "free1"):
+        wait_for(lambda: dyn in runner.started)
+        runner.finish(dyn)
+    wait_for(lambda: not store.list(status=QUEUED) and not store.list(status=RUNNING))
+    check(f"Startreihenfolge {runner.started}", runner.started == ["blocker", "paid1", "std1", "std2", "free1"])
+    sched.stop()
+
+
+def check_user_limit(tmp):
+    runner = Runner()
+    store, sched = scheduler(os.path.join(tmp, "users.sqlite3"), runner, max_concurrent=3, per_user_limit=1)
+    sched.start()
+    a1 = sched.submit("a", "a1", {}, user_id="anna")
+    a2 = sched.submit("a", "a2", {}, user_id="anna")
+    sched.submit("b", "b1", {}, user_id="ben")
+    wait_for(lambda: len(runner.started) == 2)
+    time.sleep(0.1)
+    check(f"pro User 1 gleichzeitig, anderer User parallel: {sorted(runner.started)}",
+          sorted(runner.started) == ["a1", "b1"] and store.get(a2["id"])["status"] == QUEUED)
+    runner.finish("a1")
+    check("nach Ende von a1 startet a2", wait_for(lambda: "a2" in runner.started)
+          and store.get(a1["id"])["status"] == SUCCEEDED)
+    runner.finish("a2")
+    runner.finish("b1")
+    sched.stop()
+
+
+def check_cancel(tmp):
+    runner = Runner()
+    store, sched = scheduler(os.path.join(tmp, "cancel.sqlite3"), runner)
+    sched.start()
+    running = sched.submit("a", "running", {})
+    wait_for(lambda: runner.started == ["running"])
+    queued = sched.submit("a", "queued", {})
+    check("wartender Job → CANCELLED", sched.cancel(queued["id"])["status"] == CANCELLED)
+    sched.cancel(running["id"])
+    check("laufender Job → CANCELLED (Runner bricht ab)",
+          wait_for(lambda: store.get(running["id"])["status"] == CANCELLED))
+    time.sleep(0.1)
+    check("abgebrochener wartender Job läuft nie", runner.started == ["running"]
+          and store.get(queued["id"])["status"] == CANCELLED)
+    sched.stop()
+
+    # Race: Abbruch zwischen _next_job() und dem Start
+    runner = Runner()
+    store, sched = scheduler(os.path.join(tmp, "race.sqlite3"), runner, store_cls=CancelOnList)
+    store.scheduler = sched
+    job = sched.submit("a", "race", {})
+    store.armed = True
+    sched.start()
+    time.sleep(0.2)
+    final = store.get(job["id"])
+    check(f"Abbruch während Dispatch gewinnt: {final['status']}, gestartet {runner.started}",
+          final["status"] == CANCELLED and runner.started == [] and not sched._running)
+    sched.stop()
+
+    # update_if über eine zweite Verbindung (z. B. API-Prozess bricht ab, Worker-Prozess startet)
+    db = os.path.join(tmp, "two.sqlite3")
+    one, two = SqliteJobStore(db), SqliteJobStore(db)
+    job = new_job("a", "two", {})
+    one.create(job)
+    one.update_if(job["id"], QUEUED, status=CANCELLED)
+    check("update_if: zweite Verbindung sieht den Abbruch",
+          two.update_if(job["id"], QUEUED, status=RUNNING) is None and two.get(job["id"])["status"] == CANCELLED)
+
+
+def check_requeue(tmp):
+    db = os.path.join(tmp, "restart.sqlite3")
+    store = SqliteJobStore(db)
+    job = new_job("a", "orphan", {})
+    store.create(job)
+    store.update(job["id"], status=RUNNING, stage="inference", stages={"inference": {"started_at": time.time()}})
+    runner = Runner()
+    runner.finish("orphan")
+    _, sched = scheduler(db, runner)
+    sched.start()
+    check("RUNNING beim Neustart → neu eingereiht und fertig",
+          wait_for(lambda: store.get(job["id"])["status"] == SUCCEEDED) and runner.started == ["orphan"])
+    final = store.get(job["id"])
+    check("Stages beim Neustart zurückgesetzt, Ergebnis gespeichert",
+          final["stages"]["inference"].get("skipped") and final["result"]["idle_url"].endswith("orphan.mp4"))
+    sched.stop()
+
+
+def check_progress():
+    job = new_job("a", "eta", {}, stage_seconds={"download": 10, "trim": 5, "inference": 80, "encode": 5,
+                                                 "upload": 0})
+    t0 = 1000.0
+    check(f"ETA vor Start = Summe der Stages ({job['eta_seconds']} s)", job["eta_seconds"] == 100)
+    job["stage"] = "inference"
+    job["stages"] = {"download": {"started_at": t0, "finished_at": t0 + 10},
+                     "trim": {"started_at": t0 + 10, "finished_at": t0 + 15},
+                     "inference": {"started_at": t0 + 15}}
+    by_time = compute_progress(job, now=t0 + 55)
+    check(f"ohne Rückmeldung nach Zeit geschätzt: {by_time}", by_time == {"progress": 0.55, "eta_seconds": 45})
+    job["stage_progress"] = 0.25
+    reported = compute_progress(job, now=t0 + 55)
+    check(f"gemeldeter Stage-Fortschritt: {reported}", reported == {"progress": 0.35, "eta_seconds": 65})
+    overdue = compute_progress({**job, "stage_progress": 0.0}, now=t0 + 500)
+    check(f"überfällige Stage max. 95 %, ETA >= 1 s: {overdue}",
+          overdue["eta_seconds"] == 4 + 5 and overdue["progress"] == 0.91)
+
+
+def main():
+    global TIMEOUT_S
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--timeout", type=float, default=TIMEOUT_S, help="max. Wartezeit pro Schritt (s)")
+    TIMEOUT_S = ap.parse_args().timeout
+
+    tmp = tempfile.mkdtemp(prefix="check_dynamics_jobs_")
+    try:
+        check_priorities(tmp)
+        check_user_limit(tmp)
+        check_cancel(tmp)
+        check_requeue(tmp)
+        check_progress()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    print("✅ Dynamics-Jobs OK")
+
+
+if __name__ == "__main__":
+    main()
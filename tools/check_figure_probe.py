@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Prüft die gestaffelte Figure-Erstellung (_figure_create + HedgedProber) gegen
+lokale Fake-Endpunkte:
+
+  /missing   404 sofort
+  /hang      antwortet erst nach --hang Sekunden (Timeout-Fall)
+  /slow      200 nach 1.5s, nur mit Feld 'file'
+  /fast      200 sofort, nur mit Feld 'image'
+
+Vergleicht die bisherige sequentielle Reihenfolge (Summe der Timeouts) mit
+dem Hedging und prüft, dass der zweite Aufruf die gemerkte Variante zuerst nimmt.
+
+Beispiel:
+  python tools/check_figure_probe.py --hang 8
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+
+import bithuman_service_clean as service  # noqa: E402
+from bithuman_pipeline.hedged_probe import HedgedProber  # noqa: E402
+
+HANG_S = 8.0
+HITS = []
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        field = "image" if b'name="image"' in body else "file" if b'name="file"' in body else None
+        HITS.append((self.path, field))
+        if self.path == "/missing":
+            return self._reply(404, {"error": "not found"})
+        if self.path == "/hang":
+            time.sleep(HANG_S)
+            return self._reply(504, {"error": "timeout"})
+        if self.path == "/slow" and field == "file":
+            time.sleep(1.5)
+            return self._reply(200, {"figure_id": "fig-slow"})
+        if self.path == "/fast" and field == "image":
+            return self._reply(200, {"figure_id": "fig-fast"})
+        return self._reply(422, {"error": f"field {field} not accepted"})
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+def check(name, cond):
+    print(f"{'✅' if cond else '❌'} {name}")
+    if not cond:
+        raise SystemExit(1)
+
+
+def main():
+    global HANG_S
+    ap = argparse.ArgumentParser(description="Hedged figure probe check")
+    ap.add_argument("--hang", type=float, default=8.0, help="Antwortzeit von /hang (≈ Timeout)")
+    args = ap.parse_args()
+    HANG_S = args.hang
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    work = tempfile.mkdtemp(prefix="figure_probe_")
+    try:
+        image = Path(work) / "face.jpg"
+        image.write_bytes(b"\xff\xd8\xff" + os.urandom(2000))
+        service.API_SECRET_CACHE = "test-secret"
+        os.environ["BITHUMAN_FIGURE_TIMEOUT_S"] = str(HANG_S + 5)
+        candidates = [{"url": f"{base}{p}", "field": f}
+                      for p in ("/hang", "/missing", "/slow", "/fast") for f in ("image", "file")]
+
+        # Sequentiell wie bisher: jede Variante wartet auf ihre Antwort/ihren Timeout
+        t0 = time.perf_counter()
+        for c in candidates:
+            try:
+                service._figure_post(c, image)
+                break
+            except Exception:
+                pass
+        sequential_s = time.perf_counter() - t0
+
+        service.FIGURE_PROBER = HedgedProber(hedge_delay_s=0.5, max_in_flight=3,
+                                             state_path=os.path.join(work, "figure_endpoints.json"))
+        t0 = time.perf_counter()
+        first = service._figure_create(image, candidates)
+        hedged_s = time.perf_counter() - t0
+        check(f"hedged: {first} in {hedged_s:.2f}s (sequentiell {sequential_s:.2f}s)",
+              first.get("figure_id") in ("fig-fast", "fig-slow") and hedged_s < sequential_s)
+
+        preferred = service.FIGURE_PROBER.preferred
+        HITS.clear()
+        reloaded = HedgedProber(hedge_delay_s=0.5, state_path=os.path.join(work, "figure_endpoints.json"))
+        service.FIGURE_PROBER = reloaded
+        t0 = time.perf_counter()
+        second = service._figure_create(image, candidates)
+        check(f"gemerkte Variante zuerst ({preferred}) → {time.perf_counter() - t0:.2f}s, {len(HITS)} Request(s)",
+              reloaded.preferred == preferred and len(HITS) == 1 and second == first)
+
+        try:
+            service._figure_create(image, [{"url": f"{base}/missing", "field": "image"}])
+            check("alle fehlgeschlagen → Exception", False)
+        except Exception as e:
+            check(f"alle fehlgeschlagen → Exception ({type(e).__name__})", True)
+        print(json.dumps(service.FIGURE_PROBER.metrics(), indent=2))
+    finally:
+        server.shutdown()
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
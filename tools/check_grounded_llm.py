@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Prüft bithuman_pipeline.grounded_llm gegen einen lokalen Fake-LLM-Server
+(OpenAI-kompatibles /chat/completions mit SSE) und eine Stub-KnowledgeBase:
+
+  - Antwort wird aus dem Kontext generiert (Kontext im Prompt, kein Chunk vorgelesen)
+  - Rollen wie Mistral: kein "system" nach "user"/"assistant" (Folgefragen)
+  - Token kommen gestreamt: First-Token-Latenz vs. bisher (ganze Antwort abwarten)
+  - langsames Primärmodell → Füllsatz + Fallback-Modell, erstes Token gewinnt
+  - Fehler (HTTP 500) → sofort Fallback; beide hängen → Entschuldigung nach Timeout
+  - livekit-ChatContext → Verlauf
+
+Beispiel:
+  python tools/check_grounded_llm.py --token-ms 40 --budget-ms 300
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bithuman_pipeline.grounded_llm import (  # noqa: E402
+    ChatStreamClient, GroundedResponder, build_messages, history_from_chat_ctx,
+)
+from bithuman_pipeline.knowledge import HashingEmbedder, KnowledgeBase, MemoryIndex, UsageStats  # noqa: E402
+
+NS = "u1_av1"
+CHUNK = "Die Preise beginnen bei 29 Euro im Monat, Jahresabo 290 Euro."
+ANSWER = ["Unser ", "Angebot ", "startet ", "bei ", "29 ", "Euro ", "pro ", "Monat."]
+
+# Verhalten je Pfad-Präfix: (Verzögerung vor dem ersten Token, HTTP-Status)
+MODES = {"fast": (0.0, 200), "slow": (None, 200), "hang": (30.0, 200), "broken": (0.0, 500)}
+REQUESTS = []
+CONFIG = {"token_s": 0.03, "slow_s": 1.0}
+
+
+class Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        mode = self.path.strip("/").split("/")[0]
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        REQUESTS.append((mode, body))
+        first_s, status = MODES[mode]
+        roles = [m["role"] for m in body["messages"]]
+        if "system" in roles[next((i for i, r in enumerate(roles) if r != "system"), len(roles)):]:
+            # wie Mistral: "Unexpected role 'system' after role 'assistant'"
+            self.send_response(400)
+            self.end_headers()
+            self.wfile.write(b'{"message": "Unexpected role system"}')
+            return
+        if status != 200:
+            self.send_response(status)
+            self.end_headers()
+            self.wfile.write(b'{"error": "overloaded"}')
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        try:
+            time.sleep(CONFIG["slow_s"] if first_s is None else first_s)
+            for token in ANSWER:
+                chunk = {"choices": [{"delta": {"content": token}}]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+                time.sleep(CONFIG["token_s"])
+            self.wfile.write(b"data: [DONE]\n\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def check(name, cond):
+    print(f"{'✅' if cond else '❌'} {name}")
+    if not cond:
+        raise SystemExit(1)
+
+
+def build_kb():
+    embedder, index = HashingEmbedder(), MemoryIndex()
+    docs = {"preise": CHUNK, "hobby": "Ich liebe Bergwandern und koche gerne italienisch."}
+    index.upsert([{"id": k, "values": v, "metadata": {"text": t, "source": f"{k}.txt"}}
+                  for (k, t), v in zip(docs.items(), embedder.embed(list(docs.values())))], namespace=NS)
+    return KnowledgeBase(embedder, index, NS, min_score=0.3, usage=UsageStats())
+
+
+async def timed(responder, history):
+    t = time.perf_counter()
+    tokens, first = [], None
+    async for token in responder.respond(history):
+        first = first if first is not None else time.perf_counter() - t
+        tokens.append(token)
+    return tokens, first, time.perf_counter() - t
+
+
+async def run(args, base):
+    CONFIG["token_s"] = args.token_ms / 1000
+    budget = args.budget_ms / 1000
+    CONFIG["slow_s"] = budget * 3
+    kb = build_kb()
+    history = [{"role": "system", "content": "Du bist Lena."},
+               {"role": "user", "content": "Hallo"}, {"role": "assistant", "content": "Hi!"},
+               {"role": "user", "content": "Was kosten die Preise im Monat?"}]
+
+    def client(mode):
+        return ChatStreamClient(f"{base}/{mode}/v1", "sk-test", f"model-{mode}")
+
+    # bisher: Treffer → Chunk wörtlich als Antwort
+    legacy = await kb.query(history[-1]["content"])
+    check("bisher: Avatar liest den Chunk vor", CHUNK in legacy and legacy.startswith("[preise.txt]"))
+
+    fast = GroundedResponder(client("fast"), kb=kb, first_token_s=budget, timeout_s=5)
+    tokens, first, total = await timed(fast, history)
+    mode, body = REQUESTS[-1]
+    system = [m for m in body["messages"] if m["role"] == "system"]
+    check("Folgefrage ohne HTTP 400", fast.metrics()["primary_errors"] == 0)
+    check("generiert statt vorgelesen", "".join(tokens) == "".join(ANSWER) and CHUNK not in "".join(tokens))
+    check("Kontext in der führenden System-Nachricht", body["stream"] is True and len(system) == 1
+          and body["messages"][0] is system[0] and system[0]["content"].startswith("Du bist Lena.")
+          and CHUNK in system[0]["content"] and body["messages"][1:] == history[1:])
+    check(f"gestreamt: erstes Token {first * 1000:.0f} ms, komplett {total * 1000:.0f} ms",
+          first < total / 2 and len(tokens) == len(ANSWER))
+    print(f"⏱️ bis zum Sprechen: bisher ~{total * 1000:.0f} ms (ganze Antwort), jetzt {first * 1000:.0f} ms")
+
+    await fast.complete([{"role": "user", "content": "Wie ist das Wetter auf dem Mars?"}])
+    check("ohne Treffer: Hinweis statt Kontext", "nichts in deiner Wissensbasis" in REQUESTS[-1][1]["messages"][0]["content"])
+
+    # langsames Primärmodell → Füllsatz + Fallback
+    hedged = GroundedResponder(client("slow"), kb=kb, fallback=client("fast"), first_token_s=budget, timeout_s=5)
+    tokens, first, total = await timed(hedged, history)
+    m = hedged.metrics()
+    check(f"langsam: Füllsatz nach {first * 1000:.0f} ms, dann Fallback",
+          tokens[0].startswith(hedged.filler) and "".join(tokens[1:]) == "".join(ANSWER)
+          and budget <= first < budget * 2 and m["fallback_used"] == 1 and m["fillers"] == 1)
+    check(f"Fallback schneller als abwarten ({total * 1000:.0f} ms < {(CONFIG['slow_s'] + len(ANSWER) * CONFIG['token_s']) * 1000:.0f} ms)",
+          total < CONFIG["slow_s"] + len(ANSWER) * CONFIG["token_s"])
+
+    no_fb = GroundedResponder(client("slow"), kb=kb, first_token_s=budget, timeout_s=5)
+    tokens, first, total = await timed(no_fb, history)
+    check("langsam ohne Fallback: Füllsatz, dann Primärantwort",
+          tokens[0].startswith(no_fb.filler) and "".join(tokens[1:]) == "".join(ANSWER)
+          and no_fb.metrics()["fallback_used"] == 0)
+
+    broken = GroundedResponder(client("broken"), kb=kb, fallback=client("fast"), first_token_s=budget, timeout_s=5)
+    tokens, first, _ = await timed(broken, history)
+    check(f"HTTP 500 → sofort Fallback ohne Füllsatz ({first * 1000:.0f} ms)",
+          "".join(tokens) == "".join(ANSWER) and first < budget and broken.metrics()["primary_errors"] == 1)
+
+    hang = GroundedResponder(client("hang"), kb=kb, fallback=client("hang"), first_token_s=budget / 2,
+                             timeout_s=budget * 2)
+    tokens, _, total = await timed(hang, history)
+    check(f"beide hängen → Entschuldigung nach {total * 1000:.0f} ms", tokens[-1] == hang.apology
+          and total < budget * 2 + 0.5 and hang.metrics()["timeouts"] == 1)
+
+    # livekit 1.x ChatContext
+    msg = lambda role, text: SimpleNamespace(role=role, text_content=text)  # noqa: E731
+    ctx = SimpleNamespace(items=[msg("developer", "Du bist Lena."), SimpleNamespace(name="tool_call"),
+                                 msg("user", "Preise?")])
+    check("ChatContext → Verlauf", history_from_chat_ctx(ctx) == [
+        {"role": "system", "content": "Du bist Lena."}, {"role": "user", "content": "Preise?"}])
+    check("build_messages ohne User-Frage", build_messages([{"role": "system", "content": "x"}], None)[-1]["role"]
+          == "system")
+    print(f"📊 {hedged.metrics()}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--token-ms", type=float, default=30, help="Abstand zwischen Token des Fake-LLMs")
+    ap.add_argument("--budget-ms", type=float, default=300, help="First-Token-Budget")
+    args = ap.parse_args()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    asyncio.run(run(args, f"http://127.0.0.1:{server.server_port}"))
+    server.shutdown()
+    print("✅ Grounded LLM OK")
+
+
+if __name__ == "__main__":
+    main()
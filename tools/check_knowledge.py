@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Prüft bithuman_pipeline.knowledge (gemeinsame KnowledgeBase der Agents) mit
+lokalen Stub-Backends (HashingEmbedder + MemoryIndex, künstliche Latenz):
+
+  - Session-Cache: Wiederholte/umformulierte-gleiche Fragen ohne Embedding + Suche
+  - Single-Flight: gleichzeitige gleiche Fragen → ein Lookup
+  - min_score / max_chunks / rerank ("keyword", "mmr", Funktion)
+  - Prefetch aus UsageStats: häufige Frage sofort aus dem Cache,
+    Hot-Chunks als Fallback bei langsamer Vektorsuche
+  - Latenz: bisheriges Verhalten (jeder Turn remote) vs. Cache
+
+Beispiel:
+  python tools/check_knowledge.py --embed-ms 150 --search-ms 100
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bithuman_pipeline.knowledge import (  # noqa: E402
+    HashingEmbedder, KnowledgeBase, MemoryIndex, UsageStats,
+)
+
+NS = "user1_avatar1"
+DOCS = {
+    "preise": "Die Preise beginnen bei 29 Euro im Monat, Jahresabo 290 Euro.",
+    "preise_kopie": "Die Preise beginnen bei 29 Euro im Monat, Jahresabo 290 Euro.",
+    "preise2": "Preise Preise Euro Monat Jahresabo Rabatt für Studenten auf die Preise.",
+    "oeffnung": "Öffnungszeiten sind Montag bis Freitag von 9 bis 18 Uhr.",
+    "kontakt": "Kontakt per E-Mail an hallo@example.com oder telefonisch.",
+    "hobby": "Ich liebe Bergwandern und koche gerne italienisch.",
+}
+
+
+def check(name, cond):
+    print(f"{'✅' if cond else '❌'} {name}")
+    if not cond:
+        raise SystemExit(1)
+
+
+def build(embed_s: float, search_s: float):
+    embedder = HashingEmbedder(delay_s=embed_s)
+    index = MemoryIndex(delay_s=search_s)
+    vectors = embedder.embed(list(DOCS.values()))
+    embedder.calls = 0
+    index.upsert([{"id": k, "values": v, "metadata": {"text": t, "source": f"{k}.txt"}}
+                  for (k, t), v in zip(DOCS.items(), vectors)], namespace=NS)
+    return embedder, index
+
+
+async def run(args):
+    embed_s, search_s = args.embed_ms / 1000, args.search_ms / 1000
+    embedder, index = build(embed_s, search_s)
+    tmp = tempfile.mkdtemp(prefix="kb_")
+    usage = UsageStats(os.path.join(tmp, "usage.json"), save_every=1)
+    kb = KnowledgeBase(embedder, index, NS, min_score=0.3, usage=usage)
+
+    ctx = await kb.query("Was kosten die Preise im Monat?")
+    check("Treffer mit Quelle", ctx is not None and "[preise.txt]" in ctx)
+    before = (embedder.calls, index.queries)
+    ctx2 = await kb.query("  was KOSTEN die Preise im Monat ")
+    check("gleiche Frage (normalisiert) → Cache, kein Embedding/Suche",
+          ctx2 == ctx and (embedder.calls, index.queries) == before)
+
+    results = await asyncio.gather(*(kb.query("Wann sind die Öffnungszeiten?") for _ in range(5)))
+    check("5 gleichzeitige Fragen → 1 Lookup", len(set(results)) == 1 and kb.metrics()["joined"] == 4
+          and index.queries == before[1] + 1)
+
+    strict = KnowledgeBase(embedder, index, NS, min_score=0.99, usage=UsageStats())
+    check("min_score filtert (kein Kontext)", await strict.query("Was kosten die Preise?") is None)
+    capped = KnowledgeBase(embedder, index, NS, min_score=-1.0, max_chunks=2, usage=UsageStats())
+    check("max_chunks", len(await capped.retrieve("Preise")) == 2)
+
+    q = "Preise beginnen bei 29 Euro"
+    plain = await KnowledgeBase(embedder, index, NS, min_score=0.0, max_chunks=2, usage=UsageStats()).retrieve(q)
+    mmr = await KnowledgeBase(embedder, index, NS, min_score=0.0, rerank="mmr", max_chunks=2,
+                              usage=UsageStats()).retrieve(q)
+    check("mmr: Duplikat verdrängt", {m["id"] for m in plain} == {"preise", "preise_kopie"}
+          and len({m["id"] for m in mmr} & {"preise", "preise_kopie"}) == 1 and len(mmr) == 2)
+    custom = await KnowledgeBase(embedder, index, NS, min_score=0.0, usage=UsageStats(),
+                                 rerank=lambda q, ms: sorted(ms, key=lambda m: m["id"])).retrieve("Preise Kontakt")
+    check("eigene Rerank-Funktion", [m["id"] for m in custom] == sorted(m["id"] for m in custom))
+
+    # Neue Session: Prefetch aus der Statistik der vorherigen
+    for _ in range(3):
+        await kb.query("Was kosten die Preise im Monat?")
+    session2 = KnowledgeBase(embedder, index, NS, min_score=0.3, usage=UsageStats(usage.path),
+                             search_timeout_s=max(search_s, 0.05) * 2)
+    await session2.start_prefetch()
+    m = session2.metrics()
+    check(f"Prefetch: {m['hot_chunks']} Hot-Chunks, {m['prefetched_questions']} Fragen",
+          m["hot_chunks"] >= 1 and m["prefetched_questions"] >= 1)
+    before = index.queries
+    t = time.perf_counter()
+    ctx3 = await session2.query("Was kosten die Preise im Monat?")
+    first_turn = time.perf_counter() - t
+    check(f"häufige Frage im 1. Turn aus Prefetch ({first_turn * 1000:.1f} ms)",
+          ctx3 is not None and index.queries == before)
+
+    index.delay_s = max(search_s, 0.05) * 4  # Vektorsuche hängt
+    fallbacks = session2.metrics()["hot_fallbacks"]
+    ctx4 = await session2.query("Jahresabo Preise in Euro?")
+    check("langsame Suche → Hot-Chunk-Fallback",
+          ctx4 is not None and session2.metrics()["hot_fallbacks"] == fallbacks + 1)
+    index.delay_s = search_s
+
+    # Latenz: alte KnowledgeBase = jeder Turn Embedding + Suche; neu = Cache ab Wiederholung
+    turns = ["Was kosten die Preise?", "Wann habt ihr offen?", "Was kosten die Preise?",
+             "Kontakt?", "Was kosten die Preise?", "Wann habt ihr offen?"]
+    uncached = KnowledgeBase(embedder, index, NS, min_score=0.3, cache_size=0, usage=UsageStats())
+    cached = KnowledgeBase(embedder, index, NS, min_score=0.3, usage=UsageStats())
+    t = time.perf_counter()
+    for q in turns:
+        await uncached.query(q)
+    t_old = time.perf_counter() - t
+    t = time.perf_counter()
+    for q in turns:
+        await cached.query(q)
+    t_new = time.perf_counter() - t
+    print(f"⏱️ {len(turns)} Turns: ohne Cache {t_old * 1000:.0f} ms, mit Cache {t_new * 1000:.0f} ms")
+    check("Cache spart Zeit", t_new < t_old or not (embed_s or search_s))
+    lat = cached.metrics()["latency"]
+    check("Latenzmetriken vorhanden", lat["total"]["n"] == len(turns) and lat["embed"]["n"] == 3)
+    print(f"📊 {cached.metrics()}")
+    shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--embed-ms", type=float, default=80)
+    ap.add_argument("--search-ms", type=float, default=60)
+    asyncio.run(run(ap.parse_args()))
+    print("✅ KnowledgeBase OK")
+
+
+if __name__ == "__main__":
+    main()
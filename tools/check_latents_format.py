@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Korrektheits-Check für frames.zip und latents.npz (läuft auf CPU, ohne torch/GPU).
+
+Immer (nur numpy, kein ffmpeg nötig): synthetische Frames (Verlauf + Rauschen,
+auch ungerade Größe) →
+  - encode_png/frames_zip_bytes: 25 Einträge frame_001..025.png, jede PNG mit
+    einem eigenen Referenz-Decoder (zlib + PNG-Filter, CRCs) == Frame (bitgenau)
+  - latents.npz: Schlüssel, dtype/Shape [N, 3, H/2, W/2], Metadaten,
+    Dequantisierung max. 0.5/255 vom Blockmittel der Frames
+  - Roundtrip save → load über Bytes und Datei, kaputte Dateien werden abgelehnt
+
+Optional, wenn ffmpeg da ist (sonst übersprungen, --require-ffmpeg erzwingt es):
+synthetisches Video wie der Modal-Worker paketieren (Frames über die
+ffmpeg-Pipe) und die PNGs zusätzlich von ffmpeg dekodieren lassen.
+
+Beispiel:
+  python tools/check_latents_format.py --size 512x512
+"""
+import argparse
+import io
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import zipfile
+import zlib
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dynamics_pipeline.frames import (  # noqa: E402
+    LATENTS_VERSION, build_latents, encode_png, frames_zip_bytes, latents_npz_bytes, load_latents, read_frames,
+)
+from dynamics_pipeline.packaging import package_idle_media  # noqa: E402
+
+
+def synthetic_frames(count: int, width: int, height: int, seed: int = 0) -> np.ndarray:
+    """Bewegter Verlauf + Rauschen: alle Bytewerte, Zeilen-Differenzen mit Überlauf (mod 256)."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    frames = np.empty((count, height, width, 3), dtype=np.uint8)
+    for i in range(count):
+        frames[i, ..., 0] = (x * 3 + i * 7) % 256
+        frames[i, ..., 1] = (y * 5 + i * 11) % 256
+        frames[i, ..., 2] = rng.integers(0, 256, (height, width))
+    return frames
+
+
+def decode_png_numpy(data: bytes) -> np.ndarray:
+    """Minimaler PNG-Decoder (8 bit RGB, ohne Interlace) als unabhängige Referenz."""
+    assert data[:8] == b"\x89PNG\r\n\x1a\n", "PNG-Signatur"
+    pos, idat, header = 8, b"", None
+    while pos < len(data):
+        length, tag = struct.unpack(">I4s", data[pos:pos + 8])
+        body = data[pos + 8:pos + 8 + length]
+        crc, = struct.unpack(">I", data[pos + 8 + length:pos + 12 + length])
+        assert zlib.crc32(tag + body) & 0xFFFFFFFF == crc, f"CRC {tag}"
+        if tag == b"IHDR":
+            header = struct.unpack(">IIBBBBB", body)
+        elif tag == b"IDAT":
+            idat += body
+        elif tag == b"IEND":
+            break
+        pos += 12 + length
+    w, h, depth, color, _, _, interlace = header
+    assert (depth, color, interlace) == (8, 2, 0), header
+    raw = np.frombuffer(zlib.decompress(idat), dtype=np.uint8).reshape(h, w * 3 + 1)
+    out = np.zeros((h, w * 3), dtype=np.uint8)
+    for r in range(h):
+        ftype, line = raw[r, 0], raw[r, 1:]
+        prev = out[r - 1] if r else np.zeros(w * 3, dtype=np.uint8)
+        if ftype == 0:
+            out[r] = line
+        elif ftype == 2:
+            out[r] = line + prev
+        else:
+            # Sub/Average/Paeth – encode_png nutzt sie nicht, Referenz trotzdem vollständig
+            cur = out[r]
+            for i in range(w * 3):
+                a = int(cur[i - 3]) if i >= 3 else 0
+                b, c = int(prev[i]), int(prev[i - 3]) if i >= 3 else 0
+                if ftype == 1:
+                    pred = a
+                elif ftype == 3:
+                    pred = (a + b) // 2
+                else:
+                    p = a + b - c
+                    pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+                    pred = a if pa <= pb and pa <= pc else (b if pb <= pc else c)
+                cur[i] = (int(line[i]) + pred) & 0xFF
+    return out.reshape(h, w, 3)
+
+
+def decode_png_ffmpeg(ffmpeg_bin: str, data: bytes, width: int, height: int) -> np.ndarray:
+    res = subprocess.run([ffmpeg_bin, "-v", "error", "-f", "png_pipe", "-i", "pipe:0",
+                          "-f", "rawvideo", "-pix_fmt", "rgb24", "pipe:1"],
+                         input=data, capture_output=True, check=True)
+    return np.frombuffer(res.stdout, dtype=np.uint8).reshape(height, width, 3)
+
+
+def check_zip(frames: np.ndarray, zip_source, decode) -> int:
+    with zipfile.ZipFile(zip_source) as zf:
+        names = zf.namelist()
+        assert names == [f"frame_{i:03d}.png" for i in range(1, len(frames) + 1)], names
+        for i, name in enumerate(names):
+            assert np.array_equal(decode(zf.read(name)), frames[i]), name
+    return len(names)
+
+
+def check_latents(frames: np.ndarray, work: str):
+    n, height, width, _ = frames.shape
+    latents = build_latents(frames, downsample=2, fps=25)
+    blob = latents_npz_bytes(latents)
+    path = os.path.join(work, "latents.npz")
+    with open(path, "wb") as f:
+        f.write(blob)
+    for source in (blob, path):
+        x, meta = load_latents(source)
+        assert x.dtype == np.float32 and x.shape == (n, 3, height // 2, width // 2), x.shape
+        assert meta["version"] == LATENTS_VERSION and meta["fps"] == 25.0
+        assert meta["source_size"] == (height, width)
+        assert 0.0 <= x.min() and x.max() <= 1.0
+    h2, w2 = height // 2, width // 2
+    ref = frames[:, :h2 * 2, :w2 * 2].astype(np.float64).reshape(n, h2, 2, w2, 2, 3).mean(axis=(2, 4))
+    err = np.abs(x.transpose(0, 2, 3, 1) - ref / 255.0).max()
+    assert err <= 0.5 / 255 + 1e-6, err
+    raw_mb = frames.size * 4 / 1024 / 1024  # bisher float32 [25, 3, H, W]
+    print(f"✅ latents.npz {width}x{height}: {len(blob) / 1024:.0f} KB (float32-Stack wären {raw_mb:.1f} MB), "
+          f"max. Fehler {err * 255:.3f}/255")
+    return latents
+
+
+def check_numpy(width: int, height: int, work: str):
+    frames = synthetic_frames(25, width, height)
+    zipped = frames_zip_bytes(frames)
+    count = check_zip(frames, io.BytesIO(zipped), decode_png_numpy)
+    print(f"✅ frames.zip (numpy): {count} PNGs, bitgenau ({len(zipped) / 1024:.0f} KB)")
+
+    # ungerade Größe: PNG unverändert, Latents schneiden die letzte Zeile/Spalte ab
+    odd = synthetic_frames(3, 33, 17, seed=1)
+    assert all(np.array_equal(decode_png_numpy(encode_png(f, level=level)), f) for f in odd for level in (1, 9))
+    print("✅ encode_png: ungerade Größe 33x17, Kompressionsstufen 1/9")
+    check_latents(odd, work)
+
+    latents = check_latents(frames, work)
+    # Kaputte/fremde Dateien werden abgelehnt
+    for bad in ({**latents, "version": np.int32(99)},
+                {k: v for k, v in latents.items() if k != "scale"},
+                {**latents, "latents": latents["latents"].astype(np.float32)}):
+        try:
+            load_latents(latents_npz_bytes(bad))
+        except ValueError:
+            continue
+        raise AssertionError("ungültige Latents akzeptiert")
+    try:
+        build_latents(frames.astype(np.float32))
+        raise AssertionError("float-Frames akzeptiert")
+    except ValueError:
+        pass
+    print("✅ Format-Validierung lehnt ungültige Dateien ab")
+
+
+def check_ffmpeg(ffmpeg_bin: str, width: int, height: int, work: str):
+    src = os.path.join(work, "lp.mp4")
+    subprocess.run([ffmpeg_bin, "-y", "-v", "error", "-f", "lavfi",
+                    "-i", f"testsrc2=size={width}x{height}:rate=30:duration=10",
+                    "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p", src],
+                   check=True, capture_output=True)
+
+    packaged = package_idle_media(src, work, "check", ffmpeg_bin=ffmpeg_bin,
+                                  preset="veryfast", keep_frames=True)
+    frames = packaged["frames"]
+    assert frames is not None and frames.shape == (25, height, width, 3), frames
+    assert frames.dtype == np.uint8
+
+    # read_frames (eigenständige Pipe) liefert dieselbe Frame-Geometrie
+    direct = read_frames(packaged["idle_path"], count=25, ffmpeg_bin=ffmpeg_bin)
+    assert direct.shape == frames.shape
+
+    count = check_zip(frames, packaged["frames_zip_path"],
+                      lambda data: decode_png_ffmpeg(ffmpeg_bin, data, width, height))
+    check_zip(frames, packaged["frames_zip_path"], decode_png_numpy)
+    print(f"✅ frames.zip (ffmpeg-Pipe): {count} PNGs, von ffmpeg und numpy bitgenau dekodiert")
+    check_latents(frames, work)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="frames.zip / latents.npz Format-Check")
+    ap.add_argument("--ffmpeg", default=shutil.which("ffmpeg"))
+    ap.add_argument("--size", default="512x512")
+    ap.add_argument("--require-ffmpeg", action="store_true", help="ohne ffmpeg fehlschlagen statt überspringen")
+    args = ap.parse_args()
+    width, height = (int(v) for v in args.size.split("x"))
+
+    work = tempfile.mkdtemp(prefix="check_latents_")
+    try:
+        check_numpy(width, height, work)
+        if args.ffmpeg:
+            check_ffmpeg(args.ffmpeg, width, height, work)
+        elif args.require_ffmpeg:
+            raise SystemExit("❌ ffmpeg nicht gefunden")
+        else:
+            print("⏭️ ffmpeg nicht gefunden – Vergleich mit der ffmpeg-Pipe übersprungen")
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Prüft bithuman_pipeline.live_agent (Complete Agent ohne pip/Inline-Code/Subprozess)
+mit Fake-Room und Fake-Session (kein LiveKit nötig):
+
+  - Token lokal signiert: HS256, sub "agent-<id>", Room-Grant, über das
+    gemeinsame Paket livekit_auth (derselbe Signer wie der Orchestrator)
+  - Phasen-Timings bis zum Join, Session endet bei "disconnected"
+  - Config aus dem Agent-Config-Service (kein Firestore pro Join)
+  - Join-Latenz: bisheriger Pfad (pip install + Token-HTTP + Python-Subprozess,
+    simuliert) vs. Start im Prozess
+  - kein Teilnehmer bis zum Timeout → {"status": "no_participant"}
+  - Fehler beim Start → {"status": "error"}
+  - Aufräumen in jedem Fall (Ende, max_session_s, Avatar-Start schlägt fehl):
+    session.aclose() + room.disconnect()
+
+Beispiel:
+  python tools/check_live_agent.py --pip-ms 4000 --token-ms 80
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.update({"LIVEKIT_URL": "wss://fake.livekit.cloud", "LIVEKIT_API_KEY": "APIfake",
+                   "LIVEKIT_API_SECRET": "geheim-geheim-geheim"})
+
+from bithuman_pipeline import agent_bootstrap, agent_config, live_agent  # noqa: E402
+from bithuman_pipeline.agent_config import AgentConfigService  # noqa: E402
+from livekit_auth import tokens as shared_tokens  # noqa: E402
+
+
+class FakeRoom:
+    def __init__(self, connect_s=0.0, participant_after_s=0.0, session_s=0.05):
+        self.connect_s = connect_s
+        self.participant_after_s = participant_after_s
+        self.session_s = session_s
+        self.remote_participants = {}
+        self.handlers = {}
+        self.connected_with = None
+        self.disconnects = 0
+
+    async def connect(self, url, token):
+        await asyncio.sleep(self.connect_s)
+        self.connected_with = (url, token)
+        loop = asyncio.get_running_loop()
+        loop.call_later(self.participant_after_s, self._join)
+        loop.call_later(self.participant_after_s + self.session_s, self.emit, "disconnected")
+
+    def _join(self):
+        self.remote_participants["user-1"] = object()
+        self.emit("participant_connected", self.remote_participants["user-1"])
+
+    def on(self, event, callback=None):
+        self.handlers.setdefault(event, []).append(callback)
+        return callback
+
+    def off(self, event, callback):
+        self.handlers.get(event, []).remove(callback)
+
+    async def disconnect(self):
+        self.disconnects += 1
+        self.emit("disconnected")
+
+    def emit(self, event, *args):
+        for cb in list(self.handlers.get(event, [])):
+            cb(*args)
+
+
+class FakePart:
+    def __init__(self, delay_s=0.0, error=None):
+        self.delay_s = delay_s
+        self.error = error
+        self.started = None
+        self.closed = 0
+
+    async def start(self, *args, **kwargs):
+        await asyncio.sleep(self.delay_s)
+        if self.error:
+            raise RuntimeError(self.error)
+        self.started = (args, kwargs)
+
+    async def aclose(self):
+        self.closed += 1
+
+
+class FakeConfigDB:
+    """Minimal-Firestore für AgentConfigService.warm()."""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def collection(self, name):
+        return self
+
+    def where(self, *args):
+        return self
+
+    def limit(self, n):
+        return self
+
+    def stream(self):
+        class Doc:
+            def __init__(self, i, d):
+                self.id, self._d = i, d
+
+            def to_dict(self):
+                return dict(self._d)
+        return iter([Doc(i, d) for i, d in self.docs.items()])
+
+
+def check(name, cond):
+    print(f"{'✅' if cond else '❌'} {name}")
+    if not cond:
+        raise SystemExit(1)
+
+
+def decode_jwt(token, secret):
+    header, body, sig = token.split(".")
+    expected = hmac.new(secret.encode(), f"{header}.{body}".encode(), hashlib.sha256).digest()
+    pad = lambda s: s + "=" * (-len(s) % 4)  # noqa: E731
+    ok = hmac.compare_digest(base64.urlsafe_b64decode(pad(sig)), expected)
+    return ok, json.loads(base64.urlsafe_b64decode(pad(header))), json.loads(base64.urlsafe_b64decode(pad(body)))
+
+
+def legacy_overhead(pip_s, token_s):
+    """Bisher pro Join vor dem eigentlichen Agent: pip install, Token-HTTP, Subprozess-Start."""
+    t = time.perf_counter()
+    time.sleep(pip_s + token_s)
+    subprocess.run([sys.executable, "-c", "import asyncio, json, logging, os"], check=True)
+    return time.perf_counter() - t
+
+
+async def run(args):
+    agent_bootstrap.register_model("vad", lambda: time.sleep(args.vad_ms / 1000) or "fake-vad")
+    agent_config._SERVICE = AgentConfigService(lambda: FakeConfigDB({
+        "av1": {"userId": "u1", "name": "Lena", "personality": "Du bist Lena",
+                "training": {"voice": {"elevenVoiceId": "voiceLena"}},
+                "liveAvatar": {"agentId": "A1", "model": "essence"}},
+    }), ttl_s=60)
+    agent_config._SERVICE.warm()
+
+    built = {}
+
+    def builder(agent_id, config, avatar_error=None):
+        built.update(agent_id=agent_id, config=config)
+        built["session"] = FakePart(args.session_ms / 1000)
+        return {"session": built["session"], "avatar": FakePart(args.avatar_ms / 1000, error=avatar_error),
+                "agent": object(), "start_kwargs": {}}
+
+    room = FakeRoom(connect_s=args.connect_ms / 1000)
+    joined = []
+    result = await live_agent.run_session("room-abc", "A1", room=room, session_builder=builder,
+                                          max_session_s=5, on_joined=joined.append)
+    timings = result["timings"]
+    check("Session beendet bei disconnected", result["status"] == "completed" and joined == [timings])
+    check("danach Session geschlossen + Room verlassen", built["session"].closed == 1 and room.disconnects == 1)
+    check("Phasen-Timings", all(p in timings for p in
+                                ("token", "connect", "participant", "config", "models", "session", "avatar",
+                                 "agent", "total")))
+    check("Config aus dem Service", built["config"].get("voice_id") == "voiceLena"
+          and built["config"].get("namespace") == "u1_av1")
+
+    url, token = room.connected_with
+    ok, header, claims = decode_jwt(token, os.environ["LIVEKIT_API_SECRET"])
+    check("Token: HS256, Signatur gültig", ok and header["alg"] == "HS256" and url == os.environ["LIVEKIT_URL"])
+    check("Token: Identity agent-A1, Room-Grant", claims["sub"] == "agent-A1" and claims["iss"] == "APIfake"
+          and claims["video"]["room"] == "room-abc" and claims["video"]["roomJoin"] is True)
+    check("Token-Service aus livekit_auth", live_agent.LiveKitTokenService is shared_tokens.LiveKitTokenService)
+
+    t_old = legacy_overhead(args.pip_ms / 1000, args.token_ms / 1000) + timings["total"]
+    print(f"⏱️ Join: bisher ~{t_old * 1000:.0f} ms (pip {args.pip_ms:.0f} ms + Token-HTTP {args.token_ms:.0f} ms "
+          f"+ Subprozess), jetzt {timings['total'] * 1000:.0f} ms {timings}")
+    check("Join schneller als bisher", timings["total"] < t_old)
+
+    quiet = await live_agent.run_session("room-leer", "A1", room=FakeRoom(participant_after_s=60),
+                                         session_builder=builder, participant_timeout_s=0.1)
+    check("kein Teilnehmer → no_participant", quiet["status"] == "no_participant")
+
+    long_room = FakeRoom(session_s=60)
+    t = time.perf_counter()
+    expired = await live_agent.run_session("room-lang", "A1", room=long_room, session_builder=builder,
+                                           max_session_s=0.1)
+    check("max_session_s: Session geschlossen + Room verlassen", expired["status"] == "completed"
+          and time.perf_counter() - t < 5 and built["session"].closed == 1 and long_room.disconnects == 1)
+
+    bad_room = FakeRoom()
+    try:
+        await live_agent.run_session("room-kaputt", "A1", room=bad_room, max_session_s=5,
+                                     session_builder=lambda a, c: builder(a, c, avatar_error="Avatar weg"))
+        raised = False
+    except RuntimeError:
+        raised = True
+    check("avatar.start schlägt fehl: Session geschlossen + Room verlassen",
+          raised and built["session"].closed == 1 and bad_room.disconnects == 1)
+
+    def broken(agent_id, config):
+        raise RuntimeError("Avatar-Init fehlgeschlagen")
+    res = await asyncio.to_thread(live_agent.start, "room-x", "A1", room=FakeRoom(), session_builder=broken)
+    check("Fehler → status error", res["status"] == "error" and "Avatar-Init" in res["message"])
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pip-ms", type=float, default=3000, help="simulierter pip install pro Join")
+    ap.add_argument("--token-ms", type=float, default=80, help="simulierter Token-Roundtrip zum Orchestrator")
+    ap.add_argument("--connect-ms", type=float, default=50)
+    ap.add_argument("--avatar-ms", type=float, default=100)
+    ap.add_argument("--session-ms", type=float, default=20)
+    ap.add_argument("--vad-ms", type=float, default=300, help="simuliertes silero.VAD.load()")
+    asyncio.run(run(ap.parse_args()))
+    print("✅ Live-Agent OK")
+
+
+if __name__ == "__main__":
+    main()
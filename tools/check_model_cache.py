@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Prüft bithuman_pipeline.model_cache ohne BitHuman-Zugang:
+
+  - fetch() über einen lokalen HTTP-Server (inkl. abgebrochenem Download)
+  - parallele fetch()-Aufrufe desselben Schlüssels → genau ein Download
+  - LRU-Eviction nach Bytes, gepinnte/geleaste Einträge bleiben
+  - Korruption (Datei überschrieben) wird bei get() erkannt
+  - Übernahme eines alten Caches ({md5}.imx + figures.json)
+
+Beispiel:
+  python tools/check_model_cache.py
+"""
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bithuman_pipeline.model_cache import ModelCache  # noqa: E402
+
+BLOBS = {f"/m{i}.imx": os.urandom(300_000 + i) for i in range(4)}
+HITS = {}
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        HITS[self.path] = HITS.get(self.path, 0) + 1
+        if self.path == "/truncated.imx":
+            # Content-Length verspricht mehr als geliefert wird
+            self.send_response(200)
+            self.send_header("Content-Length", "100000")
+            self.end_headers()
+            self.wfile.write(b"x" * 1000)
+            return
+        body = BLOBS.get(self.path)
+        if body is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def check(name, cond):
+    print(f"{'✅' if cond else '❌'} {name}")
+    if not cond:
+        raise SystemExit(1)
+
+
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    work = tempfile.mkdtemp(prefix="model_cache_")
+    try:
+        cache = ModelCache(work, max_bytes=700_000)
+
+        # Parallel: ein Download, alle bekommen dieselbe Datei
+        with ThreadPoolExecutor(8) as pool:
+            paths = list(pool.map(lambda _: cache.fetch(f"{base}/m0.imx", key="m0"), range(8)))
+        check("parallel fetch → 1 Download", HITS.get("/m0.imx") == 1 and len(set(paths)) == 1)
+        check("Inhalt korrekt", paths[0].read_bytes() == BLOBS["/m0.imx"])
+
+        # Abgebrochener Download landet nicht im Cache
+        try:
+            cache.fetch(f"{base}/truncated.imx", key="trunc")
+            check("truncated erkannt", False)
+        except Exception:  # requests (IncompleteRead) oder CacheIntegrityError
+            check("truncated erkannt", cache.get("trunc") is None and not list(cache.root.glob(".*.part")))
+
+        # Pin + LRU: m0 gepinnt, m1 geleast, m2 kommt dazu → kein Platz → m3 verdrängt m2? (älteste freie)
+        cache.pin("m0")
+        cache.fetch(f"{base}/m1.imx", key="m1")
+        cache.acquire("m1")
+        cache.fetch(f"{base}/m2.imx", key="m2")
+        check("über Limit, aber gepinnt/geleast bleibt", {"m0", "m1"} <= set(cache.keys()))
+        cache.release("m1")
+        cache.fetch(f"{base}/m3.imx", key="m3")
+        keys = set(cache.keys())
+        check(f"LRU-Eviction (übrig: {sorted(keys)})", "m0" in keys and "m3" in keys and cache.metrics()["bytes"] <= 700_000)
+
+        # Korruption
+        cache.path_for("m3").write_bytes(b"kaputt" * 10)
+        check("Korruption erkannt", cache.get("m3") is None and not cache.path_for("m3").exists())
+
+        # Prefetch + Alias
+        res = cache.prefetch([(f"{base}/m1.imx", "m1"), f"{base}/missing.imx"], pin=True)
+        check("prefetch", res["m1"] and list(res.values())[1] is None)
+        cache.set_alias("img123", "m1", figure_id="fig-1")
+        check("alias", cache.get_alias("img123")["figure_id"] == "fig-1")
+
+        # Migration eines alten Caches
+        legacy = tempfile.mkdtemp(prefix="legacy_cache_", dir=work)
+        md5 = hashlib.md5(b"image").hexdigest()
+        with open(os.path.join(legacy, f"{md5}.imx"), "wb") as f:
+            f.write(b"legacy-model")
+        with open(os.path.join(legacy, "figures.json"), "w") as f:
+            json.dump({md5: {"figure_id": "f", "runtime_model_hash": "h",
+                             "imx_path": os.path.join(legacy, f"{md5}.imx")}}, f)
+        old = ModelCache(legacy)
+        check("adopt_existing", old.adopt_existing(os.path.join(legacy, "figures.json")) == 1
+              and old.get(md5) is not None and old.get_alias(md5)["key"] == md5)
+        print(json.dumps({k: v for k, v in cache.metrics().items() if k != "entries"}, indent=2))
+    finally:
+        server.shutdown()
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Prüft dynamics_pipeline/readiness.py mit einem Temp-Weights-Verzeichnis und einer
+Stub-Warmup-Inferenz (ohne GPU/LivePortrait):
+
+  - erster Start ohne Manifest → Manifest geschrieben, Worker ready
+  - defekte Weight-Datei (gleiche Größe, anderer Inhalt) → fetch_weights nur
+    für diese Datei, nicht alle Weights
+  - abgeschnittene TensorRT-Engine → gelöscht, Worker trotzdem ready
+  - Warmup schlägt einmal fehl → Weights neu, genau ein Retry; schlägt es
+    wieder fehl → failed
+  - repair() nach Inferenz-Fehler: nur defekte Dateien, ohne Befund kein Download
+  - begin_job/end_job: cold/warm-Timings in probe()
+  - warm_idle_workers: nur bereite, freie Worker im Idle-Fenster
+  - CLI `check` mit --warmup-cmd
+
+Beispiel:
+  python tools/check_readiness.py --weights 6
+"""
+import argparse
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from dynamics_pipeline.readiness import (  # noqa: E402
+    FAILED, READY, ReadinessManager, warm_idle_workers,
+)
+
+# Stub-Warmup: scheitert, solange die Zähldatei weniger als FAIL_TIMES Einträge hat
+WARMUP_STUB = (
+    "import sys\n"
+    "path, fail_times = sys.argv[1], int(sys.argv[2])\n"
+    "with open(path, 'a+') as f:\n"
+    "    f.seek(0)\n"
+    "    runs = len(f.read())\n"
+    "    f.write('x')\n"
+    "if runs < fail_times:\n"
+    "    sys.exit('Warmup: CUDA-Fehler (simuliert)')\n"
+)
+
+
+def check(name, cond):
+    print(f"{'✅' if cond else '❌'} {name}")
+    if not cond:
+        raise SystemExit(1)
+
+
+class Source:
+    """fetch_weights-Stand-in: kopiert Dateien aus dem "Hub" und merkt sich die Aufrufe."""
+
+    def __init__(self, hub, weights_dir):
+        self.hub = hub
+        self.weights_dir = weights_dir
+        self.calls = []
+
+    def __call__(self, files):
+        self.calls.append(files)
+        for rel in files or os.listdir(self.hub):
+            os.makedirs(os.path.dirname(os.path.join(self.weights_dir, rel)), exist_ok=True)
+            shutil.copyfile(os.path.join(self.hub, rel), os.path.join(self.weights_dir, rel))
+
+
+def corrupt(path):
+    with open(path, "r+b") as f:
+        f.seek(100)
+        f.write(b"\xde\xad\xbe\xef")
+
+
+def warmup_cmd(work, fail_times):
+    stub = os.path.join(work, "warmup_stub.py")
+    with open(stub, "w") as f:
+        f.write(WARMUP_STUB)
+    counter = os.path.join(work, f"warmup_runs_{fail_times}")
+    return [sys.executable, stub, counter, str(fail_times)], counter
+
+
+def runs(counter):
+    with open(counter) as f:
+        return len(f.read())
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--weights", type=int, default=6, help="Anzahl Weight-Dateien")
+    args = ap.parse_args()
+
+    work = tempfile.mkdtemp(prefix="check_readiness_")
+    try:
+        hub, weights, engines = (os.path.join(work, d) for d in ("hub", "weights", "engines"))
+        os.makedirs(hub)
+        names = [f"net_{i}.pth" for i in range(args.weights)]
+        for i, name in enumerate(names):
+            with open(os.path.join(hub, name), "wb") as f:
+                f.write(os.urandom(4096 + i))
+        shutil.copytree(hub, weights)
+        source = Source(hub, weights)
+
+        def manager(**kwargs):
+            return ReadinessManager(weights, engine_dir=engines, fetch_weights=source,
+                                    min_weight_files=args.weights, **kwargs)
+
+        # 1. Kaltstart ohne Manifest; Job startet, bevor der Worker bereit ist
+        mgr = manager()
+        cold = mgr.begin_job()
+        probe = mgr.ensure_ready()
+        mgr.end_job(cold, 12.0)
+        check("Kaltstart: Manifest geschrieben, ready, kein Download",
+              probe["ready"] and probe["weights"]["manifest"] == "created" and source.calls == [])
+        warm = mgr.begin_job()
+        mgr.end_job(warm, 3.0)
+        jobs = mgr.probe()["jobs"]
+        check(f"Cold/Warm-Timings: {jobs}", cold is False and warm is True
+              and jobs == {"cold": {"count": 1, "mean_s": 12.0}, "warm": {"count": 1, "mean_s": 3.0}})
+
+        # Engines ins Manifest, dann neuer Container mit defektem Weight + abgeschnittener Engine
+        os.makedirs(engines, exist_ok=True)
+        for name in ("lp_fp16.engine", "lp_fp16.profile"):
+            with open(os.path.join(engines, name), "wb") as f:
+                f.write(os.urandom(8192))
+        check("commit_engines schreibt Engine-Manifest", mgr.commit_engines())
+        corrupt(os.path.join(weights, names[2]))
+        with open(os.path.join(engines, "lp_fp16.engine"), "r+b") as f:
+            f.truncate(1000)
+
+        mgr = manager()
+        probe = mgr.ensure_ready()
+        check(f"defektes Weight → gezielter Download {source.calls}",
+              probe["ready"] and source.calls == [[names[2]]] and probe["weights"]["manifest"] == "verified")
+        check(f"abgeschnittene Engine entfernt: {probe['engines']}",
+              probe["engines"]["removed"] == ["lp_fp16.engine"]
+              and not os.path.exists(os.path.join(engines, "lp_fp16.engine"))
+              and os.path.exists(os.path.join(engines, "lp_fp16.profile")))
+
+        # 2. repair() nach einem Inferenz-Fehler
+        source.calls.clear()
+        check("repair ohne Befund: kein Download, kein Retry", mgr.repair() is False and source.calls == [])
+        os.remove(os.path.join(weights, names[4]))
+        repaired = mgr.repair()
+        check(f"repair: nur fehlende Datei neu {source.calls}", repaired is True and source.calls == [[names[4]]])
+
+        # 3. Warmup: einmal Fehler → Weights neu + genau ein Retry
+        source.calls.clear()
+        cmd, counter = warmup_cmd(work, fail_times=1)
+        probe = manager(warmup_cmd=cmd).ensure_ready()
+        check(f"Warmup-Fehler → 1 Retry nach Download, ready ({runs(counter)} Läufe)",
+              probe["ready"] and runs(counter) == 2 and source.calls == [None] and "warmup_s" in probe["timings"])
+        cmd, counter = warmup_cmd(work, fail_times=5)
+        failing = manager(warmup_cmd=cmd)
+        probe = failing.ensure_ready()
+        check(f"Warmup scheitert zweimal → failed ({probe['error']})",
+              probe["state"] == FAILED and runs(counter) == 2 and not failing.begin_job())
+
+        # 4. CLI mit Stub-Warmup
+        cmd, counter = warmup_cmd(work, fail_times=0)
+        res = subprocess.run([sys.executable, "-m", "dynamics_pipeline.readiness", "check", weights,
+                              "--engines", engines, "--min-weight-files", str(args.weights),
+                              "--warmup-cmd", shlex.join(cmd)], cwd=ROOT, capture_output=True, text=True)
+        cli = json.loads(res.stdout[res.stdout.index("{"):])
+        check("CLI check --warmup-cmd → ready, Exit 0",
+              res.returncode == 0 and cli["state"] == READY and runs(counter) == 1)
+
+        # 5. Worker-Registry: warme, freie Worker im Idle-Fenster
+        now = 10_000.0
+        probes = [
+            {"worker_id": "frisch", "ready": True, "busy": 0, "last_job_at": now - 5},
+            {"worker_id": "bereit", "ready": True, "busy": 0, "last_job_at": None, "ready_at": now - 10},
+            {"worker_id": "belegt", "ready": True, "busy": 1, "last_job_at": now - 1},
+            {"worker_id": "kalt", "ready": False, "busy": 0, "last_job_at": now - 1},
+            {"worker_id": "abgelaufen", "ready": True, "busy": 0, "last_job_at": now - 120},
+        ]
+        warm = [p["worker_id"] for p in warm_idle_workers(probes, idle_window_s=60, now=now)]
+        check(f"warm_idle_workers: {warm}", warm == ["frisch", "bereit"])
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    print("✅ Readiness OK")
+
+
+if __name__ == "__main__":
+    main()
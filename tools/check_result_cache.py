@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Prüft dynamics_pipeline/result_cache.py (ohne Modal/Firebase, HEAD gegen lokalen Fake-Server):
+
+  - put → Treffer über den Request-Fingerprint (head_validator + lookup_request + get,
+    wie _cached_dynamics) im ms-Bereich, ohne die Medien zu laden
+  - force ist kein Teil von Content-Key/Fingerprint (der Worker überspringt bei
+    force den Lookup, legt aber unter demselben Key ab)
+  - geänderte Medien (ETag) oder Parameter → anderer Fingerprint, kein Treffer
+  - Eviction nach Alter und nach Gesamtgröße (LRU), Request-Index wird aufgeräumt
+
+Beispiel:
+  python tools/check_result_cache.py --max-ms 20
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dynamics_pipeline.result_cache import (  # noqa: E402
+    DynamicsResultCache, cache_key, head_validator, request_fingerprint,
+)
+
+PARAMS = {"driving_multiplier": 0.41, "scale": 2.0}
+ETAGS = {"/hero.jpg": '"img-1"', "/hero.mp4": '"vid-1"'}
+
+
+class HeadHandler(BaseHTTPRequestHandler):
+    gets = 0
+
+    def do_HEAD(self):
+        path = self.path.split("?", 1)[0]
+        if path not in ETAGS:
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", ETAGS[path])
+        self.send_header("Content-Length", "1000")
+        self.end_headers()
+
+    def do_GET(self):
+        HeadHandler.gets += 1
+        self.send_response(500)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def check(name, cond):
+    print(f"{'✅' if cond else '❌'} {name}")
+    if not cond:
+        raise SystemExit(1)
+
+
+def write(path, size):
+    with open(path, "wb") as f:
+        f.write(os.urandom(size))
+    return path
+
+
+def fingerprint(base, params):
+    validators = [head_validator(f"{base}/hero.jpg?token=abc"), head_validator(f"{base}/hero.mp4?token=abc")]
+    return request_fingerprint(validators, params) if all(validators) else None
+
+
+def cached_dynamics(cache, base, params):
+    """Wie modal_dynamics._cached_dynamics: Fingerprint → Index → Eintrag."""
+    fp = fingerprint(base, params)
+    key = cache.lookup_request(fp) if fp else None
+    return cache.get(key) if key else None
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--max-ms", type=float, default=50, help="Obergrenze für einen Treffer (HEAD + Lookup)")
+    args = ap.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), HeadHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    work = tempfile.mkdtemp(prefix="check_result_cache_")
+    try:
+        now = [1_000_000.0]
+        cache = DynamicsResultCache(os.path.join(work, "cache"), max_bytes=10 * 1024 ** 2,
+                                    max_age_s=3600, clock=lambda: now[0])
+        image = write(os.path.join(work, "hero.jpg"), 50_000)
+        video = write(os.path.join(work, "hero.mp4"), 500_000)
+        idle = write(os.path.join(work, "idle.mp4"), 1024 ** 2)
+
+        key = cache_key([image, video], PARAMS)
+        entry = cache.put(key, {"idle": idle, "frames": None}, extra={"parameters": PARAMS})
+        check("put: Eintrag vollständig, fehlende Dateien ausgelassen",
+              entry and set(entry["files"]) == {"idle"} and os.path.getsize(entry["files"]["idle"]) == 1024 ** 2)
+        fp = fingerprint(base, PARAMS)
+        cache.remember_request(fp, key)
+        cache.record_result(key, "a1/d1", {"idleVideoUrl": "https://cdn/idle.mp4", "idleBlob": "avatars/a1/idle.mp4"})
+
+        cached_dynamics(cache, base, PARAMS)  # Verbindungsaufbau
+        times = []
+        for _ in range(20):
+            t = time.perf_counter()
+            hit = cached_dynamics(cache, base, PARAMS)
+            times.append((time.perf_counter() - t) * 1000)
+        times.sort()
+        print(f"⏱️ Fingerprint-Treffer: median {times[10]:.1f} ms, max {times[-1]:.1f} ms")
+        check(f"Treffer über Fingerprint < {args.max_ms:.0f} ms, ohne Medien-Download",
+              hit and hit["key"] == key and hit["results"]["a1/d1"]["idleVideoUrl"].endswith("idle.mp4")
+              and times[10] < args.max_ms and HeadHandler.gets == 0)
+
+        check("force ändert weder Content-Key noch Fingerprint",
+              cache_key([image, video], {**PARAMS, "force": True}) == key
+              and fingerprint(base, {**PARAMS, "force": True}) == fp)
+        check("andere Parameter → kein Treffer", cached_dynamics(cache, base, {**PARAMS, "scale": 1.5}) is None)
+        ETAGS["/hero.mp4"] = '"vid-2"'
+        check("neues Hero-Video (ETag) → kein Treffer", cached_dynamics(cache, base, PARAMS) is None)
+        ETAGS["/hero.mp4"] = '"vid-1"'
+        check("HEAD-Fehler → kein Fingerprint", head_validator(f"{base}/fehlt.mp4") is None)
+
+        # Alter: abgelaufener Eintrag verschwindet samt Request-Index
+        now[0] += 3601
+        check("abgelaufener Eintrag → get() None", cache.get(key) is None)
+        stats = cache.evict()
+        check("Request-Index auf gelöschten Eintrag aufgeräumt",
+              cache.lookup_request(fp) is None and stats["entries"] == 0)
+
+        # Größe: 4 × 3 MB bei 10 MB Limit → ältester (LRU) fliegt, zuletzt gelesener bleibt
+        keys = []
+        for i in range(4):
+            blob = write(os.path.join(work, f"idle{i}.mp4"), 3 * 1024 ** 2)
+            k = cache_key([blob], PARAMS)
+            if i < 3:
+                cache.put(k, {"idle": blob})
+                cache.remember_request(f"fp{i}", k)
+                os.utime(os.path.join(cache.root, "entries", k, "meta.json"), (100 + i, 100 + i))
+            keys.append((k, blob))
+        cache.get(keys[0][0])  # Zugriff → 0 ist jetzt der jüngste
+        cache.put(keys[3][0], {"idle": keys[3][1]})
+        alive = [cache.get(k) is not None for k, _ in keys]
+        check(f"Größen-Eviction (LRU): {alive}", alive == [True, False, True, True])
+        check("Request-Index des verdrängten Eintrags entfernt",
+              cache.lookup_request("fp1") is None and cache.lookup_request("fp0") == keys[0][0])
+        print(f"📊 {cache.evict()}")
+    finally:
+        server.shutdown()
+        shutil.rmtree(work, ignore_errors=True)
+    print("✅ Ergebnis-Cache OK")
+
+
+if __name__ == "__main__":
+    main()
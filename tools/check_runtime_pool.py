@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Prüft bithuman_pipeline.runtime_pool mit einer Fake-Runtime (künstliche Ladezeit):
+
+  - Single-Flight: gleichzeitige Checkouts desselben Modells → ein Load
+  - Checkout exklusiv (ein Stream pro Runtime), Reset (interrupt) beim Checkin
+  - gleichzeitige Loads verschiedener Modelle bei max_runtimes=1: keine Runtime
+    wird zwischen Load und Checkout entladen (kein Doppel-Load)
+  - LRU-Eviction nach Anzahl und Speicher, ausgecheckte Runtimes bleiben
+  - Popularität persistiert → preload_popular() nach Neustart
+  - Latenz: Runtime pro Request (bisher) vs. Pool
+
+Beispiel:
+  python tools/check_runtime_pool.py --load-ms 200 --requests 20
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bithuman_pipeline.runtime_pool import RuntimePool  # noqa: E402
+
+GB = 1024 ** 3
+
+
+class FakeRuntime:
+    created = []
+
+    def __init__(self, model_path, load_s):
+        self.model_path = model_path
+        self.load_s = load_s
+        self.started = self.stopped = False
+        self.interrupts = 0
+        self.streams = 0
+        self.max_streams = 0
+        FakeRuntime.created.append(self)
+
+    async def start(self):
+        await asyncio.sleep(self.load_s)
+        self.started = True
+
+    async def stop(self):
+        self.stopped = True
+
+    def interrupt(self):
+        self.interrupts += 1
+
+    async def stream(self, seconds):
+        assert self.started and not self.stopped, "Runtime nicht nutzbar"
+        self.streams += 1
+        self.max_streams = max(self.max_streams, self.streams)
+        await asyncio.sleep(seconds)
+        self.streams -= 1
+
+
+def check(name, cond):
+    print(f"{'✅' if cond else '❌'} {name}")
+    if not cond:
+        raise SystemExit(1)
+
+
+def make_pool(load_s, **kwargs):
+    async def factory(model_path, **_):
+        return FakeRuntime(model_path, load_s)
+    return RuntimePool(factory, size_of=lambda kw: kw.get("gb", 1) * GB, **kwargs)
+
+
+async def use(pool, key, seconds=0.01, gb=1):
+    async with pool.checkout(key, model_path=f"/models/{key}.imx", gb=gb) as rt:
+        await rt.stream(seconds)
+        return rt
+
+
+async def run(args):
+    load_s = args.load_ms / 1000
+    tmp = tempfile.mkdtemp(prefix="runtime_pool_")
+
+    pool = make_pool(load_s, max_runtimes=2)
+    rts = await asyncio.gather(*(use(pool, "lena", 0.02) for _ in range(5)))
+    m = pool.metrics()
+    check("5 gleichzeitige Checkouts → 1 Load", m["loads"] == 1 and len({id(r) for r in rts}) == 1)
+    check("exklusiver Checkout + Reset je Checkin", rts[0].max_streams == 1 and rts[0].interrupts == 5)
+
+    # Race: zwei Modelle gleichzeitig, Platz für eins
+    FakeRuntime.created.clear()
+    tight = make_pool(load_s, max_runtimes=1)
+    a, b = await asyncio.gather(use(tight, "anna"), use(tight, "ben"))
+    m = tight.metrics()
+    check(f"max_runtimes=1, 2 Modelle parallel → 2 Loads (nicht {m['loads']})",
+          m["loads"] == 2 and len(FakeRuntime.created) == 2 and a.model_path != b.model_path)
+    check("danach wieder im Limit", len(m["runtimes"]) == 1 and m["evictions"] == 1)
+
+    many = await asyncio.gather(*(use(tight, k) for k in ("c", "d", "e", "c", "d", "e")))
+    check("kein Stream auf entladener Runtime", all(r.started for r in many))
+
+    # LRU nach Speicher, ausgecheckt bleibt
+    lru = make_pool(load_s, max_runtimes=10, max_bytes=3 * GB)
+    await use(lru, "x", gb=1)
+    await use(lru, "y", gb=1)
+    async with lru.checkout("big", model_path="/models/big.imx", gb=2) as big:
+        keys = {r["key"] for r in lru.metrics()["runtimes"]}
+        check("Speicherlimit: ältestes Modell (x) entladen", keys == {"y", "big"})
+        await use(lru, "z", gb=1)
+        check("ausgecheckte Runtime bleibt", not big.stopped and "big" in {r["key"] for r in lru.metrics()["runtimes"]})
+
+    # Popularität → Preload nach Neustart
+    stats = os.path.join(tmp, "runtime_stats.json")
+    p1 = make_pool(load_s, stats_path=stats)
+    for key, n in (("oft", 5), ("selten", 1)):
+        for _ in range(n):
+            await use(p1, key)
+    p2 = make_pool(load_s, stats_path=stats)
+    loaded = await p2.preload_popular(1)
+    t = time.perf_counter()
+    await use(p2, "oft")
+    check(f"preload_popular: {loaded}, erster Request ohne Load ({(time.perf_counter() - t) * 1000:.0f} ms)",
+          loaded == ["oft"] and p2.metrics()["loads"] == 1 and p2.metrics()["hits"] >= 1)
+
+    # Latenz: bisher Runtime pro Request
+    t = time.perf_counter()
+    for _ in range(args.requests):
+        rt = FakeRuntime("/models/lena.imx", load_s)
+        await rt.start()
+        await rt.stream(0.005)
+        await rt.stop()
+    t_old = time.perf_counter() - t
+    pooled = make_pool(load_s)
+    t = time.perf_counter()
+    for _ in range(args.requests):
+        await use(pooled, "lena", 0.005)
+    t_new = time.perf_counter() - t
+    print(f"⏱️ {args.requests} Requests: bisher {t_old * 1000:.0f} ms, Pool {t_new * 1000:.0f} ms")
+    check("Pool spart Ladezeit", t_new < t_old)
+    print(f"📊 {pooled.metrics()}")
+    await pooled.close()
+    shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--load-ms", type=float, default=100, help="simulierte Ladezeit einer Runtime")
+    ap.add_argument("--requests", type=int, default=10)
+    asyncio.run(run(ap.parse_args()))
+    print("✅ Runtime-Pool OK")
+
+
+if __name__ == "__main__":
+    main()
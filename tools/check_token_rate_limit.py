@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Prüft das Rate-Limit von /livekit/token im Orchestrator (Starlette-TestClient, kein LiveKit nötig):
+
+  - anonyme Anfragen (ohne user_id): Bucket pro Client-Adresse – ein Client in
+    einer Reconnect-Schleife bekommt 429, andere anonyme Clients nicht
+  - Client-Adresse = letzter X-Forwarded-For-Eintrag (vom Client vorangestellte
+    Einträge umgehen das Limit nicht)
+  - mit user_id: Bucket pro Identity, unabhängig von anonymen Anfragen
+  - Backend nutzt dieselbe Limiter-Implementierung (Paket livekit_auth, kein Duplikat)
+
+Beispiel:
+  python tools/check_token_rate_limit.py --burst 5
+"""
+import argparse
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "orchestrator"))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+
+
+def check(name, cond):
+    print(f"{'✅' if cond else '❌'} {name}")
+    if not cond:
+        raise SystemExit(1)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--burst", type=int, default=5)
+    args = ap.parse_args()
+    os.environ.update({"LIVEKIT_URL": "wss://fake.livekit.cloud", "LIVEKIT_API_KEY": "APIfake",
+                       "LIVEKIT_API_SECRET": "geheim-geheim-geheim",
+                       "LIVEKIT_TOKEN_RATE_PER_SEC": "0.001", "LIVEKIT_TOKEN_BURST": str(args.burst)})
+
+    from starlette.testclient import TestClient
+
+    import py_asgi_app
+    from app import livekit_tokens as backend_tokens
+    from livekit_auth import tokens as shared_tokens
+
+    client = TestClient(py_asgi_app.app)
+
+    def get(ip, **params):
+        return client.get("/livekit/token", params=params, headers={"X-Forwarded-For": ip}).status_code
+
+    loop = [get("203.0.113.7") for _ in range(args.burst + 3)]
+    check(f"anonymer Client in Schleife: {args.burst}× 200, dann 429",
+          loop[:args.burst] == [200] * args.burst and set(loop[args.burst:]) == {429})
+    check("anderer anonymer Client nicht betroffen", get("198.51.100.2") == 200)
+    check("vorangestellte X-Forwarded-For-Einträge umgehen das Limit nicht",
+          get("1.2.3.4, 203.0.113.7") == 429)
+    r = client.post("/livekit/token", json={"avatar_id": "avatar"}, headers={"X-Forwarded-For": "203.0.113.7"})
+    check("POST nutzt denselben Client-Bucket", r.status_code == 429 and "retry-after" in r.headers)
+    check("mit user_id: eigener Bucket", get("203.0.113.7", user_id="u1", room="r1") == 200)
+
+    check("Orchestrator und Backend nutzen den Limiter aus livekit_auth",
+          backend_tokens.IdentityRateLimiter is shared_tokens.IdentityRateLimiter is py_asgi_app.IdentityRateLimiter
+          and backend_tokens.RateLimited is shared_tokens.RateLimited)
+    print(f"📊 {py_asgi_app._token_service().metrics()}")
+    print("✅ Token-Rate-Limit OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Prüft dynamics_pipeline/uploads.py mit LocalFsStorage (ohne Firebase):
+
+  - Fehler mitten im Chunk-Upload (fail_hook) → Retry setzt am Offset fort,
+    statt die Datei neu zu übertragen; Inhalt bitgenau
+  - dauerhaft fehlschlagendes Asset fehlt im Ergebnis und im Manifest,
+    die anderen Assets sind hochgeladen
+  - zweiter Lauf: unveränderte Assets aus dem Manifest übersprungen
+  - widerrufener Download-Token oder gelöschter Blob → erneuter Upload mit
+    neuem Token (alte URL wäre tot), geänderter Inhalt → erneuter Upload
+
+Beispiel:
+  python tools/check_uploads.py --size-mb 3
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dynamics_pipeline.uploads import LocalFsStorage, file_sha256, upload_assets  # noqa: E402
+
+CHUNK = 256 * 1024
+
+
+def check(name, cond):
+    print(f"{'✅' if cond else '❌'} {name}")
+    if not cond:
+        raise SystemExit(1)
+
+
+class FailAt:
+    """fail_hook: wirft je remote_path beim ersten Erreichen eines Offsets, protokolliert alle Offsets."""
+
+    def __init__(self, fail_at=None, always=()):
+        self.fail_at = dict(fail_at or {})
+        self.always = set(always)
+        self.offsets = {}
+
+    def __call__(self, remote_path, offset):
+        self.offsets.setdefault(remote_path, []).append(offset)
+        if remote_path in self.always:
+            raise ConnectionError(f"simulierter Abbruch {remote_path}")
+        if self.fail_at.get(remote_path) == offset:
+            del self.fail_at[remote_path]
+            raise ConnectionError(f"simulierter Abbruch bei {offset} Bytes")
+
+
+def write(path, size, seed=0):
+    with open(path, "wb") as f:
+        f.write(bytes((i * 7 + seed) % 251 for i in range(size)))
+    return path
+
+
+def run(storage, assets, **kwargs):
+    return upload_assets(storage, assets, manifest_path="avatars/a1/dynamics/d1/manifest.json", max_workers=3,
+                         retries=3, backoff_s=0.0, resumable_threshold=CHUNK, chunk_size=CHUNK, **kwargs)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--size-mb", type=float, default=2.0, help="Größe des großen Assets (Chunk-Upload)")
+    args = ap.parse_args()
+
+    work = tempfile.mkdtemp(prefix="check_uploads_")
+    try:
+        big_size = int(args.size_mb * 1024 * 1024)
+        big = write(os.path.join(work, "idle.mp4"), big_size)
+        small = write(os.path.join(work, "hero.jpg"), 40_000, seed=3)
+        broken = write(os.path.join(work, "latents.npz"), 10_000, seed=5)
+        assets = [
+            {"key": "idleVideoUrl", "local_path": big, "remote_path": "avatars/a1/dynamics/d1/idle.mp4",
+             "content_type": "video/mp4"},
+            {"key": "heroImageChunkUrl", "local_path": small, "remote_path": "avatars/a1/dynamics/d1/hero.jpg",
+             "content_type": "image/jpeg"},
+            {"key": "latentsUrl", "local_path": broken, "remote_path": "avatars/a1/dynamics/d1/latents.npz",
+             "content_type": "application/octet-stream"},
+        ]
+        big_remote = assets[0]["remote_path"]
+        fail_offset = (big_size // CHUNK // 2) * CHUNK
+        hook = FailAt(fail_at={big_remote: fail_offset}, always={assets[2]["remote_path"]})
+        storage = LocalFsStorage(os.path.join(work, "bucket"), fail_hook=hook)
+
+        res = run(storage, assets)
+        offsets = hook.offsets[big_remote]
+        retry_start = offsets[offsets.index(fail_offset) + 1]
+        print(f"📦 {big_size / 1e6:.1f} MB in {CHUNK // 1024}-KB-Chunks, Abbruch bei {fail_offset / 1e6:.2f} MB")
+        check(f"Retry setzt am Offset fort ({retry_start} statt 0), keine Bytes doppelt",
+              retry_start == fail_offset and offsets.count(0) == 1)
+        check("Inhalt nach Retry bitgenau", file_sha256(storage._path(big_remote)) == file_sha256(big))
+        check("kein .part-Rest nach erfolgreichem Retry",
+              not [n for n in os.listdir(os.path.dirname(storage._path(big_remote)))
+                   if n.startswith("idle.mp4.") and n.endswith(".part")])
+        manifest = json.loads(storage.read_text("avatars/a1/dynamics/d1/manifest.json"))["assets"]
+        check("dauerhaft fehlschlagendes Asset fehlt in Ergebnis und Manifest",
+              set(res) == {"idleVideoUrl", "heroImageChunkUrl"} and set(manifest) == set(res))
+
+        # zweiter Lauf (Job wiederholt): alles aus dem Manifest
+        hook.always.clear()
+        ok = assets[:2]
+        again = run(storage, ok)
+        check("zweiter Lauf: unveränderte Assets übersprungen, gleiche URLs",
+              all(r["skipped"] for r in again.values())
+              and all(again[k]["url"] == res[k]["url"] for k in again))
+
+        # Token in der Console widerrufen → Manifest-Eintrag nicht mehr nutzbar
+        meta_path = storage._path(big_remote) + ".meta.json"
+        with open(meta_path) as f:
+            meta = json.load(f)
+        meta["firebaseStorageDownloadTokens"] = "ersetzt-in-der-console"
+        with open(meta_path, "w") as f:
+            json.dump(meta, f)
+        os.remove(storage._path(assets[1]["remote_path"]))
+        revoked = run(storage, ok)
+        check("widerrufener Token / gelöschter Blob → neu hochgeladen, neuer Token",
+              not revoked["idleVideoUrl"]["skipped"] and revoked["idleVideoUrl"]["token"] != res["idleVideoUrl"]["token"]
+              and not revoked["heroImageChunkUrl"]["skipped"]
+              and revoked["idleVideoUrl"]["token"] in storage.download_tokens(big_remote))
+
+        write(small, 40_000, seed=9)
+        changed = run(storage, ok)
+        check("geänderter Inhalt → erneuter Upload, Rest übersprungen",
+              not changed["heroImageChunkUrl"]["skipped"] and changed["idleVideoUrl"]["skipped"])
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    print("✅ Uploads OK")
+
+
+if __name__ == "__main__":
+    main()
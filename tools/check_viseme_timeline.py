@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Prüft orchestrator/viseme_timeline.py gegen die bisherige Per-Zeichen-Timeline:
+
+  - Batch-Timeline (feed() pro Audio-Chunk + flush()) ergibt auf dem 10-ms-Raster
+    dieselben Viseme wie eine Nachricht pro Zeichen – für jede Chunkgröße, also
+    auch wenn Digraphen ("t|h", "p|h", "s|c|h", "q|u") über Chunkgrenzen laufen
+  - keine Zeichen gehen verloren (chars_in, Ende der Timeline)
+  - Binärformat: to_binary → decode_binary
+  - Nachrichten pro Äußerung: bisher eine pro Zeichen, jetzt eine pro Chunk
+
+Beispiel:
+  python tools/check_viseme_timeline.py --char-ms 55 --max-chunk 12
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "orchestrator"))
+
+from viseme_timeline import (  # noqa: E402
+    VisemeTimelineEncoder, char_visemes, decode_binary, sample_timeline,
+)
+
+TEXT = ("Schöne Theorie: Philipp quatscht mit Sascha über Chemie, Physik und Thermodynamik. "
+        "Danach schreibt er: Quittung bitte per Post!")
+
+
+def check(name, cond):
+    print(f"{'✅' if cond else '❌'} {name}")
+    if not cond:
+        raise SystemExit(1)
+
+
+def alignment(text, char_ms):
+    return {
+        "chars": list(text),
+        "charStartTimesMs": [i * char_ms for i in range(len(text))],
+        "charDurationsMs": [char_ms] * len(text),
+    }
+
+
+def per_char_timeline(al):
+    """Bisher: eine Nachricht pro Zeichen, Client mappt die ganze Äußerung."""
+    visemes = char_visemes(al["chars"])
+    return [(v, s, d) for v, s, d in zip(visemes, al["charStartTimesMs"], al["charDurationsMs"])]
+
+
+def batch_timeline(al, chunk):
+    enc = VisemeTimelineEncoder(seq=7)
+    items, messages = [], 0
+    for i in range(0, len(al["chars"]), chunk):
+        runs = enc.feed({k: v[i:i + chunk] for k, v in al.items()})
+        if runs:
+            seq, decoded = decode_binary(enc.to_binary(runs))
+            assert seq == 7 and decoded == runs, "Binär-Roundtrip"
+            items += runs
+            messages += 1
+    tail = enc.flush()
+    if tail:
+        items += tail
+        messages += 1
+    return items, messages, enc
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--char-ms", type=int, default=60)
+    ap.add_argument("--max-chunk", type=int, default=40)
+    args = ap.parse_args()
+
+    al = alignment(TEXT, args.char_ms)
+    reference = sample_timeline(per_char_timeline(al))
+    end_ms = len(TEXT) * args.char_ms
+
+    mismatches = {}
+    for chunk in range(1, args.max_chunk + 1):
+        items, messages, enc = batch_timeline(al, chunk)
+        grid = sample_timeline(items)
+        diff = [t for t in reference if grid.get(t) != reference[t]]
+        if diff or set(grid) != set(reference):
+            mismatches[chunk] = diff[:5]
+        check_end = items and items[-1][1] + items[-1][2] == end_ms and enc.chars_in == len(TEXT)
+        if not check_end:
+            mismatches.setdefault(chunk, ["Ende fehlt"])
+    check(f"Chunkgrößen 1–{args.max_chunk}: Batch-Raster = Per-Zeichen-Raster"
+          + (f" (abweichend: {mismatches})" if mismatches else ""), not mismatches)
+
+    # gezielt: jeder Digraph genau an der Chunkgrenze
+    for word, cut in (("Theorie", 1), ("Philipp", 1), ("Schule", 1), ("Schule", 2), ("Quittung", 1)):
+        al_word = alignment(word, args.char_ms)
+        enc = VisemeTimelineEncoder()
+        items = enc.feed({k: v[:cut] for k, v in al_word.items()})
+        items += enc.feed({k: v[cut:] for k, v in al_word.items()}) + enc.flush()
+        check(f"{word[:cut]}|{word[cut:]}", sample_timeline(items) == sample_timeline(per_char_timeline(al_word)))
+
+    enc = VisemeTimelineEncoder()
+    first = enc.feed(alignment("Mut", args.char_ms))
+    check("Digraph-Anfang am Chunkende zurückgehalten, flush() liefert ihn",
+          first[-1][1] + first[-1][2] == 2 * args.char_ms and enc.flush() == [("E", 2 * args.char_ms, args.char_ms)])
+
+    _, messages, enc = batch_timeline(al, 40)
+    print(f"📨 {len(TEXT)} Zeichen: bisher {len(TEXT)} Nachrichten, jetzt {messages} "
+          f"({enc.items_out} Items in {enc.batches_out} Batches)")
+    check("weniger Nachrichten", messages < len(TEXT) / 10)
+    print("✅ Viseme-Timeline OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Prüft dynamics_pipeline.workspace (Request-Workspaces + Janitor):
+
+  - Aufräumen bei Erfolg, Exception und asyncio-Abbruch
+  - Quota beim Upload-Schreiben und per check_quota()
+  - handoff(): FileResponse liest die Datei, danach ist der Workspace weg
+  - Janitor: abgelaufene keep()-Verzeichnisse und Reste toter Prozesse
+
+Beispiel:
+  python tools/check_workspaces.py
+"""
+import asyncio
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dynamics_pipeline.workspace import MARKER, WorkspaceManager, WorkspaceQuotaExceeded  # noqa: E402
+
+
+class FakeUpload:
+    def __init__(self, data: bytes, filename: str):
+        self.file = io.BytesIO(data)
+        self.filename = filename
+
+    async def read(self, n: int = -1) -> bytes:
+        return self.file.read(n)
+
+
+def check(name, cond):
+    print(f"{'✅' if cond else '❌'} {name}")
+    if not cond:
+        raise SystemExit(1)
+
+
+async def run(manager: WorkspaceManager):
+    async with manager.aworkspace("ok") as ws:
+        p = await ws.save_upload(FakeUpload(b"x" * 1000, "../../etc/passwd"))
+        check("Dateiname bereinigt", p.parent == ws.path)
+    check("Erfolg → gelöscht", not ws.path.exists())
+
+    try:
+        async with manager.aworkspace("boom") as ws:
+            ws.write_bytes("a.bin", b"1")
+            raise ValueError("boom")
+    except ValueError:
+        pass
+    check("Exception → gelöscht", not ws.path.exists())
+
+    holder = {}
+
+    async def slow():
+        async with manager.aworkspace("cancel") as ws:
+            holder["ws"] = ws
+            await asyncio.sleep(10)
+    task = asyncio.ensure_future(slow())
+    await asyncio.sleep(0.05)
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    check("Abbruch → gelöscht", not holder["ws"].path.exists())
+
+    try:
+        async with manager.aworkspace("quota", quota_bytes=10_000) as ws:
+            await ws.save_upload(FakeUpload(b"x" * 50_000, "big.bin"))
+        check("Quota beim Upload", False)
+    except WorkspaceQuotaExceeded:
+        check("Quota beim Upload", not ws.path.exists())
+
+    with manager.workspace("quota2", quota_bytes=10_000) as ws:
+        ws.file("ffmpeg_out.mp4").write_bytes(b"y" * 20_000)  # externer Schreiber
+        try:
+            ws.check_quota()
+            check("check_quota", False)
+        except WorkspaceQuotaExceeded:
+            check("check_quota", True)
+
+
+def check_handoff(manager: WorkspaceManager):
+    try:
+        from fastapi import FastAPI
+        from fastapi.responses import FileResponse
+        from fastapi.testclient import TestClient
+    except ImportError:
+        print("⏭️ handoff übersprungen (fastapi/httpx fehlt)")
+        return
+    app = FastAPI()
+    seen = {}
+
+    @app.get("/video")
+    async def video():
+        ws = manager.create("handoff")
+        try:
+            out = ws.write_bytes("out.mp4", b"video-bytes")
+            seen["path"] = ws.path
+            return FileResponse(str(out), background=ws.handoff())
+        finally:
+            ws.close()
+    body = TestClient(app).get("/video").content
+    check("handoff: Datei ausgeliefert, danach gelöscht", body == b"video-bytes" and not seen["path"].exists())
+
+
+def check_janitor(manager: WorkspaceManager):
+    kept = manager.create("kept").keep(seconds=0)
+    dead = manager.root / "dead-worker"
+    dead.mkdir()
+    with open(dead / MARKER, "w") as f:
+        json.dump({"pid": 2 ** 22 + 12345, "created": time.time() - 120, "expires": None}, f)
+    fresh = manager.root / "foreign-fresh"
+    fresh.mkdir()
+    with open(fresh / MARKER, "w") as f:
+        json.dump({"pid": os.getppid(), "created": time.time(), "expires": None}, f)
+    active = manager.create("active")
+    res = manager.reap()
+    check("Janitor: keep() abgelaufen + toter Worker entfernt",
+          not kept.path.exists() and not dead.exists())
+    check("Janitor: aktive/laufende bleiben", active.path.exists() and fresh.exists())
+    active.close()
+    print(json.dumps({"reaped_now": res["removed"], **{k: v for k, v in manager.metrics().items() if k != "disk"}}, indent=2))
+
+
+def main():
+    work = tempfile.mkdtemp(prefix="workspaces_")
+    try:
+        manager = WorkspaceManager(work, quota_bytes=1024 ** 2)
+        asyncio.run(run(manager))
+        check_handoff(manager)
+        check_janitor(manager)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()